@@ -6,8 +6,11 @@ from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from database import engine, Base, get_db
-from routers import videos, journals, masters, auth, export, data_sync, password_reset, video_stream
+from database import engine, get_db, SessionLocal
+from services.blob_store import resolve_local_path
+from services.lazy_loader import register_warmup, warm_up
+from services.profiling import ProfilingMiddleware
+from routers import videos, journals, masters, auth, export, data_sync, password_reset, video_stream, metrics
 from routers import auth_v2  # 新しい認証ルーター追加
 from routers import temp_user  # 一時的なユーザー作成API
 from routers import test_email  # メール送信テストAPI
@@ -25,104 +28,17 @@ logger.info(f"サーバーポート設定: {port}")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    try:
-        # テーブル作成（既存の場合はスキップ）
-        logger.info("データベーステーブルを確認中...")
-        Base.metadata.create_all(bind=engine, checkfirst=True)
-        logger.info("データベース初期化完了")
-        
-        # マイグレーション実行（新しいカラムを追加）
+    # マイグレーションは migrate.py で実行する（RUN_MIGRATIONS_ON_STARTUP=true の場合のみ起動時にも実行）
+    if os.getenv("RUN_MIGRATIONS_ON_STARTUP", "false").lower() == "true":
         try:
-            from sqlalchemy import text
-            with engine.begin() as conn:  # begin()でトランザクション管理
-                # PostgreSQL用
-                if "postgresql" in str(engine.url) or "postgres" in str(engine.url):
-                    logger.info("PostgreSQL: reset_tokenカラムを追加中...")
-                    
-                    # カラムの存在確認
-                    result = conn.execute(text("""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'users' 
-                        AND column_name IN ('reset_token', 'reset_token_expires')
-                    """))
-                    existing_columns = [row[0] for row in result]
-                    
-                    # reset_tokenカラムが存在しない場合のみ追加
-                    if 'reset_token' not in existing_columns:
-                        try:
-                            conn.execute(text("""
-                                ALTER TABLE users ADD COLUMN reset_token VARCHAR(255)
-                            """))
-                            logger.info("✅ reset_tokenカラムを追加しました")
-                        except Exception as e:
-                            logger.warning(f"reset_tokenカラム追加エラー: {e}")
-                    
-                    # reset_token_expiresカラムが存在しない場合のみ追加
-                    if 'reset_token_expires' not in existing_columns:
-                        try:
-                            conn.execute(text("""
-                                ALTER TABLE users ADD COLUMN reset_token_expires TIMESTAMP WITH TIME ZONE
-                            """))
-                            logger.info("✅ reset_token_expiresカラムを追加しました")
-                        except Exception as e:
-                            logger.warning(f"reset_token_expiresカラム追加エラー: {e}")
-                    
-                    logger.info("PostgreSQL: マイグレーション確認完了")
-                    
-                # SQLite用
-                else:
-                    try:
-                        conn.execute(text("ALTER TABLE users ADD COLUMN reset_token VARCHAR(255)"))
-                        logger.info("SQLite: reset_tokenカラムを追加")
-                    except:
-                        pass
-                    try:
-                        conn.execute(text("ALTER TABLE users ADD COLUMN reset_token_expires DATETIME"))
-                        logger.info("SQLite: reset_token_expiresカラムを追加")
-                    except:
-                        pass
-                        
-            logger.info("マイグレーション完了")
+            from services.schema_migrations import run_migrations
+            run_migrations(engine)
         except Exception as e:
-            logger.error(f"マイグレーションエラー: {e}")
+            logger.warning(f"データベース初期化警告: {e}")
             # エラーが発生してもアプリケーションは続行
-        
-        # 初回起動時のadminユーザー作成
-        from sqlalchemy.orm import Session
-        from models import User  # Userモデルをインポート
-        from passlib.context import CryptContext
-        
-        pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-        session = Session(engine)
-        
-        try:
-            admin = session.query(User).filter_by(username='admin').first()
-            if not admin:
-                logger.info("Creating default admin user...")
-                admin = User(
-                    email='admin@example.com',
-                    username='admin',
-                    hashed_password=pwd_context.hash('admin123'),
-                    full_name='Administrator',
-                    is_superuser=True,
-                    is_active=True
-                )
-                session.add(admin)
-                session.commit()
-                logger.info("✅ Admin user created (username: admin, password: admin123)")
-            else:
-                logger.info("Admin user already exists")
-        finally:
-            session.close()
-            
-    except Exception as e:
-        logger.warning(f"データベース初期化警告: {e}")
-        # エラーが発生してもアプリケーションは続行
-        pass
     
     # Create uploads directory - Render環境では/tmpを使用
-    base_dir = "/tmp" if os.getenv("RENDER") == "true" else "uploads"
+    base_dir = resolve_local_path("uploads/")
     os.makedirs(base_dir, exist_ok=True)
     os.makedirs(f"{base_dir}/frames", exist_ok=True)
     os.makedirs(f"{base_dir}/videos", exist_ok=True)
@@ -157,9 +73,21 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+async def _authorize_profiling(authorization):
+    """X-Profile: 1 / ?__profile=1 によるプロファイルは管理者のみ"""
+    db = SessionLocal()
+    try:
+        user = await auth.get_optional_current_user(authorization, db)
+        return user is not None and user.is_superuser
+    finally:
+        db.close()
+
+# 遅いリクエスト・管理者が要求したリクエストのプロファイル（X-Request-ID ごとに保存）
+app.add_middleware(ProfilingMiddleware, authorize=_authorize_profiling)
+
 # 静的ファイル - Render環境では/tmpを使用
 import os
-static_dir = "/tmp" if os.getenv("RENDER") == "true" else "uploads"
+static_dir = resolve_local_path("uploads/")
 os.makedirs(static_dir, exist_ok=True)
 os.makedirs(f"{static_dir}/frames", exist_ok=True)
 os.makedirs(f"{static_dir}/videos", exist_ok=True)
@@ -176,6 +104,7 @@ app.include_router(masters.router, prefix="/masters", tags=["マスタ"])
 app.include_router(export.router, prefix="/export", tags=["エクスポート"])
 app.include_router(data_sync.router, tags=["データ同期"])  # データ同期API
 app.include_router(video_stream.router, prefix="/videos", tags=["ビデオストリーミング"])  # ビデオストリーミングAPI
+app.include_router(metrics.router, tags=["計測"])  # 動画処理の計測結果API
 app.include_router(temp_user.router, tags=["一時API"])  # 一時的なユーザー作成API
 app.include_router(test_email.router, tags=["テスト"])  # メール送信テストAPI
 
@@ -187,6 +116,22 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": "1.0.2"}  # トークン表示機能追加
 
+def _connect_database():
+    with engine.connect():
+        pass
+
+register_warmup("database", _connect_database)
+
+@app.api_route("/warmup", methods=["GET", "POST"])
+async def warmup():
+    """重いモジュール・クライアントを前もって読み込む（デプロイ直後・コールドスタート後に呼ぶ）"""
+    import asyncio
+    results = await asyncio.to_thread(warm_up)
+    return {
+        "status": "ok" if all(result["error"] is None for result in results.values()) else "partial",
+        "tasks": results,
+    }
+
 @app.get("/db-info")
 async def database_info(db: Session = Depends(get_db)):
     """データベース情報を取得（デバッグ用）"""
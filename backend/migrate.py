@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+データベースマイグレーションコマンド
+
+テーブル作成・後から追加したカラムの追加・adminユーザー作成を行う。
+アプリの起動時には実行しないため、デプロイ時（Render の preDeployCommand・start.sh・
+render_start.sh、Railway の startCommand、docker-compose の command）に実行する。
+
+使い方:
+    python migrate.py
+"""
+
+import sys
+import logging
+from dotenv import load_dotenv
+
+# 環境変数を読み込む
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    from services.schema_migrations import run_migrations
+
+    try:
+        run_migrations()
+    except Exception as e:
+        logger.error(f"マイグレーションエラー: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
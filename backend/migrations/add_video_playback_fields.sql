@@ -0,0 +1,5 @@
+-- 再生用レンディション（faststart MP4）とキーフレームインデックスのカラムを追加
+-- Add playback rendition and keyframe index columns
+
+ALTER TABLE videos ADD COLUMN playback_path VARCHAR(500);
+ALTER TABLE videos ADD COLUMN keyframe_index_json TEXT;
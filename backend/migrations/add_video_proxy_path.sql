@@ -0,0 +1,4 @@
+-- 解析・プレビュー用の低解像度プロキシのカラムを追加
+-- Add proxy rendition column for analysis and preview
+
+ALTER TABLE videos ADD COLUMN proxy_path VARCHAR(500);
@@ -98,6 +98,9 @@ class Video(Base):
     cloud_url = Column(String(500))  # クラウドストレージURL
     local_path = Column(String(500))
     thumbnail_path = Column(String(500))  # サムネイルパス追加
+    playback_path = Column(String(500))  # 再生用レンディション（faststart MP4）
+    keyframe_index_json = Column(Text)  # キーフレーム時刻（ミリ秒）のJSON配列
+    proxy_path = Column(String(500))  # 解析・プレビュー用の低解像度プロキシ
     file_size_mb = Column(Float)  # ファイルサイズ（MB）
     duration_ms = Column(Integer)
     status = Column(String(20), default="queued", nullable=False)
@@ -299,6 +302,48 @@ class Rule(Base):
         Index("idx_rule_active", "is_active"),
     )
 
+class ExportJob(Base):
+    """非同期エクスポートジョブ"""
+    __tablename__ = "export_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    format = Column(String(50), nullable=False)
+    filters_json = Column(Text)  # JSON string of export filters
+    data_version = Column(String(64))  # 仕訳・領収書の更新状況から算出したバージョン
+    cache_key = Column(String(64), nullable=False)  # (user, filters, format, data_version) のハッシュ
+    status = Column(String(20), default="queued", nullable=False)  # queued, processing, done, error
+    rows_written = Column(Integer, default=0)
+    artifact_path = Column(String(500))
+    artifact_size = Column(Integer)  # 圧縮後のバイト数
+    error_message = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        Index("idx_export_job_cache", "cache_key", "status"),
+        Index("idx_export_job_user", "user_id"),
+    )
+
+class ProcessingMetric(Base):
+    """動画処理ジョブの段階ごとの計測結果（1回の実行ごとに1行）"""
+    __tablename__ = "processing_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), nullable=True)
+    job = Column(String(50), nullable=False)  # run_video_analysis, process_video_ocr_sync
+    status = Column(String(20), nullable=False)  # done, error
+    duration_ms = Column(Float)
+    peak_rss_mb = Column(Float)  # ジョブ中の最大RSS（段階の境界で計測）
+    stages_json = Column(Text)  # 段階ごとの所要時間・件数のJSON配列
+    error_message = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_processing_metric_video", "video_id", "created_at"),
+    )
+
 # パスワードリセットトークン
 class PasswordResetToken(Base):
     """パスワードリセットトークンテーブル"""
@@ -24,6 +24,12 @@ echo "RENDER=$RENDER"
 echo "DATABASE_URL=${DATABASE_URL:0:30}..."
 echo "STORAGE_TYPE=$STORAGE_TYPE"
 
+# マイグレーション（render.yaml の preDeployCommand で実行する場合は MIGRATE_ON_START=false）
+if [ "${MIGRATE_ON_START:-true}" = "true" ]; then
+    echo "Running migrations..."
+    python3 migrate.py || echo "WARNING: migration failed"
+fi
+
 # アプリケーション起動
 echo "Starting FastAPI application..."
 python3 main.py
\ No newline at end of file
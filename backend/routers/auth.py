@@ -10,6 +10,7 @@ import os
 
 from database import get_db
 from models import User
+from services.auth_cache import principal_cache
 
 router = APIRouter()
 
@@ -103,6 +104,11 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # 検証済みのトークンならデコードとユーザー取得を省略
+    user = principal_cache.get(db, __name__, token)
+    if user is not None:
+        return user
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -115,6 +121,7 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
+    principal_cache.put(__name__, token, user, payload.get("exp"))
     return user
 
 async def get_current_active_user(
@@ -135,15 +142,20 @@ async def get_optional_current_user(
     
     token = authorization.replace("Bearer ", "")
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    # 検証済みのトークンならデコードとユーザー取得を省略（一覧のポーリングなど）
+    user = principal_cache.get(db, __name__, token)
+    if user is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                return None
+        except JWTError:
             return None
-    except JWTError:
-        return None
+        
+        user = db.query(User).filter(User.id == int(user_id)).first()
+        principal_cache.put(__name__, token, user, payload.get("exp"))
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
     if user and user.is_active:
         return user
     
@@ -330,6 +342,16 @@ async def list_users(
         for user in users
     ]
 
+@router.get("/cache-stats")
+async def auth_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """認証キャッシュのヒット率など（管理者のみ）"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403,
+            detail="この操作には管理者権限が必要です"
+        )
+    return principal_cache.stats()
+
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
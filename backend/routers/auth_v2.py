@@ -18,8 +18,10 @@ from services.auth_service import (
     create_refresh_token,
     get_current_user,
     get_password_hash,
+    oauth2_scheme,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from services.auth_cache import principal_cache
 
 router = APIRouter()
 
@@ -164,12 +166,13 @@ async def refresh_token(
 
 @router.post("/logout")
 async def logout(
+    token: str = Depends(oauth2_scheme),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """ログアウト"""
-    # セッショントークンを無効化する場合はここで処理
-    # JWTの場合、クライアント側でトークンを削除するだけでOK
+    # JWTの場合、クライアント側でトークンを削除する。サーバー側は認証キャッシュから外す
+    principal_cache.invalidate_token(token)
     return {"message": "ログアウトしました"}
 
 @router.put("/me", response_model=UserResponse)
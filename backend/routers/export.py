@@ -1,22 +1,27 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-import csv
-import io
 from typing import Optional
 from datetime import datetime
-from enum import Enum
+import asyncio
+import gzip
+import json
 
 from database import get_db
-from models import JournalEntry, Receipt, Video
+from models import ExportJob, User
+from routers.auth import get_optional_current_user
+from schemas import ExportJobCreate, ExportJobResponse
+from services.export_engine import build_export_query, get_format, iter_export, list_formats
+from services.export_jobs import (
+    artifact_exists, compute_data_version, create_export_job, find_reusable_job,
+    job_filters, make_cache_key, purge_expired_artifacts, run_export_job
+)
 
 router = APIRouter()
 
-class ExportFormat(str, Enum):
-    STANDARD = "standard"  # 現在形式
-    YAYOI = "yayoi"  # 弥生会計
-    FREEE = "freee"  # freee
-    MF = "moneyforward"  # MoneyForward
+# ジョブ完了通知（SSE）のポーリング間隔と最大待ち時間
+JOB_EVENTS_POLL_SECONDS = 1.0
+JOB_EVENTS_TIMEOUT_SECONDS = 600
 
 @router.get("/csv")
 async def export_csv(
@@ -24,140 +29,27 @@ async def export_csv(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     status: Optional[str] = Query(None),
-    format: ExportFormat = Query(ExportFormat.STANDARD),
+    format: str = Query("standard"),
+    parallel: Optional[bool] = Query(None, description="整形をワーカープロセスで行う（大量出力向け）"),
     db: Session = Depends(get_db)
 ):
     """改善されたCSVエクスポート - 各会計ソフト対応"""
     
-    # クエリ構築
-    query = db.query(
-        JournalEntry,
-        Receipt,
-        Video
-    ).join(
-        Receipt, JournalEntry.receipt_id == Receipt.id
-    ).join(
-        Video, JournalEntry.video_id == Video.id
-    )
-    
-    if video_id:
-        query = query.filter(JournalEntry.video_id == video_id)
-    if status:
-        query = query.filter(JournalEntry.status == status)
-    if start_date:
-        query = query.filter(Receipt.issue_date >= start_date)
-    if end_date:
-        query = query.filter(Receipt.issue_date <= end_date)
-    
-    results = query.all()
-    
-    # CSV生成
-    output = io.StringIO()
-    
-    if format == ExportFormat.YAYOI:
-        # 弥生会計形式
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        writer.writerow([
-            '伝票日付', '伝票番号', '借方科目', '借方補助', '借方税区分', 
-            '借方金額', '貸方科目', '貸方補助', '貸方税区分', '貸方金額', 
-            '摘要', '証憑番号'
-        ])
-        
-        for journal, receipt, video in results:
-            # 税込金額と税抜金額を分けて出力
-            writer.writerow([
-                receipt.issue_date.strftime('%Y/%m/%d') if receipt.issue_date else '',
-                f"R{receipt.id:06d}",  # 領収書番号
-                journal.debit_account or '経費',
-                '',  # 補助科目
-                '課税仕入 10%' if receipt.tax_rate == 0.10 else '課税仕入 8%',
-                f"{int(journal.debit_amount):,}" if journal.debit_amount else '0',
-                journal.credit_account or '現金',
-                '',  # 補助科目
-                '',  # 貸方は非課税
-                f"{int(journal.credit_amount):,}" if journal.credit_amount else '0',
-                f"{receipt.vendor} - {journal.memo}" if receipt.vendor else journal.memo,
-                f"V{video.id:03d}R{receipt.id:06d}"  # 証憑番号
-            ])
+    spec = get_format(format)
+    if not spec:
+        raise HTTPException(400, f"未対応のエクスポート形式です: {format}")
     
-    elif format == ExportFormat.FREEE:
-        # freee形式
-        writer = csv.writer(output)
-        writer.writerow([
-            '発生日', '勘定科目', '税区分', '金額', '取引先', 
-            '品目', '部門', 'メモタグ', '備考', '証憑ID'
-        ])
-        
-        for journal, receipt, video in results:
-            writer.writerow([
-                receipt.issue_date.strftime('%Y-%m-%d') if receipt.issue_date else '',
-                journal.debit_account or '経費',
-                '課税仕入10%' if receipt.tax_rate == 0.10 else '課税仕入8%',
-                int(receipt.total) if receipt.total else 0,
-                receipt.vendor or '',
-                journal.memo or '',
-                '',  # 部門
-                '',  # メモタグ
-                f"動画{video.id}より",
-                f"R{receipt.id:06d}"
-            ])
-    
-    elif format == ExportFormat.MF:
-        # MoneyForward形式
-        writer = csv.writer(output)
-        writer.writerow([
-            '取引日', '摘要', '借方勘定科目', '借方金額', 
-            '貸方勘定科目', '貸方金額', '税率', '消費税額', 'タグ'
-        ])
-        
-        for journal, receipt, video in results:
-            tax_rate_str = '10%' if receipt.tax_rate == 0.10 else '8%' if receipt.tax_rate == 0.08 else '0%'
-            writer.writerow([
-                receipt.issue_date.strftime('%Y/%m/%d') if receipt.issue_date else '',
-                f"{receipt.vendor} {journal.memo}" if receipt.vendor else journal.memo,
-                journal.debit_account or '経費',
-                int(journal.debit_amount) if journal.debit_amount else 0,
-                journal.credit_account or '現金',
-                int(journal.credit_amount) if journal.credit_amount else 0,
-                tax_rate_str,
-                int(receipt.tax) if receipt.tax else 0,
-                f"領収書{receipt.id}"
-            ])
-    
-    else:
-        # 標準形式（現在の形式を改善）
-        writer = csv.writer(output)
-        writer.writerow([
-            '日付', '取引先', '摘要', '借方科目', '借方金額',
-            '貸方科目', '貸方金額', '税率', '消費税', 'ステータス'
-        ])
-        
-        for journal, receipt, video in results:
-            writer.writerow([
-                receipt.issue_date.strftime('%Y-%m-%d') if receipt.issue_date else '',
-                receipt.vendor or '',
-                journal.memo or '',
-                journal.debit_account or '',
-                f"{int(journal.debit_amount):,}" if journal.debit_amount else '0',
-                journal.credit_account or '',
-                f"{int(journal.credit_amount):,}" if journal.credit_amount else '0',
-                f"{int(receipt.tax_rate * 100)}%" if receipt.tax_rate else '',
-                f"{int(receipt.tax):,}" if receipt.tax else '0',
-                '確認済' if journal.status == 'confirmed' else '未確認'
-            ])
-    
-    output.seek(0)
+    query = build_export_query(video_id, start_date, end_date, status)
     
     # ファイル名生成（形式名を含む）
-    format_suffix = f"_{format.value}" if format != ExportFormat.STANDARD else ""
-    filename = f"journal_export{format_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    filename = spec.filename()
     
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8-sig')),  # BOM付きUTF-8
-        media_type="text/csv",
+        iter_export(db.get_bind(), query, spec, parallel=parallel),
+        media_type=spec.media_type,
         headers={
             "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "text/csv; charset=utf-8-sig"
+            "Content-Type": spec.content_type
         }
     )
 
@@ -167,24 +59,154 @@ async def get_export_formats():
     return {
         "formats": [
             {
-                "value": "standard",
-                "label": "標準形式",
-                "description": "シンプルな汎用形式"
-            },
-            {
-                "value": "yayoi",
-                "label": "弥生会計",
-                "description": "弥生会計インポート対応形式"
-            },
-            {
-                "value": "freee",
-                "label": "freee",
-                "description": "クラウド会計freee対応形式"
-            },
-            {
-                "value": "moneyforward",
-                "label": "MoneyForward",
-                "description": "マネーフォワード対応形式"
+                "value": spec.name,
+                "label": spec.label,
+                "description": spec.description
             }
+            for spec in list_formats()
         ]
-    }
\ No newline at end of file
+    }
+
+# 非同期エクスポートジョブ
+def _job_response(job: ExportJob, cached: bool = False) -> ExportJobResponse:
+    return ExportJobResponse(
+        id=job.id,
+        format=job.format,
+        status=job.status,
+        filters=job_filters(job),
+        rows_written=job.rows_written,
+        artifact_size=job.artifact_size,
+        error_message=job.error_message,
+        cached=cached,
+        download_url=f"/export/jobs/{job.id}/download" if job.status == "done" else None,
+        created_at=job.created_at,
+        completed_at=job.completed_at
+    )
+
+def _get_job(db: Session, job_id: int, current_user: Optional[User]) -> ExportJob:
+    job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+    # 他ユーザーのジョブは存在しないものとして扱う
+    if not job or (job.user_id is not None and (not current_user or current_user.id != job.user_id)):
+        raise HTTPException(404, "エクスポートジョブが見つかりません")
+    return job
+
+@router.post("/jobs", response_model=ExportJobResponse)
+async def create_export_job_endpoint(
+    request: ExportJobCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """エクスポートジョブ登録 - 同じ条件・同じデータの成果物があればそれを返す"""
+    if not get_format(request.format):
+        raise HTTPException(400, f"未対応のエクスポート形式です: {request.format}")
+    
+    user_id = current_user.id if current_user else None
+    filters = request.model_dump(exclude={"format"})
+    
+    cache_key = make_cache_key(user_id, filters, request.format, compute_data_version(db))
+    existing = find_reusable_job(db, cache_key)
+    if existing:
+        return _job_response(existing, cached=existing.status == "done")
+    
+    purge_expired_artifacts()
+    job = create_export_job(db, user_id, filters, request.format)
+    background_tasks.add_task(run_export_job, job.id)
+    
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """エクスポートジョブの状態取得（ポーリング用）"""
+    return _job_response(_get_job(db, job_id, current_user))
+
+@router.get("/jobs/{job_id}/events")
+async def export_job_events(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """エクスポートジョブの状態通知（Server-Sent Events） - 完了・エラーで終了"""
+    _get_job(db, job_id, current_user)
+    bind = db.get_bind()
+    
+    def load():
+        with Session(bind=bind) as session:
+            current = session.query(ExportJob).filter(ExportJob.id == job_id).first()
+            if not current:
+                return None, None
+            return _job_response(current).model_dump_json(), current.status
+    
+    async def events():
+        last = None
+        waited = 0.0
+        while waited <= JOB_EVENTS_TIMEOUT_SECONDS:
+            # 同期クエリはイベントループを止めないようスレッドで実行する
+            payload, status = await asyncio.to_thread(load)
+            if payload is None:
+                # ジョブが削除された場合はエラーを通知して終了
+                gone = {"id": job_id, "status": "error", "error_message": "エクスポートジョブが見つかりません"}
+                yield f"data: {json.dumps(gone, ensure_ascii=False)}\n\n"
+                return
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            if status in ("done", "error"):
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            waited += JOB_EVENTS_POLL_SECONDS
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """エクスポート成果物のダウンロード"""
+    job = _get_job(db, job_id, current_user)
+    if job.status != "done":
+        raise HTTPException(409, "エクスポートはまだ完了していません")
+    if not artifact_exists(job):
+        raise HTTPException(410, "成果物の保存期限が切れました。再度エクスポートしてください")
+    
+    spec = get_format(job.format)
+    created = job.completed_at or datetime.now()
+    filename = spec.filename(created) if spec else f"journal_export_{job.id}.csv"
+    media_type = spec.media_type if spec else "text/csv"
+    content_type = spec.content_type if spec else media_type
+    
+    # gzip対応クライアントには圧縮済みファイルをそのまま返す
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(
+            job.artifact_path,
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Type": content_type,
+                "Content-Encoding": "gzip"
+            }
+        )
+    
+    def decompressed():
+        with gzip.open(job.artifact_path, "rb") as f:
+            while True:
+                data = f.read(64 * 1024)
+                if not data:
+                    break
+                yield data
+    
+    return StreamingResponse(
+        decompressed(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Type": content_type
+        }
+    )
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import logging
 
 from database import get_db
-from models import JournalEntry, Receipt
+from models import JournalEntry
 from schemas import JournalEntryResponse, JournalEntryUpdate, JournalConfirm
-from services.journal_generator import JournalGenerator
+from services.journal_backfill import DEFAULT_CHUNK_SIZE, generate_missing_journals_bulk
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -115,89 +115,36 @@ async def delete_journal(
 
 @router.post("/generate-missing")
 async def generate_missing_journals(
+    cursor: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunks: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """Journalがない領収書に対してJournalを生成"""
+    """Journalがない領収書に対してJournalを生成
+
+    チャンク単位で一括生成・コミットする。max_chunksで打ち切った場合や
+    途中でエラーになった場合は、返されたnext_cursorをcursorに渡して再開できる。
+    """
     try:
-        # すべての領収書を取得
-        receipts = db.query(Receipt).all()
-        logger.info(f"総領収書数: {len(receipts)}")
-        
-        # Journalがない領収書を特定
-        missing_journal_receipts = []
-        for receipt in receipts:
-            journal_exists = db.query(JournalEntry).filter(
-                JournalEntry.receipt_id == receipt.id
-            ).first()
-            
-            if not journal_exists:
-                missing_journal_receipts.append(receipt)
-        
-        logger.info(f"Journalがない領収書数: {len(missing_journal_receipts)}")
+        progress = generate_missing_journals_bulk(
+            db,
+            chunk_size=max(1, chunk_size),
+            after_id=cursor,
+            max_chunks=max_chunks
+        )
         
-        if not missing_journal_receipts:
+        if progress.total_missing == 0:
             return {
                 "message": "すべての領収書にJournalが存在します",
-                "receipts_checked": len(receipts),
-                "journals_generated": 0
+                "journals_generated": 0,
+                **progress.to_dict()
             }
         
-        # Journal生成
-        generator = JournalGenerator(db)
-        generated_count = 0
-        errors = []
-        
-        for receipt in missing_journal_receipts:
-            try:
-                logger.info(f"Processing receipt {receipt.id}: {receipt.vendor} - ¥{receipt.total}")
-                
-                # Journal生成
-                journal_entries = generator.generate_journal_entries(receipt)
-                
-                for entry_data in journal_entries:
-                    # フレーム時間を取得
-                    time_ms = 0
-                    if receipt.best_frame:
-                        time_ms = receipt.best_frame.time_ms or 0
-                    
-                    journal_entry = JournalEntry(
-                        receipt_id=entry_data.receipt_id,
-                        video_id=entry_data.video_id,
-                        time_ms=time_ms,
-                        debit_account=entry_data.debit_account,
-                        credit_account=entry_data.credit_account,
-                        debit_amount=entry_data.debit_amount,
-                        credit_amount=entry_data.credit_amount,
-                        tax_account=entry_data.tax_account,
-                        tax_amount=entry_data.tax_amount,
-                        memo=entry_data.memo,
-                        status='unconfirmed',
-                        transaction_date=receipt.issue_date if receipt.issue_date else datetime.now().date()
-                    )
-                    db.add(journal_entry)
-                    generated_count += 1
-                
-                db.commit()
-                
-            except Exception as e:
-                error_msg = f"Error processing receipt {receipt.id}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-                db.rollback()
-                continue
-        
-        # 結果確認
-        total_journals = db.query(JournalEntry).count()
-        
         return {
-            "message": f"{generated_count}件のJournalエントリを生成しました",
-            "receipts_checked": len(receipts),
-            "missing_journals_found": len(missing_journal_receipts),
-            "journals_generated": generated_count,
-            "total_journals": total_journals,
-            "errors": errors if errors else None
+            "message": f"{progress.journals_generated}件のJournalエントリを生成しました",
+            **progress.to_dict()
         }
         
     except Exception as e:
         logger.error(f"Journal生成エラー: {e}")
-        raise HTTPException(500, f"Journal生成に失敗しました: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"Journal生成に失敗しました: {str(e)}")
@@ -5,6 +5,7 @@ from typing import List
 from database import get_db
 from models import Vendor, Account, Rule
 from schemas import VendorCreate, VendorResponse, AccountCreate, AccountResponse, RuleCreate, RuleResponse
+from services.rule_engine import rule_engine
 
 router = APIRouter()
 
@@ -34,6 +35,7 @@ async def create_vendor(vendor: VendorCreate, db: Session = Depends(get_db)):
     db.add(db_vendor)
     db.commit()
     db.refresh(db_vendor)
+    rule_engine.invalidate()
     
     return db_vendor
 
@@ -46,6 +48,7 @@ async def delete_vendor(vendor_id: int, db: Session = Depends(get_db)):
     
     db.delete(vendor)
     db.commit()
+    rule_engine.invalidate()
     
     return {"message": "ベンダーを削除しました"}
 
@@ -94,6 +97,7 @@ async def create_rule(rule: RuleCreate, db: Session = Depends(get_db)):
     db.add(db_rule)
     db.commit()
     db.refresh(db_rule)
+    rule_engine.invalidate()
     
     return db_rule
 
@@ -106,5 +110,6 @@ async def delete_rule(rule_id: int, db: Session = Depends(get_db)):
     
     rule.is_active = False
     db.commit()
+    rule_engine.invalidate()
     
     return {"message": "ルールを無効化しました"}
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+動画処理の計測結果API（管理者用）
+
+- /admin/processing-metrics: 動画処理ジョブごとの段階別の計測結果（DB）
+- /metrics: プロセス内の集計を Prometheus のテキスト形式で出力
+- /admin/profiles: 遅いリクエスト・ジョブのプロファイル（collapsed 形式）
+"""
+import os
+import json
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import ProcessingMetric, User
+from routers.auth import get_current_active_user, get_optional_current_user
+from services.processing_metrics import registry
+from services.profiling import profile_store
+
+router = APIRouter()
+
+# Prometheus のスクレイプ用トークン（設定時は Authorization: Bearer <トークン> で /metrics を取得できる）
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _require_superuser(current_user: User = Depends(get_current_active_user)) -> User:
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403,
+            detail="この操作には管理者権限が必要です"
+        )
+    return current_user
+
+
+async def _authorize_scrape(
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> None:
+    """スクレイプ用トークンまたは管理者のトークンを確認"""
+    if METRICS_TOKEN and authorization and secrets.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+        return
+    user = await get_optional_current_user(authorization, db)
+    if user is None:
+        raise HTTPException(status_code=401, detail="認証に失敗しました", headers={"WWW-Authenticate": "Bearer"})
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="この操作には管理者権限が必要です")
+
+
+@router.get("/admin/processing-metrics")
+async def list_processing_metrics(
+    video_id: Optional[int] = None,
+    job: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(_require_superuser)
+):
+    """動画処理ジョブの計測結果（新しい順）"""
+    query = db.query(ProcessingMetric)
+    if video_id is not None:
+        query = query.filter(ProcessingMetric.video_id == video_id)
+    if job:
+        query = query.filter(ProcessingMetric.job == job)
+    if status:
+        query = query.filter(ProcessingMetric.status == status)
+    rows = query.order_by(ProcessingMetric.created_at.desc(), ProcessingMetric.id.desc()).limit(limit).all()
+
+    return [
+        {
+            "id": row.id,
+            "video_id": row.video_id,
+            "job": row.job,
+            "status": row.status,
+            "duration_ms": row.duration_ms,
+            "peak_rss_mb": row.peak_rss_mb,
+            "stages": json.loads(row.stages_json) if row.stages_json else [],
+            "error_message": row.error_message,
+            "created_at": row.created_at,
+        }
+        for row in rows
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(_authorize_scrape)])
+async def prometheus_metrics():
+    """プロセス起動後の動画処理の集計（Prometheus のテキスト形式）"""
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/admin/profiles")
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(_require_superuser)
+):
+    """保存されたプロファイルのメタデータ（新しい順）"""
+    return profile_store.list(limit)
+
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    current_user: User = Depends(_require_superuser)
+):
+    """プロファイル（collapsed 形式。flamegraph.pl・speedscope でそのまま読める）"""
+    path = profile_store.path_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="プロファイルが見つかりません")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{profile_id}.folded")
@@ -12,6 +12,7 @@ from typing import Optional
 from database import get_db
 from models import User
 from services.email import email_service
+from services.auth_cache import principal_cache
 from passlib.context import CryptContext
 
 logger = logging.getLogger(__name__)
@@ -167,6 +168,8 @@ async def reset_password(
             "user_id": result.id
         })
         db.commit()
+        # SQL で直接更新したため ORM のイベントが発生しない。認証キャッシュはここで無効化
+        principal_cache.invalidate_user(result.id)
         
         logger.info(f"パスワードリセット完了: {result.email}")
         
@@ -1,44 +1,52 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks, Query
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional, Dict, Any
 import os
 import shutil
 from pathlib import Path
 import logging
-import cv2
 import asyncio
+import io
+from contextlib import ExitStack
 
 from database import get_db
-from models import Video, Frame, Receipt, JournalEntry, ReceiptHistory, User
+from models import Video, Frame, Receipt, JournalEntry, ReceiptHistory, User, ProcessingMetric
 from schemas import VideoResponse, VideoDetailResponse, VideoAnalyzeRequest, FrameResponse, ReceiptUpdate
-from services.video_intelligence import VideoAnalyzer
 from services.journal_generator import JournalGenerator
-from services.storage import StorageService
+from services.processing_uow import ProcessingUnitOfWork, ProgressChannel
+from services.processing_metrics import instrument_job, mark_failed, stage
+from services.profiling import profile_job
+from services.video_remux import load_keyframe_index, nearest_keyframe, prepare_playback_rendition, proxy_source
+from services.storage import get_storage_service
+from services.upload_engine import UploadItem
+from services.blob_cache import remote_stem
+from services.blob_store import (
+    get_blob_resolver, local_file, open_video_capture, pinned_local_file, resolve_local_path, to_db_path,
+    writable_path,
+)
 from routers.auth import get_optional_current_user
-from celery_app import analyze_video_task
-from video_processing import select_receipt_frames
+from services.lazy_loader import lazy_import, register_module_warmup, register_warmup
+
+# 重いモジュールは初回使用時（または /warmup）に読み込む
+cv2 = lazy_import("cv2")
+video_intelligence = lazy_import("services.video_intelligence")
+frame_selection = lazy_import("services.frame_selection")
+register_module_warmup("cv2", "video_processing", "services.video_intelligence", "services.smart_frame_extractor", "services.frame_selection")
+# ストレージのクライアントも初回使用時に作成する
+register_warmup("storage", get_storage_service)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Supabase Storage サービス初期化
-try:
-    storage_service = StorageService()
-    use_cloud_storage = True
-    logger.info("Cloud storage (Supabase) initialized successfully")
-except Exception as e:
-    logger.warning(f"Cloud storage initialization failed: {e}. Using local storage.")
-    storage_service = None
-    use_cloud_storage = False
-
 @router.post("/test")
 async def test_upload():
     """アップロードテスト用エンドポイント"""
     try:
         # テスト用のディレクトリ作成
-        base_dir = Path("/tmp") if os.getenv("RENDER") == "true" else Path("uploads")
+        base_dir = Path(resolve_local_path("uploads/"))
         test_dir = base_dir / "test"
         test_dir.mkdir(parents=True, exist_ok=True)
         
@@ -103,6 +111,7 @@ async def upload_video(
     current_user: Optional[User] = Depends(get_optional_current_user)
 ):
     """動画アップロード"""
+    storage_service = get_storage_service()
     try:
         logger.info(f"=== アップロード開始 ===")
         logger.info(f"ファイル名: {file.filename}")
@@ -120,7 +129,7 @@ async def upload_video(
             raise HTTPException(400, f"サポートされていないファイル形式です: {file.filename}")
         
         # ファイル保存 - Render環境では/tmpを使用
-        base_dir = Path("/tmp") if os.getenv("RENDER") == "true" else Path("uploads")
+        base_dir = Path(resolve_local_path("uploads/"))
         logger.info(f"ベースディレクトリ: {base_dir}")
         
         upload_dir = base_dir / "videos"
@@ -164,7 +173,7 @@ async def upload_video(
             
             # Supabase Storageにアップロード
             cloud_url = None
-            if use_cloud_storage and storage_service:
+            if storage_service:
                 try:
                     # ファイルパス生成（user_idは0で仮設定、後でユーザー認証追加時に修正）
                     cloud_path = storage_service.generate_file_path(0, unique_filename, "video")
@@ -217,7 +226,7 @@ async def upload_video(
                 logger.info(f"Thumbnail created: {thumbnail_path}")
                 
                 # Supabase Storageにサムネイルをアップロード
-                if use_cloud_storage and storage_service:
+                if storage_service:
                     try:
                         with open(thumbnail_path, 'rb') as f:
                             thumbnail_content = f.read()
@@ -251,19 +260,15 @@ async def upload_video(
         if cloud_url:
             db_video_path = cloud_url
             logger.info(f"Using cloud URL for video: {cloud_url}")
-        elif os.getenv("RENDER") == "true":
-            # /tmp/videos/xxx.mp4 -> uploads/videos/xxx.mp4
-            db_video_path = str(file_path).replace("/tmp/", "uploads/")
-            db_thumbnail_path = str(thumbnail_path).replace("/tmp/", "uploads/") if thumbnail_path else None
         else:
-            db_video_path = str(file_path)
-            db_thumbnail_path = str(thumbnail_path) if thumbnail_path else None
+            # 環境に依存しないキーで保存（Render: /tmp/videos/xxx.mp4 -> uploads/videos/xxx.mp4）
+            db_video_path = to_db_path(file_path)
             
         video = Video(
             filename=file.filename,  # 元のファイル名を保持
-            local_path=db_video_path,  # DBにはクラウドURLまたはローカルパスを保存
+            local_path=db_video_path,  # DBにはクラウドURLまたはローカルのキーを保存
             gcs_uri=cloud_url,  # クラウドURLを別途保存
-            thumbnail_path=str(thumbnail_path) if thumbnail_path else None,  # 文字列に変換して保存
+            thumbnail_path=to_db_path(thumbnail_path) if thumbnail_path else None,
             status="processing",  # 自動的に処理開始
             progress=10,  # 初期進捗を10に設定
             user_id=current_user.id if current_user else None  # ログインしている場合のみユーザーIDを設定
@@ -273,7 +278,7 @@ async def upload_video(
         db.refresh(video)
         
         # サムネイルをクラウドにアップロード（video.idが利用可能になった後）
-        if thumbnail_path and use_cloud_storage and storage_service:
+        if thumbnail_path and storage_service:
             try:
                 with open(thumbnail_path, 'rb') as f:
                     thumbnail_content = f.read()
@@ -306,6 +311,10 @@ async def upload_video(
         
         logger.info(f"ビデオDB登録成功: ID={video.id}")
         
+        # 再生用レンディション（faststart MP4）とキーフレームインデックスを作成
+        # バックグラウンドタスクは登録順に実行されるため、OCR処理の前に完了する
+        background_tasks.add_task(prepare_playback_rendition, video.id)
+        
         # 実際のOCR処理を開始
         try:
             # バックグラウンドで処理を開始（新しいセッションを使用）
@@ -371,50 +380,71 @@ async def analyze_video(
     
     return {"message": "分析を開始しました", "video_id": video_id}
 
+@instrument_job("run_video_analysis")
+@profile_job("run_video_analysis")
 async def run_video_analysis(video_id: int, fps: int, db: Session):
     """動画分析の実行"""
+    pins = ExitStack()  # キャッシュ経由で取得した動画を処理が終わるまで残す
     try:
         video = db.query(Video).filter(Video.id == video_id).first()
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         
-        # 進行状況更新関数
-        def update_progress(progress: int, message: str):
-            video.progress = progress
-            video.progress_message = message
-            db.commit()
-            db.refresh(video)
-            logger.info(f"Video {video_id}: {progress}% - {message}")
+        # 進捗は処理用セッションとは別の軽量チャネルで更新し、
+        # フレーム・レシート・仕訳はユニットオブワークでまとめて保存する
+        progress_channel = ProgressChannel(db.get_bind(), video_id)
+        update_progress = progress_channel.update
         
         update_progress(10, "高品質フレーム選択中...")
         
         # 新しい高品質フレーム選択システムを使用
         logger.info("Using new high-quality frame selection system")
         
+        # クラウドにしかない場合・/tmp が消えた場合はキャッシュ経由で取得
+        video_path = pins.enter_context(pinned_local_file(video.local_path, video.gcs_uri)) or video.local_path
+        
         # ビデオ時間から目標フレーム数を計算
         import cv2
-        cap = cv2.VideoCapture(video.local_path)
-        fps_video = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration_seconds = total_frames / fps_video if fps_video > 0 else 0
-        cap.release()
+        with stage("probe"):
+            cap = cv2.VideoCapture(video_path)
+            fps_video = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            duration_seconds = total_frames / fps_video if fps_video > 0 else 0
+            cap.release()
         
         # 目標レシート数を計算（約2.5秒ごとに1枚、最小7枚、最大15枚）
         target_min = max(7, int(duration_seconds / 3.0))
         target_max = min(15, max(target_min + 3, int(duration_seconds / 2.0)))
         logger.info(f"Video duration: {duration_seconds:.1f}s, target frames: {target_min}-{target_max}")
         
-        # 新しいシステムで高品質フレームを選択（OCR込み）
+        # 高品質フレームを選択（既定は文書検出・OCR込みの receipt、FRAME_SELECTOR で切り替え）
+        # サンプリング・評価はプロキシ、OCR用の切り出しは元動画から行う
+        proxy_path = proxy_source(video)
         try:
-            selected_frames_new = select_receipt_frames(
-                video_path=video.local_path,
-                target_min=target_min,
-                target_max=target_max
-            )
-            logger.info(f"Selected {len(selected_frames_new)} high-quality frames")
+            selector = frame_selection.get_frame_selector(default="receipt")
+            # 各段階は select_frames.sampling などとして記録される
+            with stage("select_frames") as selecting:
+                selected = selector.select(
+                    video_path,
+                    output_dir=resolve_local_path("uploads/frames"),
+                    stem=f"frame_{video_id}",
+                    proxy_path=proxy_path,
+                    target_min=target_min,
+                    target_max=target_max
+                )
+                selecting.add(items=len(selected))
+            logger.info(f"Frame selector '{selector.name}' selected {len(selected)} frames")
+            if selector.runs_ocr:
+                selected_frames_new = selected
+            else:
+                # OCRを行わないエンジンの結果はフレームごとのAI抽出（下のフォールバック処理）に渡す
+                frames_data = [frame_selection.to_frame_data(frame) for frame in selected]
+                selected_frames_new = []
         except Exception as e:
             logger.error(f"New frame selection failed: {e}, falling back to basic extraction")
             # フォールバック: 基本的なフレーム抽出
-            frames_data = analyzer.extract_frames(video.local_path, fps)
+            with stage("extract_frames") as extracting:
+                frames_data = analyzer.extract_frames(video_path, fps, proxy_path=proxy_path)
+                extracting.add(items=len(frames_data))
             selected_frames_new = []
         
         update_progress(50, "フレームデータ保存中...")
@@ -423,8 +453,9 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
         if selected_frames_new:
             update_progress(70, "レシートデータ処理中...")
             receipts_found = 0
+            uow = ProcessingUnitOfWork(db, video, generator=JournalGenerator(db))
             
-            # 新しいシステムの結果をデータベースに保存
+            # 新しいシステムの結果をユニットオブワークに登録
             for idx, selected_frame in enumerate(selected_frames_new):
                 # Frameオブジェクトを作成
                 frame_obj = Frame(
@@ -435,8 +466,7 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
                     frame_score=selected_frame.score,
                     is_best=True
                 )
-                db.add(frame_obj)
-                db.flush()
+                receipt = None
                 
                 # レシートデータがある場合は保存
                 if selected_frame.metadata and selected_frame.metadata.get('receipt_info'):
@@ -459,11 +489,11 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
                             # 日付がない場合もNone
                             issue_date = None
                         
-                        # レシートを保存
+                        # レシートを作成
                         total_amount = receipt_info.get('total', 0) or 0
                         receipt = Receipt(
                             video_id=video.id,
-                            best_frame_id=frame_obj.id,
+                            best_frame=frame_obj,
                             vendor=receipt_info.get('vendor', 'Unknown'),
                             document_type='レシート',
                             issue_date=issue_date,
@@ -475,54 +505,21 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
                             payment_method='現金',
                             is_manual=False
                         )
-                        db.add(receipt)
                         receipts_found += 1
-                        logger.info(f"Saved receipt {receipts_found}: {receipt_info.get('vendor')} - {receipt_info.get('total')}")
+                        logger.info(f"Queued receipt {receipts_found}: {receipt_info.get('vendor')} - {receipt_info.get('total')}")
                 
+                # 仕訳はレシートの保存時に同じトランザクションで生成される
+                uow.add(frame=frame_obj, receipt=receipt)
                 update_progress(70 + (20 * idx // len(selected_frames_new)), f"レシート {idx+1}/{len(selected_frames_new)} 処理中...")
             
-            db.commit()
-            logger.info(f"Saved {receipts_found} receipts from new system")
-            
-            # 仕訳データ生成
-            update_progress(90, "仕訳データ生成中...")
-            generator = JournalGenerator(db)
-            receipts = db.query(Receipt).filter(Receipt.video_id == video.id).all()
-            logger.info(f"Found {len(receipts)} receipts for video {video.id}")
-            
-            journal_count = 0
-            for receipt in receipts:
-                logger.info(f"Generating journal entries for receipt {receipt.id} (vendor: {receipt.vendor}, total: {receipt.total})")
-                journal_entries = generator.generate_journal_entries(receipt)
-                logger.info(f"Generated {len(journal_entries)} journal entries for receipt {receipt.id}")
-                
-                for entry_data in journal_entries:
-                    journal_count += 1
-                    journal_entry = JournalEntry(
-                        receipt_id=entry_data.receipt_id,
-                        video_id=entry_data.video_id,
-                        time_ms=int(receipt.best_frame.time_ms) if receipt.best_frame and receipt.best_frame.time_ms is not None else 0,
-                        debit_account=entry_data.debit_account,
-                        credit_account=entry_data.credit_account,
-                        debit_amount=entry_data.debit_amount,
-                        credit_amount=entry_data.credit_amount,
-                        tax_account=entry_data.tax_account,
-                        tax_amount=entry_data.tax_amount,
-                        memo=entry_data.memo,
-                        status='unconfirmed',
-                        transaction_date=receipt.issue_date if receipt.issue_date else datetime.now().date()
-                    )
-                    db.add(journal_entry)
-            
-            db.commit()
-            logger.info(f"Generated and saved {journal_count} journal entries for {len(receipts)} receipts")
-            
-            # 新システムで完了
-            update_progress(100, "分析完了")
-            video.status = "done"
-            video.progress = 100
-            video.progress_message = "分析完了"
-            db.commit()
+            # 新システムで完了（残りのデータと完了ステータスを1トランザクションで保存）
+            with stage("save", items=len(uow.pending_receipts)):
+                uow.commit(status="done", progress=100, progress_message="分析完了")
+            journal_count = sum(len(unit.journal_entries) for unit in uow.saved_units)
+            logger.info(
+                f"Saved {uow.saved_receipts} receipts and {journal_count} journal entries "
+                f"from new system ({uow.commits} commits, {progress_channel.updates_sent} progress updates)"
+            )
             logger.info(f"Video {video_id} analysis complete with new system")
             return  # 新システム使用時はここで終了
             
@@ -650,7 +647,21 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
             for i, frame in enumerate(frames_data):
                 logger.info(f"Frame {i+1}: time={frame['time_ms']}ms, quality={frame.get('quality_score', 0):.3f}")
         
-        # フレームデータをDBに保存
+        # UNIQUE制約違反時は固有suffixを追加して1回だけ再試行
+        def retry_with_unique_suffix(unit, error):
+            if unit.receipt is None:
+                return False
+            import time
+            import random
+            frame_time = unit.receipt.best_frame.time_ms if unit.receipt.best_frame else 0
+            unique_suffix = f"_{video_id}_{frame_time}_{int(time.time() * 1000)}_{random.randint(1000, 9999)}"
+            unit.receipt.vendor_norm = analyzer._normalize_text(unit.receipt.vendor or '') + unique_suffix
+            logger.warning(f"Retrying receipt with unique suffix: {unit.receipt.vendor} ({error})")
+            return True
+        
+        uow = ProcessingUnitOfWork(db, video, generator=JournalGenerator(db), on_unit_error=retry_with_unique_suffix)
+        
+        # フレームデータをユニットオブワークに登録
         frames = []
         for frame_data in frames_data:
             frame = Frame(
@@ -667,7 +678,7 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
             # OCRテキストは後で処理されるため、ここでは設定しない
             # OCR処理は各フレームごとに個別に実行される
             
-            db.add(frame)
+            uow.add(frame=frame)
             frames.append(frame)
         
         # 品質ベースのフレーム選択
@@ -730,15 +741,21 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
         logger.info(f"Processing {len(selected_frames)} evenly distributed frames")
         receipts_found = 0
         
+        # 重複チェック用のレシート一覧（保存済み＋今回登録したもの）は最初に1回だけ読み込む
+        video_receipts = db.query(Receipt).options(
+            joinedload(Receipt.best_frame)
+        ).filter(Receipt.video_id == video_id).all()
+        
         for idx, best_frame in enumerate(selected_frames):
             update_progress(50 + (20 * idx // len(selected_frames)), f"レシート {idx+1}/{len(selected_frames)} 分析中...")
             logger.info(f"Analyzing frame {idx+1}/{len(selected_frames)} at {best_frame.time_ms}ms")
             
             # Gemini APIで領収書データ抽出
-            receipt_data = await analyzer.extract_receipt_data(
-                best_frame.frame_path,
-                best_frame.ocr_text or ''
-            )
+            with stage("ai_extraction", items=1, ai_calls=1):
+                receipt_data = await analyzer.extract_receipt_data(
+                    best_frame.frame_path,
+                    best_frame.ocr_text or ''
+                )
             
             # レシートデータ検証強化（過剰生成防止）
             if receipt_data and receipt_data.get('vendor'):
@@ -817,7 +834,7 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
                 
                 receipt = Receipt(
                     video_id=video_id,
-                    best_frame_id=best_frame.id,
+                    best_frame=best_frame,
                     vendor=receipt_data.get('vendor'),
                     vendor_norm=analyzer._normalize_text(receipt_data.get('vendor', '')),
                     document_type=doc_type,
@@ -835,110 +852,57 @@ async def run_video_analysis(video_id: int, fps: int, db: Session):
                 receipt.memo = receipt_data.get('memo', '') or ''
                 
                 # スマート重複チェック - 現在のビデオ内でのみ比較
-                existing_receipts = db.query(Receipt).filter(Receipt.video_id == video_id).all()
+                # 未保存のレシートはIDがないため、仮のID（負数）で区別する
                 duplicate_id = analyzer.check_duplicate(
                     best_frame.phash,
                     best_frame.ocr_text or '',
                     [{
-                        'id': r.id, 
+                        'id': r.id or -(i + 1),
                         'phash': r.best_frame.phash if r.best_frame else None,
                         'normalized_text_hash': r.normalized_text_hash,
                         'time_ms': r.best_frame.time_ms if r.best_frame else None,
                         'vendor': r.vendor,
                         'total': r.total,
                         'issue_date': r.issue_date.isoformat() if r.issue_date else None
-                    } for r in existing_receipts],
+                    } for i, r in enumerate(video_receipts)],
                     current_frame_time_ms=best_frame.time_ms,
                     current_receipt_data=receipt_data
                 )
                 
                 if duplicate_id:
-                    receipt.duplicate_of_id = duplicate_id
                     logger.info(f"重複検出: Receipt {duplicate_id}")
                     # 重複と判定された場合は保存せずにスキップ
-                    receipts_found += 0  # 重複はカウントしない
                     logger.info(f"Skipping duplicate receipt, referencing existing #{duplicate_id}")
                     continue
                 
-                # 重複でない場合のみ保存
-                try:
-                    db.add(receipt)
-                    db.commit()
-                    db.refresh(receipt)
-                    receipts_found += 1
-                    logger.info(f"New receipt saved #{receipts_found}: {receipt.vendor} - ¥{receipt.total}")
-                except Exception as e:
-                    db.rollback()
-                    # UNIQUE制約違反時は固有suffixを追加して再試行
-                    import time
-                    import random
-                    unique_suffix = f"_{video_id}_{best_frame.time_ms}_{int(time.time() * 1000)}_{random.randint(1000, 9999)}"
-                    receipt.vendor_norm = analyzer._normalize_text(receipt_data.get('vendor', '')) + unique_suffix
-                    
-                    try:
-                        db.add(receipt)
-                        db.commit()
-                        db.refresh(receipt)
-                        receipts_found += 1
-                        logger.info(f"Receipt saved with unique suffix #{receipts_found}: {receipt.vendor} - ¥{receipt.total}")
-                    except Exception as e2:
-                        db.rollback()
-                        logger.error(f"Failed to save receipt even with unique suffix: {e2}")
-                        # 最終失敗時にも既存レシートがあるか確認
-                        existing = db.query(Receipt).filter(
-                            Receipt.vendor == receipt.vendor,
-                            Receipt.issue_date == receipt.issue_date,
-                            Receipt.total == receipt.total
-                        ).first()
-                        if existing:
-                            receipt = existing
-                            logger.info(f"Using existing receipt: Receipt {existing.id}")
-                        else:
-                            continue
-                
-                update_progress(70, "仕訳生成中...")
-                
-                # 仕訳自動生成
-                if not duplicate_id:
-                    generator = JournalGenerator(db)
-                    journal_entries = generator.generate_journal_entries(receipt)
-                    
-                    for entry_data in journal_entries:
-                        journal_entry = JournalEntry(
-                            receipt_id=entry_data.receipt_id,
-                            video_id=entry_data.video_id,
-                            time_ms=int(entry_data.time_ms) if entry_data.time_ms is not None else 0,
-                            debit_account=entry_data.debit_account,
-                            credit_account=entry_data.credit_account,
-                            debit_amount=entry_data.debit_amount,
-                            credit_amount=entry_data.credit_amount,
-                            tax_account=entry_data.tax_account,
-                            tax_amount=entry_data.tax_amount,
-                            memo=entry_data.memo,
-                            status='unconfirmed',
-                            transaction_date=receipt.issue_date if receipt.issue_date else datetime.now().date()
-                        )
-                        db.add(journal_entry)
-                        db.commit()
+                # 重複でない場合のみ登録（仕訳は保存時に同じトランザクションで生成）
+                uow.add(frame=best_frame, receipt=receipt)
+                video_receipts.append(receipt)
+                receipts_found += 1
+                logger.info(f"New receipt queued #{receipts_found}: {receipt.vendor} - ¥{receipt.total}")
         
         # 新システムを使用していない場合のみここに到達
         if not selected_frames_new:
             update_progress(90, "処理完了中...")
             
-            # ステータス更新
-            video.status = "done"
-            video.progress = 100
-            video.progress_message = "分析完了"
-            db.commit()
+            # 残りのデータと完了ステータスを1トランザクションで保存
+            with stage("save", items=len(uow.pending_receipts)):
+                uow.commit(status="done", progress=100, progress_message="分析完了")
             
-            logger.info(f"動画分析完了: Video {video_id}, Found {receipts_found} receipts from {len(selected_frames)} frames")
+            logger.info(
+                f"動画分析完了: Video {video_id}, Saved {uow.saved_receipts} receipts from {len(selected_frames)} frames "
+                f"({uow.commits} commits, {progress_channel.updates_sent} progress updates)"
+            )
         
     except Exception as e:
         logger.error(f"動画分析エラー: {e}")
+        mark_failed(e)
         video = db.query(Video).filter(Video.id == video_id).first()
         video.status = "error"
         video.error_message = str(e)
         db.commit()
+    finally:
+        pins.close()
 
 @router.get("/{video_id}", response_model=VideoDetailResponse)
 async def get_video(
@@ -989,6 +953,19 @@ async def get_video(
         logger.error(f"動画詳細取得エラー (video_id={video_id}): {e}", exc_info=True)
         raise HTTPException(500, f"動画詳細の取得に失敗しました: {str(e)}")
 
+async def _cached_file_response(key: Optional[str], media_type: str = "image/jpeg") -> Optional[FileResponse]:
+    """
+    ローカルになければクラウドからキャッシュ経由で取得したファイルの FileResponse（なければ None）
+
+    クラウドの写しは送信し終わるまでキャッシュから削除されないようにする。
+    """
+    pins = ExitStack()
+    path = await asyncio.to_thread(pins.enter_context, pinned_local_file(key))
+    if not path:
+        pins.close()
+        return None
+    return FileResponse(path, media_type=media_type, background=BackgroundTask(pins.close))
+
 @router.get("/{video_id}/frame/{ms}")
 async def get_frame(video_id: int, ms: int, db: Session = Depends(get_db)):
     """指定時刻のフレーム画像取得"""
@@ -1000,15 +977,13 @@ async def get_frame(video_id: int, ms: int, db: Session = Depends(get_db)):
     if not frame or not frame.frame_path:
         raise HTTPException(404, "フレームが見つかりません")
     
-    # Render環境での実際のファイルパス取得
-    actual_frame_path = frame.frame_path
-    if os.getenv("RENDER") == "true" and actual_frame_path.startswith("uploads/"):
-        actual_frame_path = actual_frame_path.replace("uploads/", "/tmp/")
+    # ローカルになければクラウドからキャッシュ経由で取得
+    response = await _cached_file_response(frame.frame_path)
     
-    if not os.path.exists(actual_frame_path):
+    if response is None:
         raise HTTPException(404, "フレーム画像ファイルが見つかりません")
     
-    return FileResponse(actual_frame_path, media_type="image/jpeg")
+    return response
 
 @router.get("/", response_model=List[VideoResponse])
 async def list_videos(
@@ -1057,16 +1032,14 @@ async def get_frame_image(frame_id: int, db: Session = Depends(get_db)):
     if not frame or not frame.frame_path:
         raise HTTPException(404, "フレームが見つかりません")
     
-    # Render環境での実際のファイルパス取得
-    actual_frame_path = frame.frame_path
-    if os.getenv("RENDER") == "true" and actual_frame_path.startswith("uploads/"):
-        actual_frame_path = actual_frame_path.replace("uploads/", "/tmp/")
+    # ローカルになければクラウドからキャッシュ経由で取得
+    response = await _cached_file_response(frame.frame_path)
     
-    if not os.path.exists(actual_frame_path):
-        logger.error(f"Frame image not found: {actual_frame_path} (original: {frame.frame_path})")
+    if response is None:
+        logger.error(f"Frame image not found: {frame.frame_path}")
         raise HTTPException(404, "画像ファイルが見つかりません")
     
-    return FileResponse(actual_frame_path, media_type="image/jpeg")
+    return response
 
 # フレームキャッシュ（メモリ内に保持）
 frame_cache = {}
@@ -1076,6 +1049,7 @@ MAX_CACHE_SIZE = 100  # 最大100フレームをキャッシュ
 async def get_frame_at_time(
     video_id: int,
     time_ms: int = Query(..., description="時刻（ミリ秒）"),
+    snap: bool = Query(False, description="最も近いキーフレームに合わせる（スクラブ用、デコードが最小）"),
     db: Session = Depends(get_db)
 ):
     """指定時刻のフレーム画像を取得（キャッシュ付き高速版）"""
@@ -1083,6 +1057,11 @@ async def get_frame_at_time(
     if not video:
         raise HTTPException(404, "動画が見つかりません")
     
+    if snap:
+        keyframe = nearest_keyframe(load_keyframe_index(video.keyframe_index_json), time_ms)
+        if keyframe is not None:
+            time_ms = keyframe
+    
     # キャッシュキーを生成（33ms単位で丸める = 30fpsの1フレーム）
     cache_time = (time_ms // 33) * 33
     cache_key = f"{video_id}_{cache_time}"
@@ -1105,16 +1084,16 @@ async def get_frame_at_time(
     
     logger.info(f"Frame cache miss for {cache_key}")
     
-    # Render環境での実際のファイルパス取得
-    video_path = video.local_path
-    if os.getenv("RENDER") == "true" and video_path.startswith("uploads/"):
-        video_path = video_path.replace("uploads/", "/tmp/")
-    
-    if not os.path.exists(video_path):
-        raise HTTPException(404, "動画ファイルが見つかりません")
+    # 低解像度プロキシ、次に再生用レンディション（faststart・短いキーフレーム間隔でシークが速い）を優先
+    video_path = proxy_source(video)
+    if video_path is None and video.playback_path:
+        video_path = local_file(video.playback_path)
     
     # OpenCVで動画から指定時刻のフレームを抽出
-    cap = cv2.VideoCapture(video_path)
+    # （元動画がローカルになければクラウドから必要な範囲だけキャッシュ経由で読む）
+    cap = cv2.VideoCapture(video_path) if video_path else open_video_capture(video.local_path, video.gcs_uri)
+    if not cap.isOpened():
+        raise HTTPException(404, "動画ファイルが見つかりません")
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
@@ -1134,7 +1113,6 @@ async def get_frame_at_time(
         raise HTTPException(404, "フレームを取得できませんでした")
     
     # フレームをJPEGに変換してメモリ上で処理
-    import io
     from PIL import Image
     
     # BGRからRGBに変換（高速化のため品質を調整）
@@ -1177,6 +1155,20 @@ async def get_frame_at_time(
         }
     )
 
+@router.get("/{video_id}/keyframes")
+async def get_video_keyframes(video_id: int, db: Session = Depends(get_db)):
+    """キーフレーム時刻一覧（プレイヤーのスクラブ・シーク位置合わせ用）"""
+    video = db.query(Video).filter(Video.id == video_id).first()
+    if not video:
+        raise HTTPException(404, "動画が見つかりません")
+    
+    return {
+        "video_id": video.id,
+        "duration_ms": video.duration_ms,
+        "keyframes_ms": load_keyframe_index(video.keyframe_index_json),
+        "playback_ready": bool(video.playback_path),
+    }
+
 @router.get("/{video_id}/thumbnail")
 async def get_video_thumbnail(video_id: int, db: Session = Depends(get_db)):
     """ビデオサムネイル提供"""
@@ -1184,31 +1176,19 @@ async def get_video_thumbnail(video_id: int, db: Session = Depends(get_db)):
     if not video:
         raise HTTPException(404, "動画が見つかりません")
     
-    # Render環境での実際のファイルパス取得
-    actual_thumbnail_path = video.thumbnail_path
-    if os.getenv("RENDER") == "true" and actual_thumbnail_path and actual_thumbnail_path.startswith("uploads/"):
-        actual_thumbnail_path = actual_thumbnail_path.replace("uploads/", "/tmp/")
-    
-    actual_video_path = video.local_path
-    if os.getenv("RENDER") == "true" and actual_video_path.startswith("uploads/"):
-        actual_video_path = actual_video_path.replace("uploads/", "/tmp/")
+    # ローカルになければクラウドからキャッシュ経由で取得
+    response = await _cached_file_response(video.thumbnail_path)
     
     # サムネイルがなければ生成を試みる
-    if not actual_thumbnail_path or not os.path.exists(actual_thumbnail_path):
-        # 動的にサムネイル生成
-        if actual_video_path and os.path.exists(actual_video_path):
+    if response is None:
+        # 動的にサムネイル生成（デコードは低解像度プロキシがあればそちらで行う）
+        proxy_path = proxy_source(video)
+        cap = cv2.VideoCapture(proxy_path) if proxy_path else open_video_capture(video.local_path, video.gcs_uri)
+        if cap.isOpened():
             try:
-                import cv2
-                # Render環境では/tmpを使用
-                if os.getenv("RENDER") == "true":
-                    thumbnail_dir = Path("/tmp/thumbnails")
-                else:
-                    thumbnail_dir = Path("uploads/thumbnails")
-                thumbnail_dir.mkdir(parents=True, exist_ok=True)
-                thumbnail_filename = f"{Path(actual_video_path).stem}_thumb.jpg"
-                thumbnail_path = thumbnail_dir / thumbnail_filename
+                thumbnail_key = f"uploads/thumbnails/{remote_stem(video.local_path)}_thumb.jpg"
+                thumbnail_path = writable_path(thumbnail_key)
                 
-                cap = cv2.VideoCapture(actual_video_path)
                 cap.set(cv2.CAP_PROP_POS_FRAMES, 10)
                 ret, frame = cap.read()
                 if not ret:
@@ -1220,25 +1200,20 @@ async def get_video_thumbnail(video_id: int, db: Session = Depends(get_db)):
                     new_width = 320
                     new_height = int(height * (new_width / width))
                     resized = cv2.resize(frame, (new_width, new_height))
-                    cv2.imwrite(str(thumbnail_path), resized)
-                    
-                    # DBアップデート - Render環境では uploads パスとして保存
-                    if os.getenv("RENDER") == "true":
-                        db_thumbnail_path = str(thumbnail_path).replace("/tmp/", "uploads/")
-                    else:
-                        db_thumbnail_path = str(thumbnail_path)
-                    video.thumbnail_path = db_thumbnail_path
+                    cv2.imwrite(thumbnail_path, resized)
+                    video.thumbnail_path = thumbnail_key
                     db.commit()
                     
                 cap.release()
-                return FileResponse(str(thumbnail_path), media_type="image/jpeg")
+                if ret:
+                    return FileResponse(thumbnail_path, media_type="image/jpeg")
             except Exception as e:
                 logger.error(f"Thumbnail generation failed: {e}")
         
         # デフォルト画像を返すか404
         raise HTTPException(404, "サムネイルが見つかりません")
     
-    return FileResponse(actual_thumbnail_path, media_type="image/jpeg")
+    return response
 
 @router.post("/{video_id}/analyze-frame-preview")
 async def analyze_frame_preview(
@@ -1252,10 +1227,10 @@ async def analyze_frame_preview(
         raise HTTPException(404, "動画が見つかりません")
     
     try:
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         
         # 指定時刻のフレームを抽出
-        cap = cv2.VideoCapture(video.local_path)
+        cap = open_video_capture(video.local_path, video.gcs_uri)
         fps = cap.get(cv2.CAP_PROP_FPS)
         if fps <= 0:
             fps = 30
@@ -1342,7 +1317,7 @@ async def analyze_image(
             temp_path = tmp.name
         
         try:
-            analyzer = VideoAnalyzer()
+            analyzer = video_intelligence.VideoAnalyzer()
             # OCR分析を実行
             receipt_data = await analyzer.extract_receipt_data(temp_path, '')
             
@@ -1357,14 +1332,8 @@ async def analyze_image(
             if save_mode == 'create_new':
                 # フレームを保存
                 frame_filename = f"manual_frame_{video_id}_{time_ms}.jpg"
-                if os.getenv("RENDER") == "true":
-                    actual_frame_path = f"/tmp/frames/{frame_filename}"
-                    db_frame_path = f"uploads/frames/{frame_filename}"
-                else:
-                    actual_frame_path = f"uploads/frames/{frame_filename}"
-                    db_frame_path = actual_frame_path
-                
-                os.makedirs(os.path.dirname(actual_frame_path), exist_ok=True)
+                db_frame_path = f"uploads/frames/{frame_filename}"
+                actual_frame_path = writable_path(db_frame_path)
                 with open(actual_frame_path, 'wb') as f:
                     f.write(image_bytes)
                 
@@ -1505,16 +1474,17 @@ async def analyze_frame_at_time(
     db: Session = Depends(get_db)
 ):
     """特定時刻のフレームを手動で分析（データベースに保存）"""
+    storage_service = get_storage_service()
     video = db.query(Video).filter(Video.id == video_id).first()
     if not video:
         raise HTTPException(404, "動画が見つかりません")
     
     try:
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         
         # 指定時刻のフレームを抽出
         import cv2
-        cap = cv2.VideoCapture(video.local_path)
+        cap = open_video_capture(video.local_path, video.gcs_uri)
         
         # ビデオのFPSを取得
         fps = cap.get(cv2.CAP_PROP_FPS)
@@ -1539,7 +1509,7 @@ async def analyze_frame_at_time(
             # フレーム番号でのシークが失敗した場合、順次読み込みを試す
             logger.warning(f"Frame seek failed at frame {target_frame}, trying sequential read")
             cap.release()
-            cap = cv2.VideoCapture(video.local_path)
+            cap = open_video_capture(video.local_path, video.gcs_uri)
             
             # 目標フレームまで順次読み込み
             frame = None
@@ -1578,22 +1548,15 @@ async def analyze_frame_at_time(
         l = clahe.apply(l)
         frame = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
         
-        # Render環境でのフレーム保存パス
+        # フレーム保存パス
         frame_filename = f"manual_frame_{video_id}_{actual_time_ms}.jpg"
-        if os.getenv("RENDER") == "true":
-            actual_frame_path = f"/tmp/frames/{frame_filename}"
-            db_frame_path = f"uploads/frames/{frame_filename}"
-        else:
-            actual_frame_path = f"uploads/frames/{frame_filename}"
-            db_frame_path = actual_frame_path
-        
-        # ディレクトリ確認
-        os.makedirs(os.path.dirname(actual_frame_path), exist_ok=True)
+        db_frame_path = f"uploads/frames/{frame_filename}"
+        actual_frame_path = writable_path(db_frame_path)
         cv2.imwrite(actual_frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 100])  # 最高品質で保存
         cap.release()
         
         # Supabase Storageにフレームをアップロード
-        if use_cloud_storage and storage_service:
+        if storage_service:
             try:
                 with open(actual_frame_path, 'rb') as f:
                     frame_content = f.read()
@@ -1805,6 +1768,7 @@ async def update_receipt_frame(
     db: Session = Depends(get_db)
 ):
     """レシートのフレームを更新（OCR再分析後に適用時）"""
+    storage_service = get_storage_service()
     receipt = db.query(Receipt).filter(
         Receipt.id == receipt_id,
         Receipt.video_id == video_id
@@ -1819,7 +1783,7 @@ async def update_receipt_frame(
     
     try:
         # 新しいフレームを抽出して保存
-        cap = cv2.VideoCapture(video.local_path)
+        cap = open_video_capture(video.local_path, video.gcs_uri)
         fps = cap.get(cv2.CAP_PROP_FPS)
         if fps <= 0:
             fps = 30
@@ -1840,21 +1804,12 @@ async def update_receipt_frame(
         timestamp = int(time.time() * 1000)
         frame_filename = f"{timestamp}_frame_{actual_time_ms:08d}ms.jpg"
         
-        # Render環境でのパス設定
-        if os.getenv("RENDER") == "true":
-            output_dir = Path("/tmp/frames")
-            actual_frame_path = str(output_dir / frame_filename)
-            db_frame_path = f"uploads/frames/{frame_filename}"
-        else:
-            output_dir = Path("uploads/frames")
-            actual_frame_path = str(output_dir / frame_filename)
-            db_frame_path = actual_frame_path
-        
-        output_dir.mkdir(parents=True, exist_ok=True)
+        db_frame_path = f"uploads/frames/{frame_filename}"
+        actual_frame_path = writable_path(db_frame_path)
         cv2.imwrite(actual_frame_path, frame)
         
         # Supabase Storageにフレームをアップロード
-        if use_cloud_storage and storage_service:
+        if storage_service:
             try:
                 with open(actual_frame_path, 'rb') as f:
                     frame_content = f.read()
@@ -1879,7 +1834,7 @@ async def update_receipt_frame(
                 logger.warning(f"Failed to upload frame to cloud: {e}")
         
         # 画像分析（品質スコア、pHash等）
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         frame_data = analyzer._analyze_frame(actual_frame_path, actual_time_ms)
         
         # 新しいFrameオブジェクトを作成
@@ -1969,7 +1924,7 @@ async def update_receipt(
     
     # vendorが変更された場合、vendor_normも更新
     if 'vendor' in update_dict:
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         receipt.vendor_norm = analyzer._normalize_text(update_dict['vendor'] or '')
     
     # updated_at更新
@@ -2047,11 +2002,7 @@ async def delete_receipt(
         frame = db.query(Frame).filter(Frame.id == receipt.best_frame_id).first()
         if frame and frame.is_manual:
             # フレーム画像ファイルも削除
-            if frame.frame_path and os.path.exists(frame.frame_path):
-                try:
-                    os.remove(frame.frame_path)
-                except:
-                    pass
+            get_blob_resolver().delete(frame.frame_path)
             db.delete(frame)
     
     # 領収書削除
@@ -2089,22 +2040,16 @@ async def delete_video(
             db.query(Frame).filter(Frame.video_id == video_id).delete(synchronize_session=False)
             logger.info(f"Deleted {frame_count} frames for video {video_id}")
             
-            # 4. ローカルファイル削除（エラーは無視）
-            if video.local_path:
-                try:
-                    # Render環境のパス変換
-                    actual_path = video.local_path
-                    if os.getenv("RENDER") == "true" and actual_path.startswith("uploads/"):
-                        actual_path = actual_path.replace("uploads/", "/tmp/")
-                    
-                    if os.path.exists(actual_path):
-                        os.remove(actual_path)
-                        logger.info(f"Deleted file: {actual_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete file {video.local_path}: {e}")
-                    # ファイル削除失敗は無視して続行
+            # 4. 処理の計測結果
+            db.query(ProcessingMetric).filter(ProcessingMetric.video_id == video_id).delete(synchronize_session=False)
             
-            # 5. ビデオレコード削除
+            # 5. ファイル削除（元動画・再生用レンディション・プロキシ・サムネイル、エラーは無視）
+            # クラウドのオブジェクトはローカルキャッシュの写しだけを削除する
+            get_blob_resolver().delete(*{
+                video.local_path, video.gcs_uri, video.playback_path, video.proxy_path, video.thumbnail_path,
+            })
+            
+            # 6. ビデオレコード削除
             db.delete(video)
             
             # コミット
@@ -2295,185 +2240,131 @@ def process_video_ocr_wrapper(video_id: int):
             pass
         db.close()
 
+@instrument_job("process_video_ocr_sync")
+@profile_job("process_video_ocr_sync")
 def process_video_ocr_sync(video_id: int, db: Session):
     """
     実際のOCR処理を実行（同期版）
     Google Vision APIを使用して領収書を検出・認識
     """
+    storage_service = get_storage_service()
     import time
     start_time = time.time()
     max_processing_time = 180  # 最大3分
     
     logger.info(f"OCR処理開始: Video ID {video_id}")
     
+    pins = ExitStack()  # キャッシュ経由で取得した動画を処理が終わるまで残す
     try:
         video = db.query(Video).filter(Video.id == video_id).first()
         if not video:
             logger.error(f"Video {video_id} not found")
             return
         
-        # 進行状況更新
-        video.status = "processing"
-        video.progress = 20
-        video.progress_message = "フレーム抽出中..."
-        db.commit()
+        # 進捗は軽量チャネルで更新し、フレーム・レシート・仕訳はバッチで保存する
+        progress_channel = ProgressChannel(db.get_bind(), video_id)
+        uow = ProcessingUnitOfWork(db, video, generator=JournalGenerator(db))
+        progress_channel.update(20, "フレーム抽出中...", status="processing")
         
-        # 必要なディレクトリを作成（Render環境を考慮）
-        import os
-        if os.getenv("RENDER") == "true":
-            # Render環境では/tmpを使用
-            frames_dir = Path("/tmp/frames")
-        else:
-            base_path = Path(os.path.dirname(os.path.abspath(__file__))).parent  # backend/
-            frames_dir = base_path / "uploads" / "frames"
+        # 必要なディレクトリを作成
+        frames_dir = Path(resolve_local_path("uploads/frames"))
         frames_dir.mkdir(parents=True, exist_ok=True)
         
         # Vision OCRサービスを使用
         from services.vision_ocr import VisionOCRService
         ocr_service = VisionOCRService()
         
+        # リモートOCRの前段のゲート（既定は無効。OCR_GATE=shadow で判定・記録のみ、true で除外）
+        from services.ocr_gate import OCR_GATE_ENABLED, OCR_GATE_SHADOW, OCRGate, has_amount, record_rejected
+        gate = OCRGate() if OCR_GATE_ENABLED or OCR_GATE_SHADOW else None
+        
         # VideoAnalyzerインスタンス作成（領収書データ抽出用）
-        analyzer = VideoAnalyzer()
+        analyzer = video_intelligence.VideoAnalyzer()
         
         # 動画からフレーム抽出（2秒間隔）
         # Render環境での実際のビデオパス取得
-        actual_video_path = video.local_path
-        if os.getenv("RENDER") == "true" and actual_video_path.startswith("uploads/"):
-            actual_video_path = actual_video_path.replace("uploads/", "/tmp/")
+        # （ローカルになければクラウドからキャッシュ経由で取得）
+        actual_video_path = pins.enter_context(pinned_local_file(video.local_path, video.gcs_uri))
         
         # ビデオファイルの存在確認
-        if not os.path.exists(actual_video_path):
-            logger.error(f"Video file not found: {actual_video_path}")
+        if not actual_video_path:
+            logger.error(f"Video file not found: {video.local_path}")
             video.status = "error"
-            video.error_message = f"ビデオファイルが見つかりません: {actual_video_path}"
+            video.error_message = f"ビデオファイルが見つかりません: {video.local_path}"
             db.commit()
             return
         
-        logger.info(f"Processing video at: {actual_video_path}")
-        cap = cv2.VideoCapture(actual_video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration_sec = total_frames / fps if fps > 0 else 0
-        
-        logger.info(f"Video info: {duration_sec:.1f}秒, {total_frames}フレーム, {fps:.1f}fps")
+        # 候補の評価は低解像度プロキシで行い、保存するフレームだけ元動画から読む
+        proxy_path = proxy_source(video)
+        logger.info(f"Processing video at: {actual_video_path} (proxy: {proxy_path})")
         
-        # スマートフレーム抽出（品質ベース選別）
-        extracted_frames = []
+        # フレーム選択（既定は1.5秒ごとのサンプリング＋品質順の選別、FRAME_SELECTOR で切り替え）
         max_final_frames = 15  # 最終的に処理する最大フレーム数
-        sample_interval = 1.5  # 1.5秒ごとにサンプリング
-        
-        # 1. 初期サンプリング：1秒ごとにフレーム候補を収集
-        candidate_frames = []
-        for sec_float in [i * sample_interval for i in range(int(duration_sec / sample_interval) + 1)]:
-            frame_number = int(sec_float * fps)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            ret, frame = cap.read()
-            
-            if ret and frame is not None:
-                # フレーム品質を評価
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                
-                # 1. 鮮明度（ラプラシアン分散）
-                laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-                sharpness = laplacian.var()
-                
-                # 2. 明るさ（平均輝度）
-                brightness = gray.mean()
-                
-                # 3. コントラスト（標準偏差）
-                contrast = gray.std()
-                
-                # 4. エッジ検出（テキスト存在の可能性）
-                edges = cv2.Canny(gray, 50, 150)
-                edge_density = edges.mean()
-                
-                # 総合スコア計算
-                quality_score = (
-                    sharpness * 0.4 +  # 鮮明度重視
-                    (brightness / 255.0) * 100 * 0.2 +  # 適度な明るさ
-                    contrast * 0.2 +  # コントラスト
-                    edge_density * 0.2  # エッジ（テキストの可能性）
-                )
-                
-                candidate_frames.append({
-                    'frame': frame,
-                    'time_ms': int(sec_float * 1000),
-                    'quality_score': quality_score,
-                    'sharpness': sharpness,
-                    'brightness': brightness,
-                    'contrast': contrast,
-                    'phash': ''  # TODO: 後で実装
-                })
-        
-        # 2. 品質順でソートし、重複を避けながら選別
-        candidate_frames.sort(key=lambda x: x['quality_score'], reverse=True)
-        
-        selected_times = set()
-        min_time_diff = 1500  # 最低1.5秒の間隔（処理速度改善）
-        
-        for candidate in candidate_frames:
-            if len(extracted_frames) >= max_final_frames:
-                break
-                
-            # 時間的に近いフレームが既に選ばれていないかチェック
-            time_ms = candidate['time_ms']
-            too_close = any(abs(time_ms - t) < min_time_diff for t in selected_times)
+        selector = frame_selection.get_frame_selector(default="interval")
+        with stage("select_frames") as selecting:
+            selected = selector.select(
+                actual_video_path,
+                output_dir=str(frames_dir),
+                stem=f"frame_{video_id}",
+                proxy_path=proxy_path,
+                target_max=max_final_frames
+            )
+            selecting.add(items=len(selected))
+        logger.info(f"Frame selector '{selector.name}' selected {len(selected)} frames")
+
+        # OCRの期待効用（テキストらしさ・文書面積・鮮明度・既に選んだフレームとのpHash距離）が
+        # 高い順にOCR予算を割り当て、効用の低いフレームはOCR・アップロードしない
+        # （OCR込みのエンジンは選択の中で予算を割り当て済み。ここでOCRし直さない）
+        if not selector.runs_ocr:
+            from video_processing.config import load_config
+            from video_processing.ocr_budget import OCRBudgetPlanner
+            with stage("ocr_budget", items=len(selected)) as budgeting:
+                ocr_plan = OCRBudgetPlanner(load_config()).plan_images(selected, lambda frame: frame.crop_path)
+                budgeting.add(ocr_calls_saved=ocr_plan.calls_saved)
+            selected = ocr_plan.selected
+
+        extracted_frames = []
+        pending_uploads = []  # (extracted_framesのインデックス, UploadItem)
+        for selected_frame in selected:
+            frame_path = selected_frame.crop_path
+            frame_data = frame_selection.to_frame_data(selected_frame)
+            if selector.runs_ocr:
+                # 選択エンジンのOCR結果・レシート情報（下のOCR処理で Vision OCR の代わりに使う）
+                frame_data['ocr_text'] = selected_frame.ocr_text or ''
+                frame_data['receipt_data'] = frame_selection.to_receipt_data(selected_frame)
             
-            if not too_close and candidate['quality_score'] > 10:  # 最低品質基準
-                # フレーム保存
-                frame_filename = f"frame_{video_id}_{time_ms:06d}.jpg"
-                frame_path = str(frames_dir / frame_filename)
-                cv2.imwrite(frame_path, candidate['frame'])
-                
-                # Supabase Storageにフレームをアップロード
-                frame_cloud_url = frame_path  # デフォルトはローカルパス
-                if use_cloud_storage and storage_service:
-                    try:
-                        # JPEGエンコード
-                        _, buffer = cv2.imencode('.jpg', candidate['frame'], [cv2.IMWRITE_JPEG_QUALITY, 95])
-                        frame_content = buffer.tobytes()
-                        
-                        # クラウドパス生成
-                        cloud_frame_path = storage_service.generate_file_path(
-                            user_id=1,  # TODO: 実際のユーザーIDを使用
-                            filename=frame_filename,
-                            file_type="frame"
-                        )
-                        
-                        success, cloud_url = storage_service.upload_file_sync(
-                            file_content=frame_content,
-                            file_path=cloud_frame_path,
-                            content_type="image/jpeg"
-                        )
-                        
-                        if success:
-                            logger.info(f"Frame uploaded to cloud: {cloud_url}")
-                            frame_cloud_url = cloud_url
-                    except Exception as e:
-                        logger.warning(f"Failed to upload frame to cloud: {e}")
-                
-                extracted_frames.append({
-                    'path': frame_path,
-                    'frame_path': frame_cloud_url,  # クラウドURLまたはローカルパス
-                    'time_ms': time_ms,
-                    'quality_score': candidate['quality_score'],
-                    'sharpness': candidate['sharpness'],
-                    'brightness': candidate['brightness'],
-                    'contrast': candidate['contrast'],
-                    'phash': candidate['phash']
-                })
-                selected_times.add(time_ms)
-        
-        # 3. 時間順にソート
-        extracted_frames.sort(key=lambda x: x['time_ms'])
+            # クラウドへのアップロードは選別後にまとめて並列実行
+            frame_data['path'] = frame_path
+            frame_data['frame_path'] = to_db_path(frame_path)  # デフォルトはローカルのキー
+            if storage_service:
+                with open(frame_path, 'rb') as f:
+                    frame_content = f.read()
+                pending_uploads.append((len(extracted_frames), UploadItem(
+                    key=storage_service.generate_file_path(
+                        user_id=1,  # TODO: 実際のユーザーIDを使用
+                        filename=os.path.basename(frame_path),
+                        file_type="frame"
+                    ),
+                    data=frame_content,
+                    content_type="image/jpeg"
+                )))
+            extracted_frames.append(frame_data)
+        
+        # Supabase Storageに選別したフレームを並列アップロード
+        if pending_uploads:
+            with stage("upload", items=len(pending_uploads)):
+                results = storage_service.upload_many([item for _, item in pending_uploads])
+            for (index, _), result in zip(pending_uploads, results):
+                if result.success:
+                    extracted_frames[index]['frame_path'] = result.url
+                else:
+                    logger.warning(f"Failed to upload frame to cloud: {result.error}")
+            logger.info(f"Uploaded {sum(r.success for r in results)}/{len(results)} frames to cloud")
         
-        cap.release()
         logger.info(f"Extracted {len(extracted_frames)} frames")
         
         # 進行状況更新
-        video.progress = 40
-        video.progress_message = f"{len(extracted_frames)}枚のフレームをOCR処理中..."
-        db.commit()
+        progress_channel.update(40, f"{len(extracted_frames)}枚のフレームをOCR処理中...", force=True)
         
         # 各フレームをOCR処理
         receipts_found = 0
@@ -2481,54 +2372,100 @@ def process_video_ocr_sync(video_id: int, db: Session):
             # 処理時間チェック
             if time.time() - start_time > max_processing_time:
                 logger.warning(f"Processing time limit reached ({max_processing_time}s), stopping at frame {i}/{len(extracted_frames)}")
-                video.progress_message = f"時間制限により処理を終了: {receipts_found}件の領収書を検出"
+                progress_channel.update(80, f"時間制限により処理を終了: {receipts_found}件の領収書を検出", force=True)
                 break
             
             try:
                 # 進行状況更新
                 progress = 40 + int(40 * i / len(extracted_frames))
-                video.progress = progress
-                video.progress_message = f"フレーム {i+1}/{len(extracted_frames)} 分析中..."
-                db.commit()
+                progress_channel.update(progress, f"フレーム {i+1}/{len(extracted_frames)} 分析中...")
                 
                 # フレームファイルの存在確認
                 if not os.path.exists(frame_info['path']):
                     logger.error(f"Frame file not found: {frame_info['path']}")
                     continue
                 
-                # Vision APIでOCR実行
-                logger.info(f"OCR processing frame: {frame_info['path']}")
-                ocr_result = ocr_service.extract_text_from_image(frame_info['path'])
-                ocr_text = ocr_result.get('full_text', '') if ocr_result else ''
+                if selector.runs_ocr:
+                    # 選択エンジンがOCR済み（receipt）: ゲート・Vision OCR は行わずその結果を使う
+                    ocr_text = frame_info.get('ocr_text') or ''
+                else:
+                    # ローカルのゲート（テキスト行・金額の有無）を通らないフレームはリモートOCRに送らない
+                    # （shadow モードでは送って、除外していたら取りこぼしたかを記録する）
+                    gate_result = None
+                    if gate is not None:
+                        with stage("ocr_gate", items=1) as gating:
+                            gate_result = gate.check(frame_info['path'])
+                            if not gate_result.passed:
+                                gating.add(ocr_gate_rejected=1)
+                                if not OCR_GATE_SHADOW:
+                                    gating.add(ocr_calls_saved=1)
+                        if not gate_result.passed and not OCR_GATE_SHADOW:
+                            record_rejected(frame_info['path'], gate_result, video_id=video_id, frame=i)
+                            continue
+                    
+                    # Vision APIでOCR実行
+                    logger.info(f"OCR processing frame: {frame_info['path']}")
+                    with stage("ocr", items=1, ocr_calls=1) as ocr_stage:
+                        ocr_result = ocr_service.extract_text_from_image(frame_info['path'])
+                        if ocr_result:
+                            # API 1回あたりの送信量（切り出し・縮小・再エンコード後）と削減量
+                            ocr_stage.add(ocr_bytes_sent=ocr_result.get('payload_bytes', 0),
+                                          ocr_bytes_saved=ocr_result.get('payload_bytes_saved', 0))
+                    ocr_text = ocr_result.get('full_text', '') if ocr_result else ''
+                    if gate_result is not None and not gate_result.passed:
+                        missed = has_amount(ocr_text)
+                        record_rejected(frame_info['path'], gate_result, video_id=video_id, frame=i,
+                                        ocr_has_amount=missed)
+                        if missed:
+                            gating.add(ocr_gate_missed=1)
                 
                 logger.info(f"Frame {i}: OCR result - {len(ocr_text)} characters detected")
                 
                 if ocr_text and len(ocr_text) > 50:  # 最小文字数チェック
                     logger.info(f"Frame {i}: Processing OCR text (first 100 chars): {ocr_text[:100]}")
                     
-                    # AIを使用して領収書データを抽出
-                    receipt_data = None
-                    try:
-                        # Gemini APIで領収書データ抽出（同期版）
-                        import asyncio
+                    # AIを使用して領収書データを抽出（選択エンジンが抽出済みならそれを使う）
+                    receipt_data = frame_info.get('receipt_data')
+                    # OCRのテキストに金額らしい数字がなければGeminiに送らない（パターンマッチングのみ）
+                    # OCRゲートと同じ OCR_GATE で切り替える（shadow では送って、スキップしていたら取りこぼしたかを記録する）
+                    no_amount = False
+                    if not receipt_data and (OCR_GATE_ENABLED or OCR_GATE_SHADOW):
+                        with stage("amount_gate", items=1) as amount_gating:
+                            no_amount = not has_amount(ocr_text)
+                            if no_amount:
+                                amount_gating.add(ai_gate_rejected=1)
+                                if not OCR_GATE_SHADOW:
+                                    amount_gating.add(ai_calls_saved=1)
+                    if receipt_data:
+                        logger.info(f"Frame {i}: 選択エンジンの抽出結果を使用: vendor={receipt_data.get('vendor')}")
+                    elif no_amount and not OCR_GATE_SHADOW:
+                        logger.info(f"Frame {i}: 金額が見つからないためAI解析をスキップ")
+                    else:
                         try:
-                            loop = asyncio.get_event_loop()
-                        except RuntimeError:
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
+                            # Gemini APIで領収書データ抽出（同期版）
+                            import asyncio
+                            try:
+                                loop = asyncio.get_event_loop()
+                            except RuntimeError:
+                                loop = asyncio.new_event_loop()
+                                asyncio.set_event_loop(loop)
                         
-                        try:
-                            receipt_data = loop.run_until_complete(
-                                analyzer.extract_receipt_data(frame_info['path'], ocr_text)
-                            )
-                            if receipt_data:
-                                logger.info(f"Frame {i}: AI解析成功: vendor={receipt_data.get('vendor')}, total={receipt_data.get('total')}")
-                        except Exception as ai_error:
-                            logger.warning(f"Frame {i}: AI解析エラー: {ai_error}")
-                            import traceback
-                            logger.error(f"AI解析エラー詳細: {traceback.format_exc()}")
-                    except Exception as e:
-                        logger.warning(f"Frame {i}: AI解析失敗: {e}")
+                            try:
+                                with stage("ai_extraction", items=1, ai_calls=1):
+                                    receipt_data = loop.run_until_complete(
+                                        analyzer.extract_receipt_data(frame_info['path'], ocr_text)
+                                    )
+                                if receipt_data:
+                                    logger.info(f"Frame {i}: AI解析成功: vendor={receipt_data.get('vendor')}, total={receipt_data.get('total')}")
+                                    if no_amount and (receipt_data.get('vendor') or receipt_data.get('total')):
+                                        logger.info(f"Frame {i}: 金額ゲートがスキップしていた領収書をAIが抽出（shadow）")
+                                        amount_gating.add(ai_gate_missed=1)
+                            except Exception as ai_error:
+                                logger.warning(f"Frame {i}: AI解析エラー: {ai_error}")
+                                import traceback
+                                logger.error(f"AI解析エラー詳細: {traceback.format_exc()}")
+                        except Exception as e:
+                            logger.warning(f"Frame {i}: AI解析失敗: {e}")
                     
                     # フォールバック：パターンマッチング
                     if not receipt_data:
@@ -2541,39 +2478,8 @@ def process_video_ocr_sync(video_id: int, db: Session):
                     
                     if receipt_data and receipt_data.get('vendor'):
                         # Frameオブジェクトを作成
-                        # フレームイメージをSupabaseにアップロード
-                        db_frame_path = frame_info['path']
-                        cloud_frame_url = None
-                        
-                        if use_cloud_storage and storage_service:
-                            try:
-                                # フレームファイルを読み込み
-                                with open(frame_info['path'], 'rb') as f:
-                                    frame_content = f.read()
-                                
-                                # ファイルパス生成
-                                frame_filename = os.path.basename(frame_info['path'])
-                                cloud_frame_path = storage_service.generate_file_path(0, frame_filename, "frame")
-                                
-                                # アップロード
-                                success, result = storage_service.upload_file_sync(
-                                    frame_content,
-                                    cloud_frame_path,
-                                    "image/jpeg"
-                                )
-                                
-                                if success:
-                                    cloud_frame_url = result
-                                    db_frame_path = cloud_frame_url
-                                    logger.info(f"Frame uploaded to cloud: {cloud_frame_url}")
-                                else:
-                                    logger.warning(f"Frame cloud upload failed: {result}")
-                            except Exception as e:
-                                logger.error(f"Frame cloud upload error: {e}")
-                        
-                        # Render環境での経路調整（クラウド保存失敗時）
-                        if not cloud_frame_url and os.getenv("RENDER") == "true":
-                            db_frame_path = db_frame_path.replace("/tmp/", "uploads/")
+                        # フレームイメージは抽出時にアップロード済み（失敗時はローカルパス）
+                        db_frame_path = frame_info['frame_path']
                         
                         try:
                             logger.info(f"Frameオブジェクト作成中: video_id={video_id}, time_ms={frame_info['time_ms']}")
@@ -2588,9 +2494,6 @@ def process_video_ocr_sync(video_id: int, db: Session):
                                 contrast=frame_info.get('contrast', 0),
                                 is_best=True
                             )
-                            db.add(frame_obj)
-                            db.flush()  # IDを取得
-                            logger.info(f"Frameオブジェクト保存成功: frame_id={frame_obj.id}")
                         except Exception as frame_error:
                             logger.error(f"Frame保存エラー: {frame_error}")
                             import traceback
@@ -2629,7 +2532,7 @@ def process_video_ocr_sync(video_id: int, db: Session):
                             
                             receipt = Receipt(
                                 video_id=video_id,
-                                best_frame_id=frame_obj.id,
+                                best_frame=frame_obj,
                                 vendor=receipt_data.get('vendor'),
                                 vendor_norm=receipt_data.get('vendor', '').lower().replace(' ', ''),
                                 document_type=doc_type,
@@ -2642,69 +2545,41 @@ def process_video_ocr_sync(video_id: int, db: Session):
                                 payment_method=payment,
                                 is_manual=False
                             )
-                            db.add(receipt)
-                            db.commit()
-                            logger.info(f"Receipt保存成功: receipt_id={receipt.id}")
                         except Exception as receipt_error:
-                            logger.error(f"Receipt保存エラー: {receipt_error}")
+                            logger.error(f"Receipt作成エラー: {receipt_error}")
                             import traceback
-                            logger.error(f"Receipt保存エラー詳細: {traceback.format_exc()}")
-                            db.rollback()
+                            logger.error(f"Receipt作成エラー詳細: {traceback.format_exc()}")
                             continue
                         
+                        # 仕訳はフレーム・レシートと同じトランザクションで保存時に生成される
+                        uow.add(frame=frame_obj, receipt=receipt)
                         receipts_found += 1
                         logger.info(f"Receipt found: {receipt.vendor} - ¥{receipt.total}")
-                        
-                        # 仕訳データ生成
-                        try:
-                            logger.info(f"仕訳データ生成中: receipt_id={receipt.id}")
-                            generator = JournalGenerator(db)
-                            journal_entries = generator.generate_journal_entries(receipt)
-                            for entry_data in journal_entries:
-                                journal_entry = JournalEntry(
-                                    receipt_id=entry_data.receipt_id,
-                                    video_id=entry_data.video_id,
-                                    time_ms=frame_info['time_ms'],
-                                    debit_account=entry_data.debit_account,
-                                    credit_account=entry_data.credit_account,
-                                    debit_amount=entry_data.debit_amount,
-                                    credit_amount=entry_data.credit_amount,
-                                    tax_account=entry_data.tax_account,
-                                    tax_amount=entry_data.tax_amount,
-                                    memo=entry_data.memo,
-                                    status='unconfirmed',
-                                    transaction_date=receipt.issue_date if receipt.issue_date else datetime.now().date()
-                                )
-                                db.add(journal_entry)
-                            db.commit()
-                            logger.info(f"仕訳データ保存成功")
-                        except Exception as journal_error:
-                            logger.error(f"仕訳生成エラー: {journal_error}")
-                            import traceback
-                            logger.error(f"仕訳生成エラー詳細: {traceback.format_exc()}")
-                            db.rollback()
                 
             except Exception as e:
                 logger.error(f"Frame {i} processing error: {e}")
-                # エラーが発生しても処理を続行
-                try:
-                    video.progress = 40 + int(50 * (i + 1) / len(extracted_frames))
-                    video.progress_message = f"フレーム {i+1}/{len(extracted_frames)} 処理中..."
-                    db.commit()
-                except:
-                    pass  # DBエラーも無視して続行
+                # エラーが発生しても処理を続行（進捗更新の失敗も無視される）
+                progress_channel.update(
+                    40 + int(50 * (i + 1) / len(extracted_frames)),
+                    f"フレーム {i+1}/{len(extracted_frames)} 処理中..."
+                )
                 continue
         
-        # 完了
-        video.status = "done"
-        video.progress = 100
-        video.progress_message = f"処理完了: {receipts_found}件の領収書を検出"
-        db.commit()
+        # 完了（残りのデータと完了ステータスを1トランザクションで保存）
+        with stage("save", items=len(uow.pending_receipts)):
+            uow.commit(status="done", progress=100, progress_message=f"処理完了: {receipts_found}件の領収書を検出")
+        if uow.failed_units:
+            video.progress_message = f"処理完了: {uow.saved_receipts}件の領収書を検出"
+            db.commit()
         
-        logger.info(f"Video {video_id} processing complete: {receipts_found} receipts found")
+        logger.info(
+            f"Video {video_id} processing complete: {uow.saved_receipts} receipts saved "
+            f"({uow.commits} commits, {progress_channel.updates_sent} progress updates)"
+        )
         
     except Exception as e:
         logger.error(f"Video OCR processing error: {e}", exc_info=True)
+        mark_failed(e)
         video = db.query(Video).filter(Video.id == video_id).first()
         if video:
             video.status = "error"
@@ -2713,4 +2588,6 @@ def process_video_ocr_sync(video_id: int, db: Session):
             try:
                 db.commit()
             except:
-                db.rollback()
\ No newline at end of file
+                db.rollback()
+    finally:
+        pins.close()
\ No newline at end of file
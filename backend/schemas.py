@@ -320,6 +320,43 @@ class RuleResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+# Export Job Schemas
+class ExportJobCreate(BaseModel):
+    format: str = "standard"
+    video_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    status: Optional[str] = None
+
+class ExportJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    format: str
+    status: str
+    filters: Dict[str, Any] = {}
+    rows_written: Optional[int] = None
+    artifact_size: Optional[int] = None
+    error_message: Optional[str] = None
+    cached: bool = False
+    download_url: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    
+    @field_serializer('created_at')
+    def serialize_created_at(self, dt: datetime) -> str:
+        """created_atを日本時間に変換"""
+        jst_time = to_jst(dt)
+        return jst_time.isoformat() if jst_time else dt.isoformat()
+    
+    @field_serializer('completed_at')
+    def serialize_completed_at(self, dt: Optional[datetime]) -> Optional[str]:
+        """completed_atを日本時間に変換"""
+        if dt is None:
+            return None
+        jst_time = to_jst(dt)
+        return jst_time.isoformat() if jst_time else dt.isoformat()
+
 # Video Detail Response with related data
 class VideoDetailResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
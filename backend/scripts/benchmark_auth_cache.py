@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+認証キャッシュのベンチマーク
+
+一時SQLiteにユーザーと動画を投入し、認証付きの GET /videos/（list_videos）を
+認証キャッシュあり・なし（TTL 0）で繰り返し呼び出して 1秒あたりのリクエスト数と
+キャッシュのヒット率を比較する。
+
+使い方:
+    python scripts/benchmark_auth_cache.py [--requests 2000] [--videos 20]
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import get_db
+from models import Base, User, Video
+from routers import auth, videos
+from services.auth_cache import principal_cache
+
+
+def _seed(engine, video_count):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # bcrypt のハッシュ計算は不要なのでダミーのハッシュで直接登録
+        conn.execute(insert(User), [{
+            "id": 1, "email": "bench@example.com", "username": "bench",
+            "hashed_password": "x", "is_active": True, "is_superuser": False,
+        }])
+        conn.execute(insert(Video), [
+            {"id": i, "filename": f"bench{i}.mp4", "user_id": 1, "status": "done"}
+            for i in range(1, video_count + 1)
+        ])
+
+
+def _run(client, headers, requests):
+    for _ in range(min(50, requests)):
+        client.get("/videos/", headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/videos/", headers=headers)
+        assert response.status_code == 200, response.text
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="認証キャッシュ ベンチマーク")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--videos", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        _seed(engine, args.videos)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(videos.router, prefix="/videos")
+        app.dependency_overrides[get_db] = override_get_db
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': '1'})}"}
+
+        print(f"requests={args.requests} videos={args.videos}")
+        ttl = principal_cache.ttl
+        for label, mode_ttl in (("no_cache", 0), ("cache", ttl or 30)):
+            principal_cache.ttl = mode_ttl
+            principal_cache.clear()
+            principal_cache.hits = principal_cache.misses = 0
+            rps = _run(client, headers, args.requests)
+            stats = principal_cache.stats()
+            print(json.dumps({"mode": label, "req_per_s": round(rps, 1), "hit_rate": stats["hit_rate"]}))
+        principal_cache.ttl = ttl
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+/export/csv のベンチマーク
+
+一時SQLiteに仕訳を投入し、従来方式（query.all + StringIO + BytesIO）と
+ストリーミング方式（整形を同一プロセス／ワーカープロセスで行う場合）の
+最初の1バイトまでの時間・総時間・ピークRSSを比較する。
+ピークRSSを分けて測るため、各方式は別プロセスで実行する。
+
+使い方:
+    python scripts/benchmark_export_csv.py [--rows 1000000] [--format standard]
+"""
+
+import sys
+import os
+import csv
+import io
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from models import Base, Video, Receipt, JournalEntry
+
+
+def _seed(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.execute(insert(Video), [{"id": 1, "filename": "bench.mp4"}])
+        batch = 50000
+        for offset in range(0, rows, batch):
+            ids = range(offset + 1, min(offset + batch, rows) + 1)
+            db.execute(insert(Receipt), [
+                {
+                    "id": i, "video_id": 1, "vendor": f"店舗{i}", "vendor_norm": f"店舗{i}",
+                    "issue_date": datetime(2024, 1 + i % 12, 1 + i % 28),
+                    "total": 1000 + i, "tax": 100, "tax_rate": 0.10,
+                }
+                for i in ids
+            ])
+            db.execute(insert(JournalEntry), [
+                {
+                    "receipt_id": i, "video_id": 1, "transaction_date": datetime(2024, 1 + i % 12, 1 + i % 28).date(),
+                    "debit_account": "5190", "credit_account": "1110",
+                    "debit_amount": 1000 + i, "credit_amount": 1000 + i,
+                    "memo": f"店舗{i}", "status": "unconfirmed",
+                }
+                for i in ids
+            ])
+        db.commit()
+
+
+def _legacy_chunks(engine):
+    """変更前の実装（全件ロード → StringIO → BytesIO、標準形式）"""
+    with Session(engine) as db:
+        results = db.query(JournalEntry, Receipt, Video).join(
+            Receipt, JournalEntry.receipt_id == Receipt.id
+        ).join(
+            Video, JournalEntry.video_id == Video.id
+        ).all()
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow([
+            '日付', '取引先', '摘要', '借方科目', '借方金額',
+            '貸方科目', '貸方金額', '税率', '消費税', 'ステータス'
+        ])
+        for journal, receipt, video in results:
+            writer.writerow([
+                receipt.issue_date.strftime('%Y-%m-%d') if receipt.issue_date else '',
+                receipt.vendor or '',
+                journal.memo or '',
+                journal.debit_account or '',
+                f"{int(journal.debit_amount):,}" if journal.debit_amount else '0',
+                journal.credit_account or '',
+                f"{int(journal.credit_amount):,}" if journal.credit_amount else '0',
+                f"{int(receipt.tax_rate * 100)}%" if receipt.tax_rate else '',
+                f"{int(receipt.tax):,}" if receipt.tax else '0',
+                '確認済' if journal.status == 'confirmed' else '未確認'
+            ])
+        body = io.BytesIO(output.getvalue().encode('utf-8-sig'))
+    while True:
+        chunk = body.read(64 * 1024)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _measure(path, mode, format):
+    from services.export_engine import build_export_query, get_format, iter_export
+    engine = create_engine(f"sqlite:///{path}")
+    if mode == "legacy":
+        chunks = _legacy_chunks(engine)
+    else:
+        chunks = iter_export(engine, build_export_query(), get_format(format), parallel=(mode == "parallel"))
+
+    start = time.perf_counter()
+    first_byte = None
+    first_rows = None
+    total_bytes = 0
+    for chunk in chunks:
+        if first_byte is None and chunk:
+            first_byte = time.perf_counter() - start
+        total_bytes += len(chunk)
+        # BOM・ヘッダーだけでなく明細行が届くまでの時間
+        if first_rows is None and total_bytes > 4096:
+            first_rows = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "mode": mode, "ttfb_s": round(first_byte, 4), "first_rows_s": round(first_rows, 4), "total_s": round(elapsed, 2),
+        "bytes": total_bytes, "peak_rss_mb": round(peak_rss_mb, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="export/csv ベンチマーク")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--format", default="standard", help="ストリーミング方式の出力形式（従来方式は標準形式のみ）")
+    parser.add_argument("--measure", choices=["legacy", "stream", "parallel"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.db, args.measure, args.format)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _seed(path, args.rows)
+        print(f"rows={args.rows} format={args.format}")
+        for mode in ("legacy", "stream", "parallel"):
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__),
+                "--measure", mode, "--db", path, "--format", args.format
+            ], check=True)
+
+
+if __name__ == "__main__":
+    main()
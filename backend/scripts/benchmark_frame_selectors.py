@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+フレーム選択エンジン（services.frame_selection）の比較ベンチマーク
+
+ラベル付きの動画（各レシートが映っている区間）に対して登録済みのエンジンを実行し、
+次の3つを出力する。
+
+- recall:    選択したフレームのいずれかが映っている区間に入ったレシートの割合
+- ocr_calls: OCRの呼び出し回数（OCRを行わないエンジンは選択したフレーム数 = 後段でOCRする枚数）
+- wall_s:    選択にかかった時間
+
+既定では benchmark_pipeline.py の合成動画（区間のラベル付き）を使う。実際の動画は
+--labels で次の形式の JSON を渡す（OCRはスタブのため、実際の動画では receipt エンジンの
+テキスト重複除去が効かない点に注意）:
+
+    [{"video": "clip.mp4", "receipts": [{"start_s": 0.0, "end_s": 4.5}, ...]}, ...]
+
+使い方:
+    python scripts/benchmark_frame_selectors.py [--selectors receipt,smart,interval] [--quick] [--proxy]
+    python scripts/benchmark_frame_selectors.py --labels clips.json [--out results.json]
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from benchmark_pipeline import SCENARIOS, StubOCRProcessor, _scaled, generate_video
+from services.frame_selection import available_selectors, get_frame_selector
+
+
+class CountingOCR:
+    """OCRの呼び出し回数を数えるスタブ（切り出し画像のファイル名の時刻からラベルのテキストを返す）"""
+
+    calls = 0
+    timeline = []
+
+    def __init__(self, config):
+        self._stub = StubOCRProcessor(config, CountingOCR.timeline)
+
+    def process_image(self, image_path):
+        CountingOCR.calls += 1
+        match = re.search(r"_(\d+)ms\.jpg$", image_path)
+        return self._stub.process_image(image_path, int(match.group(1)) / 1000 if match else -1)
+
+    def extract_receipt_info(self, text):
+        # 本物は VisionOCRService を初期化するため、選択の処理時間に含めないよう先頭行だけ返す
+        return {"vendor": text.splitlines()[0] if text else None}
+
+
+def _recall(selected, receipts):
+    covered = sum(
+        any(receipt["start_s"] <= frame.time_s < receipt["end_s"] for frame in selected)
+        for receipt in receipts
+    )
+    return covered / len(receipts) if receipts else 0.0
+
+
+def _run(selector_name, clip, work_dir):
+    """1エンジン × 1動画を実行して結果を返す"""
+    import video_processing.extract_best_frames as extract_best_frames
+
+    receipts = clip["receipts"]
+    CountingOCR.calls = 0
+    CountingOCR.timeline = [dict(r, text=r.get("text", f"RECEIPT {i}")) for i, r in enumerate(receipts)]
+    extract_best_frames.OCRProcessor = CountingOCR
+
+    selector = get_frame_selector(selector_name)
+    duration = max((r["end_s"] for r in receipts), default=0)
+    target_min = max(7, int(duration / 3.0))
+    target_max = min(15, max(target_min + 3, int(duration / 2.0)))
+
+    start = time.perf_counter()
+    selected = selector.select(clip["video"], os.path.join(work_dir, "selected"), "frame",
+                               proxy_path=clip.get("proxy"), target_min=target_min, target_max=target_max)
+    wall = time.perf_counter() - start
+    return {
+        "frames": len(selected),
+        "recall": round(_recall(selected, receipts), 3),
+        "ocr_calls": CountingOCR.calls if selector.runs_ocr else len(selected),
+        "wall_s": round(wall, 3),
+    }
+
+
+def _synthetic_clips(work_dir, scenarios, quick, proxy):
+    clips = []
+    for name in scenarios:
+        spec = _scaled(SCENARIOS[name], quick)
+        path = os.path.join(work_dir, f"{name}.mp4")
+        clip = {"name": name, "video": path, "receipts": generate_video(path, **spec)}
+        clips.append(clip)
+    if proxy:
+        from services.video_remux import create_proxy_rendition
+        for clip in clips:
+            clip["proxy"] = create_proxy_rendition(clip["video"])
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フレーム選択エンジン 比較ベンチマーク")
+    parser.add_argument("--selectors", default=",".join(available_selectors()))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"合成動画のシナリオ（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--quick", action="store_true", help="短く・小さい合成動画で実行（動作確認用）")
+    parser.add_argument("--proxy", action="store_true", help="低解像度プロキシを作成して評価に使う（ffmpeg が必要）")
+    parser.add_argument("--labels", help="ラベル付きの動画の一覧（JSON）")
+    parser.add_argument("--out", help="結果の JSON の保存先")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    selectors = args.selectors.split(",")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.labels:
+            with open(args.labels) as f:
+                clips = [dict(clip, name=clip.get("name") or os.path.basename(clip["video"]),
+                              video=os.path.abspath(clip["video"])) for clip in json.load(f)]
+        else:
+            clips = _synthetic_clips(tmp, args.scenarios.split(","), args.quick, args.proxy)
+        # エンジンによっては相対パス（uploads/frames・output/crops）に書くため一時ディレクトリで実行する
+        os.chdir(tmp)
+
+        results = OrderedDict((name, OrderedDict()) for name in selectors)
+        for clip in clips:
+            print(f"[{clip['name']}] {len(clip['receipts'])} receipts")
+            for name in selectors:
+                result = _run(name, clip, tmp)
+                results[name][clip["name"]] = result
+                print(f"  {name:<9} recall={result['recall']:.2f}  ocr_calls={result['ocr_calls']:3d}  "
+                      f"frames={result['frames']:3d}  wall={result['wall_s']:7.2f}s")
+
+    print("total")
+    summary = OrderedDict()
+    for name, per_clip in results.items():
+        receipts = sum(len(clip["receipts"]) for clip in clips)
+        summary[name] = {
+            "recall": round(sum(r["recall"] * len(c["receipts"]) for r, c in zip(per_clip.values(), clips)) / max(receipts, 1), 3),
+            "ocr_calls": sum(r["ocr_calls"] for r in per_clip.values()),
+            "wall_s": round(sum(r["wall_s"] for r in per_clip.values()), 3),
+        }
+        print(f"  {name:<9} recall={summary[name]['recall']:.2f}  ocr_calls={summary[name]['ocr_calls']:3d}  "
+              f"wall={summary[name]['wall_s']:7.2f}s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "clips": results}, f, indent=2)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+/journals/generate-missing のベンチマーク
+
+一時SQLiteに領収書を投入し、従来の1件ずつ処理する方式と
+チャンク一括方式の実行時間・SQL発行回数を比較する
+
+使い方:
+    python scripts/benchmark_generate_missing.py [--receipts 100000] [--legacy-receipts 5000]
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import logging
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Video, Frame, Receipt, JournalEntry
+from services.journal_generator import JournalGenerator
+from services.journal_backfill import DEFAULT_CHUNK_SIZE, generate_missing_journals_bulk
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def _make_session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counter = {"statements": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)(), counter
+
+
+def _seed(db, count):
+    video = Video(filename="bench.mp4")
+    db.add(video)
+    db.flush()
+    frame = Frame(video_id=video.id, time_ms=1000)
+    db.add(frame)
+    db.flush()
+    db.execute(insert(Receipt), [
+        {
+            "video_id": video.id,
+            "best_frame_id": frame.id,
+            "vendor": f"店舗{i}",
+            "vendor_norm": f"店舗{i}",
+            "issue_date": datetime(2024, 1 + i % 12, 1 + i % 28),
+            "total": 100 + i,
+            "tax_rate": 0.10,
+            "payment_method": "現金",
+        }
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def _legacy(db):
+    """従来方式（領収書ごとに存在確認・遅延ロード・コミット）"""
+    receipts = db.query(Receipt).all()
+    generator = JournalGenerator(db)
+    for receipt in receipts:
+        if db.query(JournalEntry).filter(JournalEntry.receipt_id == receipt.id).first():
+            continue
+        for entry_data in generator.generate_journal_entries(receipt):
+            db.add(JournalEntry(
+                receipt_id=entry_data.receipt_id,
+                video_id=entry_data.video_id,
+                time_ms=receipt.best_frame.time_ms if receipt.best_frame else 0,
+                debit_account=entry_data.debit_account,
+                credit_account=entry_data.credit_account,
+                debit_amount=entry_data.debit_amount,
+                credit_amount=entry_data.credit_amount,
+                tax_account=entry_data.tax_account,
+                tax_amount=entry_data.tax_amount,
+                memo=entry_data.memo,
+                status='unconfirmed',
+                transaction_date=receipt.issue_date.date()
+            ))
+        db.commit()
+
+
+def _run(label, count, fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        db, counter = _make_session(os.path.join(tmp, "bench.db"))
+        _seed(db, count)
+        counter["statements"] = 0
+        start = time.perf_counter()
+        fn(db)
+        elapsed = time.perf_counter() - start
+        generated = db.query(JournalEntry).count()
+        db.close()
+    print(f"{label:<8} receipts={count:>7} journals={generated:>7} "
+          f"time={elapsed:8.2f}s  rate={count / elapsed:9.0f}/s  statements={counter['statements']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate-missing ベンチマーク")
+    parser.add_argument("--receipts", type=int, default=100000)
+    parser.add_argument("--legacy-receipts", type=int, default=5000, help="従来方式の件数（0でスキップ）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.legacy_receipts:
+        _run("legacy", args.legacy_receipts, _legacy)
+        _run("bulk", args.legacy_receipts, lambda db: generate_missing_journals_bulk(db, chunk_size=args.chunk_size))
+    _run("bulk", args.receipts, lambda db: generate_missing_journals_bulk(db, chunk_size=args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
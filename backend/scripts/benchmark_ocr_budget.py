@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+OCR予算（video_processing.ocr_budget.OCRBudgetPlanner）のベンチマーク
+
+ラベル付きの動画に対して、OCR予算（1動画あたりのOCR回数の上限）と ocr_min_utility の
+組み合わせごとに次を出力する。予算なし・min_utility=0 が計画なし（従来どおり）の基準。
+
+- ocr_calls:      OCRの呼び出し回数
+- calls_saved:    基準からのOCR回数の削減
+- receipts_missed: 選択したフレームのいずれも映っている区間に入らなかったレシートの数
+
+receipt エンジン（select_receipt_frames。OCRはスタブ）は設定ごとにパイプライン全体を実行し、
+interval エンジン（アップロード時の処理）は選択したフレームの画像に対して計画だけをやり直す。
+既定では benchmark_pipeline.py の合成動画を使い、実際の動画は --labels で渡す
+（形式は benchmark_frame_selectors.py と同じ）。
+
+使い方:
+    python scripts/benchmark_ocr_budget.py [--settings 0:0,0:0.1,4:0.1] [--quick]
+    python scripts/benchmark_ocr_budget.py --labels clips.json [--out results.json]
+"""
+
+import sys
+import os
+import json
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from benchmark_pipeline import SCENARIOS
+from benchmark_frame_selectors import CountingOCR, _recall, _synthetic_clips
+from services.frame_selection import IntervalFrameSelector
+from video_processing.config import load_config
+from video_processing.ocr_budget import OCRBudgetPlanner
+
+DEFAULT_SETTINGS = "0:0,0:0.1,0:0.2,0:0.3,8:0.1,4:0.1,2:0.1"
+
+
+def _parse_settings(value):
+    """「予算:min_utility」のカンマ区切り"""
+    settings = []
+    for item in value.split(","):
+        budget, min_utility = item.split(":")
+        settings.append((int(budget), float(min_utility)))
+    return settings
+
+
+def _config(budget, min_utility):
+    config = load_config()
+    config.ocr_budget = budget
+    config.ocr_min_utility = min_utility
+    return config
+
+
+def _targets(receipts):
+    duration = max((r["end_s"] for r in receipts), default=0)
+    target_min = max(7, int(duration / 3.0))
+    return target_min, min(15, max(target_min + 3, int(duration / 2.0)))
+
+
+def _run_receipt(clip, budget, min_utility):
+    """select_receipt_frames を実行（OCRの回数は CountingOCR で数える）"""
+    import video_processing.extract_best_frames as extract_best_frames
+
+    receipts = clip["receipts"]
+    CountingOCR.calls = 0
+    CountingOCR.timeline = [dict(r, text=r.get("text", f"RECEIPT {i}")) for i, r in enumerate(receipts)]
+    extract_best_frames.OCRProcessor = CountingOCR
+
+    target_min, target_max = _targets(receipts)
+    selected = extract_best_frames.select_receipt_frames(
+        clip["video"], target_min=target_min, target_max=target_max,
+        config=_config(budget, min_utility), proxy_path=clip.get("proxy"))
+    return CountingOCR.calls, selected
+
+
+def _run_interval(clip, frames, budget, min_utility):
+    """interval エンジンで選択済みのフレームに OCR 予算を適用"""
+    plan = OCRBudgetPlanner(_config(budget, min_utility)).plan_images(frames, lambda frame: frame.crop_path)
+    return len(plan.selected), plan.selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR予算 ベンチマーク")
+    parser.add_argument("--settings", default=DEFAULT_SETTINGS,
+                        help="「予算:min_utility」のカンマ区切り（予算0は上限なし。先頭が基準）")
+    parser.add_argument("--engines", default="receipt,interval")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"合成動画のシナリオ（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--quick", action="store_true", help="短く・小さい合成動画で実行（動作確認用）")
+    parser.add_argument("--labels", help="ラベル付きの動画の一覧（JSON）")
+    parser.add_argument("--out", help="結果の JSON の保存先")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    settings = _parse_settings(args.settings)
+    engines = args.engines.split(",")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.labels:
+            with open(args.labels) as f:
+                clips = [dict(clip, name=clip.get("name") or os.path.basename(clip["video"]),
+                              video=os.path.abspath(clip["video"])) for clip in json.load(f)]
+        else:
+            clips = _synthetic_clips(tmp, args.scenarios.split(","), args.quick, proxy=False)
+        # select_receipt_frames は相対パス（output/crops）に書くため一時ディレクトリで実行する
+        os.chdir(tmp)
+
+        results = OrderedDict()
+        for engine in engines:
+            totals = OrderedDict((f"{b}:{u}", {"ocr_calls": 0, "receipts_missed": 0}) for b, u in settings)
+            for clip in clips:
+                receipts = clip["receipts"]
+                if engine == "interval":
+                    interval_frames = IntervalFrameSelector().select(
+                        clip["video"], os.path.join(tmp, "interval", clip["name"]), "frame",
+                        target_max=_targets(receipts)[1])
+                for budget, min_utility in settings:
+                    if engine == "interval":
+                        calls, selected = _run_interval(clip, interval_frames, budget, min_utility)
+                    else:
+                        calls, selected = _run_receipt(clip, budget, min_utility)
+                    covered = round(_recall(selected, receipts) * len(receipts))
+                    total = totals[f"{budget}:{min_utility}"]
+                    total["ocr_calls"] += calls
+                    total["receipts_missed"] += len(receipts) - covered
+
+            baseline = next(iter(totals.values()))["ocr_calls"]
+            print(f"[{engine}] {sum(len(c['receipts']) for c in clips)} receipts in {len(clips)} clips")
+            for key, total in totals.items():
+                total["calls_saved"] = baseline - total["ocr_calls"]
+                budget, min_utility = key.split(":")
+                print(f"  budget={budget:>2} min_utility={min_utility:<4}  ocr_calls={total['ocr_calls']:3d}  "
+                      f"calls_saved={total['calls_saved']:3d}  receipts_missed={total['receipts_missed']}")
+            results[engine] = totals
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+複数フレームのOCR統合（video_processing.ocr_fusion.OCRFusion）のベンチマーク
+
+1枚のレシートが数枚のフレームに映っている状況を合成し、フレームごとのOCRの読み取り
+（品質が低いほど項目の読み誤り・欠落が増え、信頼度もぶれる）から、統合の設定ごとに次を出力する。
+
+- calls/receipt: レシートあたりのOCR呼び出し回数
+- 項目ごとの正解率（vendor, issue_date, total, tax, line_items）と全項目が正しいレシートの割合
+- wall_s: 読み取り1回に --latency-ms かかるときの実行時間（serial_s は同じ回数を直列に呼んだ場合）
+
+基準の keep_one は従来の処理（すべてのフレームをOCRし、品質スコアが最も高いフレームの結果を残す）。
+fusion:N は1レシートあたり最大 N 回（最初の2回が店舗名・合計で一致すれば打ち切り）読んで統合する。
+
+使い方:
+    python scripts/benchmark_ocr_fusion.py [--receipts 200] [--frames 4] [--settings 1,2,3,5] [--out results.json]
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import logging
+from collections import OrderedDict
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from video_processing.ocr_fusion import FrameReading, OCRFusion, normalize_value
+from video_processing.types import Config
+
+FIELDS = ("vendor", "issue_date", "total", "tax", "line_items")
+VENDORS = ["ローソン 新宿店", "セブンイレブン 渋谷店", "ファミリーマート", "スターバックス", "ENEOS 石神井",
+           "ヨドバシカメラ", "無印良品", "マクドナルド"]
+ITEMS = ["おにぎり", "お茶", "コーヒー", "サンドイッチ", "ボールペン", "ノート", "電池", "ガソリン"]
+# OCRで取り違えやすい文字
+CONFUSIONS = {"ー": "一", "ン": "ソ", "ソ": "ン", "口": "ロ", "ロ": "口", "0": "8", "8": "3", "1": "7", "5": "6", "6": "5"}
+
+
+def _receipt(rng, index):
+    items = [{"name": name, "amount": rng.randint(1, 40) * 10} for name in rng.sample(ITEMS, rng.randint(2, 5))]
+    total = sum(item["amount"] for item in items)
+    return {
+        "vendor": rng.choice(VENDORS),
+        "issue_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "total": total,
+        "tax": total // 11,
+        "line_items": items,
+    }
+
+
+def _misread(rng, value):
+    """1文字を読み誤った値"""
+    text = str(value)
+    positions = [i for i, c in enumerate(text) if c.isalnum() or c in CONFUSIONS]
+    if not positions:
+        return value
+    i = rng.choice(positions)
+    c = text[i]
+    wrong = CONFUSIONS.get(c) or (str((int(c) + rng.randint(1, 9)) % 10) if c.isdigit() else c + c)
+    text = text[:i] + wrong + text[i + 1:]
+    return int(text) if isinstance(value, int) and text.isdigit() else text
+
+
+def _reading(rng, truth, quality, noise):
+    """フレームの品質に応じて項目を読み誤る・落とす"""
+    p_wrong = noise * (1.2 - quality)
+    p_missing = 0.5 * noise * (1.0 - quality)
+    fields = {}
+    for name in FIELDS[:-1]:
+        roll = rng.random()
+        fields[name] = None if roll < p_missing else _misread(rng, truth[name]) if roll < p_missing + p_wrong else truth[name]
+    items = []
+    for item in truth["line_items"]:
+        if rng.random() < p_missing:
+            continue
+        items.append({
+            "name": _misread(rng, item["name"]) if rng.random() < p_wrong else item["name"],
+            "amount": _misread(rng, item["amount"]) if rng.random() < p_wrong else item["amount"],
+        })
+    fields["line_items"] = items
+    confidence = min(1.0, max(0.05, quality + rng.gauss(0, 0.1)))
+    return FrameReading(fields, confidence)
+
+
+def _frames(rng, receipts, frames_per_receipt, noise):
+    """レシートごとのフレーム（品質スコアの高い順）と、その読み取り"""
+    groups = []
+    for r, truth in enumerate(receipts):
+        frames = []
+        for f in range(rng.randint(1, frames_per_receipt)):
+            quality = rng.uniform(0.3, 1.0)
+            # パイプラインの品質スコアは実際の読みやすさを大まかにしか表さない
+            score = quality + rng.gauss(0, 0.15)
+            frames.append((score, f"{r}:{f}", _reading(rng, truth, quality, noise)))
+        frames.sort(key=lambda frame: frame[0], reverse=True)
+        groups.append(frames)
+    return groups
+
+
+def _correct(name, value, truth):
+    if name == "line_items":
+        key = lambda items: sorted((normalize_value("name", i["name"]), normalize_value("amount", i["amount"]))
+                                   for i in items or [])
+        return key(value) == key(truth)
+    return normalize_value(name, value) == normalize_value(name, truth)
+
+
+def _score(receipts, fused_fields, calls, wall, latency):
+    correct = {name: 0 for name in FIELDS}
+    exact = 0
+    for truth, fields in zip(receipts, fused_fields):
+        ok = [_correct(name, fields.get(name), truth[name]) for name in FIELDS]
+        for name, good in zip(FIELDS, ok):
+            correct[name] += good
+        exact += all(ok)
+    n = len(receipts)
+    result = OrderedDict(calls_per_receipt=round(calls / n, 2))
+    result.update((name, round(correct[name] / n, 3)) for name in FIELDS)
+    result["all_fields"] = round(exact / n, 3)
+    result["wall_s"] = round(wall, 2)
+    result["serial_s"] = round(calls * latency, 2)
+    return result
+
+
+def run(receipts, groups, settings, latency, workers):
+    results = OrderedDict()
+
+    # 基準: すべてのフレームを（直列に）OCRし、品質スコアが最も高いフレームの結果を残す
+    calls = sum(len(frames) for frames in groups)
+    results["keep_one"] = _score(receipts, [frames[0][2].fields for frames in groups], calls, calls * latency, latency)
+
+    readings = {name: reading for frames in groups for _, name, reading in frames}
+
+    def read(name):
+        time.sleep(latency)
+        return readings[name]
+
+    for n in settings:
+        fusion = OCRFusion(Config(), frames_per_receipt=n, min_frames=min(2, n), max_workers=workers)
+        start = time.perf_counter()
+        fused = fusion.run([[name for _, name, _ in frames] for frames in groups], read)
+        wall = time.perf_counter() - start
+        results[f"fusion:{n}"] = _score(receipts, [r.fields for r in fused], sum(r.calls for r in fused), wall, latency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数フレームのOCR統合 ベンチマーク")
+    parser.add_argument("--receipts", type=int, default=200, help="レシートの数")
+    parser.add_argument("--frames", type=int, default=4, help="1レシートあたりの最大フレーム数")
+    parser.add_argument("--settings", default="1,2,3,5", help="1レシートあたりの最大OCR回数（カンマ区切り）")
+    parser.add_argument("--noise", type=float, default=0.35, help="読み誤りの多さ（0〜1）")
+    parser.add_argument("--latency-ms", type=float, default=20, help="OCR 1回の所要時間（ミリ秒）")
+    parser.add_argument("--workers", type=int, default=Config().fusion_workers, help="並列に読む数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="結果の JSON の保存先")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    receipts = [_receipt(rng, i) for i in range(args.receipts)]
+    groups = _frames(rng, receipts, args.frames, args.noise)
+    settings = [int(n) for n in args.settings.split(",")]
+
+    frames = sum(len(g) for g in groups)
+    print(f"{len(receipts)} receipts, {frames} frames ({frames / len(receipts):.2f} per receipt), noise={args.noise}")
+    results = run(receipts, groups, settings, args.latency_ms / 1000.0, args.workers)
+    print(f"  {'setting':<10} {'calls/rcpt':>10} " + " ".join(f"{name:>10}" for name in FIELDS)
+          + f" {'all':>6} {'wall_s':>7} {'serial_s':>8}")
+    for key, r in results.items():
+        print(f"  {key:<10} {r['calls_per_receipt']:>10.2f} " + " ".join(f"{r[name]:>10.3f}" for name in FIELDS)
+              + f" {r['all_fields']:>6.3f} {r['wall_s']:>7.2f} {r['serial_s']:>8.2f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
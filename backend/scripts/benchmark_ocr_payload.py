@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+OCRに送る画像（video_processing.ocr_payload.OCRPayloadOptimizer）のベンチマーク
+
+合成のフレーム（机の上のレシート、解像度・位置・傾きを変える）について、OCR 1回あたりの
+送信量と送信時間を、従来の送り方と最適化後で比較する。
+
+- raw_frame:       フレーム全体の JPEG-95（interval エンジン → process_video_ocr_sync が送っていたもの）
+- raw_frame+opt:   同じフレームから文書を検出・切り出し、グレースケール・縮小・PNG/JPEG を選択
+- enhanced_crop:   ImagePreprocessor の出力（補正・二値化したクロップを3チャンネルに戻した JPEG-95。
+                   select_receipt_frames が送っていたもの）
+- enhanced_crop+opt: 1チャンネルのクロップを縮小・PNG/JPEG を選択
+
+出力は1回あたりの平均バイト数、最適化にかかる時間、送信時間の見積もり（--mbps の回線、
+--rtt-ms の往復）と、読みやすさの目安:
+- text_px: 送る画像のテキスト行の高さ（中央値、ピクセル）
+- accuracy: ローカルOCR（tesseract / paddle）が使える場合のみ、正解テキストとの文字列の一致率
+
+使い方:
+    python scripts/benchmark_ocr_payload.py [--frames 24] [--mbps 10] [--rtt-ms 80] [--out results.json]
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import difflib
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import cv2
+import numpy as np
+
+from benchmark_pipeline import _receipt_lines, _render_receipt
+from video_processing.config import load_config
+from video_processing.local_ocr import LocalOCRProcessor, local_engine_available
+from video_processing.ocr_payload import OCRPayloadOptimizer, median_text_height
+from video_processing.preprocess import ImagePreprocessor
+from video_processing.types import DocumentQuad
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+
+
+def _frame(rng, width, height, index):
+    """机の上に少し傾けて置いたレシートのフレームと、その四隅・テキスト"""
+    np_rng = np.random.RandomState(rng.randint(0, 2 ** 31))
+    frame = cv2.GaussianBlur(np_rng.randint(40, 90, (height, width, 3)).astype(np.uint8), (0, 0), 3)
+    lines = _receipt_lines(rng, index)
+    paper = _render_receipt(lines, int(width * rng.uniform(0.25, 0.35)))
+    paper = paper[:int(height * 0.9)]
+    ph, pw = paper.shape[:2]
+    x, y = rng.randint(10, width - pw - 10), (height - ph) // 2
+    src = np.float32([[0, 0], [pw, 0], [pw, ph], [0, ph]])
+    jitter = lambda: rng.uniform(-0.02, 0.02) * pw
+    dst = np.float32([[x + jitter(), y + jitter()], [x + pw + jitter(), y + jitter()],
+                      [x + pw + jitter(), y + ph + jitter()], [x + jitter(), y + ph + jitter()]])
+    warp = cv2.getPerspectiveTransform(src, dst)
+    mask = cv2.warpPerspective(np.full((ph, pw), 255, np.uint8), warp, (width, height))
+    warped = cv2.warpPerspective(paper, warp, (width, height))
+    frame[mask > 0] = warped[mask > 0]
+    return frame, DocumentQuad(points=dst), "\n".join(lines)
+
+
+def _accuracy(engine, image_path, truth):
+    block = engine.process_image(image_path) if engine else None
+    if block is None:
+        return None
+    return difflib.SequenceMatcher(None, " ".join(block.text.split()), " ".join(truth.split())).ratio()
+
+
+def run(frames, config, tmp, mbps, rtt_ms, engine):
+    optimizer = OCRPayloadOptimizer(config)
+    preprocessor = ImagePreprocessor(config)
+    modes = ["raw_frame", "raw_frame+opt", "enhanced_crop", "enhanced_crop+opt"]
+    stats = OrderedDict((mode, {"bytes": [], "ms": [], "text_px": [], "accuracy": [], "formats": {}}) for mode in modes)
+
+    for i, (frame, quad, truth) in enumerate(frames):
+        raw_path = os.path.join(tmp, f"raw_{i}.jpg")
+        cv2.imwrite(raw_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+        # 従来の ImagePreprocessor の出力（二値化したクロップを3チャンネルに戻して JPEG-95）
+        crop_path = os.path.join(tmp, f"crop_{i}.jpg")
+        preprocessor.process_frame(raw_path, quad, crop_path)
+        crop = cv2.imread(crop_path, cv2.IMREAD_GRAYSCALE)
+        ok, legacy_crop = cv2.imencode(".jpg", cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+        payloads = OrderedDict()
+        payloads["raw_frame"] = (raw_path, os.path.getsize(raw_path), 0.0, None)
+        start = time.perf_counter()
+        payload = optimizer.optimize_file(raw_path, detect=True)
+        payloads["raw_frame+opt"] = (payload, len(payload.data), time.perf_counter() - start, payload.format)
+        legacy_path = os.path.join(tmp, f"legacy_{i}.jpg")
+        with open(legacy_path, "wb") as f:
+            f.write(legacy_crop.tobytes())
+        payloads["enhanced_crop"] = (legacy_path, len(legacy_crop), 0.0, None)
+        start = time.perf_counter()
+        payload = optimizer.optimize_file(crop_path)
+        payloads["enhanced_crop+opt"] = (payload, len(payload.data), time.perf_counter() - start, payload.format)
+
+        for mode, (data, size, seconds, fmt) in payloads.items():
+            if isinstance(data, str):
+                path = data
+            else:
+                path = os.path.join(tmp, f"{mode}_{i}.{data.format}")
+                with open(path, "wb") as f:
+                    f.write(data.data)
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            entry = stats[mode]
+            entry["bytes"].append(size)
+            entry["ms"].append(seconds * 1000)
+            entry["text_px"].append(median_text_height(gray) or 0.0)
+            if fmt:
+                entry["formats"][fmt] = entry["formats"].get(fmt, 0) + 1
+            accuracy = _accuracy(engine, path, truth)
+            if accuracy is not None:
+                entry["accuracy"].append(accuracy)
+
+    results = OrderedDict()
+    for mode, entry in stats.items():
+        mean_bytes = float(np.mean(entry["bytes"]))
+        upload_ms = mean_bytes * 8 / (mbps * 1e6) * 1000 + rtt_ms
+        results[mode] = OrderedDict([
+            ("bytes_per_call", int(mean_bytes)),
+            ("optimize_ms", round(float(np.mean(entry["ms"])), 1)),
+            ("upload_ms", round(upload_ms, 1)),
+            ("text_px", round(float(np.mean(entry["text_px"])), 1)),
+            ("accuracy", round(float(np.mean(entry["accuracy"])), 3) if entry["accuracy"] else None),
+            ("formats", entry["formats"]),
+        ])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCRに送る画像の最適化 ベンチマーク")
+    parser.add_argument("--frames", type=int, default=24, help="合成フレームの数（解像度ごとに均等）")
+    parser.add_argument("--mbps", type=float, default=10.0, help="送信時間の見積もりに使う回線速度（Mbps）")
+    parser.add_argument("--rtt-ms", type=float, default=80.0, help="送信時間の見積もりに使う往復時間（ミリ秒）")
+    parser.add_argument("--text-height", type=int, help="ocr_payload_text_height を上書き")
+    parser.add_argument("--min-fidelity", type=float, help="ocr_payload_min_fidelity を上書き")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="結果の JSON の保存先")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    config = load_config()
+    if args.text_height:
+        config.ocr_payload_text_height = args.text_height
+    if args.min_fidelity is not None:
+        config.ocr_payload_min_fidelity = args.min_fidelity
+
+    engine = None
+    if local_engine_available(config.local_ocr_engine):
+        engine = LocalOCRProcessor(config)
+    else:
+        print(f"local OCR engine '{config.local_ocr_engine}' not available: accuracy is not measured")
+
+    rng = random.Random(args.seed)
+    frames = [_frame(rng, *RESOLUTIONS[i % len(RESOLUTIONS)], i) for i in range(args.frames)]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(frames, config, tmp, args.mbps, args.rtt_ms, engine)
+
+    base = {"raw_frame+opt": "raw_frame", "enhanced_crop+opt": "enhanced_crop"}
+    print(f"{len(frames)} frames ({', '.join(f'{w}x{h}' for w, h in RESOLUTIONS)}), "
+          f"{args.mbps:g} Mbps, rtt {args.rtt_ms:g} ms")
+    for mode, r in results.items():
+        change = ""
+        if mode in base:
+            b = results[base[mode]]
+            change = (f"  bytes -{1 - r['bytes_per_call'] / b['bytes_per_call']:.0%}"
+                      f"  latency -{1 - (r['upload_ms'] + r['optimize_ms']) / b['upload_ms']:.0%}")
+        accuracy = f"  accuracy={r['accuracy']:.3f}" if r["accuracy"] is not None else ""
+        print(f"  {mode:<18} {r['bytes_per_call']:>9,d} B/call  optimize {r['optimize_ms']:6.1f} ms  "
+              f"upload {r['upload_ms']:7.1f} ms  text {r['text_px']:5.1f} px{accuracy}{change}  {r['formats'] or ''}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
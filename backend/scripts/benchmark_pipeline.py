@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+フレーム選択パイプライン（video_processing.select_receipt_frames）のベンチマーク
+
+紙に描画したレシートを動かした合成動画（手ぶれ・移動時のモーションブラー・ピンぼけ・
+照明の反射、長さ・解像度の異なるシナリオ）を生成し、select_receipt_frames と同じ順序で
+各段階を実行して段階ごとの処理速度・メモリを測る。外部APIは使わない（OCRはスタブ）。
+
+- sampling:   AdaptiveSampler.sample_frames
+- detection:  フレームの読み込み＋DocumentDetector.detect_document
+- scoring:    QualityAssessor.assess_batch（SCORING_BATCH_SIZE 枚ずつ）
+- nms:        NMSProcessor.apply_adaptive_selection
+- preprocess: 元動画からの読み直し＋ImagePreprocessor.process_frame
+- ocr:        スタブOCR（クロップの読み込み・正解テキストのトークン化）＋テキスト重複除去
+
+段階ごとに frames/s・ピークRSS・Python/NumPy の割り当て量（tracemalloc、計測のオーバーヘッドを
+避けるため時間とは別の実行で測る）を出力し、JSON に保存する。ピークRSSを分けて測るため
+シナリオごとに別プロセスで実行する。
+
+使い方:
+    python scripts/benchmark_pipeline.py [--scenarios hd_short,fhd_medium] [--quick] [--out results.json]
+    python scripts/benchmark_pipeline.py --compare benchmark_results/pipeline_<前>.json benchmark_results/pipeline_<後>.json
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import logging
+import platform
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import cv2
+import numpy as np
+
+STAGES = ["sampling", "detection", "scoring", "nms", "preprocess", "ocr"]
+
+# 解像度・長さ・レシート枚数・手ぶれ・反射の異なる合成動画
+SCENARIOS = OrderedDict([
+    ("sd_long", {"width": 854, "height": 480, "seconds": 30, "receipts": 5, "shake": 1.5, "glare": True}),
+    ("hd_short", {"width": 1280, "height": 720, "seconds": 8, "receipts": 2, "shake": 1.0, "glare": False}),
+    ("fhd_medium", {"width": 1920, "height": 1080, "seconds": 15, "receipts": 3, "shake": 1.0, "glare": True}),
+])
+
+FPS = 30
+
+
+# ---------------------------------------------------------------------------
+# 合成動画の生成
+# ---------------------------------------------------------------------------
+
+def _receipt_lines(rng, index):
+    items = [(f"ITEM {rng.randint(100, 999)}", rng.randint(100, 3000)) for _ in range(rng.randint(4, 8))]
+    total = sum(price for _, price in items)
+    lines = [f"SHOP {index:02d} MARKET", f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}", "-" * 18]
+    lines += [f"{name:<10}{price:>7,}" for name, price in items]
+    lines += ["-" * 18, f"TOTAL     {total:>7,}", f"TAX 10%   {total // 11:>7,}", "THANK YOU"]
+    return lines
+
+
+def _render_receipt(lines, width):
+    """白い紙に等幅のテキストを描画したレシート画像"""
+    scale = width / 360
+    line_height = int(30 * scale)
+    height = int(40 * scale) + line_height * len(lines)
+    paper = np.full((height, width, 3), 245, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(paper, line, (int(18 * scale), int(34 * scale) + i * line_height),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.75 * scale, (30, 30, 30), max(1, int(2 * scale)), cv2.LINE_AA)
+    return paper
+
+
+def _motion_blur(frame, length, angle):
+    kernel = np.zeros((length, length), np.float32)
+    kernel[length // 2, :] = 1.0
+    rotation = cv2.getRotationMatrix2D((length / 2 - 0.5, length / 2 - 0.5), angle, 1.0)
+    kernel = cv2.warpAffine(kernel, rotation, (length, length))
+    return cv2.filter2D(frame, -1, kernel / max(kernel.sum(), 1e-6))
+
+
+def generate_video(path, width, height, seconds, receipts, shake, glare, seed=0):
+    """
+    レシートを順に映す合成動画を書き出し、時刻ごとのレシートのテキストを返す
+
+    各レシートは区間の中央では静止に近く（手ぶれのみ）、区間の最初と最後で
+    画面外から入って出ていく（速く動く間はモーションブラー）。
+    """
+    rng = np.random.RandomState(seed)
+    text_rng = random.Random(seed)
+
+    background = cv2.GaussianBlur(rng.randint(40, 90, (height, width, 3)).astype(np.uint8), (0, 0), 3)
+    paper_width = int(width * 0.3)
+    texts = [_receipt_lines(text_rng, i + 1) for i in range(receipts)]
+    papers = [_render_receipt(lines, paper_width) for lines in texts]
+
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    glare_spot = np.exp(-(((xx - width * 0.55) / (width * 0.08)) ** 2 + ((yy - height * 0.4) / (height * 0.1)) ** 2))
+    glare_spot = (glare_spot[..., None] * 230).astype(np.float32)
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), FPS, (width, height))
+    total_frames = int(seconds * FPS)
+    segment = total_frames / receipts
+    prev_center = None
+    for index in range(total_frames):
+        receipt = min(int(index / segment), receipts - 1)
+        phase = (index - receipt * segment) / segment  # 0..1
+        paper = papers[receipt]
+        paper_height, paper_width_ = paper.shape[:2]
+
+        # 紙の表示サイズ（フレームの高さの 85% に収める）
+        fit = min(height * 0.85 / paper_height, 1.0)
+        w, h = paper_width_ * fit, paper_height * fit
+        t = index / FPS
+        cx = width / 2 + shake * 6 * np.sin(t * 7.3) + shake * 3 * np.sin(t * 17.1)
+        cy = height / 2 + shake * 5 * np.cos(t * 5.9)
+        # 区間の最初と最後の 15% で画面外から入って出ていく
+        if phase < 0.15:
+            cx -= (1 - phase / 0.15) * width * 0.8
+        elif phase > 0.85:
+            cx += (phase - 0.85) / 0.15 * width * 0.8
+        angle = np.radians(3 * np.sin(t * 1.3) + shake * np.sin(t * 11.0))
+        tilt = 0.06 * w * np.sin(t * 0.9)
+
+        corners = np.array([[-w / 2 + tilt, -h / 2], [w / 2 - tilt, -h / 2], [w / 2, h / 2], [-w / 2, h / 2]])
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        quad = (corners @ rotation.T + [cx, cy]).astype(np.float32)
+        source = np.array([[0, 0], [paper_width_, 0], [paper_width_, paper_height], [0, paper_height]], np.float32)
+        frame = cv2.warpPerspective(paper, cv2.getPerspectiveTransform(source, quad), (width, height),
+                                    dst=background.copy(), borderMode=cv2.BORDER_TRANSPARENT)
+
+        speed = 0.0 if prev_center is None else float(np.hypot(cx - prev_center[0], cy - prev_center[1]))
+        prev_center = (cx, cy)
+        if speed > 2:
+            frame = _motion_blur(frame, min(int(speed), 31) | 1, 0)
+        # 区間の 40〜50% はピンぼけ
+        if 0.40 < phase < 0.50:
+            frame = cv2.GaussianBlur(frame, (0, 0), 2.5)
+        # 区間の 60〜75% は照明の反射
+        if glare and 0.60 < phase < 0.75:
+            frame = np.clip(frame.astype(np.float32) + glare_spot, 0, 255).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+
+    return [{"start_s": r * segment / FPS, "end_s": (r + 1) * segment / FPS, "text": "\n".join(texts[r])}
+            for r in range(receipts)]
+
+
+# ---------------------------------------------------------------------------
+# 段階ごとの計測
+# ---------------------------------------------------------------------------
+
+class StageRecorder:
+    """段階ごとの所要時間・処理フレーム数・ピークRSS・割り当て量を集計する"""
+
+    def __init__(self, trace_alloc=False):
+        self.trace_alloc = trace_alloc
+        self.results = OrderedDict((name, {"seconds": 0.0, "frames": 0}) for name in STAGES)
+
+    @contextmanager
+    def stage(self, name, frames=1):
+        """段階の処理を計測（ループ内で繰り返し呼ぶと合算する）"""
+        result = self.results[name]
+        rss_before = _max_rss_mb()
+        if self.trace_alloc:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            result["seconds"] += time.perf_counter() - start
+            result["frames"] += frames
+            result["peak_rss_mb"] = round(_max_rss_mb(), 1)
+            result["rss_growth_mb"] = round(result.get("rss_growth_mb", 0.0) + _max_rss_mb() - rss_before, 1)
+            if self.trace_alloc:
+                current, peak = tracemalloc.get_traced_memory()
+                result["alloc_peak_mb"] = round(max(result.get("alloc_peak_mb", 0.0), (peak - traced_before) / 1024 ** 2), 2)
+                result["alloc_net_mb"] = round(result.get("alloc_net_mb", 0.0) + (current - traced_before) / 1024 ** 2, 2)
+
+    def summary(self):
+        for result in self.results.values():
+            result["seconds"] = round(result["seconds"], 4)
+            result["frames_per_s"] = round(result["frames"] / result["seconds"], 1) if result["seconds"] > 0 else None
+        return self.results
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StubOCRProcessor:
+    """外部APIを呼ばないOCR（クロップを読み込み、その時刻のレシートの正解テキストを返す）"""
+
+    def __init__(self, config, timeline):
+        from video_processing.ocr import OCRProcessor
+
+        self.timeline = timeline
+        # トークン化・n-gram 生成は本物の実装を使う
+        self._tokenizer = OCRProcessor.__new__(OCRProcessor)
+        self._tokenizer.config = config
+
+    def process_image(self, image_path, time_s):
+        from video_processing.types import TextBlock
+
+        if cv2.imread(image_path) is None:
+            return None
+        text = next((r["text"] for r in self.timeline if r["start_s"] <= time_s < r["end_s"]), None)
+        if text is None:
+            return None
+        tokens = self._tokenizer._extract_tokens(text)
+        return TextBlock(text=text, confidence=0.9, tokens=tokens, ngrams=self._tokenizer._generate_ngrams(tokens, n=3))
+
+
+def run_pipeline(video_path, timeline, recorder, work_dir):
+    """select_receipt_frames と同じ順序で各段階を実行して計測する"""
+    from video_processing.config import load_config
+    from video_processing.sampling import AdaptiveSampler
+    from video_processing.doc_detect import DocumentDetector
+    from video_processing.quality import QualityAssessor
+    from video_processing.extract_best_frames import SCORING_BATCH_SIZE
+    from video_processing.nms import NMSProcessor
+    from video_processing.preprocess import ImagePreprocessor
+    from video_processing.text_dedup import TextDeduplicator
+
+    config = load_config()
+    crops_dir = os.path.join(work_dir, "crops")
+    os.makedirs(crops_dir, exist_ok=True)
+
+    with recorder.stage("sampling", frames=0):
+        candidates = AdaptiveSampler(config).sample_frames(video_path)
+    recorder.results["sampling"]["frames"] = len(candidates)
+
+    detector = DocumentDetector(config)
+    assessor = QualityAssessor(config)
+    scored = []
+    batch = []
+
+    def score_batch():
+        with recorder.stage("scoring", frames=len(batch)):
+            batch_scores = assessor.assess_batch(
+                [frame for _, frame in batch],
+                [candidate.doc_quad for candidate, _ in batch],
+                [candidate.motion_score for candidate, _ in batch],
+            )
+        for (candidate, _), scores in zip(batch, batch_scores):
+            candidate.total_score = scores["total"]
+            if candidate.total_score > 0.1:
+                scored.append(candidate)
+        batch.clear()
+
+    for candidate in candidates:
+        with recorder.stage("detection"):
+            frame = cv2.imread(candidate.frame_path)
+            candidate.doc_quad = detector.detect_document(frame)
+            candidate.has_document = candidate.doc_quad is not None
+        if batch and batch[0][1].shape != frame.shape:
+            score_batch()
+        batch.append((candidate, frame))
+        if len(batch) >= SCORING_BATCH_SIZE:
+            score_batch()
+        del frame
+    if batch:
+        score_batch()
+
+    with recorder.stage("nms", frames=len(scored)):
+        selected = NMSProcessor(config).apply_adaptive_selection(scored)
+
+    preprocessor = ImagePreprocessor(config)
+    crops = []
+    for candidate in selected:
+        with recorder.stage("preprocess"):
+            cap = cv2.VideoCapture(video_path)
+            cap.set(cv2.CAP_PROP_POS_MSEC, candidate.time_s * 1000)
+            ret, frame = cap.read()
+            cap.release()
+            if not ret:
+                continue
+            temp_path = os.path.join(work_dir, f"temp_{int(candidate.time_s * 1000)}.jpg")
+            cv2.imwrite(temp_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            crop_path = os.path.join(crops_dir, f"crop_{int(candidate.time_s * 1000):08d}ms.jpg")
+            if preprocessor.process_frame(temp_path, candidate.doc_quad, crop_path):
+                crops.append((candidate, crop_path))
+            os.remove(temp_path)
+
+    ocr = StubOCRProcessor(config, timeline)
+    text_pairs = []
+    for candidate, crop_path in crops:
+        with recorder.stage("ocr"):
+            text_block = ocr.process_image(crop_path, candidate.time_s)
+        if text_block:
+            text_pairs.append((candidate, text_block))
+    with recorder.stage("ocr", frames=0):
+        deduplicated = TextDeduplicator(config).deduplicate(text_pairs)
+
+    return {
+        "candidates": len(candidates), "with_document": sum(c.has_document for c in candidates), "scored": len(scored), "selected": len(selected),
+        "deduplicated": len(deduplicated),
+        "receipts_covered": len({next((i for i, r in enumerate(timeline) if r["start_s"] <= c.time_s < r["end_s"]), None)
+                                 for c, _ in deduplicated} - {None}),
+    }
+
+
+def _measure(name, spec, trace_alloc):
+    """1シナリオを計測して JSON を標準出力に書く（別プロセスで実行）"""
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        # 抽出フレームは相対パス uploads/frames に書かれるため一時ディレクトリで実行する
+        os.chdir(tmp)
+        video_path = os.path.join(tmp, f"{name}.mp4")
+        generate_start = time.perf_counter()
+        timeline = generate_video(video_path, **spec)
+        generate_seconds = time.perf_counter() - generate_start
+
+        recorder = StageRecorder()
+        wall_start = time.perf_counter()
+        selection = run_pipeline(video_path, timeline, recorder, tmp)
+        wall_seconds = time.perf_counter() - wall_start
+        stages = recorder.summary()
+
+        if trace_alloc:
+            # 割り当て量は別の実行で測る（tracemalloc のオーバーヘッドを所要時間に含めない）
+            for path in os.listdir(os.path.join(tmp, "uploads", "frames")):
+                os.remove(os.path.join(tmp, "uploads", "frames", path))
+            tracemalloc.start()
+            alloc_recorder = StageRecorder(trace_alloc=True)
+            run_pipeline(video_path, timeline, alloc_recorder, tmp)
+            tracemalloc.stop()
+            for stage, result in alloc_recorder.results.items():
+                stages[stage]["alloc_peak_mb"] = result.get("alloc_peak_mb")
+                stages[stage]["alloc_net_mb"] = result.get("alloc_net_mb")
+
+    print(json.dumps({
+        "scenario": name, "video": dict(spec, fps=FPS, frames=int(spec["seconds"] * FPS)),
+        "generate_s": round(generate_seconds, 2), "total_s": round(wall_seconds, 3),
+        "selection": selection, "stages": stages,
+    }))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BACKEND_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _scaled(spec, quick):
+    if not quick:
+        return spec
+    # 動作確認用に短く・小さくする
+    return dict(spec, seconds=max(4, spec["seconds"] // 4), width=spec["width"] // 2 // 2 * 2,
+                height=spec["height"] // 2 // 2 * 2, receipts=min(spec["receipts"], 2))
+
+
+def compare(base_path, head_path):
+    """2つの結果ファイルの段階ごとの frames/s・ピークRSSの変化を表示する"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"base={base['meta'].get('commit')} head={head['meta'].get('commit')}")
+    for name, result in head["scenarios"].items():
+        if name not in base["scenarios"]:
+            continue
+        print(f"[{name}] total {base['scenarios'][name]['total_s']:.2f}s -> {result['total_s']:.2f}s")
+        for stage in STAGES:
+            old, new = base["scenarios"][name]["stages"][stage], result["stages"][stage]
+            change = ""
+            if old.get("frames_per_s") and new.get("frames_per_s"):
+                change = f"{(new['frames_per_s'] / old['frames_per_s'] - 1) * 100:+6.1f}%"
+            print(f"  {stage:<10} {old.get('frames_per_s')!s:>9} -> {new.get('frames_per_s')!s:>9} frames/s {change:>8}"
+                  f"   rss {old.get('peak_rss_mb')} -> {new.get('peak_rss_mb')} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フレーム選択パイプライン ベンチマーク")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"実行するシナリオ（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--quick", action="store_true", help="短く・小さい動画で実行（動作確認用）")
+    parser.add_argument("--no-alloc", action="store_true", help="割り当て量の計測（2回目の実行）を省略")
+    parser.add_argument("--out", help="結果の JSON の保存先（既定: benchmark_results/pipeline_<コミット>.json）")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="2つの結果ファイルを比較して終了")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--spec", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.measure:
+        _measure(args.measure, json.loads(args.spec), not args.no_alloc)
+        return
+
+    results = OrderedDict()
+    for name in args.scenarios.split(","):
+        spec = _scaled(SCENARIOS[name], args.quick)
+        command = [sys.executable, os.path.abspath(__file__), "--measure", name, "--spec", json.dumps(spec)]
+        if args.no_alloc:
+            command.append("--no-alloc")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results[name] = result
+        print(f"[{name}] {spec['width']}x{spec['height']} {spec['seconds']}s total={result['total_s']:.2f}s "
+              f"selected={result['selection']['deduplicated']}/{spec['receipts']} receipts covered={result['selection']['receipts_covered']}")
+        for stage, stage_result in result["stages"].items():
+            print(f"  {stage:<10} {stage_result['seconds']:8.3f}s {stage_result['frames']:5d} frames "
+                  f"{stage_result['frames_per_s']!s:>8} frames/s  rss={stage_result['peak_rss_mb']}MB "
+                  f"alloc_peak={stage_result.get('alloc_peak_mb')}MB")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(), "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(), "opencv": cv2.__version__, "numpy": np.__version__,
+            "cpu_count": os.cpu_count(), "machine": platform.machine(), "quick": args.quick,
+        },
+        "scenarios": results,
+    }
+    out = args.out or os.path.join(BACKEND_DIR, "benchmark_results", f"pipeline_{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    main()
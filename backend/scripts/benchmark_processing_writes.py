@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+動画処理の書き込みベンチマーク
+
+process_video_ocr_sync の書き込みパターン（フレームごとの進捗コミット、
+レシート・仕訳ごとのコミット）と、ユニットオブワーク＋進捗チャネル方式の
+SQL発行回数・コミット回数を一時SQLiteで比較する。OCR・AI解析は行わない。
+
+使い方:
+    python scripts/benchmark_processing_writes.py [--frames 15] [--videos 20]
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import logging
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Video, Frame, Receipt, JournalEntry
+from services.journal_generator import JournalGenerator
+from services.processing_uow import ProcessingUnitOfWork, ProgressChannel
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def _make_session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counter = {"statements": 0, "commits": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    @event.listens_for(engine, "commit")
+    def _count_commit(conn):
+        counter["commits"] += 1
+
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)(), counter
+
+
+def _receipt_data(video_id, i):
+    return {
+        "vendor": f"店舗{video_id}-{i}",
+        "issue_date": datetime(2024, 1 + i % 12, 1 + i % 28),
+        "total": 1000 + i,
+    }
+
+
+def _legacy(db, video, frames):
+    """従来方式（進捗・フレーム・レシート・仕訳ごとにコミット）"""
+    generator = JournalGenerator(db)
+    video.status = "processing"
+    video.progress = 20
+    db.commit()
+    video.progress = 40
+    db.commit()
+    for i in range(frames):
+        video.progress = 40 + int(40 * i / frames)
+        video.progress_message = f"フレーム {i+1}/{frames} 分析中..."
+        db.commit()
+
+        data = _receipt_data(video.id, i)
+        frame = Frame(video_id=video.id, time_ms=i * 1500, is_best=True)
+        db.add(frame)
+        db.flush()
+        receipt = Receipt(
+            video_id=video.id, best_frame_id=frame.id, vendor=data["vendor"],
+            vendor_norm=data["vendor"], issue_date=data["issue_date"], total=data["total"], tax_rate=0.1,
+        )
+        db.add(receipt)
+        db.commit()
+        for entry_data in generator.generate_journal_entries(receipt):
+            db.add(JournalEntry(
+                receipt_id=entry_data.receipt_id, video_id=entry_data.video_id, time_ms=i * 1500,
+                debit_account=entry_data.debit_account, credit_account=entry_data.credit_account,
+                debit_amount=entry_data.debit_amount, credit_amount=entry_data.credit_amount,
+                tax_account=entry_data.tax_account, tax_amount=entry_data.tax_amount,
+                memo=entry_data.memo, status='unconfirmed', transaction_date=receipt.issue_date.date()
+            ))
+        db.commit()
+    video.status = "done"
+    video.progress = 100
+    db.commit()
+
+
+def _batched(db, video, frames):
+    """ユニットオブワーク＋進捗チャネル方式"""
+    channel = ProgressChannel(db.get_bind(), video.id)
+    uow = ProcessingUnitOfWork(db, video, generator=JournalGenerator(db))
+    channel.update(20, "フレーム抽出中...", status="processing")
+    channel.update(40, "OCR処理中...", force=True)
+    for i in range(frames):
+        channel.update(40 + int(40 * i / frames), f"フレーム {i+1}/{frames} 分析中...")
+        data = _receipt_data(video.id, i)
+        frame = Frame(video_id=video.id, time_ms=i * 1500, is_best=True)
+        receipt = Receipt(
+            video_id=video.id, best_frame=frame, vendor=data["vendor"],
+            vendor_norm=data["vendor"], issue_date=data["issue_date"], total=data["total"], tax_rate=0.1,
+        )
+        uow.add(frame=frame, receipt=receipt)
+    uow.commit(status="done", progress=100)
+
+
+def _run(label, frames, videos, fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db, counter = _make_session(os.path.join(tmp, "bench.db"))
+        for v in range(videos):
+            db.add(Video(filename=f"bench{v}.mp4", status="queued"))
+        db.commit()
+        video_ids = [v.id for v in db.query(Video).all()]
+        JournalGenerator(db).rules  # ルールキャッシュの読み込みは計測から除く
+
+        counter["statements"] = counter["commits"] = 0
+        start = time.perf_counter()
+        for video_id in video_ids:
+            fn(db, db.query(Video).filter(Video.id == video_id).one(), frames)
+        elapsed = time.perf_counter() - start
+
+        receipts = db.query(Receipt).count()
+        journals = db.query(JournalEntry).count()
+        db.close()
+        engine.dispose()
+    print(f"{label:<8} videos={videos} frames/video={frames} receipts={receipts} journals={journals} "
+          f"time={elapsed:6.2f}s  statements/video={counter['statements'] / videos:6.1f}  "
+          f"commits/video={counter['commits'] / videos:5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="動画処理の書き込みベンチマーク")
+    parser.add_argument("--frames", type=int, default=15, help="1動画あたりのレシート付きフレーム数")
+    parser.add_argument("--videos", type=int, default=20)
+    args = parser.parse_args()
+
+    _run("legacy", args.frames, args.videos, _legacy)
+    _run("batched", args.frames, args.videos, _batched)
+
+
+if __name__ == "__main__":
+    main()
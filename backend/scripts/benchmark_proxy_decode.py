@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+解析用プロキシのデコード時間ベンチマーク
+
+ffmpeg で合成した 4K 動画（H.264、キーフレーム間隔は --gop で指定）と、
+そこから作成したプロキシについて、フレーム解析の各処理のデコード時間を比較する。
+
+- sampler:  AdaptiveSampler.sample_frames（新システムのサンプリング）
+- smart:    SmartFrameExtractor.extract_smart_frames（全フレームのデコード・評価）
+- scrub:    ランダムな時刻へのシーク＋1フレーム読み出し（frame-at-time 相当）
+
+プロキシ使用時の smart は、選択フレームの元解像度での読み直しを含む。
+
+使い方:
+    python scripts/benchmark_proxy_decode.py [--seconds 10] [--width 3840] [--height 2160] [--gop 60] [--seeks 30]
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import logging
+import tempfile
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from services.video_remux import FFMPEG_BINARY, create_proxy_rendition
+from services.smart_frame_extractor import SmartFrameExtractor
+from video_processing.config import load_config
+from video_processing.sampling import AdaptiveSampler
+
+
+def _make_source(path, args):
+    subprocess.run([
+        FFMPEG_BINARY, "-nostdin", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={args.width}x{args.height}:rate=30:duration={args.seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(args.gop), "-pix_fmt", "yuv420p", str(path),
+    ], check=True)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _sampler(source, proxy):
+    return AdaptiveSampler(load_config()).sample_frames(str(proxy or source))
+
+
+def _smart(source, proxy):
+    return SmartFrameExtractor().extract_smart_frames(str(source), sample_fps=10, proxy_path=str(proxy) if proxy else None)
+
+
+def _scrub(source, proxy, seeks, duration_ms):
+    rng = random.Random(0)
+    for _ in range(seeks):
+        cap = cv2.VideoCapture(str(proxy or source))
+        cap.set(cv2.CAP_PROP_POS_MSEC, rng.randrange(0, duration_ms))
+        ret, _ = cap.read()
+        cap.release()
+        assert ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="プロキシのデコード時間ベンチマーク")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--gop", type=int, default=60, help="元動画のキーフレーム間隔（フレーム数）")
+    parser.add_argument("--seeks", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 抽出フレームは相対パス uploads/frames に書かれるため一時ディレクトリで実行する
+        os.chdir(tmp)
+        source = os.path.join(tmp, "videos", "source.mp4")
+        os.makedirs(os.path.dirname(source))
+        _make_source(source, args)
+
+        proxy_seconds, proxy = _timed(lambda: create_proxy_rendition(source))
+        size_mb = os.path.getsize(source) / 1024 ** 2
+        proxy_mb = os.path.getsize(proxy) / 1024 ** 2
+        print(f"source {args.width}x{args.height} {args.seconds}s gop={args.gop} {size_mb:.1f}MB, "
+              f"proxy {proxy_mb:.1f}MB created in {proxy_seconds:.2f}s (one-off per upload)")
+
+        tasks = [
+            ("sampler", lambda p: _sampler(source, p)),
+            ("smart", lambda p: _smart(source, p)),
+            ("scrub", lambda p: _scrub(source, p, args.seeks, args.seconds * 1000)),
+        ]
+        for name, task in tasks:
+            original, _ = _timed(lambda: task(None))
+            with_proxy, _ = _timed(lambda: task(proxy))
+            print(f"{name:<8} original={original:7.2f}s  proxy={with_proxy:7.2f}s  "
+                  f"reduction={(1 - with_proxy / original) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+フレーム品質スコアのバッチ計算ベンチマーク
+
+プロキシ解像度の合成フレーム（ノイズ・ぼけ・テキスト風の線・白飛び）を生成し、
+次の3つの評価をフレームごとの計算とバッチ計算（video_processing.quality.batch_frame_stats）で
+比較して frames/s と結果の最大差を出力する。
+
+- stats:     鮮明度・明るさ・コントラスト・エッジ（process_video_ocr_sync の品質評価）
+- smart:     SmartFrameExtractor._evaluate_frame_quality / _evaluate_frames_batch
+- assessor:  QualityAssessor.assess_frame / assess_batch
+
+使い方:
+    python scripts/benchmark_quality_batch.py [--frames 256] [--batch 32] [--width 640] [--height 360]
+"""
+
+import sys
+import os
+import time
+import argparse
+import logging
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from services.smart_frame_extractor import SmartFrameExtractor
+from video_processing.quality import QualityAssessor, batch_frame_stats, stack_gray
+from video_processing.types import Config
+
+
+def _make_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (5, 5), 1)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        frame[height // 4: height * 3 // 4, width // 3: width * 2 // 3] = 235
+        for y in range(height // 4 + 10, height * 3 // 4 - 10, 12):
+            cv2.line(frame, (width // 3 + 10, y), (width * 2 // 3 - 10 - (i * 7 + y) % 40, y), (30, 30, 30), 2)
+        if i % 4 == 1:
+            frame = cv2.GaussianBlur(frame, (9, 9), 3)
+        if i % 5 == 2:
+            frame[: height // 6, : width // 6] = 255
+        frames.append(np.roll(frame, i * 3, axis=1))
+    return frames
+
+
+def _per_frame_stats(frames):
+    results = []
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        results.append((
+            cv2.Laplacian(gray, cv2.CV_64F).var(),
+            gray.mean(),
+            gray.std(),
+            cv2.Canny(gray, 50, 150).mean(),
+        ))
+    return np.array(results)
+
+
+def _batch_stats(frames):
+    stats = batch_frame_stats(stack_gray(frames))
+    return np.stack([stats["laplacian_var"], stats["mean"], stats["std"], stats["edge_mean"]], axis=1)
+
+
+def _timed(func, frames, batch_size):
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(frames), batch_size):
+        results.append(func(frames[i:i + batch_size]))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フレーム品質スコアのバッチ計算ベンチマーク")
+    parser.add_argument("--frames", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    frames = _make_frames(args.frames, args.width, args.height)
+    extractor = SmartFrameExtractor()
+    assessor = QualityAssessor(Config())
+
+    def smart_scores(results):
+        return np.array([score for chunk in results for score, _ in chunk])
+
+    def assessor_scores(results):
+        return np.array([[s[k] for k in ("sharpness", "exposure", "contrast", "glare_penalty", "total")]
+                         for chunk in results for s in chunk])
+
+    tasks = [
+        ("stats", _per_frame_stats, _batch_stats, lambda results: np.concatenate(results)),
+        ("smart",
+         lambda chunk: [extractor._evaluate_frame_quality(frame) for frame in chunk],
+         extractor._evaluate_frames_batch, smart_scores),
+        ("assessor",
+         lambda chunk: [assessor.assess_frame(frame) for frame in chunk],
+         assessor.assess_batch, assessor_scores),
+    ]
+
+    print(f"{args.frames} frames {args.width}x{args.height}, batch={args.batch}")
+    for name, per_frame, batched, collect in tasks:
+        per_frame_seconds = batch_seconds = float("inf")
+        for _ in range(args.repeat):
+            seconds, per_frame_results = _timed(per_frame, frames, args.batch)
+            per_frame_seconds = min(per_frame_seconds, seconds)
+            seconds, batch_results = _timed(batched, frames, args.batch)
+            batch_seconds = min(batch_seconds, seconds)
+        expected, actual = collect(per_frame_results), collect(batch_results)
+        max_diff = float(np.max(np.abs(expected - actual) / np.maximum(np.abs(expected), 1e-9)))
+        print(f"{name:<9} per-frame={args.frames / per_frame_seconds:8.1f} frames/s  "
+              f"batch={args.frames / batch_seconds:8.1f} frames/s  "
+              f"speedup={per_frame_seconds / batch_seconds:5.2f}x  max_rel_diff={max_diff:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+/videos/stream のベンチマーク
+
+一時ファイルを配信するサーバー（uvicorn）を別プロセスで起動し、並列クライアントから
+ランダムな位置への Range 要求（シーク）を繰り返して、従来方式（8KB ジェネレーター）と
+RangeFileResponse のスループットとサーバーCPU時間（1GBあたり）を比較する。
+サーバーCPU時間は /proc から読むため Linux のみ対応。
+
+使い方:
+    python scripts/benchmark_video_stream.py [--size-mb 512] [--clients 8] [--requests 64] [--window-mb 4]
+"""
+
+import sys
+import os
+import time
+import random
+import socket
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+def _legacy_app(path):
+    """変更前の実装（8KB チャンクのジェネレーター、単一範囲のみ）"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.get("/video")
+    async def video(request: Request):
+        file_size = os.path.getsize(path)
+        range_start, range_end = 0, file_size - 1
+        range_spec = request.headers.get("range", "").replace("bytes=", "").split("-")
+        if range_spec[0]:
+            range_start = int(range_spec[0])
+        if len(range_spec) > 1 and range_spec[1]:
+            range_end = int(range_spec[1])
+        content_length = range_end - range_start + 1
+
+        def iterfile():
+            with open(path, "rb") as f:
+                f.seek(range_start)
+                remaining = content_length
+                while remaining > 0:
+                    data = f.read(min(8192, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+
+        return StreamingResponse(iterfile(), status_code=206, media_type="video/mp4", headers={
+            "Content-Length": str(content_length),
+            "Content-Range": f"bytes {range_start}-{range_end}/{file_size}",
+        })
+
+    return app
+
+
+def _range_app(path):
+    from fastapi import FastAPI, Request
+    from services.file_streaming import RangeFileResponse
+
+    app = FastAPI()
+
+    @app.get("/video")
+    async def video(request: Request):
+        return RangeFileResponse(path, request.headers, "video/mp4", method=request.method)
+
+    return app
+
+
+def _serve(mode, path, port):
+    import uvicorn
+    app = _legacy_app(path) if mode == "legacy" else _range_app(path)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _run(mode, path, size, args):
+    port = _free_port()
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", mode, "--file", path, "--port", str(port)
+    ])
+    url = f"http://127.0.0.1:{port}/video"
+    try:
+        for _ in range(100):
+            try:
+                httpx.head(url, timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+
+        window = args.window_mb * 1024 * 1024
+        rng = random.Random(0)
+        offsets = [rng.randrange(0, size - window) for _ in range(args.requests)]
+
+        def fetch(offset):
+            with httpx.Client(timeout=60) as client:
+                response = client.get(url, headers={"Range": f"bytes={offset}-{offset + window - 1}"})
+                assert response.status_code == 206 and len(response.content) == window
+                return len(response.content)
+
+        cpu_before = _cpu_seconds(server.pid)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            total = sum(pool.map(fetch, offsets))
+        elapsed = time.perf_counter() - start
+        cpu = _cpu_seconds(server.pid) - cpu_before
+    finally:
+        server.terminate()
+        server.wait()
+
+    gb = total / 1024 ** 3
+    print(f"{mode:<7} clients={args.clients} requests={args.requests} window={args.window_mb}MB "
+          f"throughput={total / 1024 ** 2 / elapsed:8.1f}MB/s  server_cpu={cpu:6.2f}s  cpu_per_gb={cpu / gb:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="動画ストリーミングのベンチマーク")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--window-mb", type=int, default=4, help="1回のシークで取得するサイズ")
+    parser.add_argument("--serve", choices=["legacy", "range"], help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.file, args.port)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mp4")
+        size = args.size_mb * 1024 * 1024
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        for mode in ("legacy", "range"):
+            _run(mode, path, size, args)
+
+
+if __name__ == "__main__":
+    main()
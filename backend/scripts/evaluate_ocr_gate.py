@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+OCRゲート（services.ocr_gate）の適合率・再現率の評価
+
+ラベル付きのサンプル（フレーム画像と、リモートOCRに送るべきか = 金額の読めるレシートが
+映っているか）に対してゲートを実行し、しきい値の組み合わせごとに次を出力する。
+
+- precision: ゲートを通したフレームのうち、送るべきフレームの割合
+- recall:    送るべきフレームのうち、ゲートを通した割合（下がるとレシートを取りこぼす）
+- pass_rate: ゲートを通したフレームの割合（1 - pass_rate がリモートOCRの削減率）
+- ms/frame:  1フレームの判定時間
+
+サンプルのディレクトリには画像と labels.json（{"ファイル名": true/false, ...}）を置く。
+--build で benchmark_pipeline.py の合成動画からサンプルを作る（レシートが静止して映っている
+フレーム＝true、画面外への出入り中のフレーム・背景だけ・文字のない紙・数字のない文章・
+ぶれたレシート＝false。ピンぼけの区間は判定が分かれるため含めない）。
+
+使い方:
+    python scripts/evaluate_ocr_gate.py --build samples/ocr_gate     # サンプルを作成して保存
+    python scripts/evaluate_ocr_gate.py --samples samples/ocr_gate [--grid] [--out results.json]
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import cv2
+import numpy as np
+
+from benchmark_pipeline import SCENARIOS, _motion_blur, _receipt_lines, _render_receipt, _scaled, generate_video
+from services import ocr_gate
+from services.ocr_gate import OCRGate
+
+# グリッドで試すしきい値（min_text_lines, min_digit_runs, min_aligned_lines, min_stroke_balance）
+GRID = [(lines, runs, aligned, balance) for lines in (2, 4) for runs in (1, 2, 3)
+        for aligned, balance in ((3, 0.0), (4, 0.5), (4, 0.6), (99, 0.0))]
+
+
+def _phase_label(phase):
+    """合成動画の区間内の位置 -> ラベル（None は含めない）"""
+    if 0.18 <= phase < 0.38 or 0.52 <= phase < 0.82:
+        return True
+    if phase < 0.06 or phase >= 0.94:
+        return False
+    return None
+
+
+def _prose_lines(rng):
+    words = ["thank", "you", "for", "shopping", "with", "us", "please", "keep", "this", "paper", "as",
+             "proof", "of", "purchase", "and", "bring", "again", "soon"]
+    return [" ".join(rng.choice(words) for _ in range(3)) for _ in range(rng.randint(8, 14))]
+
+
+def _negative_images(rng, width, height, count):
+    """レシートの映っていない・読めないフレーム"""
+    np_rng = np.random.RandomState(rng.randint(0, 2 ** 31))
+    background = cv2.GaussianBlur(np_rng.randint(40, 90, (height, width, 3)).astype(np.uint8), (0, 0), 3)
+    images = []
+    for i in range(count):
+        kind = i % 4
+        frame = background.copy()
+        if kind == 1:  # 文字のない紙
+            paper = np.full((int(height * 0.8), int(width * 0.3), 3), 245, np.uint8)
+        elif kind == 2:  # 数字のない文章
+            paper = _render_receipt(_prose_lines(rng), int(width * 0.3))
+        elif kind == 3:  # 大きくぶれたレシート
+            paper = _render_receipt(_receipt_lines(rng, i), int(width * 0.3))
+        if kind:
+            paper = paper[:height - 20]
+            y, x = (height - paper.shape[0]) // 2, rng.randint(20, width - paper.shape[1] - 20)
+            frame[y:y + paper.shape[0], x:x + paper.shape[1]] = paper
+            if kind == 3:
+                frame = _motion_blur(frame, 31, rng.choice([0, 90]))
+        images.append((f"negative_{kind}", frame))
+    return images
+
+
+def build_samples(out_dir, scenarios, quick, per_receipt=6, seed=0):
+    """合成動画のフレームと合成の否定例からサンプルを作成"""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    labels = OrderedDict()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in scenarios:
+            spec = _scaled(SCENARIOS[name], quick)
+            path = os.path.join(tmp, f"{name}.mp4")
+            receipts = generate_video(path, seed=seed, **spec)
+            cap = cv2.VideoCapture(path)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            wanted = {}
+            for receipt in receipts:
+                start, end = receipt["start_s"], receipt["end_s"]
+                for phase in np.linspace(0, 1, per_receipt * 3, endpoint=False):
+                    label = _phase_label(phase)
+                    if label is not None:
+                        wanted[min(int((start + phase * (end - start)) * fps), frame_count - 1)] = label
+            for number in sorted(wanted):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, number)
+                ret, frame = cap.read()
+                if ret:
+                    file_name = f"{name}_{number:05d}.jpg"
+                    cv2.imwrite(os.path.join(out_dir, file_name), frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                    labels[file_name] = wanted[number]
+            cap.release()
+
+            for i, (kind, frame) in enumerate(_negative_images(rng, spec["width"], spec["height"], 8)):
+                file_name = f"{name}_{kind}_{i:02d}.jpg"
+                cv2.imwrite(os.path.join(out_dir, file_name), frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                labels[file_name] = False
+
+    with open(os.path.join(out_dir, "labels.json"), "w") as f:
+        json.dump(labels, f, indent=2)
+    return labels
+
+
+def evaluate(samples_dir, labels, gate):
+    """ゲートの適合率・再現率"""
+    tp = fp = fn = passed = 0
+    elapsed = 0.0
+    misses = []
+    for file_name, label in labels.items():
+        start = time.perf_counter()
+        result = gate.check(os.path.join(samples_dir, file_name))
+        elapsed += time.perf_counter() - start
+        passed += result.passed
+        if result.passed and label:
+            tp += 1
+        elif result.passed:
+            fp += 1
+        elif label:
+            fn += 1
+            misses.append(file_name)
+    return {
+        "precision": round(tp / max(tp + fp, 1), 3),
+        "recall": round(tp / max(tp + fn, 1), 3),
+        "pass_rate": round(passed / max(len(labels), 1), 3),
+        "ms_per_frame": round(elapsed * 1000 / max(len(labels), 1), 2),
+        "missed": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCRゲート 適合率・再現率の評価")
+    parser.add_argument("--samples", help="サンプルのディレクトリ（labels.json を含む）")
+    parser.add_argument("--build", help="合成のサンプルを作成して保存するディレクトリ")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"合成動画のシナリオ（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--quick", action="store_true", help="短く・小さい合成動画で実行（動作確認用）")
+    parser.add_argument("--grid", action="store_true", help="しきい値の組み合わせを試す")
+    parser.add_argument("--out", help="結果の JSON の保存先")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        samples_dir = args.build or args.samples or tmp
+        if args.build or not args.samples:
+            labels = build_samples(samples_dir, args.scenarios.split(","), args.quick)
+            print(f"built {len(labels)} samples in {samples_dir}")
+        else:
+            with open(os.path.join(samples_dir, "labels.json")) as f:
+                labels = json.load(f)
+        positives = sum(bool(v) for v in labels.values())
+        print(f"{len(labels)} samples ({positives} to OCR, {len(labels) - positives} not)")
+
+        settings = [(ocr_gate.OCR_GATE_MIN_TEXT_LINES, ocr_gate.OCR_GATE_MIN_DIGIT_RUNS,
+                     ocr_gate.OCR_GATE_MIN_ALIGNED_LINES, ocr_gate.OCR_GATE_MIN_STROKE_BALANCE)]
+        if args.grid:
+            settings += [s for s in GRID if s != settings[0]]
+
+        results = OrderedDict()
+        for lines, runs, aligned, balance in settings:
+            gate = OCRGate(min_text_lines=lines, min_digit_runs=runs, min_aligned_lines=aligned,
+                           min_stroke_balance=balance)
+            result = evaluate(samples_dir, labels, gate)
+            key = f"lines={lines} digit_runs={runs} aligned={aligned} balance={balance}"
+            results[key] = result
+            default = " (default)" if len(results) == 1 else ""
+            print(f"  {key:<46} precision={result['precision']:.3f}  recall={result['recall']:.3f}  "
+                  f"pass_rate={result['pass_rate']:.3f}  {result['ms_per_frame']:6.2f} ms/frame{default}")
+
+        missed = next(iter(results.values()))["missed"]
+        if missed:
+            print(f"missed by default: {', '.join(missed[:10])}{' ...' if len(missed) > 10 else ''}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
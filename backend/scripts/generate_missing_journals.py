@@ -2,88 +2,42 @@
 """
 既存の領収書に対して不足しているJournalEntriesを生成するスクリプト
 プロダクション環境で実行して、JournalがないReceiptに対してJournalを生成する
+
+使い方:
+    python scripts/generate_missing_journals.py [--chunk-size 500] [--cursor <receipt_id>]
+
+途中で中断した場合は、ログに出力されたcursorを --cursor に指定して再開できる
 """
 
 import sys
 import os
+import argparse
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import get_db
-from models import Receipt, JournalEntry, Video
-from services.journal_generator import JournalGenerator
-from sqlalchemy import and_
+from models import JournalEntry
+from services.journal_backfill import DEFAULT_CHUNK_SIZE, generate_missing_journals_bulk
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_missing_journals():
+def generate_missing_journals(chunk_size: int = DEFAULT_CHUNK_SIZE, cursor: int = None):
     """Journalがない領収書を検索してJournalを生成"""
     db = next(get_db())
     
     try:
-        # すべての領収書を取得
-        receipts = db.query(Receipt).all()
-        logger.info(f"総領収書数: {len(receipts)}")
-        
-        # Journalがない領収書を特定
-        missing_journal_receipts = []
-        for receipt in receipts:
-            journal_exists = db.query(JournalEntry).filter(
-                JournalEntry.receipt_id == receipt.id
-            ).first()
-            
-            if not journal_exists:
-                missing_journal_receipts.append(receipt)
-        
-        logger.info(f"Journalがない領収書数: {len(missing_journal_receipts)}")
+        progress = generate_missing_journals_bulk(db, chunk_size=chunk_size, after_id=cursor)
         
-        if not missing_journal_receipts:
+        if progress.total_missing == 0:
             logger.info("すべての領収書にJournalが存在します")
             return
         
-        # Journal生成
-        generator = JournalGenerator(db)
-        generated_count = 0
-        
-        for receipt in missing_journal_receipts:
-            try:
-                logger.info(f"Processing receipt {receipt.id}: {receipt.vendor} - ¥{receipt.total}")
-                
-                # Journal生成
-                journal_entries = generator.generate_journal_entries(receipt)
-                
-                for entry_data in journal_entries:
-                    # フレーム時間を取得
-                    time_ms = 0
-                    if receipt.best_frame:
-                        time_ms = receipt.best_frame.time_ms or 0
-                    
-                    journal_entry = JournalEntry(
-                        receipt_id=entry_data.receipt_id,
-                        video_id=entry_data.video_id,
-                        time_ms=time_ms,
-                        debit_account=entry_data.debit_account,
-                        credit_account=entry_data.credit_account,
-                        debit_amount=entry_data.debit_amount,
-                        credit_amount=entry_data.credit_amount,
-                        tax_account=entry_data.tax_account,
-                        tax_amount=entry_data.tax_amount,
-                        memo=entry_data.memo,
-                        status='unconfirmed'
-                    )
-                    db.add(journal_entry)
-                    generated_count += 1
-                    logger.info(f"  → Journal created: 借方={entry_data.debit_account}, 貸方={entry_data.credit_account}")
-                
-                db.commit()
-                
-            except Exception as e:
-                logger.error(f"Error processing receipt {receipt.id}: {e}")
-                db.rollback()
-                continue
-        
-        logger.info(f"生成完了: {generated_count}件のJournalエントリを作成")
+        logger.info(f"生成完了: {progress.journals_generated}件のJournalエントリを作成")
+        if not progress.finished:
+            logger.warning(f"途中で停止しました。--cursor {progress.cursor} で再開してください")
+        for error in progress.errors:
+            logger.error(error)
         
         # 結果確認
         total_journals = db.query(JournalEntry).count()
@@ -96,6 +50,11 @@ def generate_missing_journals():
         db.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="不足しているJournalEntriesを生成")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--cursor", type=int, default=None, help="このReceipt IDより後から再開")
+    args = parser.parse_args()
+    
     logger.info("=== Journal生成スクリプト開始 ===")
-    generate_missing_journals()
-    logger.info("=== 完了 ===")
\ No newline at end of file
+    generate_missing_journals(chunk_size=args.chunk_size, cursor=args.cursor)
+    logger.info("=== 完了 ===")
@@ -0,0 +1,161 @@
+"""
+認証済みトークン → ユーザーの短時間キャッシュ
+
+一覧のポーリング（1秒ごと）やスクラブのたびに JWT のデコードと
+db.query(User) を行わないよう、検証済みのトークンとユーザーの列の値を
+TTL 付きの LRU にキャッシュする。
+
+- キャッシュの有効期限は TTL とトークンの exp の早い方
+- キーは（検証した側, トークン）。routers.auth と services.auth_service は SECRET_KEY の
+  既定値が異なり、一方で検証したトークンが他方の検証を省略させないよう分けて持つ
+- ヒット時は列の値からユーザーを復元し、Session.merge(load=False) で
+  リクエストのセッションに SELECT なしで関連付ける（変更はそのまま保存できる）
+- User の更新・削除（ORM の flush）、パスワードリセット（SQL 直接更新）、
+  ログアウトでキャッシュを無効化する
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# キャッシュの有効期間（秒、0 で無効）
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+
+# キャッシュするトークン数の上限
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+
+
+class PrincipalCache:
+    """（検証した側, トークン）→ ユーザーの列の値の TTL 付き LRU"""
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES,
+                 clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, Dict]]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[Tuple[str, str]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, db: Session, verifier: str, token: str) -> Optional[User]:
+        """
+        verifier が検証済みのトークンならユーザーをセッションに関連付けて返す（なければ None）
+
+        verifier はトークンを検証する側の名前（モジュール名）。同じトークンでも別の verifier の
+        登録は使わない
+        """
+        if not self.enabled or not token:
+            return None
+        key = (verifier, token)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            values = entry[2]
+
+        # 同じリクエストで既に読み込まれていればそれを使う
+        existing = db.identity_map.get(identity_key(User, values["id"]))
+        if existing is not None:
+            return existing
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def put(self, verifier: str, token: str, user: User, expires_at: Optional[float] = None) -> None:
+        """verifier が検証したトークンとユーザーを登録（expires_at はトークンの exp）"""
+        if not self.enabled or not token or user is None:
+            return
+        state = inspect(user)
+        # 未保存の変更がある・一部の列が未読み込み（コミット後の期限切れなど）の場合は登録しない
+        if state.modified or any(column.key not in state.dict for column in User.__table__.columns):
+            return
+        values = {column.key: state.dict[column.key] for column in User.__table__.columns}
+        expires = self.clock() + self.ttl
+        if expires_at is not None:
+            expires = min(expires, float(expires_at))
+        key = (verifier, token)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires, values["id"], values)
+            self._tokens_by_user.setdefault(values["id"], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[1])
+            if tokens is not None:
+                tokens.discard(key)
+                if not tokens:
+                    del self._tokens_by_user[entry[1]]
+
+    def invalidate_token(self, token: str) -> None:
+        """トークンを無効化（ログアウト時。すべての verifier の登録を外す）"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == token]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """ユーザーのすべてのトークンを無効化（パスワード変更・無効化・プロフィール更新時）"""
+        with self._lock:
+            for key in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    """User の更新・削除でそのユーザーのキャッシュを無効化"""
+    if target.id is not None:
+        principal_cache.invalidate_user(target.id)
@@ -13,6 +13,7 @@ import secrets
 
 from database import get_db
 from models import User, UserSession
+from services.auth_cache import principal_cache
 
 # セキュリティ設定
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
@@ -64,17 +65,21 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == user_id).first()
+    # 検証済みのトークンならデコードとユーザー取得を省略
+    user = principal_cache.get(db, __name__, token)
     if user is None:
-        raise credentials_exception
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: int = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise credentials_exception
+        principal_cache.put(__name__, token, user, payload.get("exp"))
     
     if not user.is_active:
         raise HTTPException(
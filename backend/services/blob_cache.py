@@ -0,0 +1,437 @@
+"""
+クラウドに保存された動画・フレームのローカル読み込みキャッシュ
+
+Video.local_path がクラウドURLの場合や、Render の /tmp が消えた後でも、
+フレーム抽出・サムネイル・再処理が元のファイルを読めるようにする。
+
+- オブジェクトはキー（URL またはストレージのオブジェクトキー）の SHA-256 を
+  アドレスとしてディスクに保存する。アップロードされたオブジェクトは上書きされない
+  （キーにハッシュ・タイムスタンプを含む）ため、キーのハッシュが内容のアドレスになる。
+- 容量の上限を超えたら、使用中でないものを最終アクセスの古い順に削除する（LRU）。
+- 同じオブジェクト・同じブロックへの同時取得は1回の取得にまとめる（single-flight）。
+- 取得はブロック単位の Range 要求で行い、全体のダウンロードを待たずに必要な範囲だけ
+  読める。open() のリーダーを OpenCV に渡すと、フレーム抽出は moov と対象の GOP の
+  分だけを取得して始められる。
+"""
+import io
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# キャッシュディレクトリ（Render環境では /tmp 配下）
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR") or ("/tmp/blob_cache" if os.getenv("RENDER") == "true" else "uploads/cache")
+
+# キャッシュ全体の容量上限（バイト）
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# 部分取得の単位（バイト）
+BLOB_CACHE_BLOCK_SIZE = int(os.getenv("BLOB_CACHE_BLOCK_SIZE", str(1024 * 1024)))
+
+# 全体取得で1リクエストにまとめる最大サイズ（バイト）
+BLOB_CACHE_FETCH_SIZE = int(os.getenv("BLOB_CACHE_FETCH_SIZE", str(8 * 1024 * 1024)))
+
+
+class BlobNotFound(Exception):
+    """取得元にオブジェクトが存在しない"""
+
+
+def is_remote(path: Optional[str]) -> bool:
+    return bool(path) and path.startswith(("http://", "https://"))
+
+
+class BlobSource:
+    """キャッシュの取得元"""
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        raise NotImplementedError
+
+
+class HttpBlobSource(BlobSource):
+    """公開URL・署名付きURLから Range 要求で取得（HTTP セッションを使い回す）"""
+
+    def __init__(self, session=None, timeout: float = 30.0):
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=8))
+            session.mount("http://", HTTPAdapter(pool_maxsize=8))
+        self.session = session
+        self.timeout = timeout
+
+    def _get(self, url: str, start: int, end: int):
+        response = self.session.get(url, headers={"Range": f"bytes={start}-{end}"}, timeout=self.timeout)
+        if response.status_code == 404:
+            raise BlobNotFound(url)
+        if response.status_code not in (200, 206):
+            raise OSError(f"HTTP {response.status_code}: {url}")
+        return response
+
+    def size(self, key: str) -> int:
+        # 署名付きURLは GET 専用の署名なので HEAD ではなく先頭1バイトの GET で調べる
+        response = self._get(key, 0, 0)
+        if response.status_code == 206:
+            return int(response.headers["Content-Range"].rsplit("/", 1)[1])
+        return len(response.content)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        response = self._get(key, start, start + length - 1)
+        if response.status_code == 200:
+            # Range 非対応のサーバーは全体を返す
+            return response.content[start:start + length]
+        return response.content
+
+
+class StorageBlobSource(BlobSource):
+    """StorageService のオブジェクトキーから取得"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def size(self, key: str) -> int:
+        size = self.storage.object_size(key)
+        if size is None:
+            raise BlobNotFound(key)
+        return size
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        return self.storage.read_range(key, start, length)
+
+
+@dataclass
+class _Entry:
+    address: str
+    key: str
+    size: int
+    path: Path
+    blocks: Set[int] = field(default_factory=set)
+    fetching: Set[int] = field(default_factory=set)
+    complete: bool = False
+    pins: int = 0
+    fd: Optional[int] = None
+    cond: threading.Condition = field(default_factory=threading.Condition)
+
+
+class BlobCache:
+    """ブロック単位で取得するディスクキャッシュ（LRU・single-flight）"""
+
+    def __init__(
+        self,
+        source_for: Callable[[str], BlobSource],
+        directory=BLOB_CACHE_DIR,
+        max_bytes: int = BLOB_CACHE_MAX_BYTES,
+        block_size: int = BLOB_CACHE_BLOCK_SIZE,
+        fetch_size: int = BLOB_CACHE_FETCH_SIZE,
+    ):
+        self.source_for = source_for
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.fetch_blocks = max(1, fetch_size // block_size)
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetched_bytes = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # 最終アクセスの古い順
+        self._creating: Dict[str, threading.Event] = {}
+        self._load()
+
+    # -- 管理 ---------------------------------------------------------------
+
+    def _load(self) -> None:
+        """既存のキャッシュを読み込む（途中までの取得は破棄）"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == ".partial":
+                path.unlink(missing_ok=True)
+            elif path.is_file():
+                files.append((path.stat().st_mtime, path))
+        for _, path in sorted(files):
+            size = path.stat().st_size
+            entry = _Entry(address=path.name, key="", size=size, path=path, complete=True,
+                           blocks=set(range(self._block_count(size))))
+            self._entries[path.name] = entry
+
+    @staticmethod
+    def address(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _final_path(self, address: str) -> Path:
+        return self.directory / address[:2] / address
+
+    def _block_count(self, size: int) -> int:
+        return (size + self.block_size - 1) // self.block_size
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def contains(self, key: str) -> bool:
+        """オブジェクト全体がキャッシュ済みか"""
+        with self._lock:
+            entry = self._entries.get(self.address(key))
+            return entry is not None and entry.complete
+
+    def _acquire(self, key: str) -> _Entry:
+        """エントリを使用中にする（なければ作成、同時作成は1回にまとめる）"""
+        address = self.address(key)
+        while True:
+            with self._lock:
+                entry = self._entries.get(address)
+                if entry is not None:
+                    entry.pins += 1
+                    self._entries.move_to_end(address)
+                    if entry.complete:
+                        self.hits += 1
+                    return entry
+                waiter = self._creating.get(address)
+                if waiter is None:
+                    waiter = self._creating[address] = threading.Event()
+                    break
+            waiter.wait()
+
+        try:
+            size = self.source_for(key).size(key)
+            path = self._final_path(address)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(path.name + ".partial")
+            with open(partial, "wb") as f:
+                f.truncate(size)
+            entry = _Entry(address=address, key=key, size=size, path=partial, pins=1)
+            if size == 0:
+                os.replace(partial, path)
+                entry.path, entry.complete = path, True
+            with self._lock:
+                self.misses += 1
+                self._entries[address] = entry
+                self._evict()
+            return entry
+        finally:
+            with self._lock:
+                self._creating.pop(address).set()
+
+    def _release(self, entry: _Entry) -> None:
+        with self._lock:
+            entry.pins -= 1
+            if entry.pins == 0 and entry.fd is not None:
+                os.close(entry.fd)
+                entry.fd = None
+            self._evict()
+
+    def _evict(self) -> None:
+        """容量上限を超えている間、使用中でないエントリを古い順に削除（_lock を保持して呼ぶ）"""
+        total = sum(entry.size for entry in self._entries.values())
+        for address in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[address]
+            if entry.pins:
+                continue
+            del self._entries[address]
+            entry.path.unlink(missing_ok=True)
+            total -= entry.size
+            logger.debug(f"キャッシュから削除: {address} ({entry.size} bytes)")
+
+    def invalidate(self, key: str) -> None:
+        """オブジェクトをキャッシュから削除（使用中なら使用終了後の容量超過時に削除される）"""
+        with self._lock:
+            entry = self._entries.get(self.address(key))
+            if entry is not None and not entry.pins:
+                del self._entries[entry.address]
+                entry.path.unlink(missing_ok=True)
+
+    # -- 取得 ---------------------------------------------------------------
+
+    def _fd(self, entry: _Entry) -> int:
+        with entry.cond:
+            if entry.fd is None:
+                entry.fd = os.open(entry.path, os.O_RDWR)
+            return entry.fd
+
+    def _ensure(self, entry: _Entry, start: int, end: int, max_blocks: int) -> None:
+        """[start, end) のブロックを取得済みにする（他のスレッドが取得中のブロックは完了を待つ）"""
+        if entry.complete or start >= end:
+            return
+        needed = range(start // self.block_size, (end - 1) // self.block_size + 1)
+        while True:
+            with entry.cond:
+                missing = [block for block in needed if block not in entry.blocks]
+                if not missing:
+                    return
+                claimable = [block for block in missing if block not in entry.fetching]
+                if not claimable:
+                    entry.cond.wait()
+                    continue
+                # 連続する未取得ブロックをまとめて1リクエストで取得
+                run = [claimable[0]]
+                while (len(run) < max_blocks and run[-1] + 1 < self._block_count(entry.size)
+                       and run[-1] + 1 not in entry.blocks and run[-1] + 1 not in entry.fetching):
+                    run.append(run[-1] + 1)
+                entry.fetching.update(run)
+
+            offset = run[0] * self.block_size
+            length = min(len(run) * self.block_size, entry.size - offset)
+            try:
+                data = self.source_for(entry.key).read_range(entry.key, offset, length)
+                if len(data) != length:
+                    raise OSError(f"取得サイズ不一致: {len(data)} != {length} ({entry.key})")
+                os.pwrite(self._fd(entry), data, offset)
+            except BaseException:
+                with entry.cond:
+                    entry.fetching.difference_update(run)
+                    entry.cond.notify_all()
+                raise
+
+            with entry.cond:
+                self.fetches += 1
+                self.fetched_bytes += length
+                entry.fetching.difference_update(run)
+                entry.blocks.update(run)
+                if len(entry.blocks) == self._block_count(entry.size):
+                    final = self._final_path(entry.address)
+                    os.replace(entry.path, final)
+                    entry.path, entry.complete = final, True
+                entry.cond.notify_all()
+
+    @contextmanager
+    def get_path(self, key: str) -> Iterator[str]:
+        """
+        オブジェクト全体を取得してキャッシュ上のパスを渡す
+
+        with の間は使用中になり、容量超過でも削除されない（with を出た後のパスは
+        他の取得で削除されることがあるため、ファイルを使い終わるまで with の中で使う）。
+        """
+        entry = self._acquire(key)
+        try:
+            self._ensure(entry, 0, entry.size, self.fetch_blocks)
+            yield str(entry.path)
+        finally:
+            self._release(entry)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        """必要なブロックだけ取得して指定範囲を返す"""
+        entry = self._acquire(key)
+        try:
+            return self._read(entry, start, length)
+        finally:
+            self._release(entry)
+
+    def _read(self, entry: _Entry, start: int, length: int) -> bytes:
+        end = min(entry.size, start + length)
+        if start >= end:
+            return b""
+        blocks = (end - 1) // self.block_size - start // self.block_size + 1
+        self._ensure(entry, start, end, blocks)
+        return os.pread(self._fd(entry), end - start, start)
+
+    def open(self, key: str) -> "CachedBlobReader":
+        """必要な範囲だけ取得しながら読むファイルオブジェクト（close まで使用中になる）"""
+        return CachedBlobReader(self, self._acquire(key))
+
+
+class CachedBlobReader(io.BufferedIOBase):
+    """BlobCache のオブジェクトを読むシーク可能なリーダー（OpenCV の VideoCapture に渡せる）"""
+
+    def __init__(self, cache: BlobCache, entry: _Entry):
+        super().__init__()
+        self._cache = cache
+        self._entry = entry
+        self._position = 0
+
+    @property
+    def size(self) -> int:
+        return self._entry.size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._entry.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        if size is None or size < 0:
+            size = self._entry.size - self._position
+        data = self._cache._read(self._entry, self._position, size)
+        self._position += len(data)
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._cache._release(self._entry)
+        super().close()
+
+
+_default_cache: Optional[BlobCache] = None
+_default_cache_lock = threading.Lock()
+_http_source: Optional[HttpBlobSource] = None
+_storage_source: Optional[StorageBlobSource] = None
+
+
+def _default_source_for(key: str) -> BlobSource:
+    """URL は HTTP、それ以外は StorageService のオブジェクトキーとして取得"""
+    global _http_source, _storage_source
+    if is_remote(key):
+        if _http_source is None:
+            _http_source = HttpBlobSource()
+        return _http_source
+    if _storage_source is None:
+        from services.storage import get_storage_service
+        storage = get_storage_service()
+        if storage is None:
+            raise BlobNotFound(key)
+        _storage_source = StorageBlobSource(storage)
+    return _storage_source
+
+
+def get_blob_cache() -> BlobCache:
+    """アプリ全体で共有するキャッシュ"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = BlobCache(_default_source_for)
+        return _default_cache
+
+
+def remote_stem(path: str) -> str:
+    """URL・パスのファイル名部分（拡張子なし）"""
+    return Path(urlparse(path).path).stem if is_remote(path) else Path(path).stem
@@ -0,0 +1,327 @@
+"""
+動画・フレーム・サムネイルの保存先の抽象化
+
+DB には環境に依存しない安定したオブジェクトキーを保存する。
+- ローカルのオブジェクト: "uploads/<種類>/<ファイル名>"（例: uploads/frames/x.jpg）
+- クラウドのオブジェクト: 公開URL
+
+キーから実体への対応はストアが行う。
+- LocalBlobStore:     uploads/ 配下に保存（ローカル開発）
+- EphemeralBlobStore: Render の /tmp 配下に保存（再起動・再デプロイで消える）
+- CloudBlobStore:     クラウドのオブジェクトを読み込みキャッシュ経由で読む
+
+BlobResolver は存在確認（stat）の結果を短時間キャッシュし、ハンドラーごとの
+os.path.exists とパス変換をまとめる。書き込み・削除はリゾルバー経由で行い、
+キャッシュを無効化する。
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from services.blob_cache import BlobCache, BlobNotFound, get_blob_cache, is_remote
+
+logger = logging.getLogger(__name__)
+
+# ローカルのオブジェクトキーの接頭辞
+LOCAL_KEY_PREFIX = "uploads/"
+
+# 存在するファイルの stat 結果をキャッシュする秒数
+BLOB_STAT_TTL_SECONDS = float(os.getenv("BLOB_STAT_TTL_SECONDS", "30"))
+
+# 存在しなかった結果をキャッシュする秒数（既定では、バックグラウンド処理の書き込みをすぐ反映するためキャッシュしない）
+BLOB_MISSING_TTL_SECONDS = float(os.getenv("BLOB_MISSING_TTL_SECONDS", "0"))
+
+
+class BlobStore:
+    """オブジェクトキーと実体の対応"""
+
+    def path_for(self, key: str) -> str:
+        """キーに対応するローカルのパス（存在確認はしない）"""
+        raise NotImplementedError
+
+    def fetch(self, key: str) -> Optional[str]:
+        """キーのオブジェクトを読めるローカルのパス（なければ None）"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """ローカルディスク上のストア（uploads/ のキーを root 配下に対応させる）"""
+
+    def __init__(self, root="uploads"):
+        self.root = Path(root)
+
+    def path_for(self, key: str) -> str:
+        if key.startswith(LOCAL_KEY_PREFIX):
+            return str(self.root / key[len(LOCAL_KEY_PREFIX):])
+        # 以前の形式（実ファイルのパスをそのまま保存）はそのまま扱う
+        return key
+
+    def key_for(self, path) -> str:
+        """実ファイルのパスからキーを求める（root 配下でなければパスのまま）"""
+        path = str(path)
+        root = str(self.root).rstrip("/") + "/"
+        if path.startswith(root):
+            return LOCAL_KEY_PREFIX + path[len(root):]
+        return path
+
+    def fetch(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        return path if os.path.exists(path) else None
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.path_for(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class EphemeralBlobStore(LocalBlobStore):
+    """Render の /tmp 上のストア（再起動・再デプロイで消えるため、クラウドの写しを併用する）"""
+
+    def __init__(self, root="/tmp"):
+        super().__init__(root)
+
+
+class CloudBlobStore(BlobStore):
+    """クラウドのオブジェクト（URL）を読み込みキャッシュ経由で読むストア"""
+
+    def __init__(self, cache: Optional[BlobCache] = None):
+        self._cache = cache
+
+    @property
+    def cache(self) -> BlobCache:
+        return self._cache or get_blob_cache()
+
+    def fetch(self, key: str) -> Optional[str]:
+        # 返したパスは容量超過で削除されることがある（読み終わるまで残すには pinned）
+        with self.pinned(key) as path:
+            return path
+
+    @contextmanager
+    def pinned(self, key: str) -> Iterator[Optional[str]]:
+        """キャッシュ経由で取得したパスを渡す（with の間は削除されない、取得できなければ None）"""
+        with ExitStack() as stack:
+            try:
+                path = stack.enter_context(self.cache.get_path(key))
+            except (BlobNotFound, OSError) as e:
+                logger.warning(f"キャッシュ経由の取得に失敗: {key}: {e}")
+                path = None
+            yield path
+
+    def open(self, key: str):
+        return self.cache.open(key)
+
+    def contains(self, key: str) -> bool:
+        return self.cache.contains(key)
+
+    def delete(self, key: str) -> bool:
+        # クラウドのオブジェクト自体は StorageService で削除する。ここではローカルの写しだけ消す
+        self.cache.invalidate(key)
+        return True
+
+
+class BlobResolver:
+    """キーの解決と存在確認のキャッシュ"""
+
+    def __init__(
+        self,
+        local: LocalBlobStore,
+        cloud: CloudBlobStore,
+        ttl: float = BLOB_STAT_TTL_SECONDS,
+        missing_ttl: float = BLOB_MISSING_TTL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.local = local
+        self.cloud = cloud
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.clock = clock
+        self.stat_calls = 0
+        self.stat_hits = 0
+        self._lock = threading.Lock()
+        self._resolved: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def store_for(self, key: str) -> BlobStore:
+        return self.cloud if is_remote(key) else self.local
+
+    def key_for(self, path) -> str:
+        """実ファイルのパス（またはURL）から DB に保存するキーを求める"""
+        path = str(path)
+        return path if is_remote(path) else self.local.key_for(path)
+
+    def path_for(self, key: str) -> str:
+        """ローカルのキーに対応する実ファイルのパス（存在確認はしない）"""
+        return self.local.path_for(key)
+
+    def writable_path(self, key: str) -> str:
+        """ローカルのキーに書き込むためのパス（ディレクトリを作成し、キャッシュを無効化）"""
+        path = self.local.path_for(key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.invalidate(key)
+        return path
+
+    def _lookup(self, key: str) -> Optional[str]:
+        now = self.clock()
+        with self._lock:
+            cached = self._resolved.get(key)
+            # クラウドの写しは容量超過で削除されることがあるのでキャッシュに残っているか確認
+            if (cached is not None and cached[0] > now
+                    and not (cached[1] and is_remote(key) and not self.cloud.contains(key))):
+                self.stat_hits += 1
+                return cached[1]
+            self.stat_calls += 1
+
+        path = self.store_for(key).fetch(key)
+        with self._lock:
+            self._resolved[key] = (now + (self.ttl if path else self.missing_ttl), path)
+        return path
+
+    def resolve(self, *candidates: Optional[str]) -> Optional[str]:
+        """
+        候補のキーのうち読めるもののローカルのパスを返す（どれも読めなければ None）
+
+        ローカルのキーを優先し、なければクラウドのキーを読み込みキャッシュ経由で取得する。
+        """
+        for candidate in candidates:
+            if candidate and not is_remote(candidate):
+                path = self._lookup(candidate)
+                if path:
+                    return path
+        for candidate in candidates:
+            if is_remote(candidate):
+                path = self._lookup(candidate)
+                if path:
+                    return path
+        return None
+
+    @contextmanager
+    def pinned(self, *candidates: Optional[str]) -> Iterator[Optional[str]]:
+        """
+        resolve と同じ順で候補を探し、読めるファイルのパスを渡す（どれも読めなければ None）
+
+        クラウドの写しは with の間キャッシュから削除されない。動画のデコード・ffmpeg など、
+        パスを開き直しながら長く使う処理はこちらを使う。
+        """
+        for candidate in candidates:
+            if candidate and not is_remote(candidate):
+                path = self._lookup(candidate)
+                if path:
+                    yield path
+                    return
+        for candidate in candidates:
+            if is_remote(candidate):
+                with self.cloud.pinned(candidate) as path:
+                    if path:
+                        yield path
+                        return
+        yield None
+
+    def exists(self, key: Optional[str]) -> bool:
+        return bool(key) and self.resolve(key) is not None
+
+    def open_video_capture(self, *candidates: Optional[str]):
+        """
+        候補の動画を開いた cv2.VideoCapture を返す（見つからなければ開いていない VideoCapture）
+
+        ローカルにない動画は、OpenCV がファイルオブジェクトからの読み込みに対応していれば
+        キャッシュのリーダーで開き、ダウンロード完了を待たずに必要な範囲だけ取得する。
+        """
+        import cv2
+
+        for candidate in candidates:
+            if candidate and not is_remote(candidate):
+                path = self._lookup(candidate)
+                if path:
+                    return cv2.VideoCapture(path)
+
+        # OpenCV 4.10 以降は io.BufferedIOBase からの読み込みに対応
+        stream_supported = hasattr(cv2, "IStreamReader")
+        for candidate in candidates:
+            if not is_remote(candidate):
+                continue
+            if stream_supported and not self.cloud.contains(candidate):
+                try:
+                    return cv2.VideoCapture(self.cloud.open(candidate), cv2.CAP_FFMPEG, [])
+                except (BlobNotFound, OSError) as e:
+                    logger.warning(f"キャッシュ経由で動画を開けません: {candidate}: {e}")
+                    continue
+            path = self._lookup(candidate)
+            if path:
+                return cv2.VideoCapture(path)
+        return cv2.VideoCapture()
+
+    def delete(self, *keys: Optional[str]) -> None:
+        """キーのオブジェクトを削除（クラウドはローカルの写しのみ、エラーは記録して続行）"""
+        for key in keys:
+            if not key:
+                continue
+            try:
+                if self.store_for(key).delete(key):
+                    logger.info(f"Deleted file: {key}")
+            except OSError as e:
+                logger.warning(f"Failed to delete file {key}: {e}")
+            self.invalidate(key)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._resolved.pop(key, None)
+
+
+_default_resolver: Optional[BlobResolver] = None
+_default_resolver_lock = threading.Lock()
+
+
+def local_store() -> LocalBlobStore:
+    """現在の環境のローカルストア（Render環境では /tmp）"""
+    return EphemeralBlobStore() if os.getenv("RENDER") == "true" else LocalBlobStore()
+
+
+def get_blob_resolver() -> BlobResolver:
+    """アプリ全体で共有するリゾルバー"""
+    global _default_resolver
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = BlobResolver(local_store(), CloudBlobStore())
+        return _default_resolver
+
+
+def resolve_local_path(db_path: str) -> str:
+    """DB上のキーを実ファイルのパスに変換（Render環境では uploads/ → /tmp/）"""
+    return get_blob_resolver().path_for(db_path)
+
+
+def to_db_path(path) -> str:
+    """実ファイルのパスをDB保存用のキーに変換（Render環境では /tmp/ → uploads/）"""
+    return get_blob_resolver().key_for(path)
+
+
+def local_file(*candidates: Optional[str]) -> Optional[str]:
+    """
+    候補（DB上のキーまたはクラウドURL）のうち読めるファイルのパスを返す
+
+    クラウドの写しは返した後に容量超過で削除されることがある。読み終わるまで残すには pinned_local_file。
+    """
+    return get_blob_resolver().resolve(*candidates)
+
+
+def pinned_local_file(*candidates: Optional[str]):
+    """local_file と同じパスを with の間渡す（クラウドの写しは with の間キャッシュから削除されない）"""
+    return get_blob_resolver().pinned(*candidates)
+
+
+def open_video_capture(*candidates: Optional[str]):
+    """候補の動画を開いた cv2.VideoCapture を返す"""
+    return get_blob_resolver().open_video_capture(*candidates)
+
+
+def writable_path(key: str) -> str:
+    """ローカルのキーに書き込むためのパス（ディレクトリを作成）"""
+    return get_blob_resolver().writable_path(key)
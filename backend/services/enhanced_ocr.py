@@ -233,41 +233,33 @@ class EnhancedOCRService:
             "memo": "Enhanced OCR failed, manual input required"
         }
     
-    def process_multiple_frames(self, frame_paths: List[str]) -> Dict[str, Any]:
+    def process_multiple_frames(self, frame_paths: List[str], max_frames: int = 5) -> Dict[str, Any]:
         """
-        複数フレームを処理して最良の結果を選択
+        同じ領収書の複数フレームを処理して結果を統合
+
+        フレームは並列に処理し（最初の2枚が店舗名・合計で一致すればそこで打ち切り、
+        最大 max_frames 枚）、店舗名・日付・金額・税額・明細を信頼度で重み付けした投票で統合する。
         """
-        results = []
-        
-        for frame_path in frame_paths[:5]:  # 最大5フレーム処理
+        from video_processing.config import load_config
+        from video_processing.ocr_fusion import FrameReading, OCRFusion
+
+        def read(frame_path: str) -> Optional[FrameReading]:
             result = self.process_receipt(frame_path)
             if result and result.get('confidence_score', 0) > 0.5:
-                results.append(result)
-        
-        if not results:
+                return FrameReading(result, result['confidence_score'])
+            return None
+
+        fused = OCRFusion(load_config(), frames_per_receipt=max_frames).run([frame_paths], read)[0]
+        if not fused.readings:
             return self._basic_ocr_extraction(frame_paths[0])
-        
-        # 最も信頼度の高い結果を選択
-        best_result = max(results, key=lambda x: x.get('confidence_score', 0))
-        
-        # 複数の結果から情報を統合（オプション）
-        if len(results) > 1:
-            # 店舗名の投票
-            vendors = [r.get('vendor') for r in results if r.get('vendor')]
-            if vendors:
-                from collections import Counter
-                vendor_counts = Counter(vendors)
-                best_result['vendor'] = vendor_counts.most_common(1)[0][0]
-            
-            # 金額の平均または最頻値
-            totals = [r.get('total') for r in results if r.get('total')]
-            if totals:
-                # 外れ値を除外して平均
-                totals_sorted = sorted(totals)
-                if len(totals_sorted) > 2:
-                    # 上下10%を除外
-                    trim_count = max(1, len(totals_sorted) // 10)
-                    totals_trimmed = totals_sorted[trim_count:-trim_count] if trim_count < len(totals_sorted) // 2 else totals_sorted
-                    best_result['total'] = sum(totals_trimmed) / len(totals_trimmed)
-        
+
+        # 最も信頼度の高い結果を統合した値で上書きする（どのフレームも読めなかった項目はそのまま）
+        _, best_reading = fused.readings[0]
+        best_result = dict(best_reading.fields)
+        best_result.update({name: value for name, value in fused.fields.items() if value is not None})
+        if len(fused.readings) > 1:
+            # 複数フレームで一致した分だけ信頼度を上げる
+            agreement = fused.agreement.get('total', fused.agreement.get('vendor', 0.0))
+            best_result['confidence_score'] = min(0.95, best_reading.confidence + 0.1 * agreement)
+        best_result['fusion'] = {'calls': fused.calls, 'readings': len(fused.readings), 'agreement': fused.agreement}
         return best_result
\ No newline at end of file
@@ -0,0 +1,430 @@
+"""
+仕訳エクスポートエンジン
+
+会計ソフトごとの出力形式を ExportFormatSpec として登録し、DBから読んだ行を
+チャンク単位の列配列に変換してから列ごとにまとめて整形する。
+出力ファイル形式（CSVなど）は ExportRenderer として別に登録するため、
+新しい形式の追加は register_format / register_renderer の呼び出しだけで済む。
+
+大量出力では整形処理をワーカープロセスで実行し、DBの読み込みと並行させられる。
+"""
+import csv
+import io
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import JournalEntry, Receipt, Video
+
+logger = logging.getLogger(__name__)
+
+# 1チャンクあたりの行数（DBカーソルの取得単位とレスポンスへの書き出し単位）
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+# ワーカープロセスに同時に渡すチャンク数の上限（メモリを一定に保つ）
+PARALLEL_MAX_IN_FLIGHT = 4
+
+# 大量出力時に整形をワーカープロセスで行うか（リクエストごとにも指定可）
+EXPORT_PARALLEL_FORMATTING = os.getenv("EXPORT_PARALLEL_FORMATTING", "false").lower() == "true"
+
+# UTF-8 BOM（Excelでの文字化け対策、先頭に1回だけ出力）
+UTF8_BOM = '\ufeff'.encode('utf-8')
+
+# エクスポートで参照する列（build_export_query の選択順と一致させる）
+SOURCE_COLUMNS: Tuple[str, ...] = (
+    'debit_account', 'credit_account', 'debit_amount', 'credit_amount', 'memo', 'status',
+    'receipt_id', 'issue_date', 'vendor', 'total', 'tax', 'tax_rate', 'video_id',
+)
+
+# チャンク: 列名 → 値の並び
+ColumnChunk = Dict[str, Sequence[Any]]
+ColumnFormatter = Callable[[ColumnChunk], List[Any]]
+
+
+def build_export_query(
+    video_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[str] = None
+):
+    """エクスポート対象の列のみを選択するクエリ"""
+    query = select(
+        JournalEntry.debit_account,
+        JournalEntry.credit_account,
+        JournalEntry.debit_amount,
+        JournalEntry.credit_amount,
+        JournalEntry.memo,
+        JournalEntry.status,
+        Receipt.id.label('receipt_id'),
+        Receipt.issue_date,
+        Receipt.vendor,
+        Receipt.total,
+        Receipt.tax,
+        Receipt.tax_rate,
+        Video.id.label('video_id')
+    ).join(
+        Receipt, JournalEntry.receipt_id == Receipt.id
+    ).join(
+        Video, JournalEntry.video_id == Video.id
+    )
+
+    if video_id:
+        query = query.where(JournalEntry.video_id == video_id)
+    if status:
+        query = query.where(JournalEntry.status == status)
+    if start_date:
+        query = query.where(Receipt.issue_date >= start_date)
+    if end_date:
+        query = query.where(Receipt.issue_date <= end_date)
+
+    return query
+
+
+def to_column_chunk(rows: Sequence[Sequence[Any]]) -> ColumnChunk:
+    """行の並びを列配列に変換"""
+    if not rows:
+        return {name: () for name in SOURCE_COLUMNS}
+    return dict(zip(SOURCE_COLUMNS, zip(*rows)))
+
+
+# --- 列整形関数（チャンク全体をまとめて処理する） ---
+
+def const(value: Any) -> ColumnFormatter:
+    """固定値の列"""
+    def column(chunk: ColumnChunk) -> List[Any]:
+        return [value] * len(chunk['receipt_id'])
+    return column
+
+
+def text(name: str, default: Any = '') -> ColumnFormatter:
+    """値がなければ既定値にする列"""
+    def column(chunk: ColumnChunk) -> List[Any]:
+        return [v or default for v in chunk[name]]
+    return column
+
+
+def date(name: str, fmt: str) -> ColumnFormatter:
+    """日付列（同じ日付は1回だけ整形する）"""
+    def column(chunk: ColumnChunk) -> List[str]:
+        cache: Dict[Any, str] = {}
+        out = []
+        for v in chunk[name]:
+            if not v:
+                out.append('')
+                continue
+            formatted = cache.get(v)
+            if formatted is None:
+                formatted = cache[v] = v.strftime(fmt)
+            out.append(formatted)
+        return out
+    return column
+
+
+def amount(name: str, thousands: bool = True) -> ColumnFormatter:
+    """金額列（thousands=Trueならカンマ区切りの文字列、Falseなら整数）"""
+    if thousands:
+        def column(chunk: ColumnChunk) -> List[Any]:
+            return [f"{int(v):,}" if v else '0' for v in chunk[name]]
+    else:
+        def column(chunk: ColumnChunk) -> List[Any]:
+            return [int(v) if v else 0 for v in chunk[name]]
+    return column
+
+
+def template(fmt: str, *names: str) -> ColumnFormatter:
+    """str.format テンプレートで複数列を組み立てる列"""
+    render = fmt.format
+
+    def column(chunk: ColumnChunk) -> List[str]:
+        return [render(*values) for values in zip(*(chunk[n] for n in names))]
+    return column
+
+
+def mapped(name: str, mapping: Dict[Any, Any], default: Any) -> ColumnFormatter:
+    """値を対応表で変換する列"""
+    def column(chunk: ColumnChunk) -> List[Any]:
+        return [mapping.get(v, default) for v in chunk[name]]
+    return column
+
+
+def vendor_memo(separator: str) -> ColumnFormatter:
+    """「取引先{区切り}摘要」の列（取引先がなければ摘要のみ）"""
+    def column(chunk: ColumnChunk) -> List[Any]:
+        return [f"{v}{separator}{m}" if v else m for v, m in zip(chunk['vendor'], chunk['memo'])]
+    return column
+
+
+# --- 出力ファイル形式 ---
+
+class ExportRenderer:
+    """整形済みの行をバイト列に変換する出力形式"""
+    media_type = "application/octet-stream"
+    content_type = "application/octet-stream"
+    extension = "bin"
+    # ステートレスでワーカープロセスでの並列整形に対応しているか
+    supports_parallel = False
+
+    def __init__(self, spec: "ExportFormatSpec"):
+        self.spec = spec
+
+    def begin(self, header: List[str]) -> bytes:
+        return b''
+
+    def render(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        raise NotImplementedError
+
+    def end(self) -> bytes:
+        return b''
+
+
+class CsvRenderer(ExportRenderer):
+    """BOM付きUTF-8のCSV"""
+    media_type = "text/csv"
+    content_type = "text/csv; charset=utf-8-sig"
+    extension = "csv"
+    supports_parallel = True
+
+    def __init__(self, spec: "ExportFormatSpec"):
+        super().__init__(spec)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, quoting=spec.options.get('quoting', csv.QUOTE_MINIMAL))
+
+    def _flush(self) -> bytes:
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        return data
+
+    def begin(self, header: List[str]) -> bytes:
+        self._writer.writerow(header)
+        return UTF8_BOM + self._flush()
+
+    def render(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        self._writer.writerows(rows)
+        return self._flush()
+
+
+_RENDERERS: Dict[str, Callable[["ExportFormatSpec"], ExportRenderer]] = {}
+
+
+def register_renderer(name: str, factory: Callable[["ExportFormatSpec"], ExportRenderer]) -> None:
+    """出力ファイル形式を登録"""
+    _RENDERERS[name] = factory
+
+
+register_renderer("csv", CsvRenderer)
+
+
+# --- 会計ソフト形式 ---
+
+@dataclass
+class ExportFormatSpec:
+    """会計ソフトごとの出力形式"""
+    name: str
+    label: str
+    description: str
+    columns: List[Tuple[str, ColumnFormatter]]
+    renderer: str = "csv"
+    options: Dict[str, Any] = field(default_factory=dict)
+    # ファイル名に付ける接尾辞（標準形式は付けない）
+    filename_suffix: Optional[str] = None
+
+    @property
+    def header(self) -> List[str]:
+        return [title for title, _ in self.columns]
+
+    def format_chunk(self, chunk: ColumnChunk) -> Iterable[Tuple[Any, ...]]:
+        """列ごとに整形してから行に組み直す"""
+        return zip(*(formatter(chunk) for _, formatter in self.columns))
+
+    def create_renderer(self) -> ExportRenderer:
+        return _RENDERERS[self.renderer](self)
+
+    @property
+    def media_type(self) -> str:
+        return _RENDERERS[self.renderer].media_type
+
+    @property
+    def content_type(self) -> str:
+        return _RENDERERS[self.renderer].content_type
+
+    @property
+    def extension(self) -> str:
+        return _RENDERERS[self.renderer].extension
+
+    def filename(self, now: Optional[datetime] = None) -> str:
+        suffix = self.filename_suffix if self.filename_suffix is not None else f"_{self.name}"
+        timestamp = (now or datetime.now()).strftime('%Y%m%d_%H%M%S')
+        return f"journal_export{suffix}_{timestamp}.{self.extension}"
+
+
+_FORMATS: Dict[str, ExportFormatSpec] = {}
+
+
+def register_format(spec: ExportFormatSpec) -> ExportFormatSpec:
+    """会計ソフト形式を登録（同名は上書き）"""
+    if spec.renderer not in _RENDERERS:
+        raise ValueError(f"Unknown export renderer: {spec.renderer}")
+    _FORMATS[spec.name] = spec
+    return spec
+
+
+def get_format(name: str) -> Optional[ExportFormatSpec]:
+    return _FORMATS.get(name)
+
+
+def list_formats() -> List[ExportFormatSpec]:
+    return list(_FORMATS.values())
+
+
+# 標準形式（現在の形式を改善）
+register_format(ExportFormatSpec(
+    name="standard",
+    label="標準形式",
+    description="シンプルな汎用形式",
+    filename_suffix="",
+    columns=[
+        ('日付', date('issue_date', '%Y-%m-%d')),
+        ('取引先', text('vendor')),
+        ('摘要', text('memo')),
+        ('借方科目', text('debit_account')),
+        ('借方金額', amount('debit_amount')),
+        ('貸方科目', text('credit_account')),
+        ('貸方金額', amount('credit_amount')),
+        ('税率', lambda chunk: [f"{int(r * 100)}%" if r else '' for r in chunk['tax_rate']]),
+        ('消費税', amount('tax')),
+        ('ステータス', mapped('status', {'confirmed': '確認済'}, '未確認')),
+    ],
+))
+
+# 弥生会計形式
+register_format(ExportFormatSpec(
+    name="yayoi",
+    label="弥生会計",
+    description="弥生会計インポート対応形式",
+    options={'quoting': csv.QUOTE_ALL},
+    columns=[
+        ('伝票日付', date('issue_date', '%Y/%m/%d')),
+        ('伝票番号', template("R{:06d}", 'receipt_id')),  # 領収書番号
+        ('借方科目', text('debit_account', '経費')),
+        ('借方補助', const('')),
+        ('借方税区分', mapped('tax_rate', {0.10: '課税仕入 10%'}, '課税仕入 8%')),
+        ('借方金額', amount('debit_amount')),
+        ('貸方科目', text('credit_account', '現金')),
+        ('貸方補助', const('')),
+        ('貸方税区分', const('')),  # 貸方は非課税
+        ('貸方金額', amount('credit_amount')),
+        ('摘要', vendor_memo(' - ')),
+        ('証憑番号', template("V{:03d}R{:06d}", 'video_id', 'receipt_id')),
+    ],
+))
+
+# freee形式
+register_format(ExportFormatSpec(
+    name="freee",
+    label="freee",
+    description="クラウド会計freee対応形式",
+    columns=[
+        ('発生日', date('issue_date', '%Y-%m-%d')),
+        ('勘定科目', text('debit_account', '経費')),
+        ('税区分', mapped('tax_rate', {0.10: '課税仕入10%'}, '課税仕入8%')),
+        ('金額', amount('total', thousands=False)),
+        ('取引先', text('vendor')),
+        ('品目', text('memo')),
+        ('部門', const('')),
+        ('メモタグ', const('')),
+        ('備考', template("動画{}より", 'video_id')),
+        ('証憑ID', template("R{:06d}", 'receipt_id')),
+    ],
+))
+
+# MoneyForward形式
+register_format(ExportFormatSpec(
+    name="moneyforward",
+    label="MoneyForward",
+    description="マネーフォワード対応形式",
+    columns=[
+        ('取引日', date('issue_date', '%Y/%m/%d')),
+        ('摘要', vendor_memo(' ')),
+        ('借方勘定科目', text('debit_account', '経費')),
+        ('借方金額', amount('debit_amount', thousands=False)),
+        ('貸方勘定科目', text('credit_account', '現金')),
+        ('貸方金額', amount('credit_amount', thousands=False)),
+        ('税率', mapped('tax_rate', {0.10: '10%', 0.08: '8%'}, '0%')),
+        ('消費税額', amount('tax', thousands=False)),
+        ('タグ', template("領収書{}", 'receipt_id')),
+    ],
+))
+
+
+# --- 実行 ---
+
+def _iter_column_chunks(bind, query, chunk_rows: int) -> Iterator[ColumnChunk]:
+    """サーバーサイドカーソル（yield_per）でチャンクごとに読み込む"""
+    with Session(bind=bind) as session:
+        result = session.execute(query.execution_options(yield_per=chunk_rows))
+        for rows in result.partitions():
+            yield to_column_chunk(rows)
+
+
+def _report_chunks(chunks: Iterator[ColumnChunk], on_chunk: Callable[[int], None]) -> Iterator[ColumnChunk]:
+    for chunk in chunks:
+        on_chunk(len(chunk['receipt_id']))
+        yield chunk
+
+
+def _render_chunk(format_name: str, chunk: ColumnChunk) -> bytes:
+    """ワーカープロセスで1チャンクを整形する"""
+    spec = get_format(format_name)
+    return spec.create_renderer().render(spec.format_chunk(chunk))
+
+
+def iter_export(
+    bind,
+    query,
+    spec: ExportFormatSpec,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    parallel: Optional[bool] = None,
+    on_chunk: Optional[Callable[[int], None]] = None
+) -> Iterator[bytes]:
+    """
+    エクスポートをチャンク単位で生成するジェネレーター
+
+    メモリ使用量は行数によらず一定。レスポンス送信中も接続を保持するため、
+    リクエストとは別のセッションを使う。parallel=True の場合は整形を
+    ワーカープロセスで行い、その間に次のチャンクを読み込む。
+    on_chunk には各チャンクの行数が渡される（進捗報告用）。
+    """
+    if parallel is None:
+        parallel = EXPORT_PARALLEL_FORMATTING
+    renderer = spec.create_renderer()
+    chunks = _iter_column_chunks(bind, query, chunk_rows)
+    if on_chunk:
+        chunks = _report_chunks(chunks, on_chunk)
+
+    yield renderer.begin(spec.header)
+
+    if parallel and renderer.supports_parallel:
+        # 登録済みの形式名だけを渡し、ワーカー側で同じ仕様を引く
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_render_chunk, spec.name, chunk))
+                if len(pending) >= PARALLEL_MAX_IN_FLIGHT:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        for chunk in chunks:
+            yield renderer.render(spec.format_chunk(chunk))
+
+    tail = renderer.end()
+    if tail:
+        yield tail
@@ -0,0 +1,214 @@
+"""
+非同期エクスポートジョブ
+
+月末の年度一括エクスポートなど大きな出力をバックグラウンドで実行し、
+gzip圧縮したファイルを成果物として保存する。成果物は
+(ユーザー, フィルター, 形式, データバージョン) のキーでキャッシュし、
+同じ条件のエクスポートは再生成せずに返す。
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ExportJob, JournalEntry, Receipt
+from services.export_engine import build_export_query, get_format, iter_export
+from services.profiling import profile_job
+
+logger = logging.getLogger(__name__)
+
+# 成果物の保存先（/uploads として静的公開されるディレクトリには置かない）
+EXPORT_ARTIFACT_DIR = os.getenv("EXPORT_ARTIFACT_DIR", "export_artifacts")
+
+# 成果物の保持時間
+EXPORT_ARTIFACT_TTL_HOURS = float(os.getenv("EXPORT_ARTIFACT_TTL_HOURS", "24"))
+
+# 進捗をDBへ書き込む間隔（行数）
+PROGRESS_COMMIT_ROWS = 10000
+
+# 再起動などで止まったまま更新されないジョブは再利用しない
+STALE_JOB_SECONDS = 3600
+
+
+def compute_data_version(db: Session) -> str:
+    """仕訳・領収書の更新状況からデータバージョンを算出"""
+    versions = []
+    for model in (JournalEntry, Receipt):
+        row = db.execute(select(
+            func.max(model.updated_at),
+            func.max(model.created_at),
+            func.count(model.id)  # 削除も検知する
+        )).one()
+        versions.append([str(value) for value in row])
+    return hashlib.sha256(json.dumps(versions).encode()).hexdigest()[:16]
+
+
+def normalize_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """キャッシュキー・保存用にフィルターを正規化（値がないものは除く）"""
+    normalized = {}
+    for key, value in sorted(filters.items()):
+        if value is None or value == "":
+            continue
+        normalized[key] = value.isoformat() if isinstance(value, datetime) else value
+    return normalized
+
+
+def make_cache_key(user_id: Optional[int], filters: Dict[str, Any], format: str, data_version: str) -> str:
+    payload = json.dumps([user_id, normalize_filters(filters), format, data_version], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def artifact_exists(job: ExportJob) -> bool:
+    return bool(job.artifact_path) and os.path.exists(job.artifact_path)
+
+
+def find_reusable_job(db: Session, cache_key: str) -> Optional[ExportJob]:
+    """同じキーで完了済み（成果物あり）または実行中のジョブを探す"""
+    jobs = db.query(ExportJob).filter(
+        ExportJob.cache_key == cache_key,
+        ExportJob.status.in_(["queued", "processing", "done"])
+    ).order_by(ExportJob.id.desc()).all()
+
+    for job in jobs:
+        if job.status == "done":
+            if artifact_exists(job):
+                return job
+        elif not _is_stale(job):
+            return job
+    return None
+
+
+def _is_stale(job: ExportJob) -> bool:
+    last_update = job.updated_at or job.created_at
+    if last_update is None:
+        return False
+    if last_update.tzinfo is None:
+        last_update = last_update.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - last_update).total_seconds() > STALE_JOB_SECONDS
+
+
+def create_export_job(db: Session, user_id: Optional[int], filters: Dict[str, Any], format: str) -> ExportJob:
+    """ジョブを登録（実行は run_export_job で行う）"""
+    data_version = compute_data_version(db)
+    job = ExportJob(
+        user_id=user_id,
+        format=format,
+        filters_json=json.dumps(normalize_filters(filters), ensure_ascii=False),
+        data_version=data_version,
+        cache_key=make_cache_key(user_id, filters, format, data_version),
+        status="queued",
+        rows_written=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def job_filters(job: ExportJob) -> Dict[str, Any]:
+    return json.loads(job.filters_json) if job.filters_json else {}
+
+
+def purge_expired_artifacts(artifact_dir: str = EXPORT_ARTIFACT_DIR) -> int:
+    """保持時間を過ぎた成果物を削除"""
+    if not os.path.isdir(artifact_dir):
+        return 0
+
+    cutoff = time.time() - EXPORT_ARTIFACT_TTL_HOURS * 3600
+    removed = 0
+    for name in os.listdir(artifact_dir):
+        path = os.path.join(artifact_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"期限切れのエクスポート成果物を削除: {removed}件")
+    return removed
+
+
+def _write_artifact(db: Session, job: ExportJob, artifact_dir: str) -> None:
+    spec = get_format(job.format)
+    if not spec:
+        raise ValueError(f"未対応のエクスポート形式です: {job.format}")
+
+    filters = job_filters(job)
+    query = build_export_query(
+        video_id=filters.get("video_id"),
+        start_date=datetime.fromisoformat(filters["start_date"]) if filters.get("start_date") else None,
+        end_date=datetime.fromisoformat(filters["end_date"]) if filters.get("end_date") else None,
+        status=filters.get("status")
+    )
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    path = os.path.join(artifact_dir, f"{job.cache_key}.{spec.extension}.gz")
+    partial_path = f"{path}.part"
+
+    rows = {"written": 0, "committed": 0}
+    # SQLiteは読み込み中のカーソルがあると書き込みがロック待ちになるため、途中経過は保存しない
+    report_progress = db.get_bind().dialect.name != "sqlite"
+
+    def on_chunk(count: int):
+        rows["written"] += count
+        if report_progress and rows["written"] - rows["committed"] >= PROGRESS_COMMIT_ROWS:
+            job.rows_written = rows["written"]
+            db.commit()
+            rows["committed"] = rows["written"]
+
+    with gzip.open(partial_path, "wb", compresslevel=6) as f:
+        for data in iter_export(db.get_bind(), query, spec, on_chunk=on_chunk):
+            f.write(data)
+    os.replace(partial_path, path)
+
+    job.rows_written = rows["written"]
+    job.artifact_path = path
+    job.artifact_size = os.path.getsize(path)
+
+
+@profile_job("export")
+def run_export_job(job_id: int, artifact_dir: str = EXPORT_ARTIFACT_DIR, session_factory=SessionLocal) -> None:
+    """バックグラウンドタスク: エクスポートを実行して成果物を保存"""
+    db = session_factory()
+    try:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if not job:
+            logger.error(f"エクスポートジョブが見つかりません: {job_id}")
+            return
+
+        job.status = "processing"
+        db.commit()
+        logger.info(f"エクスポートジョブ開始: ID={job_id}, format={job.format}")
+
+        start = time.perf_counter()
+        _write_artifact(db, job, artifact_dir)
+
+        job.status = "done"
+        job.completed_at = datetime.utcnow()
+        db.commit()
+        logger.info(
+            f"エクスポートジョブ完了: ID={job_id}, rows={job.rows_written}, "
+            f"size={job.artifact_size}B, {time.perf_counter() - start:.1f}s"
+        )
+    except Exception as e:
+        logger.error(f"エクスポートジョブエラー: ID={job_id}, {e}", exc_info=True)
+        db.rollback()
+        try:
+            job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+            if job:
+                job.status = "error"
+                job.error_message = str(e)[:500]
+                db.commit()
+        except Exception:
+            db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,281 @@
+"""
+ファイル配信（Range対応）
+
+動画などの大きなファイルを、条件付きリクエスト（ETag / Last-Modified /
+If-Range）と Range 要求（単一・サフィックス・複数範囲）に対応して配信する。
+サーバーが ASGI のゼロコピー拡張（http.response.zerocopysend /
+http.response.pathsend）に対応していればカーネルの sendfile に任せ、
+対応していない場合は大きめのアラインされたチャンクを pread で読み出して送る。
+"""
+import os
+import secrets
+import stat as stat_module
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# 1回の読み出しサイズ（アラインメントの倍数）
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
+# 読み出し位置のアラインメント（ページキャッシュ・ストレージのブロック境界に合わせる）
+STREAM_ALIGNMENT = 64 * 1024
+
+# 1リクエストで受け付ける範囲の最大数（これを超える Range ヘッダーは無視して全体を返す）
+MAX_RANGES = 16
+
+ByteRange = Tuple[int, int]
+
+
+class RangeNotSatisfiable(Exception):
+    """満たせる範囲が1つもない Range 要求"""
+
+
+@dataclass(frozen=True)
+class FileInfo:
+    """配信に必要なファイル情報（stat 1回分）"""
+    size: int
+    mtime: float
+    etag: str
+    last_modified: str
+
+
+def get_file_info(path) -> FileInfo:
+    """ファイル情報を取得（通常ファイルでなければ FileNotFoundError）"""
+    st = os.stat(path)
+    if not stat_module.S_ISREG(st.st_mode):
+        raise FileNotFoundError(path)
+    return FileInfo(
+        size=st.st_size,
+        mtime=st.st_mtime,
+        etag=f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+        last_modified=formatdate(st.st_mtime, usegmt=True),
+    )
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[ByteRange]]:
+    """
+    Range ヘッダーを解析して (開始, 終了) の一覧を返す（終了は含む）
+
+    構文が不正な場合や bytes 以外の単位、範囲数が多すぎる場合は None を返し、
+    ヘッダーは無視する（RFC 9110）。満たせる範囲がない場合は RangeNotSatisfiable。
+    重なる範囲・隣接する範囲はまとめる。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    specs = [s.strip() for s in spec.split(",") if s.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in specs:
+        first, sep, last = item.partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if start < 0 or (last and end < start):
+                    return None
+            else:
+                # サフィックス範囲（末尾 N バイト）
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start = max(0, size - suffix)
+                end = size - 1
+        except ValueError:
+            return None
+
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def if_range_matches(value: str, info: FileInfo) -> bool:
+    """If-Range の条件がファイルと一致するか（ETag は強い比較のみ）"""
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        return value == info.etag
+    timestamp = _parse_http_date(value)
+    return timestamp is not None and int(info.mtime) == int(timestamp)
+
+
+def is_not_modified(headers: Mapping[str, str], info: FileInfo) -> bool:
+    """If-None-Match / If-Modified-Since により 304 を返せるか"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or info.etag in tags or f"W/{info.etag}" in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        timestamp = _parse_http_date(if_modified_since)
+        return timestamp is not None and int(info.mtime) <= int(timestamp)
+    return False
+
+
+def _aligned_chunks(start: int, end: int, chunk_size: int):
+    """[start, end] を、2つ目以降の読み出し位置がアラインメント境界になるよう分割"""
+    position = start
+    while position <= end:
+        # chunk_size はアラインメントの倍数なので、次の読み出し位置は必ず境界になる
+        chunk_end = min(end + 1, position - position % STREAM_ALIGNMENT + chunk_size)
+        yield position, chunk_end - position
+        position = chunk_end
+
+
+class RangeFileResponse(Response):
+    """
+    Range・条件付きリクエスト対応のファイルレスポンス
+
+    - 200: 全体（Range なし、If-Range 不一致、無効な Range）
+    - 206: 単一範囲、または multipart/byteranges による複数範囲
+    - 304: If-None-Match / If-Modified-Since に一致
+    - 416: 満たせる範囲がない
+    """
+
+    def __init__(
+        self,
+        path,
+        request_headers: Mapping[str, str],
+        media_type: str,
+        method: str = "GET",
+        info: Optional[FileInfo] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        self.path = str(path)
+        self.info = info or get_file_info(path)
+        self.send_body = method.upper() != "HEAD"
+        self.chunk_size = max(STREAM_ALIGNMENT, chunk_size - chunk_size % STREAM_ALIGNMENT)
+        self.content_type = media_type
+        self.media_type = None
+        self.background = None
+        self.ranges: List[ByteRange] = []
+        self.boundary: Optional[str] = None
+
+        response_headers = {
+            "accept-ranges": "bytes",
+            "etag": self.info.etag,
+            "last-modified": self.info.last_modified,
+        }
+        response_headers.update(headers or {})
+
+        size = self.info.size
+        if is_not_modified(request_headers, self.info):
+            self.status_code = 304
+        else:
+            self.status_code = 200
+            range_header = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            if range_header and size > 0 and (if_range is None or if_range_matches(if_range, self.info)):
+                try:
+                    self.ranges = parse_range_header(range_header, size) or []
+                except RangeNotSatisfiable:
+                    self.status_code = 416
+                    response_headers["content-range"] = f"bytes */{size}"
+                    response_headers["content-length"] = "0"
+            if self.ranges:
+                self.status_code = 206
+
+        if self.status_code == 200:
+            self.ranges = [(0, size - 1)] if size else []
+            response_headers["content-type"] = media_type
+            response_headers["content-length"] = str(size)
+        elif self.status_code == 206:
+            if len(self.ranges) == 1:
+                start, end = self.ranges[0]
+                response_headers["content-type"] = media_type
+                response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+                response_headers["content-length"] = str(end - start + 1)
+            else:
+                self.boundary = secrets.token_hex(16)
+                response_headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+                response_headers["content-length"] = str(self._multipart_length())
+
+        self.init_headers(response_headers)
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.info.size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("latin-1")
+
+    def _multipart_length(self) -> int:
+        length = len(self._closing())
+        for start, end in self.ranges:
+            length += len(self._part_header(start, end)) + (end - start + 1) + 2
+        return length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.ranges:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        whole_file = self.status_code == 200
+        if whole_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        zerocopy = "http.response.zerocopysend" in extensions
+        file = await anyio.to_thread.run_sync(open, self.path, "rb", 0)
+        try:
+            fd = file.fileno()
+            for start, end in self.ranges:
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._part_header(start, end), "more_body": True})
+
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": True,
+                    })
+                else:
+                    for offset, length in _aligned_chunks(start, end, self.chunk_size):
+                        data = await anyio.to_thread.run_sync(os.pread, fd, length, offset)
+                        if not data:
+                            break
+                        await send({"type": "http.response.body", "body": data, "more_body": True})
+
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+
+            await send({"type": "http.response.body", "body": self._closing() if self.boundary else b""})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
@@ -0,0 +1,321 @@
+"""
+フレーム選択エンジンの共通インターフェース
+
+これまで3つのフレーム選択がそれぞれ動画をデコードし、別々のスコアで選んでいた。
+
+- receipt:  video_processing.select_receipt_frames（/analyze。文書検出・NMS・OCR込み）
+- smart:    SmartFrameExtractor.extract_smart_frames（VideoAnalyzer.extract_frames）
+- interval: 1.5秒ごとのサンプリング＋品質順の選別（アップロード時の process_video_ocr_sync）
+
+FrameSelector を実装して register_selector で登録し、get_frame_selector で取得する。
+FRAME_SELECTOR を設定するとすべての呼び出し元で同じエンジンを使う（未設定なら呼び出し元の既定）。
+デコード（指定フレームの読み出し・元解像度の読み直し）と品質の特徴量
+（video_processing.quality.batch_frame_stats）は各エンジンで共通の関数を使う。
+
+エンジンの比較は scripts/benchmark_frame_selectors.py（レシートの再現率・OCR回数・処理時間）。
+"""
+import os
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+
+from services.processing_metrics import stage
+from video_processing.quality import batch_frame_stats, stack_gray
+from video_processing.types import SelectedFrame
+
+logger = logging.getLogger(__name__)
+
+# すべての呼び出し元で使うフレーム選択エンジン（receipt / smart / interval、未設定なら呼び出し元の既定）
+FRAME_SELECTOR = os.getenv("FRAME_SELECTOR", "").strip().lower()
+
+# 読み出すフレームがこれ以上離れていればシークする（秒。近ければ grab で読み進める）
+SEEK_SECONDS = 2.0
+
+
+# ---------------------------------------------------------------------------
+# 共通のデコード・特徴量
+# ---------------------------------------------------------------------------
+
+def video_info(video_path: str) -> Tuple[float, int]:
+    """(fps, フレーム数)"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or 0.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def iter_frames_at(video_path: str, frame_numbers: Iterable[int],
+                   seek_seconds: float = SEEK_SECONDS) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    指定したフレーム番号のフレームを (フレーム番号, フレーム) の順に読む
+
+    元動画はキーフレーム間隔が長いことが多く、シークのたびにキーフレームから
+    デコードし直すことになるため、近いフレームはシークせずに grab で読み進める。
+    読めなかったフレームは飛ばす。
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        position = 0  # 次に読むフレーム番号
+        for target in sorted(set(frame_numbers)):
+            if target < position or target - position > fps * seek_seconds:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+
+            ret = True
+            while ret and position < target:
+                ret = cap.grab()
+                position += 1
+            if ret:
+                ret, frame = cap.read()
+                position += 1
+            if ret:
+                yield target, frame
+    finally:
+        cap.release()
+
+
+def read_full_resolution(video_path: str, times_ms: Iterable[int],
+                         seek_seconds: float = SEEK_SECONDS) -> Dict[int, np.ndarray]:
+    """指定した時刻（ミリ秒）のフレームを元動画から読む（読めなかった時刻は含めない）"""
+    fps, _ = video_info(video_path)
+    fps = fps or 30
+    by_frame: Dict[int, List[int]] = {}
+    for time_ms in times_ms:
+        by_frame.setdefault(int(round(time_ms * fps / 1000)), []).append(time_ms)
+    frames = {}
+    for frame_number, frame in iter_frames_at(video_path, by_frame, seek_seconds):
+        for time_ms in by_frame[frame_number]:
+            frames[time_ms] = frame
+    return frames
+
+
+def frame_features(frames: List[np.ndarray], edges: bool = True) -> Dict[str, np.ndarray]:
+    """同じサイズのフレームの品質の特徴量（鮮明度・明るさ・コントラスト・ヒストグラム・エッジ）"""
+    return batch_frame_stats(stack_gray(frames), edges=edges)
+
+
+# ---------------------------------------------------------------------------
+# エンジン
+# ---------------------------------------------------------------------------
+
+class FrameSelector(ABC):
+    """フレーム選択エンジン"""
+
+    name = ""
+    # OCR・レシート情報の抽出まで行う（SelectedFrame.ocr_text・metadata['receipt_info']）
+    runs_ocr = False
+
+    @abstractmethod
+    def select(self, video_path: str, output_dir: str, stem: str,
+               proxy_path: Optional[str] = None, target_min: int = 7,
+               target_max: int = 15) -> List[SelectedFrame]:
+        """
+        フレームを選択し、元解像度の画像を output_dir に保存する
+
+        Args:
+            video_path: 元動画（保存する画像はこの解像度）
+            output_dir: 画像の保存先
+            stem: 画像のファイル名の接頭辞（receipt・smart は動画のファイル名を使うため無視する）
+            proxy_path: 低解像度プロキシ（あればサンプリング・評価はプロキシで行う）
+            target_min: 選択するフレーム数の目安（最小）
+            target_max: 選択するフレーム数の上限
+
+        Returns:
+            時刻順の SelectedFrame（crop_path が保存した画像）
+        """
+
+
+_SELECTORS: Dict[str, Type[FrameSelector]] = {}
+
+
+def register_selector(name: str):
+    """FrameSelector の実装を登録するデコレーター"""
+    def decorator(cls: Type[FrameSelector]) -> Type[FrameSelector]:
+        cls.name = name
+        _SELECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def available_selectors() -> List[str]:
+    return sorted(_SELECTORS)
+
+
+def get_frame_selector(name: Optional[str] = None, default: str = "receipt") -> FrameSelector:
+    """
+    フレーム選択エンジンを取得
+
+    name を指定しなければ FRAME_SELECTOR、未設定なら default を使う。
+    """
+    name = (name or FRAME_SELECTOR or default).lower()
+    if name not in _SELECTORS:
+        raise ValueError(f"Unknown frame selector: {name} (available: {', '.join(available_selectors())})")
+    return _SELECTORS[name]()
+
+
+def to_frame_data(frame: SelectedFrame) -> Dict:
+    """run_video_analysis のフォールバック処理が使うフレーム情報の辞書"""
+    metadata = frame.metadata or {}
+    return {
+        'time_ms': int(round(frame.time_s * 1000)),
+        'frame_path': frame.crop_path,
+        'quality_score': frame.score,
+        'sharpness': metadata.get('sharpness', 0.0),
+        'brightness': metadata.get('brightness', 0.0),
+        'contrast': metadata.get('contrast', 0.0),
+        'phash': frame.phash,
+    }
+
+
+def to_receipt_data(frame: SelectedFrame) -> Optional[Dict]:
+    """
+    OCR込みのエンジンが抽出したレシート情報（metadata['receipt_info']）を process_video_ocr_sync の
+    receipt_data の形（日付は issue_date、値のない項目は含めない）にする。店舗名がなければ None
+    """
+    info = (frame.metadata or {}).get('receipt_info') or {}
+    if not info.get('vendor'):
+        return None
+    data = {key: info.get(key) for key in ('vendor', 'total', 'subtotal', 'tax', 'tax_rate', 'currency',
+                                           'payment_method', 'document_type')}
+    data['issue_date'] = info.get('date')
+    return {key: value for key, value in data.items() if value is not None}
+
+
+@register_selector("receipt")
+class ReceiptFrameSelector(FrameSelector):
+    """文書検出・品質スコア・NMS・OCR・テキスト重複除去（video_processing）"""
+
+    runs_ocr = True
+
+    def select(self, video_path, output_dir, stem, proxy_path=None, target_min=7, target_max=15):
+        from video_processing import select_receipt_frames
+
+        # 切り出し画像のファイル名は select_receipt_frames が決める（stem は使わない）
+        return select_receipt_frames(
+            video_path=video_path,
+            target_min=target_min,
+            target_max=target_max,
+            proxy_path=proxy_path,
+            output_dir=output_dir
+        )
+
+
+@register_selector("smart")
+class SmartFrameSelector(FrameSelector):
+    """全フレームの品質評価＋pHash の重複除去＋時間的な均等選択（SmartFrameExtractor）"""
+
+    def __init__(self, sample_fps: int = 10):
+        self.sample_fps = sample_fps
+
+    def select(self, video_path, output_dir, stem, proxy_path=None, target_min=7, target_max=15):
+        from services.smart_frame_extractor import SmartFrameExtractor
+
+        # 画像のファイル名は SmartFrameExtractor が決める（stem は使わない）
+        frames = SmartFrameExtractor().extract_smart_frames(video_path, sample_fps=self.sample_fps,
+                                                            proxy_path=proxy_path, output_dir=output_dir)
+        return [
+            SelectedFrame(
+                time_s=frame['time_ms'] / 1000,
+                score=frame['quality_score'],
+                doc_quad=None,
+                crop_path=frame['frame_path'],
+                phash=str(frame['phash']),
+                metadata=dict(frame['quality_details']),
+            )
+            for frame in frames
+        ]
+
+
+@register_selector("interval")
+class IntervalFrameSelector(FrameSelector):
+    """一定間隔のサンプリング＋品質順の選別（間隔を空けて上位から選ぶ）"""
+
+    def __init__(self, interval_s: float = 1.5, min_gap_ms: int = 1500, min_score: float = 10,
+                 jpeg_quality: int = 95):
+        self.interval_s = interval_s
+        self.min_gap_ms = min_gap_ms
+        self.min_score = min_score
+        self.jpeg_quality = jpeg_quality
+
+    def score(self, frames: List[np.ndarray]) -> List[Dict[str, float]]:
+        """鮮明度・明るさ・コントラスト・エッジの総合スコア"""
+        if not frames:
+            return []
+        stats = frame_features(frames)
+        scores = []
+        for i in range(len(frames)):
+            sharpness = float(stats['laplacian_var'][i])
+            brightness = float(stats['mean'][i])
+            contrast = float(stats['std'][i])
+            edge_density = float(stats['edge_mean'][i])
+            scores.append({
+                'quality_score': (
+                    sharpness * 0.4 +  # 鮮明度重視
+                    (brightness / 255.0) * 100 * 0.2 +  # 適度な明るさ
+                    contrast * 0.2 +  # コントラスト
+                    edge_density * 0.2  # エッジ（テキストの可能性）
+                ),
+                'sharpness': sharpness,
+                'brightness': brightness,
+                'contrast': contrast,
+            })
+        return scores
+
+    def select(self, video_path, output_dir, stem, proxy_path=None, target_min=7, target_max=15):
+        source = proxy_path or video_path
+        fps, total_frames = video_info(source)
+        duration_sec = total_frames / fps if fps > 0 else 0
+
+        with stage("sampling") as sampling:
+            times = [i * self.interval_s for i in range(int(duration_sec / self.interval_s) + 1)]
+            time_by_frame = {int(t * fps): int(t * 1000) for t in times}
+            samples = []
+            for frame_number, frame in iter_frames_at(source, time_by_frame):
+                samples.append((time_by_frame[frame_number], frame))
+                sampling.add(items=1, bytes_decoded=frame.nbytes)
+
+        with stage("scoring", items=len(samples)):
+            scores = self.score([frame for _, frame in samples])
+
+        # 品質順に、時間的に近いフレームを避けて選別
+        ranked = sorted(zip(samples, scores), key=lambda x: x[1]['quality_score'], reverse=True)
+        chosen = []
+        for (time_ms, frame), score in ranked:
+            if len(chosen) >= target_max:
+                break
+            if score['quality_score'] <= self.min_score:
+                continue
+            if any(abs(time_ms - t) < self.min_gap_ms for t, _, _ in chosen):
+                continue
+            chosen.append((time_ms, frame, score))
+
+        # OCR用に元解像度のフレームを取得（読めなければプロキシのフレームを使う）
+        full_frames = {}
+        if proxy_path and chosen:
+            with stage("full_resolution") as reading:
+                full_frames = read_full_resolution(video_path, [time_ms for time_ms, _, _ in chosen])
+                reading.add(items=len(full_frames), bytes_decoded=sum(f.nbytes for f in full_frames.values()))
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        selected = []
+        for time_ms, frame, score in sorted(chosen, key=lambda x: x[0]):
+            frame = full_frames.get(time_ms, frame)
+            path = str(Path(output_dir) / f"{stem}_{time_ms:06d}.jpg")
+            cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            selected.append(SelectedFrame(
+                time_s=time_ms / 1000,
+                score=score['quality_score'],
+                doc_quad=None,
+                crop_path=path,
+                phash='',
+                metadata=score,
+            ))
+        return selected
@@ -0,0 +1,162 @@
+"""
+不足仕訳の一括生成サービス
+
+Journalがない領収書をアンチジョイン1本で抽出し、ID順のチャンクで読み込んで
+仕訳を生成・一括INSERTする。チャンクごとにコミットし、最後に処理した
+領収書IDをカーソルとして返すため、途中から再開できる。
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.orm import Session, joinedload
+
+from models import JournalEntry, Receipt
+from services.journal_generator import JournalGenerator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+@dataclass
+class BackfillProgress:
+    """一括生成の進捗"""
+    total_missing: int = 0
+    receipts_processed: int = 0
+    journals_generated: int = 0
+    chunks_committed: int = 0
+    cursor: Optional[int] = None
+    finished: bool = False
+    errors: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_missing": self.total_missing,
+            "receipts_processed": self.receipts_processed,
+            "journals_generated": self.journals_generated,
+            "chunks_committed": self.chunks_committed,
+            "next_cursor": self.cursor,
+            "finished": self.finished,
+            "errors": self.errors or None,
+        }
+
+
+def _missing_condition():
+    """仕訳が1件もない領収書（NOT EXISTSによるアンチジョイン）"""
+    return ~exists().where(JournalEntry.receipt_id == Receipt.id)
+
+
+def count_missing_receipts(db: Session, after_id: Optional[int] = None) -> int:
+    """仕訳がない領収書数"""
+    query = select(func.count(Receipt.id)).where(_missing_condition())
+    if after_id is not None:
+        query = query.where(Receipt.id > after_id)
+    return db.execute(query).scalar_one()
+
+
+def _fetch_chunk(db: Session, after_id: Optional[int], chunk_size: int) -> List[Receipt]:
+    query = (
+        select(Receipt)
+        .options(joinedload(Receipt.best_frame))
+        .where(_missing_condition())
+        .order_by(Receipt.id)
+        .limit(chunk_size)
+    )
+    if after_id is not None:
+        query = query.where(Receipt.id > after_id)
+    return list(db.execute(query).unique().scalars())
+
+
+def _transaction_date(receipt: Receipt):
+    if receipt.issue_date:
+        return receipt.issue_date.date() if isinstance(receipt.issue_date, datetime) else receipt.issue_date
+    return datetime.now().date()
+
+
+def generate_missing_journals_bulk(
+    db: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    after_id: Optional[int] = None,
+    max_chunks: Optional[int] = None,
+    on_progress: Optional[Callable[[BackfillProgress], None]] = None,
+) -> BackfillProgress:
+    """
+    仕訳がない領収書に対して仕訳を一括生成
+
+    Args:
+        db: DBセッション
+        chunk_size: 1チャンク（1トランザクション）あたりの領収書数
+        after_id: 再開用カーソル。このIDより大きい領収書のみ処理する
+        max_chunks: 1回の呼び出しで処理する最大チャンク数（Noneなら最後まで）
+        on_progress: チャンクのコミットごとに呼ばれるコールバック
+
+    Returns:
+        進捗。finishedがFalseの場合はcursorをafter_idに渡して再開する
+    """
+    progress = BackfillProgress(total_missing=count_missing_receipts(db, after_id), cursor=after_id)
+    logger.info(f"Journalがない領収書数: {progress.total_missing}")
+
+    generator = JournalGenerator(db)
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        receipts = _fetch_chunk(db, progress.cursor, chunk_size)
+        if not receipts:
+            progress.finished = True
+            break
+
+        rows = []
+        for receipt in receipts:
+            try:
+                for entry_data in generator.generate_journal_entries(receipt):
+                    rows.append({
+                        "receipt_id": entry_data.receipt_id,
+                        "video_id": entry_data.video_id,
+                        "time_ms": entry_data.time_ms or 0,
+                        "debit_account": entry_data.debit_account,
+                        "credit_account": entry_data.credit_account,
+                        "debit_amount": entry_data.debit_amount,
+                        "credit_amount": entry_data.credit_amount,
+                        "tax_account": entry_data.tax_account,
+                        "tax_amount": entry_data.tax_amount,
+                        "memo": entry_data.memo,
+                        "status": "unconfirmed",
+                        "transaction_date": _transaction_date(receipt),
+                    })
+            except Exception as e:
+                error_msg = f"Error processing receipt {receipt.id}: {str(e)}"
+                logger.error(error_msg)
+                progress.errors.append(error_msg)
+
+        last_id = receipts[-1].id
+        try:
+            if rows:
+                db.execute(insert(JournalEntry), rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            error_msg = f"Error inserting receipts {receipts[0].id}-{last_id}: {str(e)}"
+            logger.error(error_msg)
+            progress.errors.append(error_msg)
+            # 同じチャンクで失敗し続けないよう、カーソルを進めずに中断する
+            break
+
+        # コミット後はセッション内のオブジェクトを解放してメモリを一定に保つ
+        db.expunge_all()
+
+        chunks += 1
+        progress.chunks_committed += 1
+        progress.receipts_processed += len(receipts)
+        progress.journals_generated += len(rows)
+        progress.cursor = last_id
+        logger.info(
+            f"仕訳一括生成: {progress.receipts_processed}/{progress.total_missing} 件処理 "
+            f"(cursor={progress.cursor}, 生成={progress.journals_generated})"
+        )
+        if on_progress:
+            on_progress(progress)
+
+    return progress
@@ -1,20 +1,26 @@
 import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-import re
 from sqlalchemy.orm import Session
-from models import Vendor, Account, Rule, JournalEntry, Receipt
+from models import JournalEntry, Receipt
 from schemas import JournalEntryCreate, PaymentMethod
+from services.rule_engine import RuleEngine, RuleSnapshot, VendorEntry, rule_engine
 
 logger = logging.getLogger(__name__)
 
 class JournalGenerator:
     """仕訳自動生成サービス"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, engine: Optional[RuleEngine] = None):
         self.db = db
+        self.engine = engine or rule_engine
         self._load_default_accounts()
     
+    @property
+    def rules(self) -> RuleSnapshot:
+        """キャッシュ済みのベンダー・ルール"""
+        return self.engine.get_snapshot(self.db)
+    
     def _load_default_accounts(self):
         """デフォルト勘定科目の初期化"""
         self.default_accounts = {
@@ -87,55 +93,33 @@ class JournalGenerator:
         
         return entries
     
-    def _get_vendor(self, vendor_norm: str) -> Optional[Vendor]:
+    def _get_vendor(self, vendor_norm: str) -> Optional[VendorEntry]:
         """ベンダーマスタから検索"""
-        if not vendor_norm:
-            return None
-        
-        return self.db.query(Vendor).filter(
-            Vendor.name_norm == vendor_norm
-        ).first()
+        return self.rules.get_vendor(vendor_norm)
     
-    def _determine_debit_account(self, receipt: Receipt, vendor: Optional[Vendor]) -> str:
+    def _determine_debit_account(self, receipt: Receipt, vendor: Optional[VendorEntry]) -> str:
         """借方勘定科目の決定"""
         # 1. ベンダーマスタ優先
         if vendor and vendor.default_debit_account:
             return vendor.default_debit_account
         
-        # 2. ルールベース判定
-        rules = self.db.query(Rule).filter(
-            Rule.is_active == True
-        ).order_by(Rule.priority.desc()).all()
+        rules = self.rules
         
-        for rule in rules:
-            if self._match_rule(rule, receipt):
-                if rule.debit_account:
-                    return rule.debit_account
+        # 2. ルールベース判定
+        for rule in rules.iter_matching_rules(receipt.vendor, receipt.total):
+            if rule.debit_account:
+                return rule.debit_account
         
         # 3. 汎用ルール（ベンダー名から推測）
-        if receipt.vendor_norm:
-            vendor_lower = receipt.vendor_norm.lower()
-            
-            # 交通費
-            if any(keyword in vendor_lower for keyword in ['jr', 'taxi', 'タクシー', '鉄道', 'バス']):
-                return self.default_accounts['expenses']['旅費交通費']
-            
-            # 飲食費
-            if any(keyword in vendor_lower for keyword in ['スタバ', 'starbucks', 'カフェ', 'レストラン']):
-                return self.default_accounts['expenses']['会議費']
-            
-            # ガソリン代
-            if any(keyword in vendor_lower for keyword in ['eneos', 'エネオス', 'shell', 'コスモ']):
-                return self.default_accounts['expenses']['旅費交通費']
-            
-            # コンビニ・小売
-            if any(keyword in vendor_lower for keyword in ['セブン', 'ローソン', 'ファミリー', 'amazon']):
-                return self.default_accounts['expenses']['消耗品費']
+        keyword_match = rules.match_keyword(receipt.vendor_norm)
+        if keyword_match:
+            category, name = keyword_match
+            return self.default_accounts[category][name]
         
         # デフォルト
         return self.default_accounts['expenses']['雑費']
     
-    def _determine_credit_account(self, receipt: Receipt, vendor: Optional[Vendor]) -> str:
+    def _determine_credit_account(self, receipt: Receipt, vendor: Optional[VendorEntry]) -> str:
         """貸方勘定科目の決定"""
         # 1. ベンダーマスタ優先
         if vendor and vendor.default_credit_account:
@@ -172,28 +156,6 @@ class JournalGenerator:
         
         return tax_amount, tax_account
     
-    def _match_rule(self, rule: Rule, receipt: Receipt) -> bool:
-        """ルールマッチング"""
-        try:
-            pattern = re.compile(rule.pattern, re.IGNORECASE)
-            
-            if rule.pattern_type == 'vendor':
-                return bool(pattern.search(receipt.vendor or ''))
-            elif rule.pattern_type == 'item':
-                # 品目での判定（将来拡張用）
-                return False
-            elif rule.pattern_type == 'amount_range':
-                # 金額範囲での判定
-                if receipt.total:
-                    return pattern.search(str(receipt.total))
-            
-            # デフォルトはベンダー名で判定
-            return bool(pattern.search(receipt.vendor or ''))
-            
-        except Exception as e:
-            logger.error(f"ルールマッチングエラー: {e}")
-            return False
-    
     def _get_frame_time(self, receipt: Receipt) -> int:
         """レシートのベストフレーム時刻を取得"""
         if receipt.best_frame and receipt.best_frame.time_ms is not None:
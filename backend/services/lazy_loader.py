@@ -0,0 +1,71 @@
+"""
+重いモジュール・クライアントの遅延読み込み
+
+起動時に cv2・scikit-learn・Google Cloud SDK・ストレージ SDK などを読み込むと
+Render のコールドスタートが数秒遅くなる。これらは初回使用時に読み込み、
+/warmup エンドポイント（warm_up）でまとめて前もって読み込めるようにする。
+"""
+import time
+import logging
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(ModuleType):
+    """属性に初めてアクセスした時にモジュールを読み込むプロキシ"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    def _load(self) -> ModuleType:
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> LazyModule:
+    """初回アクセス時に読み込むモジュールを返す（import name の代わり）"""
+    return LazyModule(name)
+
+
+_warmup_tasks: List[Tuple[str, Callable[[], object]]] = []
+
+
+def register_warmup(name: str, task: Callable[[], object]) -> None:
+    """ウォームアップで実行する初期化処理を登録"""
+    _warmup_tasks.append((name, task))
+
+
+def register_module_warmup(*module_names: str) -> None:
+    """ウォームアップで読み込むモジュールを登録"""
+    for module_name in module_names:
+        register_warmup(module_name, lambda module_name=module_name: importlib.import_module(module_name))
+
+
+def warm_up() -> Dict[str, Dict]:
+    """登録された初期化処理を実行し、処理ごとの所要時間（ミリ秒）とエラーを返す"""
+    results = {}
+    for name, task in list(_warmup_tasks):
+        start = time.perf_counter()
+        try:
+            task()
+            error = None
+        except Exception as e:
+            logger.warning(f"ウォームアップ失敗: {name}: {e}")
+            error = str(e)
+        results[name] = {"ms": round((time.perf_counter() - start) * 1000, 1), "error": error}
+    return results
@@ -0,0 +1,277 @@
+"""
+リモートOCR（Vision・Gemini）の前段のゲート
+
+process_video_ocr_sync では、OCRしたフレームの多くが VisionOCRService.extract_receipt_data で
+「Invalid receipt - zero amount」になる（レシートの映っていないフレームにAPIを1往復使っている）。
+そこで安価なローカルの判定を2段で行い、通ったフレームだけをリモートOCRに送る。
+
+1. テキスト領域の検出: ブラックハット＋横方向のクロージングでテキスト行を検出
+   （QualityAssessor._estimate_text_density と同じ考え方）。行が少なければ不合格
+2. 金額・数字の有無の判定: テキスト行の中の「高さ・間隔のそろった細い字形の並び」（数字列）と、
+   右端のそろった行（値段の列）・モーションブラーの有無を見る。OCR_GATE_LOCAL_OCR=true でローカルOCR
+   （video_processing.local_ocr）が使える場合は、代わりにローカルOCRのテキストに金額があるかで判定する
+
+OCRのテキストに金額らしい数字がなければ Gemini による抽出も行わない（has_amount）。
+しきい値は環境変数で変更できる。適合率・再現率は scripts/evaluate_ocr_gate.py で確認する。
+
+合成のサンプルでしか検証していないため、ゲートは既定で無効（OCR_GATE=false）。
+OCR_GATE=shadow では判定だけ行って全フレームをリモートOCRに送り、除外されるはずだったフレームの
+OCRに金額があったか（取りこぼすレシート）を記録する。実際のフレームで取りこぼしがないことを
+確認してから OCR_GATE=true にする。除外した（shadow では除外するはずだった）フレームは
+OCR_GATE_REJECTED_DIR に画像と rejected.jsonl で保存する（record_rejected）。
+"""
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ゲートのモード: false（使わない）・shadow（判定して記録するだけで、すべてのフレームを送る）・
+# true（通らないフレームをリモートOCRに送らない）
+OCR_GATE_MODE = os.getenv("OCR_GATE", "false").lower()
+OCR_GATE_ENABLED = OCR_GATE_MODE == "true"
+OCR_GATE_SHADOW = OCR_GATE_MODE == "shadow"
+
+# 除外したフレームの画像と rejected.jsonl の保存先（空なら保存しない）
+OCR_GATE_REJECTED_DIR = os.getenv("OCR_GATE_REJECTED_DIR", "")
+
+# テキスト行がこれ未満のフレームは送らない
+OCR_GATE_MIN_TEXT_LINES = int(os.getenv("OCR_GATE_MIN_TEXT_LINES", "4"))
+
+# 数字列（3文字以上）がこれ以上あるか、右端のそろった行（値段の列）がこれ以上あり、
+# 行の縦横の勾配の比（モーションブラーで 0 に近づく）がこれ以上なら金額ありとする
+OCR_GATE_MIN_DIGIT_RUNS = int(os.getenv("OCR_GATE_MIN_DIGIT_RUNS", "2"))
+OCR_GATE_MIN_ALIGNED_LINES = int(os.getenv("OCR_GATE_MIN_ALIGNED_LINES", "4"))
+OCR_GATE_MIN_STROKE_BALANCE = float(os.getenv("OCR_GATE_MIN_STROKE_BALANCE", "0.5"))
+
+# 金額・数字の判定にローカルOCRを使う（エンジンが使えなければ字形の判定）
+OCR_GATE_LOCAL_OCR = os.getenv("OCR_GATE_LOCAL_OCR", "false").lower() == "true"
+
+# 判定する画像の幅（これより大きい画像は縮小する）
+OCR_GATE_WIDTH = int(os.getenv("OCR_GATE_WIDTH", "1280"))
+
+# 金額らしい数字（¥1,280・1280円・合計 1280 など）
+_AMOUNT = re.compile(r"[¥￥]\s*\d[\d,]*|\d[\d,]*\s*円|(合計|小計|total|税)\D{0,6}\d[\d,]{2,}|\d{1,3}(,\d{3})+|\d{3,}",
+                     re.IGNORECASE)
+
+
+@dataclass
+class GateResult:
+    """ゲートの判定結果"""
+    passed: bool
+    text_lines: int = 0
+    digit_runs: int = 0
+    aligned_lines: int = 0
+    stroke_balance: float = 0.0
+    reason: str = ""
+    line_boxes: List[Tuple[int, int, int, int]] = field(default_factory=list, repr=False)
+
+
+def has_amount(text: Optional[str]) -> bool:
+    """OCRのテキストに金額らしい数字があるか"""
+    return bool(text) and _AMOUNT.search(text) is not None
+
+
+_rejected_lock = threading.Lock()
+
+
+def record_rejected(image_path: str, result: GateResult, directory: Optional[str] = None, **meta) -> dict:
+    """
+    ゲートで除外したフレームを記録する（ログに出し、directory があれば画像のコピーと rejected.jsonl の1行を保存）
+
+    meta には video_id・frame のほか、shadow モードでは ocr_has_amount（リモートOCRのテキストに
+    金額があったか = 除外すると取りこぼすレシートか）を渡す。
+    """
+    directory = OCR_GATE_REJECTED_DIR if directory is None else directory
+    record = {
+        "source": image_path, "reason": result.reason, "text_lines": result.text_lines,
+        "digit_runs": result.digit_runs, "aligned_lines": result.aligned_lines,
+        "stroke_balance": result.stroke_balance, "created_at": time.time(), **meta,
+    }
+    if meta.get("ocr_has_amount"):
+        logger.warning(f"OCRゲートが金額のあるフレームを除外しています: {image_path} ({result.reason})")
+    else:
+        logger.info(f"OCRゲートで除外: {image_path} ({result.reason})")
+    if not directory:
+        return record
+    try:
+        os.makedirs(directory, exist_ok=True)
+        name = "_".join(str(meta[key]) for key in ("video_id", "frame") if key in meta)
+        name = f"{name or int(record['created_at'] * 1000)}_{os.path.basename(image_path)}"
+        shutil.copyfile(image_path, os.path.join(directory, name))
+        record["file"] = name
+        with _rejected_lock, open(os.path.join(directory, "rejected.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning(f"除外したフレームを保存できません: {image_path}: {e}")
+    return record
+
+
+def detect_text_lines(gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """テキスト行らしい領域 (x, y, w, h) を検出"""
+    height, width = gray.shape
+    # ブラックハット: 明るい紙の上の、カーネルより小さい暗い部分（文字）だけが残る
+    # （勾配と違い、紙の縁・背景との境界は残らない）
+    size = max(9, width // 40)
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    _, binary = cv2.threshold(blackhat, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # 文字の間をつなぐ（行の高さより十分長く、行どうしはつながらない横長のカーネル）
+    joined = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 80), 1)))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    lines = []
+    max_height = max(8, height // 12)
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if not (5 <= h <= max_height and w >= 2.5 * h):
+            continue
+        # 枠線・紙の縁のような細い線は塗りつぶしの割合が低い／高すぎる
+        fill = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+        if 0.2 <= fill <= 0.9:
+            lines.append((x, y, w, h))
+    return lines
+
+
+def _digit_runs(gray: np.ndarray, box: Tuple[int, int, int, int]) -> int:
+    """
+    行の中の数字列らしい字形の並び（3文字以上）の数
+
+    数字は高さがそろい（アセンダー・ディセンダーがない）、幅が狭く、間隔が一定に並ぶ。
+    英大文字も同じ形になるため区別しない（漢字・かなは幅が広いので数えない）。
+    """
+    x, y, w, h = box
+    pad = max(1, h // 4)
+    region = gray[max(0, y - pad):y + h + pad, max(0, x - pad):x + w + pad]
+    # 小さい文字は拡大してから二値化する（縮小・ぼけで隣の字とつながるのを防ぐ）
+    if h < 20:
+        scale = 20.0 / h
+        region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        h = 20
+    # 紙と文字の中間で二値化する（ぼけた文字は Otsu だと太って隣とつながる）
+    ink, paper = np.percentile(region, (3, 90))
+    _, glyphs = cv2.threshold(region, (ink + paper) / 2, 255, cv2.THRESH_BINARY_INV)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(glyphs, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    heights = heights[heights >= 0.3 * h]
+    if len(heights) < 3:
+        return 0
+    # 字の高さの基準は行の高さではなく大きい字形の高さ（傾いた行は枠が字より高くなる）。
+    # 低い成分（カンマ・ピリオド・小文字・ノイズ）は無視する
+    glyph_height = np.percentile(heights, 90)
+    components = sorted(
+        (tuple(stats[i, :4]) for i in range(1, count) if stats[i, cv2.CC_STAT_HEIGHT] >= 0.8 * glyph_height),
+        key=lambda c: c[0]
+    )
+
+    runs, run = 0, []
+    for cx, cy, cw, ch in components:
+        narrow = 0.15 <= cw / float(ch) <= 0.9
+        if run and narrow:
+            px, py, pw, ph = run[-1]
+            same_height = abs(ch - ph) <= max(2, 0.2 * ph)
+            same_baseline = abs((cy + ch) - (py + ph)) <= max(2, 0.2 * ph)
+            close = cx - (px + pw) <= 0.9 * ph
+            if same_height and same_baseline and close:
+                run.append((cx, cy, cw, ch))
+                continue
+        if len(run) >= 3:
+            runs += 1
+        run = [(cx, cy, cw, ch)] if narrow else []
+    if len(run) >= 3:
+        runs += 1
+    return runs
+
+
+def _stroke_balance(gray: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> float:
+    """
+    テキスト行の横方向と縦方向の勾配の比（小さい方 / 大きい方、行の中央値）
+
+    手ぶれ・移動のモーションブラーは一方向の勾配だけを消すため、読めない行は 0 に近づく。
+    """
+    balances = []
+    for x, y, w, h in boxes:
+        region = gray[y:y + h, x:x + w].astype(np.float32)
+        gx = float(np.abs(cv2.Sobel(region, cv2.CV_32F, 1, 0)).mean())
+        gy = float(np.abs(cv2.Sobel(region, cv2.CV_32F, 0, 1)).mean())
+        balances.append(min(gx, gy) / max(gx, gy, 1e-3))
+    return float(np.median(balances)) if balances else 0.0
+
+
+def _aligned_right_edges(boxes: List[Tuple[int, int, int, int]]) -> int:
+    """右端のそろった行の最大数（値段の列）"""
+    if not boxes:
+        return 0
+    edges = sorted(x + w for x, _, w, _ in boxes)
+    tolerance = max(3, int(np.median([h for _, _, _, h in boxes]) * 0.6))
+    best = 0
+    start = 0
+    for end in range(len(edges)):
+        while edges[end] - edges[start] > tolerance:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+class OCRGate:
+    """テキスト領域の検出＋金額・数字の有無の判定"""
+
+    def __init__(self, min_text_lines: int = OCR_GATE_MIN_TEXT_LINES, min_digit_runs: int = OCR_GATE_MIN_DIGIT_RUNS,
+                 min_aligned_lines: int = OCR_GATE_MIN_ALIGNED_LINES,
+                 min_stroke_balance: float = OCR_GATE_MIN_STROKE_BALANCE,
+                 use_local_ocr: bool = OCR_GATE_LOCAL_OCR, width: int = OCR_GATE_WIDTH):
+        self.min_text_lines = min_text_lines
+        self.min_digit_runs = min_digit_runs
+        self.min_aligned_lines = min_aligned_lines
+        self.min_stroke_balance = min_stroke_balance
+        self.width = width
+        self.local_ocr = None
+        if use_local_ocr:
+            from video_processing.config import load_config
+            from video_processing.local_ocr import LocalOCRProcessor, local_engine_available
+            config = load_config()
+            if local_engine_available(config.local_ocr_engine):
+                self.local_ocr = LocalOCRProcessor(config)
+            else:
+                logger.warning(f"Local OCR engine '{config.local_ocr_engine}' not available, using glyph classifier")
+
+    def check_image(self, image: np.ndarray, image_path: Optional[str] = None) -> GateResult:
+        """画像（BGR またはグレースケール）を判定"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if gray.shape[1] > self.width:
+            scale = self.width / gray.shape[1]
+            gray = cv2.resize(gray, (self.width, int(gray.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+        lines = detect_text_lines(gray)
+        if len(lines) < self.min_text_lines:
+            return GateResult(False, len(lines), reason="no text", line_boxes=lines)
+
+        if self.local_ocr is not None and image_path:
+            block = self.local_ocr.process_image(image_path)
+            passed = has_amount(block.text if block else None)
+            return GateResult(passed, len(lines), reason="" if passed else "no amount (local OCR)", line_boxes=lines)
+
+        digit_runs = sum(_digit_runs(gray, box) for box in lines)
+        aligned = _aligned_right_edges(lines)
+        balance = _stroke_balance(gray, lines)
+        # 数字列が読み取れるか、値段の列があってモーションブラーのない行か
+        passed = digit_runs >= self.min_digit_runs or (
+            aligned >= self.min_aligned_lines and balance >= self.min_stroke_balance
+        )
+        return GateResult(passed, len(lines), digit_runs, aligned, round(balance, 3),
+                          "" if passed else "no amount", lines)
+
+    def check(self, image_path: str) -> GateResult:
+        """画像ファイルを判定（読めない画像は通す: 判定できないものはリモートOCRに任せる）"""
+        image = cv2.imread(image_path)
+        if image is None:
+            return GateResult(True, reason="unreadable")
+        return self.check_image(image, image_path)
@@ -0,0 +1,320 @@
+"""
+動画処理ジョブの段階ごとの計測
+
+select_receipt_frames・process_video_ocr_sync・run_video_analysis の各段階について、
+所要時間・処理件数・デコードしたバイト数・OCR/AI の呼び出し回数・メモリ（RSS）を記録する。
+ジョブの最大メモリは段階の境界で計測した RSS の最大値（プロセス開始からの ru_maxrss ではない）。
+
+- ジョブ全体は track()（または instrument_job デコレーター）で囲み、実行中のジョブは
+  contextvar で受け渡す。段階は stage() で囲む（ジョブの外では何もしない）
+- 同じ名前の段階を繰り返し計測すると合算する（フレームごとのループ用）。
+  段階の中の段階は "select_frames.sampling" のように親の名前を付けて記録する
+- ジョブの終了時に processing_metrics テーブルへ1行保存し（処理用セッションとは別の接続）、
+  プロセス内の集計に加えて Prometheus のテキスト形式で出力できるようにする
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import resource
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 計測の有効・無効
+PROCESSING_METRICS_ENABLED = os.getenv("PROCESSING_METRICS_ENABLED", "true").lower() == "true"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb() -> Optional[float]:
+    """現在の RSS（MB、取得できない環境では None）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    """プロセス開始からの最大 RSS（MB）。ジョブごとの値には使わない（Prometheus のプロセスのゲージ用）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageStats:
+    """1つの段階の集計（繰り返し計測した分を合算）"""
+
+    def __init__(self, name: str, offset_ms: float):
+        self.name = name
+        self.offset_ms = offset_ms
+        self.calls = 0
+        self.seconds = 0.0
+        self.counters: Dict[str, int] = {}
+        self.rss_growth_mb = 0.0
+
+    def add(self, **counts: int) -> None:
+        """件数（items・bytes_decoded・ocr_calls・ai_calls など）を加算"""
+        for key, value in counts.items():
+            self.counters[key] = self.counters.get(key, 0) + int(value or 0)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "offset_ms": round(self.offset_ms, 1),
+            "calls": self.calls,
+            "duration_ms": round(self.seconds * 1000, 1),
+            "rss_growth_mb": round(self.rss_growth_mb, 1),
+            **self.counters,
+        }
+
+
+class _NullStage:
+    """ジョブの外で stage() を使った場合の何もしない段階"""
+
+    def add(self, **counts: int) -> None:
+        pass
+
+
+class ProcessingMetrics:
+    """1回のジョブ実行の計測結果"""
+
+    def __init__(self, job: str, video_id: Optional[int] = None, clock=time.perf_counter):
+        self.job = job
+        self.video_id = video_id
+        self.clock = clock
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+        # ジョブ中の最大 RSS（段階の開始・終了時に計測した現在の RSS の最大値）
+        self.peak_rss_mb: Optional[float] = None
+        self.stages: "OrderedDict[str, StageStats]" = OrderedDict()
+        self._started = clock()
+        self._stack: List[str] = []
+        self._sample_rss()
+
+    def _sample_rss(self) -> Optional[float]:
+        """現在の RSS を読み、ジョブ中の最大値を更新して返す"""
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_rss_mb is None or rss > self.peak_rss_mb):
+            self.peak_rss_mb = rss
+        return rss
+
+    @contextmanager
+    def stage(self, name: str, **counts: int):
+        """段階を計測（with の中で返した StageStats.add で件数を加算できる）"""
+        path = ".".join(self._stack + [name])
+        stats = self.stages.get(path)
+        if stats is None:
+            stats = self.stages[path] = StageStats(path, (self.clock() - self._started) * 1000)
+        stats.add(**counts)
+        rss_before = self._sample_rss()
+        self._stack.append(name)
+        start = self.clock()
+        try:
+            yield stats
+        finally:
+            stats.seconds += self.clock() - start
+            stats.calls += 1
+            self._stack.pop()
+            rss_after = self._sample_rss()
+            if rss_before is not None and rss_after is not None:
+                stats.rss_growth_mb = max(stats.rss_growth_mb, rss_after - rss_before)
+
+    def fail(self, error) -> None:
+        """ジョブを失敗として記録（例外を握りつぶす処理の except 節から呼ぶ）"""
+        self.status = "error"
+        self.error = str(error)[:500]
+
+    def finish(self) -> None:
+        if self.status == "running":
+            self.status = "done"
+        self.duration_ms = (self.clock() - self._started) * 1000
+        self._sample_rss()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job": self.job,
+            "video_id": self.video_id,
+            "status": self.status,
+            "error": self.error,
+            "duration_ms": round(self.duration_ms, 1) if self.duration_ms is not None else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "stages": [stats.to_dict() for stats in self.stages.values()],
+        }
+
+    def save(self, bind) -> None:
+        """processing_metrics に保存（処理用セッションとは別の接続で即時コミット）"""
+        from models import ProcessingMetric
+
+        data = self.to_dict()
+        try:
+            with bind.begin() as conn:
+                conn.execute(insert(ProcessingMetric).values(
+                    video_id=self.video_id,
+                    job=self.job,
+                    status=self.status,
+                    duration_ms=data["duration_ms"],
+                    peak_rss_mb=data["peak_rss_mb"],
+                    stages_json=json.dumps(data["stages"], ensure_ascii=False),
+                    error_message=self.error,
+                ))
+        except Exception as e:
+            # 計測結果の保存失敗で処理本体を止めない
+            logger.warning(f"処理の計測結果を保存できません (video_id={self.video_id}): {e}")
+
+
+_current: ContextVar[Optional[ProcessingMetrics]] = ContextVar("processing_metrics", default=None)
+
+
+def current_metrics() -> Optional[ProcessingMetrics]:
+    """実行中のジョブの計測（ジョブの外では None）"""
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str, **counts: int):
+    """実行中のジョブの段階を計測（ジョブの外では何もしない）"""
+    metrics = _current.get()
+    if metrics is None:
+        yield _NullStage()
+        return
+    with metrics.stage(name, **counts) as stats:
+        yield stats
+
+
+def mark_failed(error) -> None:
+    """実行中のジョブを失敗として記録"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.fail(error)
+
+
+@contextmanager
+def track(job: str, video_id: Optional[int] = None, bind=None):
+    """ジョブ全体を計測し、終了時に保存・集計する"""
+    if not PROCESSING_METRICS_ENABLED:
+        yield None
+        return
+    metrics = ProcessingMetrics(job, video_id)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        metrics.finish()
+        registry.observe(metrics)
+        if bind is not None:
+            metrics.save(bind)
+        logger.info(
+            f"{job} (video_id={video_id}) {metrics.status} in {metrics.duration_ms:.0f}ms: "
+            + ", ".join(f"{s.name}={s.seconds * 1000:.0f}ms" for s in metrics.stages.values())
+        )
+
+
+def instrument_job(job: str):
+    """
+    (video_id, ..., db) を受け取るジョブ関数を track() で囲むデコレーター
+
+    db（Session）のエンジンに計測結果を保存する。同期・非同期どちらの関数にも使える。
+    """
+    def _bind(args, kwargs):
+        db = kwargs.get("db") or next((arg for arg in args if isinstance(arg, Session)), None)
+        return db.get_bind() if db is not None else None
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(video_id, *args, **kwargs):
+                with track(job, video_id, _bind(args, kwargs)):
+                    return await func(video_id, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(video_id, *args, **kwargs):
+            with track(job, video_id, _bind(args, kwargs)):
+                return func(video_id, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class MetricsRegistry:
+    """プロセス内の集計（Prometheus のテキスト形式で出力）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs: Dict[tuple, Dict[str, float]] = {}
+        self.stages: Dict[tuple, Dict[str, float]] = {}
+
+    def observe(self, metrics: ProcessingMetrics) -> None:
+        with self._lock:
+            job = self.jobs.setdefault((metrics.job, metrics.status), {"count": 0, "seconds": 0.0})
+            job["count"] += 1
+            job["seconds"] += (metrics.duration_ms or 0) / 1000
+            for stats in metrics.stages.values():
+                totals = self.stages.setdefault((metrics.job, stats.name), {"count": 0, "seconds": 0.0})
+                totals["count"] += stats.calls
+                totals["seconds"] += stats.seconds
+                for key, value in stats.counters.items():
+                    totals[key] = totals.get(key, 0) + value
+
+    def clear(self) -> None:
+        with self._lock:
+            self.jobs.clear()
+            self.stages.clear()
+
+    def render_prometheus(self) -> str:
+        """Prometheus のテキスト形式（text/plain; version=0.0.4）"""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP video_processing_job_duration_seconds Duration of video processing jobs.",
+                "# TYPE video_processing_job_duration_seconds summary",
+            ]
+            for (job, status), values in sorted(self.jobs.items()):
+                labels = f'job="{_escape(job)}",status="{_escape(status)}"'
+                lines.append(f"video_processing_job_duration_seconds_sum{{{labels}}} {values['seconds']:.6f}")
+                lines.append(f"video_processing_job_duration_seconds_count{{{labels}}} {values['count']}")
+
+            lines += [
+                "# HELP video_processing_stage_duration_seconds Time spent in each stage of video processing jobs.",
+                "# TYPE video_processing_stage_duration_seconds summary",
+            ]
+            for (job, name), values in sorted(self.stages.items()):
+                labels = f'job="{_escape(job)}",stage="{_escape(name)}"'
+                lines.append(f"video_processing_stage_duration_seconds_sum{{{labels}}} {values['seconds']:.6f}")
+                lines.append(f"video_processing_stage_duration_seconds_count{{{labels}}} {values['count']}")
+
+            counter_names = sorted({key for values in self.stages.values() for key in values} - {"count", "seconds"})
+            for counter in counter_names:
+                metric = f"video_processing_stage_{counter}_total"
+                lines += [f"# HELP {metric} Total {counter} per stage of video processing jobs.", f"# TYPE {metric} counter"]
+                for (job, name), values in sorted(self.stages.items()):
+                    if counter in values:
+                        lines.append(f'{metric}{{job="{_escape(job)}",stage="{_escape(name)}"}} {values[counter]}')
+
+        lines += [
+            "# HELP process_peak_resident_memory_bytes Peak resident memory of this process.",
+            "# TYPE process_peak_resident_memory_bytes gauge",
+            f"process_peak_resident_memory_bytes {int(peak_rss_mb() * 1024 ** 2)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,241 @@
+"""
+動画処理のユニットオブワーク
+
+動画処理中に生成する Frame / Receipt / JournalEntry をメモリ上に溜め、
+バッチ単位で1トランザクションにまとめて書き込む。進捗表示は処理用の
+セッションとは別の軽量チャネル（videos の進捗列だけのUPDATE）で更新するため、
+進捗のたびに処理中のデータをコミットする必要がない。
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import Frame, JournalEntry, Receipt, Video
+
+logger = logging.getLogger(__name__)
+
+# 1トランザクションで書き込む領収書数
+DEFAULT_BATCH_SIZE = int(os.getenv("PROCESSING_BATCH_SIZE", "20"))
+
+# 進捗更新の最小間隔（秒）。間隔内の更新は間引く
+PROGRESS_MIN_INTERVAL_SECONDS = float(os.getenv("PROGRESS_MIN_INTERVAL_SECONDS", "1.0"))
+
+
+class ProgressChannel:
+    """
+    進捗専用の軽量チャネル
+
+    処理用セッションを使わず、エンジンから借りた接続で videos の
+    進捗列だけを UPDATE して即時コミットする。同じ内容や間隔内の更新は送らない。
+    """
+
+    def __init__(self, bind, video_id: int, min_interval: float = PROGRESS_MIN_INTERVAL_SECONDS):
+        self.bind = bind
+        self.video_id = video_id
+        self.min_interval = min_interval
+        self.updates_sent = 0
+        self._last_values: Optional[Dict[str, Any]] = None
+        self._last_sent_at: Optional[float] = None
+
+    def update(self, progress: int, message: str, status: Optional[str] = None, force: bool = False) -> bool:
+        """
+        進捗を更新（送信した場合True）
+
+        statusを変更する場合は間引かずに必ず送信する
+        """
+        values = {"progress": progress, "progress_message": message}
+        if status is not None:
+            values["status"] = status
+
+        now = time.monotonic()
+        if not force and status is None:
+            if values == self._last_values:
+                return False
+            if self._last_sent_at is not None and now - self._last_sent_at < self.min_interval:
+                return False
+
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(update(Video).where(Video.id == self.video_id).values(**values))
+        except Exception as e:
+            # 進捗の更新失敗で処理本体を止めない
+            logger.warning(f"進捗更新エラー (video_id={self.video_id}): {e}")
+            return False
+
+        self._last_values = values
+        self._last_sent_at = now
+        self.updates_sent += 1
+        logger.info(f"Video {self.video_id}: {progress}% - {message}")
+        return True
+
+
+@dataclass
+class ProcessingUnit:
+    """一緒に保存されるべきオブジェクトのまとまり（フレーム・領収書・仕訳）"""
+    frame: Optional[Frame] = None
+    receipt: Optional[Receipt] = None
+    journal_entries: List[JournalEntry] = field(default_factory=list)
+    journals_generated: bool = False
+
+    def objects(self) -> List[Any]:
+        objects = [obj for obj in (self.frame, self.receipt) if obj is not None]
+        return objects + self.journal_entries
+
+
+def transaction_date(receipt: Receipt):
+    """仕訳の取引日（領収書の日付がなければ今日）"""
+    if receipt.issue_date:
+        return receipt.issue_date.date() if isinstance(receipt.issue_date, datetime) else receipt.issue_date
+    return datetime.now().date()
+
+
+def build_journal_entries(generator, receipt: Receipt) -> List[JournalEntry]:
+    """領収書（ID確定済み）から JournalEntry を作成"""
+    entries = []
+    for entry_data in generator.generate_journal_entries(receipt):
+        entries.append(JournalEntry(
+            receipt=receipt,
+            video_id=entry_data.video_id,
+            time_ms=int(entry_data.time_ms) if entry_data.time_ms is not None else 0,
+            debit_account=entry_data.debit_account,
+            credit_account=entry_data.credit_account,
+            debit_amount=entry_data.debit_amount,
+            credit_amount=entry_data.credit_amount,
+            tax_account=entry_data.tax_account,
+            tax_amount=entry_data.tax_amount,
+            memo=entry_data.memo,
+            status='unconfirmed',
+            transaction_date=transaction_date(receipt)
+        ))
+    return entries
+
+
+class ProcessingUnitOfWork:
+    """
+    動画処理の書き込みをまとめるユニットオブワーク
+
+    add() で登録したオブジェクトは、未コミットの領収書が batch_size 件に
+    達するか commit() が呼ばれた時点で1トランザクションで保存する。
+    generator を渡した場合、仕訳はフラッシュで領収書IDが確定した後に
+    生成し、同じトランザクションで保存する。一意制約違反などでバッチ全体が
+    失敗した場合は、ユニットごとに保存し直して失敗したユニットだけを除外する。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        video: Video,
+        generator=None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_unit_error: Optional[Callable[[ProcessingUnit, Exception], bool]] = None,
+    ):
+        """
+        Args:
+            db: 処理用セッション
+            video: 処理中の動画
+            generator: 仕訳生成に使う JournalGenerator（Noneなら仕訳を生成しない）
+            batch_size: 1トランザクションで保存する領収書数
+            on_unit_error: ユニットの保存に失敗した時に呼ばれる。Trueを返すと1回だけ再試行する
+        """
+        self.db = db
+        self.video = video
+        self.generator = generator
+        self.batch_size = batch_size
+        self.on_unit_error = on_unit_error
+        self.commits = 0
+        self.saved_units: List[ProcessingUnit] = []
+        self.failed_units: List[ProcessingUnit] = []
+        self._pending: List[ProcessingUnit] = []
+
+    @property
+    def pending_receipts(self) -> List[Receipt]:
+        return [unit.receipt for unit in self._pending if unit.receipt is not None]
+
+    @property
+    def saved_receipts(self) -> int:
+        return sum(1 for unit in self.saved_units if unit.receipt is not None)
+
+    def add(self, frame: Optional[Frame] = None, receipt: Optional[Receipt] = None) -> ProcessingUnit:
+        """フレームと領収書（あれば）をまとめて登録"""
+        unit = ProcessingUnit(frame=frame, receipt=receipt)
+        if receipt is not None and frame is not None:
+            receipt.best_frame = frame
+
+        self.db.add_all(unit.objects())
+        self._pending.append(unit)
+
+        if len(self.pending_receipts) >= self.batch_size:
+            self.commit()
+        return unit
+
+    def commit(self, **video_values) -> None:
+        """
+        未保存のユニットを1トランザクションで保存
+
+        video_values を渡すと同じトランザクションで動画の列（status など）も更新する
+        """
+        units, self._pending = self._pending, []
+        for key, value in video_values.items():
+            setattr(self.video, key, value)
+
+        try:
+            self._generate_journals(units)
+            self.db.commit()
+            self.commits += 1
+            self.saved_units.extend(units)
+            return
+        except Exception as e:
+            self.db.rollback()
+            if not units:
+                raise
+            logger.warning(f"一括保存に失敗したためユニットごとに保存します ({len(units)}件): {e}")
+
+        for unit in units:
+            self._commit_unit(unit)
+
+        # ロールバックで失われた動画の更新をやり直す
+        if video_values:
+            for key, value in video_values.items():
+                setattr(self.video, key, value)
+            self.db.commit()
+            self.commits += 1
+
+    def _commit_unit(self, unit: ProcessingUnit) -> None:
+        retried = False
+        while True:
+            self.db.add_all(unit.objects())
+            try:
+                self._generate_journals([unit])
+                self.db.commit()
+                self.commits += 1
+                self.saved_units.append(unit)
+                return
+            except Exception as e:
+                self.db.rollback()
+                if not retried and self.on_unit_error and self.on_unit_error(unit, e):
+                    retried = True
+                    continue
+                logger.error(f"保存に失敗したため除外します: {e}")
+                self.failed_units.append(unit)
+                return
+
+    def _generate_journals(self, units: List[ProcessingUnit]) -> None:
+        """フラッシュで領収書IDを確定させてから仕訳を生成（コミットはしない）"""
+        targets = [unit for unit in units if unit.receipt is not None and not unit.journals_generated]
+        if self.generator is None or not targets:
+            return
+
+        self.db.flush()
+        for unit in targets:
+            try:
+                unit.journal_entries = build_journal_entries(self.generator, unit.receipt)
+            except Exception as e:
+                logger.error(f"仕訳生成エラー (receipt={unit.receipt.id}): {e}")
+            unit.journals_generated = True
+        self.db.add_all(entry for unit in targets for entry in unit.journal_entries)
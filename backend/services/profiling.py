@@ -0,0 +1,393 @@
+"""
+遅いリクエスト・処理ジョブのサンプリングプロファイラー
+
+ローカルで再現できない遅いリクエスト（get_video・export_csv・analyze_image など）の
+ホットパスを本番で後から確認するためのもの。外部のプロファイラーは使わず、別スレッドから
+一定間隔で sys._current_frames() のスタックを取得して集計する（計測対象のコードには
+フックを入れないので、サンプリング中のオーバーヘッドは小さい）。
+
+- リクエスト: 管理者が X-Profile: 1 ヘッダーか ?__profile=1 を付けた場合は最初から、
+  PROFILE_SLOW_REQUEST_MS を超えたリクエストはその時点からサンプリングする
+  （速いリクエストにはコストがかからない）
+- ジョブ: profile_job デコレーター。PROFILE_JOBS=true なら常に、PROFILE_SLOW_JOB_SECONDS を
+  超えたジョブはその時点からサンプリングする
+
+結果は flamegraph.pl・speedscope などで読める collapsed 形式（"関数;関数;... 回数"）で
+リクエストID（レスポンスの X-Request-ID）ごとに PROFILE_DIR に保存する。
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import tempfile
+import functools
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+# サンプリング間隔（ミリ秒）
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# この時間を超えたリクエストをプロファイルする（0 で無効）
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+
+# この時間を超えたジョブをプロファイルする（0 で無効）
+PROFILE_SLOW_JOB_SECONDS = float(os.getenv("PROFILE_SLOW_JOB_SECONDS", "0"))
+
+# すべてのジョブをプロファイルする
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "false").lower() == "true"
+
+# 同時にサンプリングするセッション数の上限（遅いリクエストが重なった時のオーバーヘッドを抑える）
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+# 保存先と保存するプロファイル数の上限（古いものから削除）
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# スタックの最大の深さ
+PROFILE_MAX_DEPTH = 128
+
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+# 待機中のスレッドの先頭フレーム（スレッドプール・イベントループの待ち受け）
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+def is_valid_profile_id(profile_id: str) -> bool:
+    return bool(profile_id) and bool(_PROFILE_ID.match(profile_id)) and profile_id not in (".", "..")
+
+
+def new_profile_id(prefix: str = "") -> str:
+    return f"{prefix}{uuid.uuid4().hex}"
+
+
+class StackSampler:
+    """別スレッドから一定間隔でスタックを取得して collapsed 形式で集計する"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000, thread_ids: Optional[Set[int]] = None,
+                 max_depth: int = PROFILE_MAX_DEPTH):
+        """
+        Args:
+            interval: サンプリング間隔（秒）
+            thread_ids: 対象のスレッド（None なら待機中でないすべてのスレッド）
+        """
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.max_depth = max_depth
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            parts = filename.replace("\\", "/").split("/")
+            short = "/".join(parts[-2:])
+            # collapsed 形式の区切り文字は使わない
+            label = self._labels[code] = f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ":")
+        return label
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.sample(own, names)
+
+    def sample(self, own: Optional[int] = None, names: Optional[Dict[int, str]] = None) -> None:
+        """全スレッドのスタックを1回取得"""
+        names = names if names is not None else {}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            if self.thread_ids is not None:
+                if thread_id not in self.thread_ids:
+                    continue
+            elif frame.f_code.co_filename.endswith(_IDLE_FILES):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if thread_id not in names:
+                thread = threading._active.get(thread_id)
+                names[thread_id] = f"thread {thread.name if thread else thread_id}"
+            stack.append(names[thread_id])
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """collapsed 形式（1行に "呼び出し元;...;呼び出し先 回数"）"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    @property
+    def duration_ms(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return ((self.stopped_at or time.monotonic()) - self.started_at) * 1000
+
+
+class ProfileStore:
+    """プロファイルの保存先（<ID>.folded と <ID>.json）"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_profiles: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile_id: str, sampler: StackSampler, **meta) -> Optional[str]:
+        """保存してパスを返す（サンプルがない・IDが不正な場合は保存しない）"""
+        if not sampler.stacks or not is_valid_profile_id(profile_id):
+            return None
+        meta = dict(
+            meta, id=profile_id, samples=sampler.samples, interval_ms=sampler.interval * 1000,
+            sampled_ms=round(sampler.duration_ms, 1), created_at=time.time(),
+        )
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{profile_id}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+            with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            self._prune()
+        logger.info(f"プロファイルを保存しました: {profile_id} ({meta.get('trigger')}, {sampler.samples} samples)")
+        return path
+
+    def _prune(self) -> None:
+        metas = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in metas[:max(0, len(metas) - self.max_profiles)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, entry.name[:-5] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        """新しい順のメタデータ"""
+        if not os.path.isdir(self.directory):
+            return []
+        metas = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    with open(entry.path, encoding="utf-8") as f:
+                        metas.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        metas.sort(key=lambda meta: meta.get("created_at", 0), reverse=True)
+        return metas[:limit]
+
+    def path_for(self, profile_id: str) -> Optional[str]:
+        """collapsed 形式のファイルのパス（なければ None）"""
+        if not is_valid_profile_id(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.exists(path) else None
+
+
+profile_store = ProfileStore()
+
+_active_sessions = threading.BoundedSemaphore(max(PROFILE_MAX_CONCURRENT, 1))
+
+
+class ProfileSession:
+    """1回のリクエスト・ジョブのサンプリング（同時実行数の上限を超えた場合は何もしない）"""
+
+    def __init__(self, profile_id: str, thread_ids: Optional[Set[int]] = None, store: Optional[ProfileStore] = None):
+        self.profile_id = profile_id
+        self.store = store or profile_store
+        self.sampler = StackSampler(thread_ids=thread_ids)
+        self.trigger: Optional[str] = None
+        self._acquired = False
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self.trigger is not None
+
+    def start(self, trigger: str) -> bool:
+        with self._lock:
+            if self.started:
+                return True
+            if not _active_sessions.acquire(blocking=False):
+                logger.info(f"プロファイルの同時実行数の上限に達したためスキップ: {self.profile_id}")
+                return False
+            self._acquired = True
+            self.trigger = trigger
+            self.sampler.start()
+            return True
+
+    def finish(self, **meta) -> Optional[str]:
+        """サンプリングを止めて保存（開始していなければ何もしない）"""
+        with self._lock:
+            if not self.started or not self._acquired:
+                return None
+            self.sampler.stop()
+            self._acquired = False
+            _active_sessions.release()
+        try:
+            return self.store.save(self.profile_id, self.sampler, trigger=self.trigger, **meta)
+        except OSError as e:
+            logger.warning(f"プロファイルを保存できません: {self.profile_id}: {e}")
+            return None
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def profile_requested(scope) -> bool:
+    """X-Profile: 1 ヘッダーか ?__profile=1 でプロファイルが要求されているか"""
+    if (_header(scope, b"x-profile") or "").lower() in ("1", "true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("__profile", [""])[0].lower() in ("1", "true")
+
+
+class ProfilingMiddleware:
+    """
+    リクエストをプロファイルする ASGI ミドルウェア
+
+    すべてのレスポンスに X-Request-ID を付け、プロファイルはこのIDで保存する。
+    同期エンドポイントはスレッドプールで実行されるため、リクエスト中は待機中でない
+    すべてのスレッドをサンプリングする（同時に処理中の他のリクエストも含まれる）。
+    """
+
+    def __init__(self, app, authorize: Optional[Callable[[Optional[str]], Awaitable[bool]]] = None,
+                 slow_request_ms: float = PROFILE_SLOW_REQUEST_MS, store: Optional[ProfileStore] = None):
+        """
+        Args:
+            authorize: Authorization ヘッダーを受け取り、要求によるプロファイルを許可するか返す（管理者の確認）
+            slow_request_ms: この時間を超えたリクエストをプロファイルする（0 で無効）
+        """
+        self.app = app
+        self.authorize = authorize
+        self.slow_request_ms = slow_request_ms
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _header(scope, b"x-request-id")
+        if not request_id or not is_valid_profile_id(request_id):
+            request_id = new_profile_id()
+        session = ProfileSession(request_id, store=self.store)
+
+        if profile_requested(scope) and self.authorize is not None:
+            if await self.authorize(_header(scope, b"authorization")):
+                session.start("requested")
+        timer = None
+        if not session.started and self.slow_request_ms > 0:
+            # イベントループのタイマーは async のハンドラーがループを止めている間は発火しないため、
+            # profile_job と同じく別スレッドのタイマーで開始する
+            timer = threading.Timer(self.slow_request_ms / 1000, session.start, args=("slow",))
+            timer.daemon = True
+            timer.start()
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if session.started:
+                    headers.append((b"x-profile-id", request_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if session.started:
+                await asyncio.to_thread(
+                    session.finish,
+                    kind="request", method=scope.get("method"), path=scope.get("path"),
+                    duration_ms=round((time.monotonic() - start) * 1000, 1),
+                )
+
+
+def profile_job(name: str, slow_seconds: Optional[float] = None):
+    """
+    処理ジョブをプロファイルするデコレーター（同期・非同期どちらの関数にも使える）
+
+    ジョブを実行するスレッドだけをサンプリングする。PROFILE_JOBS=true なら常に、
+    slow_seconds（既定は PROFILE_SLOW_JOB_SECONDS）を超えた場合はその時点から開始する。
+    """
+    def _begin():
+        threshold = PROFILE_SLOW_JOB_SECONDS if slow_seconds is None else slow_seconds
+        session = ProfileSession(new_profile_id(f"{name}-"), thread_ids={threading.get_ident()})
+        timer = None
+        if PROFILE_JOBS:
+            session.start("job")
+        elif threshold > 0:
+            timer = threading.Timer(threshold, session.start, args=("slow",))
+            timer.daemon = True
+            timer.start()
+        return session, timer, time.monotonic()
+
+    def _end(session, timer, start, args):
+        if timer is not None:
+            timer.cancel()
+        session.finish(kind="job", job=name, args=[repr(arg)[:100] for arg in args[:2]],
+                       duration_ms=round((time.monotonic() - start) * 1000, 1))
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                session, timer, start = _begin()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _end(session, timer, start, args)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session, timer, start = _begin()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _end(session, timer, start, args)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,203 @@
+"""
+仕訳ルールエンジン
+
+ベンダーマスタと仕訳ルールを一度だけ読み込み、コンパイル済み・優先度順の
+構造としてリクエスト間で共有する。マスタの登録・削除時にバージョンを進めて
+キャッシュを無効化する。
+"""
+import os
+import re
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Vendor, Rule
+
+logger = logging.getLogger(__name__)
+
+# 複数ワーカー構成ではバージョン更新が他プロセスへ届かないため、TTLでも再読込する
+RULE_CACHE_TTL_SECONDS = float(os.getenv("RULE_CACHE_TTL_SECONDS", "300"))
+
+# 汎用ルール（ベンダー名から推測）: (キーワード, 勘定科目カテゴリ, 科目名) を判定順に並べる
+KEYWORD_RULES: List[Tuple[List[str], str, str]] = [
+    (['jr', 'taxi', 'タクシー', '鉄道', 'バス'], 'expenses', '旅費交通費'),       # 交通費
+    (['スタバ', 'starbucks', 'カフェ', 'レストラン'], 'expenses', '会議費'),     # 飲食費
+    (['eneos', 'エネオス', 'shell', 'コスモ'], 'expenses', '旅費交通費'),        # ガソリン代
+    (['セブン', 'ローソン', 'ファミリー', 'amazon'], 'expenses', '消耗品費'),   # コンビニ・小売
+]
+
+# キーワード群ごとに1本の選択パターンへコンパイルしておく
+_KEYWORD_PATTERNS: List[Tuple[Pattern, str, str]] = [
+    (re.compile('|'.join(re.escape(k) for k in keywords)), category, name)
+    for keywords, category, name in KEYWORD_RULES
+]
+
+
+@dataclass(frozen=True)
+class VendorEntry:
+    """ベンダーマスタのスナップショット（セッションに依存しない）"""
+    id: int
+    name: str
+    name_norm: str
+    default_debit_account: Optional[str] = None
+    default_credit_account: Optional[str] = None
+    default_tax_rate: Optional[float] = None
+    default_payment_method: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """コンパイル済み仕訳ルール"""
+    id: int
+    pattern: Pattern
+    pattern_type: Optional[str]
+    debit_account: Optional[str]
+    credit_account: Optional[str]
+    tax_rate: Optional[float]
+    priority: int
+
+
+class RuleSnapshot:
+    """ある時点のベンダー・ルールをまとめた読み取り専用の構造"""
+
+    def __init__(self, vendors: List[VendorEntry], rules: List[CompiledRule], version: int):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.vendors: Dict[str, VendorEntry] = {v.name_norm: v for v in vendors}
+        # 優先度の高い順（同順位は登録順）
+        self.rules: List[CompiledRule] = sorted(rules, key=lambda r: (-r.priority, r.id))
+        # ベンダー名で判定するルールを1本の選択パターンにまとめ、どれにも当たらない場合はループを省略する
+        self._vendor_prefilter = self._build_prefilter(
+            [r for r in self.rules if r.pattern_type not in ('item', 'amount_range')]
+        )
+
+    @staticmethod
+    def _build_prefilter(rules: List[CompiledRule]) -> Optional[Pattern]:
+        if not rules:
+            return None
+        try:
+            return re.compile('|'.join(f'(?:{r.pattern.pattern})' for r in rules), re.IGNORECASE)
+        except re.error:
+            # 番号付き後方参照などで結合できない場合は事前判定なしで処理する
+            return None
+
+    def get_vendor(self, vendor_norm: Optional[str]) -> Optional[VendorEntry]:
+        """正規化ベンダー名からマスタを検索"""
+        if not vendor_norm:
+            return None
+        return self.vendors.get(vendor_norm)
+
+    def iter_matching_rules(self, vendor: Optional[str], total: Optional[float]) -> Iterator[CompiledRule]:
+        """優先度順にマッチしたルールを返す"""
+        vendor = vendor or ''
+        vendor_possible = self._vendor_prefilter is None or bool(self._vendor_prefilter.search(vendor))
+
+        for rule in self.rules:
+            if rule.pattern_type == 'item':
+                # 品目での判定（将来拡張用）
+                continue
+            if rule.pattern_type == 'amount_range':
+                # 金額範囲での判定（合計がない場合はベンダー名で判定する）
+                if total:
+                    if rule.pattern.search(str(total)):
+                        yield rule
+                elif rule.pattern.search(vendor):
+                    yield rule
+                continue
+            # デフォルトはベンダー名で判定
+            if vendor_possible and rule.pattern.search(vendor):
+                yield rule
+
+    def match_keyword(self, vendor_norm: Optional[str]) -> Optional[Tuple[str, str]]:
+        """汎用キーワードから (カテゴリ, 科目名) を推測"""
+        if not vendor_norm:
+            return None
+        vendor_lower = vendor_norm.lower()
+        for pattern, category, name in _KEYWORD_PATTERNS:
+            if pattern.search(vendor_lower):
+                return category, name
+        return None
+
+
+class RuleEngine:
+    """ベンダー・ルールのキャッシュを管理するエンジン"""
+
+    def __init__(self, ttl_seconds: float = RULE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._version = 0
+        self._snapshot: Optional[RuleSnapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self) -> int:
+        """マスタ変更時にバージョンを進め、次回アクセスで再読込させる"""
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def get_snapshot(self, db: Optional[Session]) -> RuleSnapshot:
+        """有効なスナップショットを返す（必要なら読み込む）"""
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh(snapshot):
+            return snapshot
+
+        if db is None:
+            return snapshot or RuleSnapshot([], [], self._version)
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and self._is_fresh(snapshot):
+                return snapshot
+            snapshot = self._load(db, self._version)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _is_fresh(self, snapshot: RuleSnapshot) -> bool:
+        if snapshot.version != self._version:
+            return False
+        return time.monotonic() - snapshot.loaded_at < self.ttl_seconds
+
+    def _load(self, db: Session, version: int) -> RuleSnapshot:
+        vendors = [
+            VendorEntry(
+                id=v.id,
+                name=v.name,
+                name_norm=v.name_norm,
+                default_debit_account=v.default_debit_account,
+                default_credit_account=v.default_credit_account,
+                default_tax_rate=v.default_tax_rate,
+                default_payment_method=v.default_payment_method,
+            )
+            for v in db.query(Vendor).all()
+        ]
+
+        rules = []
+        for rule in db.query(Rule).filter(Rule.is_active == True).all():
+            try:
+                pattern = re.compile(rule.pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.error(f"ルールマッチングエラー: rule_id={rule.id}, {e}")
+                continue
+            rules.append(CompiledRule(
+                id=rule.id,
+                pattern=pattern,
+                pattern_type=rule.pattern_type,
+                debit_account=rule.debit_account,
+                credit_account=rule.credit_account,
+                tax_rate=rule.tax_rate,
+                priority=rule.priority or 0,
+            ))
+
+        logger.info(f"Rule engine loaded: vendors={len(vendors)}, rules={len(rules)}, version={version}")
+        return RuleSnapshot(vendors, rules, version)
+
+
+# グローバルインスタンス
+rule_engine = RuleEngine()
@@ -0,0 +1,116 @@
+"""
+起動前に実行するデータベースのマイグレーション
+
+以前はアプリの起動時（lifespan）に毎回実行していたが、create_all・information_schema の
+問い合わせ・bcrypt のハッシュ計算でコールドスタートが遅くなるため、
+デプロイ時に migrate.py（python migrate.py）から実行する。
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# videosテーブルに後から追加したカラム（create_allでは既存テーブルに追加されないため）
+ADDED_VIDEO_COLUMNS = [
+    ("playback_path", "VARCHAR(500)"),
+    ("keyframe_index_json", "TEXT"),
+    ("proxy_path", "VARCHAR(500)"),
+]
+
+
+def create_tables(engine) -> None:
+    """テーブル作成（既存の場合はスキップ）"""
+    from models import Base
+
+    logger.info("データベーステーブルを確認中...")
+    Base.metadata.create_all(bind=engine, checkfirst=True)
+    logger.info("データベース初期化完了")
+
+
+def add_missing_columns(engine) -> None:
+    """後から追加したカラムを既存のテーブルに追加（存在しない場合のみ）"""
+    with engine.begin() as conn:  # begin()でトランザクション管理
+        # PostgreSQL用
+        if "postgresql" in str(engine.url) or "postgres" in str(engine.url):
+            logger.info("PostgreSQL: reset_tokenカラムを追加中...")
+
+            # カラムの存在確認
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'users'
+                AND column_name IN ('reset_token', 'reset_token_expires')
+            """))
+            existing_columns = [row[0] for row in result]
+
+            # reset_tokenカラムが存在しない場合のみ追加
+            if 'reset_token' not in existing_columns:
+                try:
+                    conn.execute(text("ALTER TABLE users ADD COLUMN reset_token VARCHAR(255)"))
+                    logger.info("✅ reset_tokenカラムを追加しました")
+                except Exception as e:
+                    logger.warning(f"reset_tokenカラム追加エラー: {e}")
+
+            # reset_token_expiresカラムが存在しない場合のみ追加
+            if 'reset_token_expires' not in existing_columns:
+                try:
+                    conn.execute(text("ALTER TABLE users ADD COLUMN reset_token_expires TIMESTAMP WITH TIME ZONE"))
+                    logger.info("✅ reset_token_expiresカラムを追加しました")
+                except Exception as e:
+                    logger.warning(f"reset_token_expiresカラム追加エラー: {e}")
+
+            logger.info("PostgreSQL: マイグレーション確認完了")
+
+        # SQLite用
+        else:
+            existing_user_columns = {column["name"] for column in inspect(conn).get_columns("users")}
+            if "reset_token" not in existing_user_columns:
+                conn.execute(text("ALTER TABLE users ADD COLUMN reset_token VARCHAR(255)"))
+                logger.info("SQLite: reset_tokenカラムを追加")
+            if "reset_token_expires" not in existing_user_columns:
+                conn.execute(text("ALTER TABLE users ADD COLUMN reset_token_expires DATETIME"))
+                logger.info("SQLite: reset_token_expiresカラムを追加")
+
+        existing_video_columns = {column["name"] for column in inspect(conn).get_columns("videos")}
+        for column_name, column_type in ADDED_VIDEO_COLUMNS:
+            if column_name not in existing_video_columns:
+                conn.execute(text(f"ALTER TABLE videos ADD COLUMN {column_name} {column_type}"))
+                logger.info(f"✅ videos.{column_name}カラムを追加しました")
+
+    logger.info("マイグレーション完了")
+
+
+def ensure_admin_user(engine) -> bool:
+    """初回のadminユーザー作成（作成した場合は True）"""
+    from models import User
+    from passlib.context import CryptContext
+
+    with Session(engine) as session:
+        if session.query(User).filter_by(username='admin').first():
+            logger.info("Admin user already exists")
+            return False
+
+        logger.info("Creating default admin user...")
+        pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+        session.add(User(
+            email='admin@example.com',
+            username='admin',
+            hashed_password=pwd_context.hash('admin123'),
+            full_name='Administrator',
+            is_superuser=True,
+            is_active=True
+        ))
+        session.commit()
+        logger.info("✅ Admin user created (username: admin, password: admin123)")
+        return True
+
+
+def run_migrations(engine=None) -> None:
+    """テーブル作成・カラム追加・adminユーザー作成をまとめて実行"""
+    if engine is None:
+        from database import engine
+    create_tables(engine)
+    add_missing_columns(engine)
+    ensure_admin_user(engine)
@@ -12,6 +12,9 @@ from PIL import Image
 from collections import defaultdict
 import math
 
+from video_processing import quality
+from video_processing.quality import batch_frame_stats, stack_gray
+
 logger = logging.getLogger(__name__)
 
 class SmartFrameExtractor:
@@ -31,9 +34,26 @@ class SmartFrameExtractor:
         # 最小品質スコア（より低く）
         self.min_quality_score = 0.15  # 0.2 → 0.15により低く（より多くのフレーム受容）
         
-    def extract_smart_frames(self, video_path: str, sample_fps: int = 10) -> List[Dict[str, Any]]:
-        logger.info(f"Starting smart frame extraction with sample_fps={sample_fps}")
-        cap = cv2.VideoCapture(video_path)
+        # 元解像度の読み直しで、これ以上離れたフレームへはシークする（秒）
+        self.full_res_seek_seconds = 2.0
+        
+        # 品質評価をまとめて行うフレーム数の上限（_evaluate_frames_batch）。
+        # 実際にはフレームの画素数の合計が BATCH_STATS_PIXELS 以下になるよう減らす
+        # （プロキシのない 4K 動画では1枚ずつ評価し、デコード済みフレームを溜め込まない）
+        self.quality_batch_size = 32
+        
+    def extract_smart_frames(self, video_path: str, sample_fps: int = 10,
+                             proxy_path: Optional[str] = None,
+                             output_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        フレーム抽出
+
+        proxy_path（低解像度プロキシ）があれば全フレームの評価はプロキシで行い、
+        最終的に選択したフレームだけ元動画（video_path）の解像度で保存し直す。
+        output_dir は画像の保存先（既定は uploads/frames）。
+        """
+        logger.info(f"Starting smart frame extraction with sample_fps={sample_fps}, proxy={bool(proxy_path)}")
+        cap = cv2.VideoCapture(proxy_path or video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Cannot open video: {video_path}")
@@ -51,22 +71,14 @@ class SmartFrameExtractor:
         candidate_frames = []
         frame_idx = 0
         
-        output_dir = Path("uploads/frames")
+        output_dir = Path(output_dir or "uploads/frames")
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_idx % frame_interval == 0:
-                # フレームインデックスから計算する方が正確
-                # OpenCVのCAP_PROP_POS_MSECは不正確な場合が多い
-                time_ms = int((frame_idx / fps) * 1000)
-                
-                # フレーム品質評価
-                quality_score, quality_details = self._evaluate_frame_quality(frame)
-                
+        pending = []  # 品質評価待ちの (frame_idx, time_ms, frame)
+        
+        def evaluate_pending():
+            results = self._evaluate_frames_batch([frame for _, _, frame in pending])
+            for (frame_idx, time_ms, frame), (quality_score, quality_details) in zip(pending, results):
                 if quality_score >= self.min_quality_score:
                     # フレーム保存 - タイムスタンプをファイル名に含む
                     frame_filename = f"{Path(video_path).stem}_frame_{time_ms:08d}ms.jpg"
@@ -88,9 +100,28 @@ class SmartFrameExtractor:
                     })
                     
                     logger.debug(f"Frame {frame_idx} at {time_ms}ms: score={quality_score:.2f}, receipt={quality_details.get('has_receipt')}, sharpness={quality_details.get('sharpness', 0):.2f}")
+            pending.clear()
+        
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            if frame_idx % frame_interval == 0:
+                # フレームインデックスから計算する方が正確
+                # OpenCVのCAP_PROP_POS_MSECは不正確な場合が多い
+                time_ms = int((frame_idx / fps) * 1000)
+                
+                # フレーム品質はまとめて評価（溜めるのは画素数の上限まで）
+                pending.append((frame_idx, time_ms, frame))
+                if len(pending) >= self._batch_frames(frame):
+                    evaluate_pending()
             
             frame_idx += 1
         
+        if pending:
+            evaluate_pending()
+        
         cap.release()
         
         if not candidate_frames:
@@ -115,8 +146,30 @@ class SmartFrameExtractor:
             optimal_frames.sort(key=lambda x: x['time_ms'])
             logger.info(f"Extended selection to {len(optimal_frames)} frames")
         
+        if proxy_path:
+            self._save_full_resolution(video_path, optimal_frames)
+        
         return optimal_frames
     
+    def _save_full_resolution(self, video_path: str, frames: List[Dict[str, Any]]) -> None:
+        """選択したフレームを元動画の解像度で読み直して frame_path を上書き（OCR用）"""
+        from services.frame_selection import read_full_resolution
+        
+        try:
+            full_frames = read_full_resolution(
+                video_path, [frame_data['time_ms'] for frame_data in frames], seek_seconds=self.full_res_seek_seconds
+            )
+        except ValueError:
+            logger.warning(f"Cannot open original video, keeping proxy frames: {video_path}")
+            return
+        
+        for frame_data in frames:
+            frame = full_frames.get(frame_data['time_ms'])
+            if frame is not None:
+                cv2.imwrite(frame_data['frame_path'], frame)
+            else:
+                logger.warning(f"Failed to read full-resolution frame at {frame_data['time_ms']}ms, keeping proxy frame")
+    
     def _evaluate_frame_quality(self, frame: np.ndarray) -> Tuple[float, Dict[str, Any]]:
         """
         フレーム品質評価
@@ -185,6 +238,58 @@ class SmartFrameExtractor:
         
         return score, details
     
+    def _batch_frames(self, frame: np.ndarray) -> int:
+        """このサイズのフレームをまとめて評価する枚数（画素数の合計が BATCH_STATS_PIXELS 以下、最低1枚）"""
+        pixels = frame.shape[0] * frame.shape[1]
+        return max(1, min(self.quality_batch_size, quality.BATCH_STATS_PIXELS // pixels))
+
+    def _evaluate_frames_batch(self, frames: List[np.ndarray]) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        同じサイズのフレームをまとめて品質評価（結果は _evaluate_frame_quality と同じ）
+
+        鮮明度・コントラスト・明度・エッジ密度はバッチ全体で一度に計算し、
+        二値化と形態学処理を使うテキスト密度だけフレームごとに計算する。
+        """
+        if not frames:
+            return []
+        gray = stack_gray(frames)
+        height, width = gray.shape[1:]
+        stats = batch_frame_stats(gray)
+        
+        sharpness = np.minimum(stats['laplacian_var'] / 500, 1.0)
+        contrast = np.minimum(stats['std'] / 70, 1.0)
+        brightness = stats['mean']
+        brightness_score = np.where(
+            (80 < brightness) & (brightness < 220),
+            np.maximum(0, 1.0 - np.abs(brightness - 150) / 100),
+            0.2
+        )
+        edge_density = np.minimum(stats['edge_ratio'] * 10, 1.0)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width // 30, 1))
+        
+        results = []
+        for i in range(len(frames)):
+            details = {
+                'sharpness': float(sharpness[i]),
+                'contrast': float(contrast[i]),
+                'brightness': float(brightness_score[i]),
+                'edge_density': float(edge_density[i]),
+            }
+            
+            _, binary = cv2.threshold(gray[i], 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+            details['text_density'] = min(cv2.countNonZero(horizontal) / (height * width) * 100, 1.0)
+            
+            # _detect_receipt_features と同じ判定（2%以上のエッジがあればレシートあり）
+            details['has_receipt'] = bool(stats['edge_ratio'][i] > 0.02)
+            
+            score = sum(details[metric] * weight for metric, weight in self.quality_weights.items())
+            if score < 0.3:
+                score = score * 0.5  # 低品質フレームはさらに減点
+            details['final_score'] = score
+            results.append((score, details))
+        return results
+    
     def _detect_receipt_features(self, gray: np.ndarray, edges: np.ndarray) -> bool:
         """
         レシート特徴検出 - 基本的なテキスト存在チェック
@@ -1,21 +1,29 @@
 """
 クラウドストレージサービス (Supabase Storage / S3 / GCS)
+
+アップロードは services.upload_engine の UploadEngine が行う（並列・マルチパート・再試行）。
 """
 import os
+import asyncio
 import hashlib
-from typing import Optional, Tuple
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
 from datetime import datetime
-import boto3
-from botocore.exceptions import ClientError
 import logging
 
+from services.upload_engine import (
+    UPLOAD_MAX_WORKERS, CloudinaryBackend, FilesystemBackend, GCSBackend, S3Backend, SupabaseBackend,
+    UploadBackend, UploadEngine, UploadItem, UploadResult,
+)
+
 logger = logging.getLogger(__name__)
 
 class StorageService:
     """クラウドストレージ統合サービス"""
     
     def __init__(self):
-        self.storage_type = os.getenv("STORAGE_TYPE", "supabase")  # supabase, cloudinary, s3, gcs
+        self.storage_type = os.getenv("STORAGE_TYPE", "supabase")  # supabase, cloudinary, s3, gcs, filesystem
         
         if self.storage_type == "cloudinary":
             self._init_cloudinary()
@@ -25,8 +33,12 @@ class StorageService:
             self._init_s3()
         elif self.storage_type == "gcs":
             self._init_gcs()
+        elif self.storage_type == "filesystem":
+            self._init_filesystem()
         else:
             raise ValueError(f"Unsupported storage type: {self.storage_type}")
+        
+        self.upload_engine = UploadEngine(self._create_upload_backend())
     
     def _init_cloudinary(self):
         """Cloudinary初期化"""
@@ -50,12 +62,18 @@ class StorageService:
         self.bucket_name = os.getenv("SUPABASE_BUCKET", "videos")
     
     def _init_s3(self):
-        """AWS S3初期化"""
+        """AWS S3初期化（S3_ENDPOINT_URL を指定すると MinIO などの S3 互換ストレージを使用）"""
+        import boto3
+        from botocore.config import Config as BotoConfig
+
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION", "us-east-1")
+            region_name=os.getenv("AWS_REGION", "us-east-1"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            # 並列アップロード（オブジェクト × パート）分の接続をプールする。再試行は UploadEngine が行う
+            config=BotoConfig(max_pool_connections=UPLOAD_MAX_WORKERS * 2, retries={"max_attempts": 1, "mode": "standard"})
         )
         self.bucket_name = os.getenv("S3_BUCKET_NAME", "video-accounting-app")
     
@@ -68,6 +86,24 @@ class StorageService:
         self.bucket_name = os.getenv("GCS_BUCKET_NAME", "video-accounting-app")
         self.bucket = self.gcs_client.bucket(self.bucket_name)
     
+    def _init_filesystem(self):
+        """ローカルディレクトリをストレージとして使用（開発・テスト用）"""
+        self.storage_root = Path(os.getenv("STORAGE_ROOT", "uploads/storage"))
+        self.storage_root.mkdir(parents=True, exist_ok=True)
+        self.filesystem_backend = FilesystemBackend(self.storage_root, os.getenv("STORAGE_PUBLIC_URL"))
+    
+    def _create_upload_backend(self) -> UploadBackend:
+        """ストレージ種別に対応するアップロードバックエンド（クライアントは初期化済みのものを共有）"""
+        if self.storage_type == "cloudinary":
+            return CloudinaryBackend(self.cloudinary)
+        if self.storage_type == "supabase":
+            return SupabaseBackend(self.supabase_url, self.supabase_key, self.bucket_name)
+        if self.storage_type == "s3":
+            return S3Backend(self.s3_client, self.bucket_name)
+        if self.storage_type == "gcs":
+            return GCSBackend(self.bucket)
+        return self.filesystem_backend
+    
     def generate_file_path(self, user_id: int, filename: str, file_type: str = "video") -> str:
         """
         ユーザーごとの整理されたファイルパスを生成
@@ -92,23 +128,14 @@ class StorageService:
     
     async def upload_file(self, file_content: bytes, file_path: str, content_type: str = None) -> Tuple[bool, str]:
         """
-        ファイルをクラウドストレージにアップロード
+        ファイルをクラウドストレージにアップロード（アップロードエンジンのワーカーで実行）
         
         Returns:
             (success: bool, url_or_error: str)
         """
-        try:
-            if self.storage_type == "cloudinary":
-                return await self._upload_cloudinary(file_content, file_path, content_type)
-            elif self.storage_type == "supabase":
-                return await self._upload_supabase(file_content, file_path, content_type)
-            elif self.storage_type == "s3":
-                return await self._upload_s3(file_content, file_path, content_type)
-            elif self.storage_type == "gcs":
-                return await self._upload_gcs(file_content, file_path, content_type)
-        except Exception as e:
-            logger.error(f"Upload failed: {e}")
-            return False, str(e)
+        future = self.upload_engine.submit(UploadItem(file_path, file_content, content_type=content_type or "video/mp4"))
+        result = await asyncio.wrap_future(future)
+        return result.as_tuple()
     
     def upload_file_sync(self, file_content: bytes, file_path: str, content_type: str = None) -> Tuple[bool, str]:
         """
@@ -117,169 +144,16 @@ class StorageService:
         Returns:
             (success: bool, url_or_error: str)
         """
-        try:
-            if self.storage_type == "cloudinary":
-                return self._upload_cloudinary_sync(file_content, file_path, content_type)
-            elif self.storage_type == "supabase":
-                return self._upload_supabase_sync(file_content, file_path, content_type)
-            elif self.storage_type == "s3":
-                return self._upload_s3_sync(file_content, file_path, content_type)
-            elif self.storage_type == "gcs":
-                return self._upload_gcs_sync(file_content, file_path, content_type)
-        except Exception as e:
-            logger.error(f"Upload failed: {e}")
-            return False, str(e)
-    
-    def _upload_cloudinary_sync(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Cloudinaryに同期アップロード"""
-        try:
-            # ファイル名から拡張子を取得
-            filename = os.path.basename(file_path)
-            
-            # Cloudinaryにアップロード
-            success, result = self.cloudinary.upload_video_from_bytes(
-                file_bytes=file_content,
-                filename=filename,
-                public_id=file_path.replace("/", "_").replace(".", "_")  # スラッシュとドットを変換
-            )
-            
-            if success:
-                logger.info(f"Uploaded to Cloudinary: {result['public_id']}")
-                return True, result['secure_url']
-            else:
-                return False, result.get('error', 'Unknown error')
-        except Exception as e:
-            logger.error(f"Cloudinary sync upload error: {e}")
-            return False, str(e)
-    
-    async def _upload_cloudinary(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Cloudinaryにアップロード（非同期）"""
-        # Cloudinaryは同期APIなので、同期版を呼び出す
-        return self._upload_cloudinary_sync(file_content, file_path, content_type)
-    
-    def _upload_supabase_sync(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Supabase Storageに同期アップロード"""
-        try:
-            # Supabase Storageにアップロード
-            response = self.client.storage.from_(self.bucket_name).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": content_type or "video/mp4", "upsert": "true"}
-            )
-            
-            # レスポンスを確認
-            logger.info(f"Supabase upload response: {response}")
-            
-            # エラーチェック
-            if hasattr(response, 'error') and response.error:
-                logger.error(f"Supabase upload error: {response.error}")
-                return False, str(response.error)
-            
-            # 公開URLを取得
-            public_url = self.client.storage.from_(self.bucket_name).get_public_url(file_path)
-            
-            logger.info(f"Uploaded to Supabase: {file_path}, URL: {public_url}")
-            return True, public_url
-        except Exception as e:
-            logger.error(f"Supabase upload error: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return False, str(e)
-    
-    async def _upload_supabase(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Supabase Storageにアップロード"""
-        try:
-            # Supabase Storageにアップロード
-            response = self.client.storage.from_(self.bucket_name).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": content_type or "video/mp4"}
-            )
-            
-            # 公開URLを取得
-            public_url = self.client.storage.from_(self.bucket_name).get_public_url(file_path)
-            
-            logger.info(f"Uploaded to Supabase: {file_path}")
-            return True, public_url
-        except Exception as e:
-            logger.error(f"Supabase upload error: {e}")
-            return False, str(e)
-    
-    def _upload_s3_sync(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """AWS S3に同期アップロード"""
-        try:
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=file_path,
-                Body=file_content,
-                ContentType=content_type or "video/mp4"
-            )
-            
-            # 署名付きURL生成（7日間有効）
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': file_path},
-                ExpiresIn=604800  # 7 days
-            )
-            
-            logger.info(f"Uploaded to S3: {file_path}")
-            return True, url
-        except ClientError as e:
-            logger.error(f"S3 upload error: {e}")
-            return False, str(e)
-    
-    def _upload_gcs_sync(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Google Cloud Storageに同期アップロード"""
-        try:
-            blob = self.bucket.blob(file_path)
-            blob.upload_from_string(file_content, content_type=content_type or "video/mp4")
-            
-            # 公開URLを取得
-            url = blob.public_url
-            
-            logger.info(f"Uploaded to GCS: {file_path}")
-            return True, url
-        except Exception as e:
-            logger.error(f"GCS upload error: {e}")
-            return False, str(e)
+        result = self.upload_engine.upload(UploadItem(file_path, file_content, content_type=content_type or "video/mp4"))
+        return result.as_tuple()
     
-    async def _upload_s3(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """AWS S3にアップロード"""
-        try:
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=file_path,
-                Body=file_content,
-                ContentType=content_type or "video/mp4"
-            )
-            
-            # 署名付きURL生成（7日間有効）
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': file_path},
-                ExpiresIn=604800  # 7 days
-            )
-            
-            logger.info(f"Uploaded to S3: {file_path}")
-            return True, url
-        except ClientError as e:
-            logger.error(f"S3 upload error: {e}")
-            return False, str(e)
-    
-    async def _upload_gcs(self, file_content: bytes, file_path: str, content_type: str) -> Tuple[bool, str]:
-        """Google Cloud Storageにアップロード"""
-        try:
-            blob = self.bucket.blob(file_path)
-            blob.upload_from_string(file_content, content_type=content_type or "video/mp4")
-            
-            # 公開URLを取得
-            url = blob.public_url
-            
-            logger.info(f"Uploaded to GCS: {file_path}")
-            return True, url
-        except Exception as e:
-            logger.error(f"GCS upload error: {e}")
-            return False, str(e)
+    def upload_many(self, items: Iterable[UploadItem]) -> List[UploadResult]:
+        """
+        複数ファイルを並列にアップロード（結果は入力順）
+        
+        1件の失敗で他のアップロードは中断しない。各結果の success / url / error を確認すること。
+        """
+        return self.upload_engine.upload_many(items)
     
     async def download_file(self, file_path: str) -> Optional[bytes]:
         """
@@ -294,6 +168,8 @@ class StorageService:
                 return await self._download_s3(file_path)
             elif self.storage_type == "gcs":
                 return await self._download_gcs(file_path)
+            elif self.storage_type == "filesystem":
+                return self.filesystem_backend.path_for(file_path).read_bytes()
         except Exception as e:
             logger.error(f"Download failed: {e}")
             return None
@@ -332,7 +208,7 @@ class StorageService:
         try:
             response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)
             return response['Body'].read()
-        except ClientError as e:
+        except self.s3_client.exceptions.ClientError as e:
             logger.error(f"S3 download error: {e}")
             return None
     
@@ -345,6 +221,44 @@ class StorageService:
             logger.error(f"GCS download error: {e}")
             return None
     
+    def _http_source(self):
+        """公開URL経由の部分ダウンロード用（セッションを使い回す）"""
+        if getattr(self, "_http", None) is None:
+            from services.blob_cache import HttpBlobSource
+            self._http = HttpBlobSource()
+        return self._http
+    
+    def object_size(self, file_path: str) -> Optional[int]:
+        """オブジェクトのサイズ（存在しなければ None）"""
+        try:
+            if self.storage_type == "s3":
+                return self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path)["ContentLength"]
+            elif self.storage_type == "gcs":
+                blob = self.bucket.get_blob(file_path)
+                return blob.size if blob else None
+            elif self.storage_type == "filesystem":
+                return self.filesystem_backend.path_for(file_path).stat().st_size
+            else:
+                return self._http_source().size(self.get_public_url(file_path))
+        except Exception as e:
+            logger.warning(f"Object size lookup failed ({file_path}): {e}")
+            return None
+    
+    def read_range(self, file_path: str, start: int, length: int) -> bytes:
+        """オブジェクトの一部（start から length バイト）をダウンロード"""
+        if self.storage_type == "s3":
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=file_path, Range=f"bytes={start}-{start + length - 1}"
+            )
+            return response['Body'].read()
+        elif self.storage_type == "gcs":
+            return self.bucket.blob(file_path).download_as_bytes(start=start, end=start + length - 1)
+        elif self.storage_type == "filesystem":
+            with open(self.filesystem_backend.path_for(file_path), 'rb') as f:
+                return os.pread(f.fileno(), length, start)
+        else:
+            return self._http_source().read_range(self.get_public_url(file_path), start, length)
+    
     async def delete_file(self, file_path: str) -> bool:
         """
         クラウドストレージからファイルを削除
@@ -360,6 +274,8 @@ class StorageService:
             elif self.storage_type == "gcs":
                 blob = self.bucket.blob(file_path)
                 blob.delete()
+            elif self.storage_type == "filesystem":
+                self.filesystem_backend.path_for(file_path).unlink()
             
             logger.info(f"Deleted file: {file_path}")
             return True
@@ -380,5 +296,32 @@ class StorageService:
             return f"https://{self.bucket_name}.s3.amazonaws.com/{file_path}"
         elif self.storage_type == "gcs":
             return f"https://storage.googleapis.com/{self.bucket_name}/{file_path}"
+        elif self.storage_type == "filesystem":
+            return self.filesystem_backend.url_for(file_path)
         
-        return ""
\ No newline at end of file
+        return ""
+
+
+_storage_service: Optional[StorageService] = None
+_storage_service_loaded = False
+_storage_service_lock = threading.Lock()
+
+
+def get_storage_service() -> Optional[StorageService]:
+    """
+    共有の StorageService を初回使用時に作成して返す
+
+    SDK の読み込みとクライアント作成は起動時ではなくここで行う。
+    作成に失敗した場合は None（ローカル保存のみ）を返し、以後も再試行しない。
+    """
+    global _storage_service, _storage_service_loaded
+    with _storage_service_lock:
+        if not _storage_service_loaded:
+            try:
+                _storage_service = StorageService()
+                logger.info(f"Cloud storage ({_storage_service.storage_type}) initialized successfully")
+            except Exception as e:
+                logger.warning(f"Cloud storage initialization failed: {e}. Using local storage.")
+                _storage_service = None
+            _storage_service_loaded = True
+        return _storage_service
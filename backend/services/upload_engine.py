@@ -0,0 +1,458 @@
+"""
+クラウドストレージのアップロードエンジン
+
+バックエンドごとに接続を使い回すクライアント（HTTP セッションのコネクションプール）を持ち、
+上限付きのワーカープールで並列にアップロードする。大きなオブジェクトはマルチパート
+（チャンク）で送り、一時的なエラーはジッター付き指数バックオフで再試行する。
+"""
+import os
+import time
+import uuid
+import base64
+import random
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 同時にアップロードするオブジェクト数（およびマルチパートの同時パート数）
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", "4"))
+
+# これ以上のサイズはマルチパートで送る（バイト）
+UPLOAD_MULTIPART_THRESHOLD = int(os.getenv("UPLOAD_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+
+# マルチパートの1パートのサイズ（バイト、S3 の最小は 5MB）
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+
+# 1リクエストあたりの最大試行回数
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+
+# 再試行の待ち時間（秒）: 0〜min(上限, 基準 * 2^(n-1)) の一様乱数（フルジッター）
+UPLOAD_BACKOFF_BASE_SECONDS = float(os.getenv("UPLOAD_BACKOFF_BASE_SECONDS", "0.5"))
+UPLOAD_BACKOFF_MAX_SECONDS = float(os.getenv("UPLOAD_BACKOFF_MAX_SECONDS", "8.0"))
+
+
+class UploadError(Exception):
+    """アップロード失敗（再試行しない）"""
+
+
+class TransientUploadError(UploadError):
+    """一時的なアップロード失敗（再試行する）"""
+
+
+@dataclass
+class UploadItem:
+    """アップロードするオブジェクト（data か source_path のどちらかを指定）"""
+    key: str
+    data: Optional[bytes] = None
+    source_path: Optional[str] = None
+    content_type: str = "application/octet-stream"
+
+    @property
+    def size(self) -> int:
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.source_path)
+
+    def read(self, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """指定範囲を読み出す（ファイルの場合は pread で、位置を共有せずに並列に読める）"""
+        if length is None:
+            length = self.size - offset
+        if self.data is not None:
+            return self.data[offset:offset + length]
+        fd = os.open(self.source_path, os.O_RDONLY)
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+
+@dataclass
+class UploadResult:
+    """アップロード結果（成功時は url、失敗時は error）"""
+    key: str
+    success: bool
+    url: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    parts: int = 1
+
+    def as_tuple(self) -> Tuple[bool, str]:
+        """StorageService の従来の戻り値 (success, url_or_error)"""
+        return (True, self.url) if self.success else (False, self.error or "")
+
+
+class UploadBackend:
+    """
+    アップロード先のバックエンド
+
+    put は1リクエストでの送信。multipart が True のバックエンドは
+    start_multipart / put_part / finish_multipart / abort_multipart で
+    パート単位に送る（パート単位で再試行される）。
+    """
+    name = "backend"
+    multipart = False
+    parallel_parts = True  # パートを並列に送れるか（オフセット順に送る必要があれば False）
+    part_size: Optional[int] = None  # バックエンド固有のパートサイズ（None ならエンジンの設定）
+
+    def put(self, item: UploadItem) -> str:
+        raise NotImplementedError
+
+    def start_multipart(self, item: UploadItem) -> Any:
+        raise NotImplementedError
+
+    def put_part(self, item: UploadItem, state: Any, number: int, offset: int, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def finish_multipart(self, item: UploadItem, state: Any, parts: List[Any]) -> str:
+        raise NotImplementedError
+
+    def abort_multipart(self, item: UploadItem, state: Any) -> None:
+        pass
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, (TransientUploadError, ConnectionError, TimeoutError))
+
+
+class FilesystemBackend(UploadBackend):
+    """ローカルディレクトリへの保存（開発・テスト用、S3 互換サーバーの代わり）"""
+    name = "filesystem"
+    multipart = True
+
+    def __init__(self, root, base_url: Optional[str] = None):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/") if base_url else None
+
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise UploadError(f"不正なキー: {key}")
+        return path
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}" if self.base_url else str(self.path_for(key))
+
+    def put(self, item: UploadItem) -> str:
+        path = self.path_for(item.key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        partial.write_bytes(item.read())
+        os.replace(partial, path)
+        return self.url_for(item.key)
+
+    def start_multipart(self, item: UploadItem) -> Path:
+        path = self.path_for(item.key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        with open(partial, "wb") as f:
+            f.truncate(item.size)
+        return partial
+
+    def put_part(self, item: UploadItem, state: Path, number: int, offset: int, data: bytes) -> int:
+        fd = os.open(state, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+        return number
+
+    def finish_multipart(self, item: UploadItem, state: Path, parts: List[int]) -> str:
+        os.replace(state, self.path_for(item.key))
+        return self.url_for(item.key)
+
+    def abort_multipart(self, item: UploadItem, state: Path) -> None:
+        state.unlink(missing_ok=True)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, TransientUploadError)
+
+
+class S3Backend(UploadBackend):
+    """AWS S3 / S3 互換ストレージ（MinIO など）"""
+    name = "s3"
+    multipart = True
+
+    RETRYABLE_CODES = {"SlowDown", "RequestTimeout", "RequestTimeTooSkewed", "InternalError",
+                       "ServiceUnavailable", "Throttling", "ThrottlingException"}
+
+    def __init__(self, client, bucket: str, presign_seconds: int = 604800):
+        self.client = client
+        self.bucket = bucket
+        self.presign_seconds = presign_seconds
+
+    def _url(self, key: str) -> str:
+        # 署名付きURL（デフォルト7日間有効）
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.presign_seconds
+        )
+
+    def put(self, item: UploadItem) -> str:
+        self.client.put_object(Bucket=self.bucket, Key=item.key, Body=item.read(), ContentType=item.content_type)
+        return self._url(item.key)
+
+    def start_multipart(self, item: UploadItem) -> str:
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=item.key, ContentType=item.content_type)
+        return response["UploadId"]
+
+    def put_part(self, item: UploadItem, state: str, number: int, offset: int, data: bytes) -> dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=item.key, UploadId=state, PartNumber=number, Body=data
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def finish_multipart(self, item: UploadItem, state: str, parts: List[dict]) -> str:
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=item.key, UploadId=state, MultipartUpload={"Parts": parts}
+        )
+        return self._url(item.key)
+
+    def abort_multipart(self, item: UploadItem, state: str) -> None:
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=item.key, UploadId=state)
+
+    def is_retryable(self, error: Exception) -> bool:
+        from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+        if isinstance(error, (BotoConnectionError, ReadTimeoutError)):
+            return True
+        if isinstance(error, ClientError):
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            return status >= 500 or error.response.get("Error", {}).get("Code") in self.RETRYABLE_CODES
+        return super().is_retryable(error)
+
+
+class SupabaseBackend(UploadBackend):
+    """
+    Supabase Storage（REST API を直接呼び、HTTP セッションを使い回す）
+
+    大きなオブジェクトは TUS の再開可能アップロードで送る。TUS はオフセット順に
+    送る必要があり、Supabase ではチャンクサイズが 6MB 固定。
+    """
+    name = "supabase"
+    multipart = True
+    parallel_parts = False
+    part_size = 6 * 1024 * 1024
+
+    def __init__(self, url: str, key: str, bucket: str, session=None, pool_size: int = UPLOAD_MAX_WORKERS):
+        self.url = url.rstrip("/")
+        self.bucket = bucket
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        session.headers.update({"Authorization": f"Bearer {key}", "apikey": key})
+        self.session = session
+
+    def public_url(self, key: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{key}"
+
+    def _check(self, response) -> None:
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientUploadError(f"{response.status_code}: {response.text[:200]}")
+        if response.status_code >= 400:
+            raise UploadError(f"{response.status_code}: {response.text[:200]}")
+
+    def put(self, item: UploadItem) -> str:
+        response = self.session.post(
+            f"{self.url}/storage/v1/object/{self.bucket}/{item.key}",
+            data=item.read(),
+            headers={"Content-Type": item.content_type, "x-upsert": "true"},
+        )
+        self._check(response)
+        return self.public_url(item.key)
+
+    def start_multipart(self, item: UploadItem) -> str:
+        def encode(value: str) -> str:
+            return base64.b64encode(value.encode()).decode()
+
+        response = self.session.post(
+            f"{self.url}/storage/v1/upload/resumable",
+            headers={
+                "Tus-Resumable": "1.0.0",
+                "Upload-Length": str(item.size),
+                "Upload-Metadata": ",".join([
+                    f"bucketName {encode(self.bucket)}",
+                    f"objectName {encode(item.key)}",
+                    f"contentType {encode(item.content_type)}",
+                ]),
+                "x-upsert": "true",
+            },
+        )
+        self._check(response)
+        return response.headers["Location"]
+
+    def put_part(self, item: UploadItem, state: str, number: int, offset: int, data: bytes) -> int:
+        response = self.session.patch(state, data=data, headers={
+            "Tus-Resumable": "1.0.0",
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream",
+        })
+        self._check(response)
+        return number
+
+    def finish_multipart(self, item: UploadItem, state: str, parts: List[int]) -> str:
+        return self.public_url(item.key)
+
+    def abort_multipart(self, item: UploadItem, state: str) -> None:
+        self.session.delete(state, headers={"Tus-Resumable": "1.0.0"})
+
+    def is_retryable(self, error: Exception) -> bool:
+        import requests
+
+        return isinstance(error, (requests.ConnectionError, requests.Timeout)) or super().is_retryable(error)
+
+
+class GCSBackend(UploadBackend):
+    """
+    Google Cloud Storage
+
+    クライアントの認証済みセッションを使い回す。大きなオブジェクトは chunk_size を
+    指定した再開可能アップロード（ライブラリがチャンク単位で送信）になる。
+    """
+    name = "gcs"
+
+    def __init__(self, bucket, chunk_size: int = UPLOAD_PART_SIZE, multipart_threshold: int = UPLOAD_MULTIPART_THRESHOLD):
+        self.bucket = bucket
+        # GCS のチャンクサイズは 256KB の倍数
+        self.chunk_size = max(256 * 1024, chunk_size - chunk_size % (256 * 1024))
+        self.multipart_threshold = multipart_threshold
+
+    def put(self, item: UploadItem) -> str:
+        blob = self.bucket.blob(item.key)
+        if item.size >= self.multipart_threshold:
+            blob.chunk_size = self.chunk_size
+        if item.data is not None:
+            blob.upload_from_string(item.data, content_type=item.content_type)
+        else:
+            blob.upload_from_filename(item.source_path, content_type=item.content_type)
+        return blob.public_url
+
+    def is_retryable(self, error: Exception) -> bool:
+        from google.api_core import exceptions as gexc
+
+        return isinstance(error, (gexc.ServerError, gexc.TooManyRequests)) or super().is_retryable(error)
+
+
+class CloudinaryBackend(UploadBackend):
+    """Cloudinary（SDK の1回のアップロードで送る）"""
+    name = "cloudinary"
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def put(self, item: UploadItem) -> str:
+        success, result = self.storage.upload_video_from_bytes(
+            file_bytes=item.read(),
+            filename=os.path.basename(item.key),
+            public_id=item.key.replace("/", "_").replace(".", "_"),  # スラッシュとドットを変換
+        )
+        if not success:
+            raise UploadError(result.get("error", "Unknown error"))
+        return result["secure_url"]
+
+
+class UploadEngine:
+    """上限付きワーカープールでの並列アップロード（マルチパート・再試行付き）"""
+
+    def __init__(
+        self,
+        backend: UploadBackend,
+        max_workers: int = UPLOAD_MAX_WORKERS,
+        multipart_threshold: int = UPLOAD_MULTIPART_THRESHOLD,
+        part_size: int = UPLOAD_PART_SIZE,
+        max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+        backoff_base: float = UPLOAD_BACKOFF_BASE_SECONDS,
+        backoff_max: float = UPLOAD_BACKOFF_MAX_SECONDS,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.backend = backend
+        self.multipart_threshold = multipart_threshold
+        self.part_size = backend.part_size or part_size
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        # オブジェクト用とパート用でプールを分ける（オブジェクトのワーカーがパートの完了を
+        # 待つため、同じプールだとワーカーが埋まってデッドロックする）
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._part_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-part")
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目の失敗後の待ち時間（フルジッター）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _with_retries(self, func: Callable[[], Any], description: str) -> Tuple[Any, int]:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(), attempt
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.backend.is_retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"{description} 失敗（{attempt}/{self.max_attempts}回目）、{delay:.2f}秒後に再試行: {e}")
+                self._sleep(delay)
+
+    def _upload_multipart(self, item: UploadItem) -> Tuple[str, int, int]:
+        size = item.size
+        offsets = list(range(0, size, self.part_size))
+        state, attempts = self._with_retries(lambda: self.backend.start_multipart(item), f"{item.key} マルチパート開始")
+
+        def send(number: int) -> Tuple[Any, int]:
+            offset = offsets[number - 1]
+            data = item.read(offset, min(self.part_size, size - offset))
+            return self._with_retries(
+                lambda: self.backend.put_part(item, state, number, offset, data),
+                f"{item.key} パート{number}/{len(offsets)}",
+            )
+
+        numbers = range(1, len(offsets) + 1)
+        try:
+            if self.backend.parallel_parts:
+                sent = list(self._part_pool.map(send, numbers))
+            else:
+                sent = [send(number) for number in numbers]
+            url, finish_attempts = self._with_retries(
+                lambda: self.backend.finish_multipart(item, state, [part for part, _ in sent]),
+                f"{item.key} マルチパート完了",
+            )
+        except Exception:
+            try:
+                self.backend.abort_multipart(item, state)
+            except Exception as e:
+                logger.warning(f"{item.key} マルチパート中止に失敗: {e}")
+            raise
+        return url, max([attempts, finish_attempts] + [a for _, a in sent]), len(offsets)
+
+    def upload(self, item: UploadItem) -> UploadResult:
+        """1オブジェクトを呼び出し元のスレッドでアップロード（失敗は結果として返す）"""
+        try:
+            if self.backend.multipart and item.size >= self.multipart_threshold:
+                url, attempts, parts = self._upload_multipart(item)
+            else:
+                url, attempts = self._with_retries(lambda: self.backend.put(item), item.key)
+                parts = 1
+        except Exception as e:
+            logger.error(f"アップロード失敗 ({self.backend.name}: {item.key}): {e}")
+            return UploadResult(key=item.key, success=False, error=str(e))
+        logger.info(f"アップロード完了 ({self.backend.name}: {item.key}, parts={parts}, attempts={attempts})")
+        return UploadResult(key=item.key, success=True, url=url, attempts=attempts, parts=parts)
+
+    def submit(self, item: UploadItem) -> "Future[UploadResult]":
+        """ワーカープールでアップロードを開始"""
+        return self._pool.submit(self.upload, item)
+
+    def upload_many(self, items: Iterable[UploadItem]) -> List[UploadResult]:
+        """複数オブジェクトを並列にアップロード（結果は入力順、失敗しても他は続行）"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+        self._part_pool.shutdown(wait=wait)
@@ -49,8 +49,8 @@ class VideoAnalyzer:
         else:
             self.gemini_model = None
         
-    def extract_frames(self, video_path: str, fps: int = 2) -> List[Dict[str, Any]]:
-        """動画からフレームを抽出 - スマート抽出モード"""
+    def extract_frames(self, video_path: str, fps: int = 2, proxy_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """動画からフレームを抽出 - スマート抽出モード（proxy_pathがあれば評価はプロキシで行う）"""
         try:
             # スマート抽出を試みる
             from services.smart_frame_extractor import SmartFrameExtractor
@@ -59,7 +59,7 @@ class VideoAnalyzer:
             extractor = SmartFrameExtractor()
             
             # 初期サンプリングは多めに（fps=10）、その後フィルタリング
-            frames = extractor.extract_smart_frames(video_path, sample_fps=10)
+            frames = extractor.extract_smart_frames(video_path, sample_fps=10, proxy_path=proxy_path)
             
             if frames:
                 logger.info(f"Smart extraction found {len(frames)} optimal frames")
@@ -0,0 +1,436 @@
+"""
+再生用レンディションの作成（faststart リマックス）とキーフレームインデックス
+
+iPhone の MOV は moov アトムがファイル末尾にあることが多く、ブラウザの
+プレイヤーは再生開始前に余分な Range 要求が必要になる。アップロード後に
+moov を先頭に置いた MP4（faststart）を作成して再生に使う。コーデックが
+MP4 でそのまま使え、キーフレーム間隔が十分短い場合は再エンコードせずに
+コピーする。キーフレームの時刻は MP4 のサンプルテーブル（stss / stts / ctts）
+から読み取り、デコードせずにインデックスを作る。
+
+あわせて解析・プレビュー用の低解像度プロキシ（短い GOP の H.264）も作成する。
+フレームのサンプリング・スクラブ・サムネイルはプロキシをデコードし、
+OCR に渡す最終的な切り出しだけ元の解像度の動画から読む。
+"""
+import bisect
+import json
+import os
+import struct
+import logging
+import subprocess
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from services.blob_store import local_file, pinned_local_file, resolve_local_path, to_db_path
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# 再エンコードせずにコピーできる映像コーデック（MP4 のサンプルエントリ）
+COPY_VIDEO_CODECS = {"avc1", "avc3", "hvc1", "hev1"}
+
+# キーフレーム間隔がこれを超える場合は再エンコードする（秒）
+REMUX_MAX_KEYFRAME_GAP_SECONDS = float(os.getenv("REMUX_MAX_KEYFRAME_GAP_SECONDS", "4.0"))
+
+# 再エンコード時のキーフレーム間隔（秒）
+REMUX_KEYFRAME_INTERVAL_SECONDS = float(os.getenv("REMUX_KEYFRAME_INTERVAL_SECONDS", "1.0"))
+
+# プロキシの長辺の最大ピクセル数（元動画の方が小さい場合は拡大しない）
+PROXY_MAX_DIMENSION = int(os.getenv("PROXY_MAX_DIMENSION", "960"))
+
+# プロキシのキーフレーム間隔（秒）。短いほどシークが速い
+PROXY_KEYFRAME_INTERVAL_SECONDS = float(os.getenv("PROXY_KEYFRAME_INTERVAL_SECONDS", "0.5"))
+
+# ffmpeg の最大実行時間（秒）
+REMUX_TIMEOUT_SECONDS = int(os.getenv("REMUX_TIMEOUT_SECONDS", "600"))
+
+
+@dataclass
+class Mp4Info:
+    """MP4 / MOV のコンテナ情報"""
+    faststart: bool
+    video_codec: Optional[str] = None
+    duration_ms: Optional[int] = None
+    keyframes_ms: List[int] = field(default_factory=list)
+
+    @property
+    def max_keyframe_gap_ms(self) -> Optional[int]:
+        if not self.keyframes_ms:
+            return None
+        points = list(self.keyframes_ms)
+        if self.duration_ms and self.duration_ms > points[-1]:
+            points.append(self.duration_ms)
+        return max((b - a for a, b in zip(points, points[1:])), default=0)
+
+
+# ---------------------------------------------------------------------------
+# MP4 ボックスの読み取り
+# ---------------------------------------------------------------------------
+
+def _iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[str, int, int]]:
+    """[start, end) の子ボックスを (種類, ペイロード開始, ボックス終了) で列挙"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            break
+        yield box_type.decode("latin-1"), position + header, position + size
+        position += size
+
+
+def _find(f: BinaryIO, start: int, end: int, path: List[str]) -> Optional[Tuple[int, int]]:
+    """ボックスのパス（例: ["mdia", "minf", "stbl"]）をたどって最初の一致を返す"""
+    for box_type, payload, box_end in _iter_boxes(f, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return _find(f, payload, box_end, path[1:])
+    return None
+
+
+def _read_table(f: BinaryIO, box: Optional[Tuple[int, int]], entry_format: str) -> List[tuple]:
+    """full box のエントリテーブルを読む（version/flags・entry_count の後に続く配列）"""
+    if box is None:
+        return []
+    f.seek(box[0] + 4)
+    count = struct.unpack(">I", f.read(4))[0]
+    entry_size = struct.calcsize(entry_format)
+    data = f.read(entry_size * count)
+    return [struct.unpack_from(entry_format, data, i * entry_size) for i in range(len(data) // entry_size)]
+
+
+def _read_timescale(f: BinaryIO, mdhd: Tuple[int, int]) -> Tuple[int, int]:
+    f.seek(mdhd[0])
+    version = f.read(1)[0]
+    f.read(3)
+    if version == 1:
+        f.read(16)
+        return struct.unpack(">IQ", f.read(12))
+    f.read(8)
+    return struct.unpack(">II", f.read(8))
+
+
+def _read_media_time(f: BinaryIO, elst: Optional[Tuple[int, int]]) -> int:
+    """編集リストの最初の有効な開始位置（B フレームによる表示遅延の補正）"""
+    if elst is None:
+        return 0
+    f.seek(elst[0])
+    version = f.read(1)[0]
+    f.read(3)
+    count = struct.unpack(">I", f.read(4))[0]
+    for _ in range(count):
+        if version == 1:
+            _, media_time, _ = struct.unpack(">Qqi", f.read(20))
+        else:
+            _, media_time, _ = struct.unpack(">Iii", f.read(12))
+        if media_time >= 0:
+            return media_time
+    return 0
+
+
+def _keyframe_times(f: BinaryIO, trak: Tuple[int, int]) -> Tuple[Optional[str], Optional[int], List[int]]:
+    """映像トラックのコーデック・長さ・キーフレーム時刻（ミリ秒）"""
+    mdhd = _find(f, trak[0], trak[1], ["mdia", "mdhd"])
+    stbl = _find(f, trak[0], trak[1], ["mdia", "minf", "stbl"])
+    if mdhd is None or stbl is None:
+        return None, None, []
+
+    timescale, duration = _read_timescale(f, mdhd)
+    if not timescale:
+        return None, None, []
+
+    codec = None
+    stsd = _find(f, stbl[0], stbl[1], ["stsd"])
+    if stsd is not None:
+        f.seek(stsd[0] + 12)
+        codec = f.read(4).decode("latin-1")
+
+    stts = _read_table(f, _find(f, stbl[0], stbl[1], ["stts"]), ">II")
+    stss = _find(f, stbl[0], stbl[1], ["stss"])
+    ctts = _read_table(f, _find(f, stbl[0], stbl[1], ["ctts"]), ">Ii")
+    media_time = _read_media_time(f, _find(f, trak[0], trak[1], ["edts", "elst"]))
+
+    total_samples = sum(count for count, _ in stts)
+    if stss is None:
+        # stss がない場合は全サンプルがキーフレーム
+        sync_samples = list(range(1, total_samples + 1))
+    else:
+        sync_samples = [number for (number,) in _read_table(f, stss, ">I")]
+
+    # サンプル番号（1始まり）→ デコード時刻
+    times = []
+    run_iter = iter(stts)
+    run_first, run_count, run_delta, run_dts = 1, 0, 0, 0
+    ctts_index, ctts_first = 0, 1
+    for sample in sorted(sync_samples):
+        while sample >= run_first + run_count:
+            run_dts += run_count * run_delta
+            run_first += run_count
+            try:
+                run_count, run_delta = next(run_iter)
+            except StopIteration:
+                run_count = 0
+                break
+        if sample >= run_first + run_count:
+            break
+        dts = run_dts + (sample - run_first) * run_delta
+
+        offset = 0
+        while ctts_index < len(ctts) and sample >= ctts_first + ctts[ctts_index][0]:
+            ctts_first += ctts[ctts_index][0]
+            ctts_index += 1
+        if ctts_index < len(ctts):
+            offset = ctts[ctts_index][1]
+
+        times.append(max(0, int((dts + offset - media_time) * 1000 / timescale)))
+
+    return codec, int(duration * 1000 / timescale), times
+
+
+def read_mp4_info(path) -> Optional[Mp4Info]:
+    """MP4 / MOV を読み、faststart かどうかとキーフレーム時刻を返す（MP4 系でなければ None）"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            top_level = [(box_type, payload, box_end) for box_type, payload, box_end in _iter_boxes(f, 0, size)]
+            types = [box_type for box_type, _, _ in top_level]
+            if "moov" not in types or types[0] not in ("ftyp", "wide", "free", "moov", "mdat", "skip"):
+                return None
+
+            info = Mp4Info(faststart="mdat" not in types or types.index("moov") < types.index("mdat"))
+            moov = next((payload, end) for box_type, payload, end in top_level if box_type == "moov")
+            for box_type, payload, box_end in _iter_boxes(f, *moov):
+                if box_type != "trak":
+                    continue
+                hdlr = _find(f, payload, box_end, ["mdia", "hdlr"])
+                if hdlr is None:
+                    continue
+                f.seek(hdlr[0] + 8)
+                if f.read(4) != b"vide":
+                    continue
+                info.video_codec, info.duration_ms, info.keyframes_ms = _keyframe_times(f, (payload, box_end))
+                break
+            return info
+    except (OSError, struct.error, IndexError, StopIteration) as e:
+        logger.debug(f"MP4解析失敗 ({path}): {e}")
+        return None
+
+
+# ---------------------------------------------------------------------------
+# キーフレームインデックス
+# ---------------------------------------------------------------------------
+
+def dump_keyframe_index(keyframes_ms: List[int]) -> str:
+    return json.dumps(keyframes_ms, separators=(",", ":"))
+
+
+def load_keyframe_index(value: Optional[str]) -> List[int]:
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return []
+
+
+def nearest_keyframe(keyframes_ms: List[int], time_ms: int) -> Optional[int]:
+    """指定時刻に最も近いキーフレームの時刻"""
+    if not keyframes_ms:
+        return None
+    index = bisect.bisect_left(keyframes_ms, time_ms)
+    candidates = keyframes_ms[max(0, index - 1):index + 1]
+    return min(candidates, key=lambda keyframe: abs(keyframe - time_ms))
+
+
+# ---------------------------------------------------------------------------
+# リマックス
+# ---------------------------------------------------------------------------
+
+def playback_path_for(video_path) -> Path:
+    """元動画に対応する再生用ファイルのパス（videos/playback/<stem>.mp4）"""
+    video_path = Path(video_path)
+    return video_path.parent / "playback" / f"{video_path.stem}.mp4"
+
+
+def needs_reencode(info: Optional[Mp4Info]) -> bool:
+    """コピーでは再生用の要件（MP4 で扱えるコーデック・短いキーフレーム間隔）を満たせないか"""
+    if info is None or info.video_codec not in COPY_VIDEO_CODECS:
+        return True
+    gap = info.max_keyframe_gap_ms
+    return gap is None or gap > REMUX_MAX_KEYFRAME_GAP_SECONDS * 1000
+
+
+def _ffmpeg_command(source, destination, info: Optional[Mp4Info], reencode: bool) -> List[str]:
+    command = [FFMPEG_BINARY, "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+               "-map", "0:v:0", "-map", "0:a:0?", "-map_metadata", "0"]
+    if reencode:
+        command += [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+            # 一定間隔でキーフレームを入れる（シーンチェンジによる追加は行わない）
+            "-force_key_frames", f"expr:gte(t,n_forced*{REMUX_KEYFRAME_INTERVAL_SECONDS})",
+            "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", "128k",
+        ]
+    else:
+        command += ["-c", "copy"]
+        if info and info.video_codec in ("hvc1", "hev1"):
+            # Safari は hev1 タグの HEVC を再生しない
+            command += ["-tag:v", "hvc1"]
+    command += ["-movflags", "+faststart", "-f", "mp4", str(destination)]
+    return command
+
+
+def create_playback_rendition(source, name=None) -> Tuple[Path, Dict]:
+    """
+    再生用の faststart MP4 を作成し、(パス, 結果) を返す
+
+    既に faststart な MP4 でキーフレーム間隔も十分なら元ファイルをそのまま使う
+    （name を指定した場合は name をファイル名の基準にして必ず作成する）。
+    結果には mode（original / copy / reencode）とキーフレーム時刻を含む。
+    """
+    source = Path(source)
+    info = read_mp4_info(source)
+    reencode = needs_reencode(info)
+
+    if (name is None and info and info.faststart and not reencode
+            and source.suffix.lower() in (".mp4", ".m4v")):
+        return source, {"mode": "original", "keyframes_ms": info.keyframes_ms, "duration_ms": info.duration_ms}
+
+    destination = playback_path_for(name or source)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(destination.name + ".part")
+
+    mode = "reencode" if reencode else "copy"
+    try:
+        subprocess.run(_ffmpeg_command(source, partial, info, reencode),
+                       check=True, capture_output=True, timeout=REMUX_TIMEOUT_SECONDS)
+    except subprocess.CalledProcessError as e:
+        if reencode:
+            raise
+        # コピーできないストリームが含まれる場合は再エンコードにフォールバック
+        logger.warning(f"コピーでのリマックスに失敗したため再エンコードします: {e.stderr.decode(errors='ignore')[:200]}")
+        mode = "reencode"
+        subprocess.run(_ffmpeg_command(source, partial, info, True),
+                       check=True, capture_output=True, timeout=REMUX_TIMEOUT_SECONDS)
+    finally:
+        if partial.exists() and not partial.stat().st_size:
+            partial.unlink()
+    os.replace(partial, destination)
+
+    output_info = read_mp4_info(destination)
+    return destination, {
+        "mode": mode,
+        "keyframes_ms": output_info.keyframes_ms if output_info else [],
+        "duration_ms": output_info.duration_ms if output_info else None,
+    }
+
+
+def proxy_path_for(video_path) -> Path:
+    """元動画に対応するプロキシのパス（videos/proxy/<stem>.mp4）"""
+    video_path = Path(video_path)
+    return video_path.parent / "proxy" / f"{video_path.stem}.mp4"
+
+
+def _proxy_command(source, destination) -> List[str]:
+    size = PROXY_MAX_DIMENSION
+    return [
+        FFMPEG_BINARY, "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+        "-map", "0:v:0", "-an", "-map_metadata", "-1",
+        # 縦横比を保って長辺を PROXY_MAX_DIMENSION 以下に縮小（拡大はしない）
+        "-vf", f"scale='min({size},iw)':'min({size},ih)':force_original_aspect_ratio=decrease:force_divisible_by=2",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "26", "-pix_fmt", "yuv420p",
+        # デコード負荷の低い設定（CABAC・デブロッキングなし）
+        "-tune", "fastdecode",
+        "-force_key_frames", f"expr:gte(t,n_forced*{PROXY_KEYFRAME_INTERVAL_SECONDS})",
+        "-sc_threshold", "0",
+        "-movflags", "+faststart", "-f", "mp4", str(destination),
+    ]
+
+
+def create_proxy_rendition(source, name=None) -> Path:
+    """解析・プレビュー用の低解像度プロキシを作成してパスを返す（name はファイル名の基準）"""
+    source = Path(source)
+    destination = proxy_path_for(name or source)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(destination.name + ".part")
+    try:
+        subprocess.run(_proxy_command(source, partial), check=True, capture_output=True, timeout=REMUX_TIMEOUT_SECONDS)
+    finally:
+        if partial.exists() and not partial.stat().st_size:
+            partial.unlink()
+    os.replace(partial, destination)
+    return destination
+
+
+def proxy_source(video) -> Optional[str]:
+    """解析・プレビューに使うプロキシの実ファイルパス（未作成・消失時は None で元動画を使う）"""
+    if not getattr(video, "proxy_path", None):
+        return None
+    return local_file(video.proxy_path)
+
+
+def prepare_playback_rendition(video_id: int, session_factory=None) -> None:
+    """
+    バックグラウンドタスク: アップロード後に再生用レンディション・キーフレームインデックス・
+    解析用プロキシを作成
+
+    どちらか一方の作成に失敗しても、もう一方は保存する（失敗した側は元動画にフォールバック）。
+    """
+    from database import SessionLocal
+    from models import Video
+
+    db = (session_factory or SessionLocal)()
+    pins = ExitStack()  # キャッシュ経由で取得した動画を作成し終わるまで残す
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video or not video.local_path:
+            return
+
+        # クラウドにしかない動画はキャッシュ経由で取得し、レンディションは videos/ 配下に作る
+        source = pins.enter_context(pinned_local_file(video.local_path, video.gcs_uri))
+        if source is None:
+            logger.warning(f"再生用レンディション作成をスキップ（ファイルなし）: {video.local_path}")
+            return
+        name = None
+        if source != resolve_local_path(video.local_path):
+            name = Path(resolve_local_path("uploads/videos")) / f"video_{video_id}.mp4"
+
+        try:
+            path, result = create_playback_rendition(source, name)
+        except FileNotFoundError:
+            logger.warning("ffmpegが見つからないため再生用レンディション・プロキシを作成しません")
+            return
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.error(f"再生用レンディション作成エラー (video_id={video_id}): {e}")
+        else:
+            video.playback_path = to_db_path(path)
+            video.keyframe_index_json = dump_keyframe_index(result["keyframes_ms"])
+            if result.get("duration_ms") and not video.duration_ms:
+                video.duration_ms = result["duration_ms"]
+            db.commit()
+            logger.info(
+                f"再生用レンディション作成: video_id={video_id}, mode={result['mode']}, "
+                f"keyframes={len(result['keyframes_ms'])}, path={path}"
+            )
+
+        try:
+            proxy = create_proxy_rendition(source, name)
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.error(f"プロキシ作成エラー (video_id={video_id}): {e}")
+            return
+        video.proxy_path = to_db_path(proxy)
+        db.commit()
+        logger.info(f"解析用プロキシ作成: video_id={video_id}, path={proxy}")
+    finally:
+        pins.close()
+        db.close()
@@ -23,6 +23,12 @@ class VisionOCRService:
         - Cloud Run: Workload Identity自動使用
         - Railway/Render: Base64エンコードされたJSONキー使用
         """
+        # OCRに送る画像の最適化（VP_OCR_PAYLOAD=false で元の画像をそのまま送る）
+        from video_processing.config import load_config
+        from video_processing.ocr_payload import OCRPayloadOptimizer
+        config = load_config()
+        self.payload_optimizer = OCRPayloadOptimizer(config) if config.ocr_payload else None
+        
         try:
             # 環境変数からBase64エンコードされたJSONキーを確認
             import base64
@@ -54,15 +60,36 @@ class VisionOCRService:
             logger.info("Please run: gcloud auth application-default login or set GOOGLE_APPLICATION_CREDENTIALS_JSON")
             self.client = None
     
+    def _ocr_payload(self, image_path: str):
+        """
+        OCRに送る画像（文書の検出・切り出し、グレースケール、縮小、PNG/JPEGの選択）
+
+        フレーム全体を送るとAPI 1回あたり数MBになるため。VP_OCR_PAYLOAD=false または
+        読めない画像は None（元のファイルをそのまま送る）
+        """
+        if self.payload_optimizer is None:
+            return None
+        try:
+            return self.payload_optimizer.optimize_file(image_path, detect=True)
+        except Exception as e:
+            logger.warning(f"OCR payload optimization failed, sending original image: {e}")
+            return None
+    
     def extract_text_from_image(self, image_path: str) -> Dict[str, Any]:
         """画像からテキスト抽出（OCR）"""
         if not self.client:
             raise Exception("Vision API client not initialized")
         
         try:
-            # 画像ファイル読み込み
-            with io.open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            # 画像ファイル読み込み（レシートの領域だけを切り出し、縮小・再エンコードして送る）
+            payload = self._ocr_payload(image_path)
+            if payload is not None:
+                content = payload.data
+                logger.info(f"OCR payload: {len(content)} bytes ({payload.format}, {payload.shape[1]}x{payload.shape[0]}), "
+                            f"{payload.bytes_saved} bytes saved")
+            else:
+                with io.open(image_path, 'rb') as image_file:
+                    content = image_file.read()
             
             image = vision.Image(content=content)
             
@@ -102,7 +129,9 @@ class VisionOCRService:
             return {
                 'full_text': full_text,
                 'blocks': blocks,
-                'raw_response': response
+                'raw_response': response,
+                'payload_bytes': len(content),
+                'payload_bytes_saved': payload.bytes_saved if payload is not None else 0
             }
             
         except Exception as e:
@@ -19,6 +19,12 @@ if [ -z "$DATABASE_URL" ]; then
     echo "Please set DATABASE_URL in Render Dashboard > Environment Variables"
 fi
 
+# マイグレーション（render.yaml の preDeployCommand で実行する場合は MIGRATE_ON_START=false）
+if [ "${MIGRATE_ON_START:-true}" = "true" ]; then
+    echo "Running migrations..."
+    python migrate.py || echo "WARNING: migration failed"
+fi
+
 # サーバー起動
 echo "Starting server on port: $PORT"
 exec uvicorn main:app --host 0.0.0.0 --port "$PORT" --log-level info
\ No newline at end of file
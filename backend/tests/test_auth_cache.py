@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, User
+from services.auth_cache import PrincipalCache, principal_cache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # bcrypt のハッシュ計算は不要なのでダミーのハッシュで直接登録
+        conn.execute(insert(User), [
+            {"id": i, "email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x", "is_active": True}
+            for i in (1, 2)
+        ])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine), statements
+    engine.dispose()
+
+def _load(db, user_id):
+    return db.query(User).filter(User.id == user_id).first()
+
+def test_hit_skips_query_and_persists_changes(session_factory):
+    """ヒット時はSELECTを行わず、返したユーザーの変更はコミットで保存されるテスト"""
+    SessionLocal, statements = session_factory
+    cache = PrincipalCache(ttl=30, max_entries=10)
+
+    with SessionLocal() as db:
+        assert cache.get(db, "v", "t1") is None
+        cache.put("v", "t1", _load(db, 1))
+
+    with SessionLocal() as db:
+        statements.clear()
+        user = cache.get(db, "v", "t1")
+        assert user.username == "user1" and user.is_active
+        assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+        user.full_name = "変更後"
+        db.commit()
+
+    with SessionLocal() as db:
+        assert _load(db, 1).full_name == "変更後"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_expiry_and_lru(session_factory):
+    """TTLとトークンのexpの早い方で期限切れになり、上限を超えると古いものから削除されるテスト"""
+    SessionLocal, _ = session_factory
+    clock = Clock()
+    cache = PrincipalCache(ttl=30, max_entries=2, clock=clock)
+
+    with SessionLocal() as db:
+        user1, user2 = _load(db, 1), _load(db, 2)
+        cache.put("v", "short", user1, expires_at=clock.now + 5)
+        cache.put("v", "long", user1)
+        clock.now += 10
+        assert cache.get(db, "v", "short") is None
+        assert cache.get(db, "v", "long") is not None
+
+        cache.put("v", "a", user2)
+        cache.put("v", "b", user2)
+        assert cache.get(db, "v", "long") is None
+        assert cache.get(db, "v", "a") is not None
+        assert cache.stats()["evictions"] == 1
+
+        clock.now += 31
+        assert cache.get(db, "v", "a") is None
+
+    # TTL 0 では無効
+    disabled = PrincipalCache(ttl=0)
+    with SessionLocal() as db:
+        disabled.put("v", "t", _load(db, 1))
+        assert disabled.get(db, "v", "t") is None
+
+def test_invalidation(session_factory):
+    """ユーザーの更新（無効化・パスワード変更）とログアウトでキャッシュが無効化されるテスト"""
+    SessionLocal, _ = session_factory
+    principal_cache.clear()
+
+    with SessionLocal() as db:
+        principal_cache.put("v", "t1", _load(db, 1))
+        principal_cache.put("v", "t2", _load(db, 1))
+        principal_cache.put("v", "t3", _load(db, 2))
+
+    with SessionLocal() as db:
+        user = _load(db, 1)
+        user.is_active = False
+        db.commit()
+
+    with SessionLocal() as db:
+        assert principal_cache.get(db, "v", "t1") is None
+        assert principal_cache.get(db, "v", "t2") is None
+        assert principal_cache.get(db, "v", "t3") is not None
+
+        principal_cache.invalidate_token("t3")
+        assert principal_cache.get(db, "v", "t3") is None
+    principal_cache.clear()
+
+def test_entries_are_per_verifier(session_factory):
+    """別の verifier（SECRET_KEY の異なる認証）が検証したトークンは使わないテスト"""
+    SessionLocal, _ = session_factory
+    cache = PrincipalCache(ttl=30, max_entries=10)
+
+    with SessionLocal() as db:
+        cache.put("routers.auth", "t1", _load(db, 1))
+        assert cache.get(db, "services.auth_service", "t1") is None
+        assert cache.get(db, "routers.auth", "t1") is not None
+
+        # ログアウトはすべての verifier の登録を外す
+        cache.put("services.auth_service", "t1", _load(db, 1))
+        cache.invalidate_token("t1")
+        assert cache.get(db, "routers.auth", "t1") is None
+        assert cache.get(db, "services.auth_service", "t1") is None
+        assert cache.stats()["entries"] == 0
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+import pytest
+from services.blob_cache import BlobCache, BlobNotFound, BlobSource, CachedBlobReader
+
+class CountingSource(BlobSource):
+    """メモリ上のオブジェクトを返し、取得回数・範囲を記録するソース"""
+    def __init__(self, objects, delay=0.0):
+        self.objects = objects
+        self.delay = delay
+        self.ranges = []
+        self.size_calls = 0
+        self._lock = threading.Lock()
+
+    def size(self, key):
+        with self._lock:
+            self.size_calls += 1
+        if key not in self.objects:
+            raise BlobNotFound(key)
+        return len(self.objects[key])
+
+    def read_range(self, key, start, length):
+        time.sleep(self.delay)
+        with self._lock:
+            self.ranges.append((start, length))
+        return self.objects[key][start:start + length]
+
+def _path(cache, key):
+    """オブジェクト全体を取得したキャッシュ上のパス（使用中にはしない）"""
+    with cache.get_path(key) as path:
+        return path
+
+def _cache(tmp_path, source, **kwargs):
+    kwargs.setdefault("block_size", 100)
+    kwargs.setdefault("fetch_size", 200)
+    return BlobCache(lambda key: source, tmp_path / "cache", **kwargs)
+
+def test_partial_range_and_complete(tmp_path):
+    """範囲読み出しは必要なブロックだけ取得し、全体取得後はファイルとして使えるテスト"""
+    data = os.urandom(1050)
+    source = CountingSource({"https://cdn.example/v.mp4": data})
+    cache = _cache(tmp_path, source)
+    key = "https://cdn.example/v.mp4"
+
+    assert cache.read_range(key, 420, 50) == data[420:470]
+    assert source.ranges == [(400, 100)]
+    assert not cache.contains(key)
+
+    # 取得済みブロックは再取得しない
+    assert cache.read_range(key, 410, 80) == data[410:490]
+    assert len(source.ranges) == 1
+
+    path = _path(cache, key)
+    assert open(path, "rb").read() == data
+    assert cache.contains(key)
+    assert not list((tmp_path / "cache").rglob("*.partial"))
+    # 最大 fetch_size ずつ、取得済みブロックを除いて取得する
+    assert sum(length for _, length in source.ranges) == len(data)
+    assert all(length <= 200 for _, length in source.ranges)
+
+    # 再起動後も完成したキャッシュを使う
+    restarted = _cache(tmp_path, source)
+    assert _path(restarted, key) == path
+    assert source.size_calls == 1
+
+    with pytest.raises(BlobNotFound):
+        _path(cache, "https://cdn.example/missing.mp4")
+
+def test_single_flight(tmp_path):
+    """同じオブジェクトへの同時アクセスで取得が1回にまとまるテスト"""
+    data = os.urandom(800)
+    source = CountingSource({"k": data}, delay=0.05)
+    cache = _cache(tmp_path, source, fetch_size=800)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(_path(cache, "k"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1
+    assert source.size_calls == 1
+    assert source.ranges == [(0, 800)]
+    assert cache.misses == 1
+
+def test_lru_eviction(tmp_path):
+    """容量を超えたら最後に使われたのが古いものから削除されるテスト"""
+    objects = {key: os.urandom(300) for key in ("a", "b", "c")}
+    source = CountingSource(objects)
+    cache = _cache(tmp_path, source, max_bytes=700)
+
+    path_a = _path(cache, "a")
+    _path(cache, "b")
+    _path(cache, "a")  # a を最近使ったものにする
+    _path(cache, "c")
+
+    assert cache.contains("a") and cache.contains("c")
+    assert not cache.contains("b")
+    assert cache.total_bytes <= 700
+    assert os.path.exists(path_a)
+
+    # 使用中のエントリは削除しない
+    with cache.open("b") as reader:
+        assert reader.read(10) == objects["b"][:10]
+        _path(cache, "a")
+        assert cache.total_bytes > 0
+    cache.invalidate("a")
+    assert not cache.contains("a") and not os.path.exists(path_a)
+
+    # get_path のパスは with の間は削除されず、出た後は削除されうる
+    with cache.get_path("b") as path_b:
+        _path(cache, "a")
+        _path(cache, "c")
+        assert open(path_b, "rb").read() == objects["b"]
+        cache.invalidate("b")
+        assert os.path.exists(path_b)
+    _path(cache, "a")
+    assert not os.path.exists(path_b)
+
+def test_reader_with_video_capture(tmp_path):
+    """キャッシュのリーダーを seek/read でき、OpenCV で動画として開けるテスト"""
+    video = tmp_path / "video.mp4"
+    writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, np.uint8))
+    writer.release()
+    data = video.read_bytes()
+
+    source = CountingSource({"https://cdn.example/video.mp4": data})
+    cache = _cache(tmp_path, source, block_size=4096, fetch_size=8192)
+
+    reader = cache.open("https://cdn.example/video.mp4")
+    assert isinstance(reader, CachedBlobReader)
+    reader.seek(-8, os.SEEK_END)
+    assert reader.read() == data[-8:]
+    reader.seek(0)
+
+    if hasattr(cv2, "IStreamReader"):
+        cap = cv2.VideoCapture(reader, cv2.CAP_FFMPEG, [])
+        ret, frame = cap.read()
+        cap.release()
+        assert ret and frame.shape[:2] == (48, 64)
+    reader.close()
+
+    with cache.get_path("https://cdn.example/video.mp4") as path:
+        cap = cv2.VideoCapture(path)
+        assert cap.read()[0]
+        cap.release()
@@ -0,0 +1,102 @@
+import os
+from services.blob_cache import BlobCache, BlobNotFound, BlobSource
+from services.blob_store import BlobResolver, CloudBlobStore, EphemeralBlobStore, LocalBlobStore
+
+class MemorySource(BlobSource):
+    def __init__(self, objects):
+        self.objects = objects
+        self.reads = 0
+
+    def size(self, key):
+        if key not in self.objects:
+            raise BlobNotFound(key)
+        return len(self.objects[key])
+
+    def read_range(self, key, start, length):
+        self.reads += 1
+        return self.objects[key][start:start + length]
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _resolver(tmp_path, objects=None, **kwargs):
+    source = MemorySource(objects or {})
+    cache = BlobCache(lambda key: source, tmp_path / "cache")
+    return BlobResolver(LocalBlobStore(tmp_path / "uploads"), CloudBlobStore(cache), **kwargs), source
+
+def test_keys_are_environment_independent(tmp_path):
+    """キーは uploads/ 形式で保存し、ストアのルートに対応させるテスト"""
+    local = LocalBlobStore(tmp_path / "uploads")
+    ephemeral = EphemeralBlobStore("/tmp")
+    assert local.path_for("uploads/frames/a.jpg") == str(tmp_path / "uploads/frames/a.jpg")
+    assert ephemeral.path_for("uploads/frames/a.jpg") == "/tmp/frames/a.jpg"
+    assert ephemeral.key_for("/tmp/frames/a.jpg") == "uploads/frames/a.jpg"
+    assert local.key_for(tmp_path / "uploads/videos/v.mp4") == "uploads/videos/v.mp4"
+    # 以前の形式（実ファイルのパス）はそのまま
+    assert ephemeral.path_for("/var/data/a.jpg") == "/var/data/a.jpg"
+    assert ephemeral.key_for("/var/data/a.jpg") == "/var/data/a.jpg"
+
+def test_resolve_caches_stat(tmp_path):
+    """存在確認の結果をTTLの間キャッシュし、書き込み・削除で無効化するテスト"""
+    clock = Clock()
+    resolver, _ = _resolver(tmp_path, ttl=30, missing_ttl=0, clock=clock)
+    path = resolver.writable_path("uploads/frames/a.jpg")
+    with open(path, "wb") as f:
+        f.write(b"jpg")
+
+    assert resolver.resolve("uploads/frames/a.jpg") == path
+    assert resolver.resolve("uploads/frames/a.jpg") == path
+    assert (resolver.stat_calls, resolver.stat_hits) == (1, 1)
+
+    # 存在しない結果は既定ではキャッシュしない
+    assert resolver.resolve("uploads/frames/b.jpg") is None
+    assert resolver.resolve("uploads/frames/b.jpg") is None
+    assert resolver.stat_calls == 3
+
+    clock.now = 31
+    assert resolver.resolve("uploads/frames/a.jpg") == path
+    assert resolver.stat_calls == 4
+
+    resolver.delete("uploads/frames/a.jpg")
+    assert not os.path.exists(path)
+    assert resolver.resolve("uploads/frames/a.jpg") is None
+
+def test_resolve_falls_back_to_cloud(tmp_path):
+    """ローカルを優先し、なければクラウドのオブジェクトをキャッシュ経由で読むテスト"""
+    url = "https://cdn.example/videos/v.mp4"
+    resolver, source = _resolver(tmp_path, {url: b"remote"})
+
+    path = resolver.resolve("uploads/videos/v.mp4", url)
+    assert open(path, "rb").read() == b"remote"
+    assert resolver.resolve(url) == path
+    assert source.reads == 1
+
+    local = resolver.writable_path("uploads/videos/v.mp4")
+    with open(local, "wb") as f:
+        f.write(b"local")
+    assert resolver.resolve("uploads/videos/v.mp4", url) == local
+    assert resolver.resolve("uploads/videos/none.mp4", "https://cdn.example/none.mp4") is None
+
+    # 写しが容量超過などで消えたら取り直す
+    resolver.delete(url)
+    assert not os.path.exists(path)
+    assert open(resolver.resolve(url), "rb").read() == b"remote"
+    assert source.reads == 2
+
+def test_pinned_keeps_cloud_copy(tmp_path):
+    """pinned の間はクラウドの写しがキャッシュから削除されないテスト"""
+    url = "https://cdn.example/videos/v.mp4"
+    resolver, _ = _resolver(tmp_path, {url: b"remote"})
+
+    with resolver.pinned("uploads/videos/v.mp4", url) as path:
+        resolver.delete(url)
+        assert open(path, "rb").read() == b"remote"
+    resolver.delete(url)
+    assert not os.path.exists(path)
+
+    with resolver.pinned("uploads/videos/none.mp4", "https://cdn.example/none.mp4") as path:
+        assert path is None
@@ -0,0 +1,115 @@
+import csv
+import io
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Video, Receipt, JournalEntry
+from services.export_engine import (
+    ExportFormatSpec, build_export_query, get_format, iter_export, register_format,
+    template, text, UTF8_BOM
+)
+
+# テスト用データベース
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.flush()
+    for i in range(5):
+        receipt = Receipt(
+            video_id=video.id,
+            vendor=f"店舗{i}",
+            vendor_norm=f"店舗{i}",
+            issue_date=datetime(2024, 1, 10 + i),
+            total=1100 + i,
+            tax=100,
+            tax_rate=0.10
+        )
+        db.add(receipt)
+        db.flush()
+        db.add(JournalEntry(
+            receipt_id=receipt.id,
+            video_id=video.id,
+            transaction_date=receipt.issue_date.date(),
+            debit_account="5190",
+            credit_account="1110",
+            debit_amount=1100 + i,
+            credit_amount=1100 + i,
+            memo=f"店舗{i}",
+            status="confirmed" if i % 2 == 0 else "unconfirmed"
+        ))
+    db.commit()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _read(chunks):
+    data = b"".join(chunks)
+    assert data.startswith(UTF8_BOM)
+    assert data.count(UTF8_BOM) == 1
+    return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+
+def test_streams_in_chunks(db):
+    """チャンク単位で出力され、BOMは先頭に1回だけ"""
+    chunks = list(iter_export(engine, build_export_query(), get_format("standard"), chunk_rows=2))
+    assert chunks[0].startswith(UTF8_BOM)
+    assert len(chunks) == 4  # BOM・ヘッダー + 3チャンク
+    
+    rows = _read(chunks)
+    assert rows[0][0] == '日付'
+    assert rows[1] == ['2024-01-10', '店舗0', '店舗0', '5190', '1,100', '1110', '1,100', '10%', '100', '確認済']
+    assert rows[2][9] == '未確認'
+    assert len(rows) == 6
+
+def test_accounting_formats(db):
+    """各会計ソフト形式の出力"""
+    rows = _read(iter_export(engine, build_export_query(), get_format("yayoi")))
+    assert rows[1] == ['2024/01/10', 'R000001', '5190', '', '課税仕入 10%', '1,100', '1110', '', '', '1,100',
+                       '店舗0 - 店舗0', 'V001R000001']
+    
+    rows = _read(iter_export(engine, build_export_query(), get_format("freee")))
+    assert rows[1] == ['2024-01-10', '5190', '課税仕入10%', '1100', '店舗0', '店舗0', '', '', '動画1より', 'R000001']
+    
+    rows = _read(iter_export(engine, build_export_query(), get_format("moneyforward")))
+    assert rows[1] == ['2024/01/10', '店舗0 店舗0', '5190', '1100', '1110', '1100', '10%', '100', '領収書1']
+
+def test_filters(db):
+    """フィルター"""
+    query = build_export_query(status="confirmed", start_date=datetime(2024, 1, 11))
+    rows = _read(iter_export(engine, query, get_format("yayoi")))
+    assert len(rows) == 3
+    assert rows[1][0] == '2024/01/12'
+
+def test_parallel_matches_serial(db):
+    """ワーカープロセスでの整形結果は逐次処理と同じ"""
+    spec = get_format("yayoi")
+    serial = b"".join(iter_export(engine, build_export_query(), spec, chunk_rows=2, parallel=False))
+    parallel = b"".join(iter_export(engine, build_export_query(), spec, chunk_rows=2, parallel=True))
+    assert parallel == serial
+
+def test_register_format(db):
+    """形式はプラグインとして追加できる"""
+    spec = register_format(ExportFormatSpec(
+        name="test_minimal",
+        label="テスト",
+        description="テスト用形式",
+        columns=[
+            ('証憑', template("R{:06d}", 'receipt_id')),
+            ('取引先', text('vendor')),
+        ],
+    ))
+    assert get_format("test_minimal") is spec
+    assert spec.filename().startswith("journal_export_test_minimal_")
+    
+    rows = _read(iter_export(engine, build_export_query(), spec))
+    assert rows[0] == ['証憑', '取引先']
+    assert rows[1] == ['R000001', '店舗0']
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,117 @@
+import gzip
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Video, Receipt, JournalEntry, ExportJob
+from services.export_engine import UTF8_BOM
+from services.export_jobs import (
+    compute_data_version, create_export_job, find_reusable_job, make_cache_key, run_export_job
+)
+
+# テスト用データベース
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.flush()
+    for i in range(3):
+        receipt = Receipt(video_id=video.id, vendor=f"店舗{i}", issue_date=datetime(2024, 3, 1 + i), total=1000 + i)
+        db.add(receipt)
+        db.flush()
+        db.add(JournalEntry(
+            receipt_id=receipt.id,
+            video_id=video.id,
+            transaction_date=receipt.issue_date.date(),
+            debit_amount=1000 + i,
+            credit_amount=1000 + i,
+            status="unconfirmed"
+        ))
+    db.commit()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_job_writes_compressed_artifact(db, tmp_path):
+    """ジョブは圧縮した成果物を書き出す"""
+    filters = {"start_date": datetime(2024, 3, 2), "video_id": None}
+    job = create_export_job(db, None, filters, "freee")
+    assert job.status == "queued"
+    
+    run_export_job(job.id, artifact_dir=str(tmp_path), session_factory=TestingSessionLocal)
+    db.refresh(job)
+    
+    assert job.status == "done"
+    assert job.rows_written == 2
+    with gzip.open(job.artifact_path, "rb") as f:
+        data = f.read()
+    assert data.startswith(UTF8_BOM)
+    assert len(data.decode("utf-8-sig").splitlines()) == 3
+
+def test_cached_artifact_reused_until_data_changes(db, tmp_path):
+    """同じ条件・同じデータなら成果物を再利用し、データが変わると別キーになる"""
+    filters = {"status": "unconfirmed"}
+    job = create_export_job(db, 1, filters, "standard")
+    run_export_job(job.id, artifact_dir=str(tmp_path), session_factory=TestingSessionLocal)
+    
+    key = make_cache_key(1, filters, "standard", compute_data_version(db))
+    assert key == job.cache_key
+    assert find_reusable_job(db, key).id == job.id
+    
+    # 他ユーザー・他形式では再利用しない
+    assert find_reusable_job(db, make_cache_key(2, filters, "standard", compute_data_version(db))) is None
+    assert find_reusable_job(db, make_cache_key(1, filters, "yayoi", compute_data_version(db))) is None
+    
+    journal = db.query(JournalEntry).first()
+    journal.status = "confirmed"
+    journal.updated_at = datetime(2030, 1, 1)
+    db.commit()
+    assert make_cache_key(1, filters, "standard", compute_data_version(db)) != key
+
+def test_unknown_format_marks_error(db, tmp_path):
+    """未対応の形式はエラーとして記録される"""
+    job = create_export_job(db, None, {}, "unknown")
+    run_export_job(job.id, artifact_dir=str(tmp_path), session_factory=TestingSessionLocal)
+    db.refresh(job)
+    assert job.status == "error"
+    assert find_reusable_job(db, job.cache_key) is None
+
+def test_job_events_end_when_job_is_deleted(tmp_path, monkeypatch):
+    """ジョブが削除されたらSSEはエラーを通知して終了する"""
+    import asyncio
+    import json
+    from routers import export
+    
+    # 別スレッドから同じDBを読むためファイルのSQLiteを使う
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=file_engine)
+    session = sessionmaker(bind=file_engine)()
+    job = create_export_job(session, None, {}, "standard")
+    job_id = job.id
+    monkeypatch.setattr(export, "JOB_EVENTS_POLL_SECONDS", 0)
+    
+    async def collect():
+        response = await export.export_job_events(job_id, db=session, current_user=None)
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(json.loads(chunk[len("data: "):]))
+            if len(chunks) == 1:
+                session.delete(job)
+                session.commit()
+        return chunks
+    
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        session.close()
+    
+    assert [chunk["status"] for chunk in chunks] == ["queued", "error"]
+    assert chunks[1] == {"id": job_id, "status": "error", "error_message": "エクスポートジョブが見つかりません"}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from services.file_streaming import RangeFileResponse, RangeNotSatisfiable, parse_range_header
+
+DATA = bytes(range(256)) * 4096  # 1MB
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(DATA)
+
+    app = FastAPI()
+
+    @app.api_route("/video", methods=["GET", "HEAD"])
+    async def video(request: Request):
+        return RangeFileResponse(path, request.headers, "video/mp4", method=request.method, chunk_size=64 * 1024)
+
+    return TestClient(app)
+
+def test_parse_range_header():
+    """Range ヘッダーの解析（サフィックス・結合・不正・範囲外）のテスト"""
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=0-1999", 1000) == [(0, 999)]
+    # 重なり・隣接する範囲はまとめる
+    assert parse_range_header("bytes=50-99, 0-49, 200-299, 250-350", 1000) == [(0, 99), (200, 350)]
+    # 構文が不正なものは無視（全体を返す）
+    assert parse_range_header("bytes=abc", 1000) is None
+    assert parse_range_header("items=0-1", 1000) is None
+    assert parse_range_header("bytes=10-5", 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-", 1000)
+
+def test_full_and_single_range(client):
+    """全体・単一範囲・末尾指定の配信テスト"""
+    response = client.get("/video")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+
+    response = client.get("/video", headers={"Range": "bytes=100000-300000"})
+    assert response.status_code == 206
+    assert response.content == DATA[100000:300001]
+    assert response.headers["content-range"] == f"bytes 100000-300000/{len(DATA)}"
+
+    response = client.get("/video", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == DATA[-10:]
+
+    response = client.head("/video", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
+
+def test_multipart_byteranges(client):
+    """複数範囲を multipart/byteranges で返すテスト"""
+    response = client.get("/video", headers={"Range": "bytes=0-9, 500000-500009, -5"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+    assert int(response.headers["content-length"]) == len(response.content)
+
+    parts = response.content.split(b"--" + boundary)
+    assert parts[-1] == b"--\r\n"
+    bodies = [part.split(b"\r\n\r\n", 1)[1][:-2] for part in parts[1:-1]]
+    assert bodies == [DATA[0:10], DATA[500000:500010], DATA[-5:]]
+    assert b"Content-Range: bytes 500000-500009/" in parts[2]
+
+def test_conditional_requests(client):
+    """If-None-Match・If-Range・範囲外のテスト"""
+    etag = client.get("/video").headers["etag"]
+
+    assert client.get("/video", headers={"If-None-Match": etag}).status_code == 304
+
+    # If-Range が一致すれば部分、一致しなければ全体を返す
+    response = client.get("/video", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    response = client.get("/video", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert len(response.content) == len(DATA)
+
+    response = client.get("/video", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import pytest
+from services import frame_selection
+from services.frame_selection import (
+    FrameSelector, IntervalFrameSelector, available_selectors, get_frame_selector,
+    iter_frames_at, read_full_resolution, register_selector, to_frame_data, to_receipt_data,
+)
+from video_processing.types import SelectedFrame
+
+def _write_video(path, size, seconds=6, fps=10):
+    """フレームごとに位置の変わるテキスト風の線を描いた動画"""
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(seconds * fps):
+        frame = np.full((height, width, 3), 40 + i, np.uint8)
+        for y in range(height // 8, height * 7 // 8, max(4, height // 12)):
+            cv2.line(frame, (width // 8 + i % 7, y), (width * 7 // 8, y), (250, 250, 250), max(1, height // 60))
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+def test_registry_and_deployment_setting(monkeypatch):
+    """既定・FRAME_SELECTOR・名前指定の順でエンジンを選ぶテスト"""
+    assert {"receipt", "smart", "interval"} <= set(available_selectors())
+    assert get_frame_selector(default="interval").name == "interval"
+    assert get_frame_selector().runs_ocr
+
+    monkeypatch.setattr(frame_selection, "FRAME_SELECTOR", "smart")
+    assert get_frame_selector(default="interval").name == "smart"
+    assert get_frame_selector("interval").name == "interval"
+    with pytest.raises(ValueError):
+        get_frame_selector("missing")
+
+    @register_selector("fixed")
+    class FixedSelector(FrameSelector):
+        def select(self, video_path, output_dir, stem, proxy_path=None, target_min=7, target_max=15):
+            return []
+
+    try:
+        assert isinstance(get_frame_selector("fixed"), FixedSelector)
+    finally:
+        frame_selection._SELECTORS.pop("fixed")
+
+def test_iter_frames_at_matches_sequential_read(tmp_path):
+    """指定フレームの読み出し（grab で読み進める・シークする）が順に読んだフレームと一致するテスト"""
+    path = _write_video(tmp_path / "video.mp4", (160, 96))
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    wanted = [0, 3, 4, 25, 59, 3]
+    for seek_seconds in (10.0, 0.0):
+        read = list(iter_frames_at(path, wanted, seek_seconds=seek_seconds))
+        assert [number for number, _ in read] == [0, 3, 4, 25, 59]
+        for number, frame in read:
+            assert np.abs(frame.astype(int) - frames[number]).mean() < 1.0
+    assert list(iter_frames_at(path, [1000])) == []
+
+    full = read_full_resolution(path, [0, 2500, 100000])
+    assert sorted(full) == [0, 2500]
+    assert np.abs(full[2500].astype(int) - frames[25]).mean() < 1.0
+
+def test_interval_selector_uses_proxy_and_saves_full_resolution(tmp_path):
+    """interval エンジンがプロキシで評価し、元解像度の画像を間隔を空けて保存するテスト"""
+    source = _write_video(tmp_path / "source.mp4", (320, 192))
+    proxy = _write_video(tmp_path / "proxy.mp4", (160, 96))
+
+    selected = IntervalFrameSelector().select(source, str(tmp_path / "frames"), "frame_1", proxy_path=proxy, target_max=3)
+    assert 0 < len(selected) <= 3
+    times = [frame.time_s for frame in selected]
+    assert times == sorted(times)
+    assert all(b - a >= 1.5 for a, b in zip(times, times[1:]))
+    for frame in selected:
+        assert frame.crop_path.endswith(f"frame_1_{int(frame.time_s * 1000):06d}.jpg")
+        assert cv2.imread(frame.crop_path).shape[:2] == (192, 320)
+        data = to_frame_data(frame)
+        assert data["quality_score"] == frame.score > 10
+        assert data["sharpness"] == frame.metadata["sharpness"]
+
+def test_smart_selector_saves_to_output_dir(tmp_path, monkeypatch):
+    """smart エンジンも画像を output_dir に保存するテスト（作業ディレクトリの uploads/frames を使わない）"""
+    monkeypatch.chdir(tmp_path)
+    source = _write_video(tmp_path / "source.mp4", (320, 192))
+
+    selected = get_frame_selector("smart").select(source, str(tmp_path / "frames"), "frame_1")
+    assert selected
+    assert all(frame.crop_path.startswith(str(tmp_path / "frames")) for frame in selected)
+    assert not (tmp_path / "uploads").exists()
+
+def test_receipt_data_from_selected_frame():
+    """OCR込みのエンジンのレシート情報を receipt_data の形にするテスト"""
+    frame = SelectedFrame(time_s=1.0, score=0.9, doc_quad=None, crop_path="crop.jpg", phash="", ocr_text="...",
+                          metadata={"receipt_info": {"vendor": "ローソン", "date": "2024-05-05", "total": 1280,
+                                                     "tax": None, "currency": "JPY", "fusion": {"frames": 2}}})
+    assert to_receipt_data(frame) == {"vendor": "ローソン", "issue_date": "2024-05-05", "total": 1280, "currency": "JPY"}
+
+    frame.metadata["receipt_info"]["vendor"] = None
+    assert to_receipt_data(frame) is None
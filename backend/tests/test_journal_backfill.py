@@ -0,0 +1,74 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Video, Frame, Receipt, JournalEntry
+from services.journal_backfill import generate_missing_journals_bulk, count_missing_receipts
+
+# テスト用データベース
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _seed(db, count):
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.flush()
+    frame = Frame(video_id=video.id, time_ms=1500)
+    db.add(frame)
+    db.flush()
+    for i in range(count):
+        db.add(Receipt(
+            video_id=video.id,
+            best_frame_id=frame.id if i % 2 == 0 else None,
+            vendor=f"店舗{i}",
+            vendor_norm=f"店舗{i}",
+            issue_date=datetime(2024, 1, 1 + i % 28),
+            total=1000 + i,
+            tax_rate=0.10,
+            payment_method="現金"
+        ))
+    db.commit()
+    return video
+
+def test_generates_only_missing(db):
+    """既存の仕訳がある領収書はスキップされる"""
+    video = _seed(db, 5)
+    first_id = db.query(Receipt.id).order_by(Receipt.id).first()[0]
+    db.add(JournalEntry(receipt_id=first_id, video_id=video.id, transaction_date=datetime(2024, 1, 1).date()))
+    db.commit()
+    
+    progress = generate_missing_journals_bulk(db, chunk_size=2)
+    
+    assert progress.total_missing == 4
+    assert progress.journals_generated == 4
+    assert progress.chunks_committed == 2
+    assert progress.finished
+    assert count_missing_receipts(db) == 0
+    
+    entry = db.query(JournalEntry).filter(JournalEntry.receipt_id == first_id + 2).one()
+    assert entry.time_ms == 1500
+    assert entry.transaction_date.day == 3
+
+def test_resume_with_cursor(db):
+    """カーソルで途中から再開できる"""
+    _seed(db, 5)
+    
+    progress = generate_missing_journals_bulk(db, chunk_size=2, max_chunks=1)
+    assert progress.receipts_processed == 2
+    assert not progress.finished
+    
+    resumed = generate_missing_journals_bulk(db, chunk_size=2, after_id=progress.cursor)
+    assert resumed.total_missing == 3
+    assert resumed.finished
+    assert db.query(JournalEntry).count() == 5
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,60 @@
+import os
+import cv2
+import numpy as np
+from video_processing.local_ocr import (
+    LocalOCREngine, LocalOCRPool, LocalOCRProcessor, _join_words, available_cores,
+    local_engine_available, register_local_engine,
+)
+from video_processing.types import Config
+
+@register_local_engine("filename")
+class FilenameEngine(LocalOCREngine):
+    """ファイル名と画像の明るさを「認識」するテスト用のエンジン"""
+
+    def __init__(self, config):
+        pass
+
+    def recognize(self, image_path):
+        brightness = int(cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).mean())
+        return [(os.path.basename(image_path), 0.9), ("合計 ¥1,280", 0.7), (f"level {brightness}", 0.5), ("  ", 0.1)]
+
+def _config(engine="filename"):
+    config = Config()
+    config.local_ocr_engine = engine
+    return config
+
+def _images(tmp_path, count):
+    paths = []
+    for i in range(count):
+        paths.append(str(tmp_path / f"crop_{i}.png"))
+        cv2.imwrite(paths[-1], np.full((32, 32), i * 10, np.uint8))
+    return paths
+
+def test_processor_returns_text_block(tmp_path):
+    """認識した行から Vision と同じ TextBlock（テキスト・信頼度・トークン・n-gram）を作るテスト"""
+    path = _images(tmp_path, 1)[0]
+    block = LocalOCRProcessor(_config()).process_image(path)
+    assert block.text == "crop_0.png\n合計 ¥1,280\nlevel 0"
+    assert abs(block.confidence - 0.7) < 1e-9
+    assert block.tokens == ["crop_0", "png", "合計", "280", "level"]
+    assert "crop_0 png 合計" in block.ngrams
+
+    assert _join_words(["合", "計", "1,280", "YEN"]) == "合計1,280 YEN"
+
+def test_unavailable_engine_returns_none(tmp_path):
+    """未登録のエンジンでは OCR せず None を返すテスト"""
+    assert not local_engine_available("missing")
+    assert local_engine_available("filename")
+    assert LocalOCRProcessor(_config("missing")).process_image(_images(tmp_path, 1)[0]) is None
+
+def test_pool_keeps_order(tmp_path):
+    """プロセスプールで OCR した結果が入力の順になるテスト（1ワーカーならプロセス内で実行）"""
+    paths = _images(tmp_path, 6)
+    assert LocalOCRPool(_config()).max_workers == available_cores()
+
+    for workers in (2, 1):
+        with LocalOCRPool(_config(), max_workers=workers) as pool:
+            blocks = pool.process_images(paths)
+        assert [b.text.splitlines()[0] for b in blocks] == [os.path.basename(p) for p in paths]
+        assert [b.text.splitlines()[2] for b in blocks] == [f"level {i * 10}" for i in range(6)]
+    assert pool.process_images([]) == []
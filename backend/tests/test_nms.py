@@ -0,0 +1,63 @@
+import random
+import numpy as np
+import pytest
+from video_processing.nms import NMSProcessor, hamming_components
+from video_processing.types import Config, FrameCandidate
+
+def _dbscan_labels(hashes, eps):
+    """以前の実装（距離行列 + DBSCAN）のラベル"""
+    DBSCAN = pytest.importorskip("sklearn.cluster").DBSCAN
+    nms = NMSProcessor(Config())
+    n = len(hashes)
+    distances = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1, n):
+            if hashes[i] and hashes[j]:
+                distances[i, j] = distances[j, i] = nms._hamming_distance(hashes[i], hashes[j])
+    return DBSCAN(eps=eps, min_samples=1, metric="precomputed").fit_predict(distances).tolist()
+
+def _random_hashes(rng, n, centers=6, flips=6):
+    """いくつかの中心からビットを反転させた64ビットハッシュ"""
+    bases = [rng.getrandbits(64) for _ in range(centers)]
+    hashes = []
+    for _ in range(n):
+        value = rng.choice(bases)
+        for _ in range(rng.randint(0, flips)):
+            value ^= 1 << rng.randrange(64)
+        hashes.append(f"{value:016x}")
+    return hashes
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parity_with_dbscan(seed):
+    """ランダムなハッシュで DBSCAN と同じラベルになるテスト"""
+    rng = random.Random(seed)
+    hashes = _random_hashes(rng, rng.randint(1, 120))
+    for eps in (0.5, 3, 8, 12):
+        assert hamming_components(hashes, eps) == _dbscan_labels(hashes, eps)
+
+def test_parity_edge_cases():
+    """短い・不正・欠損ハッシュの扱いが DBSCAN と同じテスト"""
+    cases = [
+        ["ff", "00000000000000ff", "xyz", "0f"],
+        ["xyz", "not-hex", "ffff"],
+        ["ffff", None, "0000"],
+        ["", "ffff"],
+    ]
+    for hashes in cases:
+        for eps in (1, 8, 64):
+            assert hamming_components(hashes, eps) == _dbscan_labels(hashes, eps)
+    assert hamming_components([], 8) == []
+
+def test_visual_nms_keeps_best_per_cluster():
+    """類似フレームのクラスターごとに最高スコアのフレームを残すテスト"""
+    scores = [0.2, 0.9, 0.5, 0.7]
+    hashes = ["ffffffffffffffff", "fffffffffffffff0", "0000000000000000", "000000000000000f"]
+    candidates = []
+    for i, (score, phash) in enumerate(zip(scores, hashes)):
+        candidate = FrameCandidate(frame_idx=i, time_ms=i * 500, time_s=i * 0.5, frame=None, frame_path="")
+        candidate.phash = phash
+        candidate.total_score = score
+        candidates.append(candidate)
+
+    selected = NMSProcessor(Config()).apply_visual_nms(candidates, eps=8)
+    assert [c.frame_idx for c in selected] == [1, 3]
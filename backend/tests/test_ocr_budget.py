@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+from video_processing.ocr_budget import OCRBudgetPlanner, hamming_distance
+from video_processing.types import Config
+
+def _planner(**overrides):
+    config = Config()
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return OCRBudgetPlanner(config)
+
+def _plan(planner, items, budget=None):
+    """items: (名前, 基本効用, pHash)"""
+    return planner.plan(items, lambda item: item[1], lambda item: item[2], budget)
+
+def test_budget_is_spent_on_highest_utility():
+    """予算の範囲で効用の高い順に選び、結果は入力の順を保つテスト"""
+    items = [("a", 0.3, "0000000000000000"), ("b", 0.9, "ffffffffffffffff"),
+             ("c", 0.6, "00000000ffffffff"), ("d", 0.5, "ffffffff00000000")]
+    plan = _plan(_planner(), items, budget=2)
+    assert [item[0] for item in plan.selected] == ["b", "c"]
+    assert [item[0] for item in plan.skipped] == ["a", "d"]
+    assert plan.calls_saved == 2
+
+    # 予算0（既定）は上限なし
+    assert len(_plan(_planner(), items).selected) == 4
+    assert len(_plan(_planner(ocr_budget=3), items).selected) == 3
+
+def test_low_utility_and_near_duplicates_are_skipped():
+    """効用が min_utility 未満のフレームと、選んだフレームとほぼ同じ見た目のフレームを送らないテスト"""
+    items = [("sharp", 0.8, "ffffffffffffffff"), ("same", 0.7, "fffffffffffffffe"),
+             ("blank", 0.05, "0000000000000000"), ("other", 0.5, "00000000ffffffff")]
+    plan = _plan(_planner(ocr_min_utility=0.1), items)
+    assert [item[0] for item in plan.selected] == ["sharp", "other"]
+    # 距離1 / ocr_novelty_distance(16) で効用が下がる
+    assert abs(plan.utilities[1] - 0.7 / 16) < 1e-9
+
+    # pHash がなければ重複とみなさない
+    assert hamming_distance(None, "ffff") == hamming_distance("xyz", "ffff") == 64
+    unknown = [("x", 0.8, None), ("y", 0.7, None)]
+    assert len(_plan(_planner(), unknown).selected) == 2
+
+def test_plan_candidates_and_images(tmp_path):
+    """FrameCandidate の特徴量と、保存した画像から求めた特徴量で計画するテスト"""
+    planner = _planner()
+    assert planner.base_utility(1.0, 1.0, 1.0) == 1.0
+    assert planner.base_utility(0.0, 0.0, 0.0) == 0.0
+
+    receipt = np.full((480, 640, 3), 40, np.uint8)
+    cv2.rectangle(receipt, (160, 60), (480, 420), (245, 245, 245), -1)
+    for y in range(90, 400, 18):
+        cv2.putText(receipt, "TOTAL 1,280 YEN", (180, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (20, 20, 20), 1)
+    blank = np.full((480, 640, 3), 128, np.uint8)
+    paths = []
+    for name, image in (("receipt", receipt), ("copy", receipt), ("blank", blank)):
+        paths.append(str(tmp_path / f"{name}.jpg"))
+        cv2.imwrite(paths[-1], image)
+    paths.append(str(tmp_path / "missing.jpg"))
+
+    features = planner.image_features(paths[0])
+    assert features["textness"] > 0 and features["sharpness"] > 0.5 and features["phash"]
+    plan = planner.plan_images(paths, lambda path: path)
+    assert plan.selected == [paths[0]]
@@ -0,0 +1,76 @@
+import threading
+import time
+from video_processing.ocr_fusion import FrameReading, OCRFusion, fuse_readings, group_frames, normalize_value
+from video_processing.types import Config
+
+def test_frames_are_grouped_by_time_and_phash():
+    """時間が近くpHashの近いフレームを同じレシートにまとめるテスト"""
+    # (時刻, pHash)
+    frames = [(0.0, "ffffffffffffffff"), (0.8, "fffffffffffffff0"), (1.6, "ffffffffffffff00"),
+              (2.2, "0000000000000000"), (5.0, "000000000000000f"), (5.5, None)]
+    groups = group_frames(frames, lambda f: f[0], lambda f: f[1], max_gap_s=1.5, max_distance=12)
+    # 見た目が変われば時間が近くても別、時間が離れれば見た目が近くても別、pHashがなければ別
+    assert groups == [[0, 1, 2], [3], [4], [5]]
+
+    # 入力が時刻順でなくても時刻順にまとめ、グループの中は入力の順のまま
+    assert group_frames(frames[::-1], lambda f: f[0], lambda f: f[1], 1.5, 12)[0] == [3, 4, 5]
+
+def test_fields_are_fused_by_weighted_vote():
+    """項目ごとに正規化した値を信頼度で重み付けして投票するテスト"""
+    readings = [
+        FrameReading({"vendor": "ローソン 新宿店", "issue_date": "令和6年11月26日", "total": 1280, "tax": 116,
+                      "line_items": [{"name": "おにぎり", "amount": 150}, {"name": "お茶", "amount": 160}]}, 0.6),
+        FrameReading({"vendor": "ローソン新宿店", "issue_date": "2024/11/26", "total": "¥1,280", "tax": 118,
+                      "line_items": [{"name": "おにぎり", "amount": 150}, {"name": "お茶", "amount": 160},
+                                     {"name": "ノイズ", "amount": 9}]}, 0.7),
+        FrameReading({"vendor": "ロ一ソン新宿店", "issue_date": None, "total": 7280, "tax": 116,
+                      "line_items": [{"name": "おにぎり", "amount": 180}, {"name": "お茶", "amount": 160}]}, 0.5),
+    ]
+    fields, agreement = fuse_readings(readings)
+    assert normalize_value("vendor", fields["vendor"]) == "ローソン新宿店"
+    assert normalize_value("issue_date", fields["issue_date"]) == "2024-11-26"
+    assert agreement["issue_date"] == 1.0
+    assert normalize_value("total", fields["total"]) == 1280
+    assert fields["tax"] == 116  # 0.6 + 0.5 > 0.7
+    # 片方のフレームにしかない明細は落とし、明細の金額も投票する
+    assert fields["line_items"] == [{"name": "おにぎり", "amount": 150}, {"name": "お茶", "amount": 160}]
+    assert round(agreement["total"], 2) == round(1.3 / 1.8, 2)
+
+def test_fusion_reads_more_frames_only_when_readings_disagree():
+    """最初の2枚が一致したレシートはそこで打ち切り、一致しないレシートだけ追加で読むテスト"""
+    totals = {"a1": 500, "a2": 500, "a3": 500, "b1": 900, "b2": 990, "b3": 900, "b4": 900, "c1": None}
+    threads = set()
+
+    def read(name):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        if totals[name] is None:
+            return None
+        return FrameReading({"vendor": "shop", "total": totals[name]}, 0.8)
+
+    fusion = OCRFusion(Config(), frames_per_receipt=3, min_frames=2, max_workers=4)
+    a, b, c = fusion.run([["a1", "a2", "a3"], ["b1", "b2", "b3", "b4"], ["c1"]], read)
+    assert (a.calls, b.calls, c.calls) == (2, 3, 1)
+    assert a.fields["total"] == 500 and b.fields["total"] == 900
+    assert b.best[0] in ("b1", "b3") and c.best is None and c.fields == {}
+    # 同じ波の読み取りは並列に実行される
+    assert len(threads) > 1
+
+def test_best_scoring_frames_are_read_first():
+    """時刻の順とスコアの順が違っても、グループの中でスコアの高いフレームから読むテスト"""
+    # (名前, 時刻, pHash, スコア): 1枚のレシートで、最も良いフレームが最後に映っている
+    frames = [("worst", 0.0, "ffffffffffffffff", 0.2), ("mid", 0.5, "fffffffffffffff0", 0.5),
+              ("best", 1.0, "ffffffffffffff00", 0.9)]
+    ranked = sorted(frames, key=lambda f: f[3], reverse=True)
+    fusion = OCRFusion(Config(), frames_per_receipt=3, min_frames=2, max_workers=1)
+    groups = fusion.group(ranked, lambda f: f[1], lambda f: f[2])
+    assert [[f[0] for f in group] for group in groups] == [["best", "mid", "worst"]]
+
+    read = []
+    def reader(frame):
+        read.append(frame[0])
+        return FrameReading({"vendor": "shop", "total": 500}, frame[3])
+
+    result, = fusion.run(groups, reader)
+    # 最初の2枚が一致するので、最も悪いフレームは読まない
+    assert sorted(read) == ["best", "mid"] and result.best[0][0] == "best"
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+from services.ocr_gate import OCRGate, detect_text_lines, has_amount
+
+LINES = ["SHOP 01 MARKET", "2024-05-05 12:48", "ITEM 876    1,822", "ITEM 141    1,160",
+         "ITEM 623    2,090", "ITEM 514    1,342", "TOTAL       6,414", "TAX 10%       583"]
+
+def _frame(lines=LINES, blur=0):
+    """暗い机の上に置いたレシートのフレーム"""
+    frame = np.full((720, 1280, 3), 60, np.uint8)
+    cv2.rectangle(frame, (440, 80), (840, 640), (245, 245, 245), -1)
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (460, 140 + i * 56), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 30), 2, cv2.LINE_AA)
+    if blur:
+        kernel = np.zeros((blur, blur), np.float32)
+        kernel[blur // 2, :] = 1.0 / blur
+        frame = cv2.filter2D(frame, -1, kernel)
+    return frame
+
+def test_receipt_passes_gate(tmp_path):
+    """数字列のあるレシートはゲートを通るテスト"""
+    gray = cv2.cvtColor(_frame(), cv2.COLOR_BGR2GRAY)
+    assert len(detect_text_lines(gray)) >= len(LINES)
+
+    path = str(tmp_path / "receipt.jpg")
+    cv2.imwrite(path, _frame())
+    result = OCRGate().check(path)
+    assert result.passed and result.digit_runs >= 2
+    # 読めない画像は判定せずリモートOCRに任せる
+    assert OCRGate().check(str(tmp_path / "missing.jpg")).passed
+
+def test_frames_without_amount_are_rejected():
+    """文字のない紙・数字のない文章・モーションブラーのレシートはゲートを通らないテスト"""
+    gate = OCRGate()
+    blank = gate.check_image(_frame(lines=[]))
+    assert not blank.passed and blank.reason == "no text"
+
+    prose = ["thank you for", "shopping with us", "please keep this", "paper as proof",
+             "of purchase and", "bring it again", "see you soon"]
+    assert not gate.check_image(_frame(lines=prose)).passed
+    assert not gate.check_image(_frame(blur=41)).passed
+
+    # しきい値を下げれば値段の列だけで通る
+    assert OCRGate(min_digit_runs=99, min_aligned_lines=3, min_stroke_balance=0.0).check_image(_frame()).passed
+
+def test_has_amount():
+    """OCRのテキストに金額らしい数字があるかの判定のテスト"""
+    assert has_amount("ローソン\n合計 ¥1,280")
+    assert has_amount("お会計 1280円")
+    assert has_amount("TOTAL 12,800")
+    assert not has_amount("いらっしゃいませ\nまたお越しください")
+    assert not has_amount("")
+    assert not has_amount(None)
+
+def test_rejected_frames_are_recorded(tmp_path):
+    """除外したフレームを画像と rejected.jsonl で保存するテスト"""
+    import json
+    from services.ocr_gate import record_rejected
+
+    path = str(tmp_path / "frame.jpg")
+    cv2.imwrite(path, _frame(lines=[]))
+    result = OCRGate().check(path)
+    assert not result.passed
+
+    directory = str(tmp_path / "rejected")
+    record_rejected(path, result, directory, video_id=3, frame=7, ocr_has_amount=True)
+    with open(tmp_path / "rejected" / "rejected.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]["reason"] == "no text" and records[0]["ocr_has_amount"] is True
+    assert (tmp_path / "rejected" / records[0]["file"]).exists()
+    assert records[0]["file"] == "3_7_frame.jpg"
+
+    # 保存先がなければログだけ
+    assert "file" not in record_rejected(path, result, "", video_id=3, frame=8)
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+from video_processing.ocr_payload import OCRPayloadOptimizer, ink_fidelity, median_text_height
+from video_processing.preprocess import ImagePreprocessor
+from video_processing.types import Config, DocumentQuad
+
+LINES = ["SHOP 01 MARKET", "2024-05-05 12:48", "ITEM 876    1,822", "ITEM 141    1,160",
+         "ITEM 623    2,090", "TOTAL       5,072", "TAX 10%       461"]
+
+def _frame():
+    """暗い机の上に置いたレシートの 1080p フレームと、その四隅"""
+    frame = np.full((1080, 1920, 3), 60, np.uint8)
+    frame[:, :, 1] = 80
+    cv2.rectangle(frame, (700, 100), (1220, 980), (245, 245, 245), -1)
+    for i, line in enumerate(LINES):
+        cv2.putText(frame, line, (730, 200 + i * 100), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (30, 30, 30), 3, cv2.LINE_AA)
+    quad = DocumentQuad(points=np.float32([[700, 100], [1220, 100], [1220, 980], [700, 980]]))
+    return frame, quad
+
+def test_payload_is_cropped_grayscale_and_downscaled(tmp_path):
+    """文書の領域だけを1チャンネルで、テキスト行が目標の高さになるまで縮小して送るテスト"""
+    frame, quad = _frame()
+    optimizer = OCRPayloadOptimizer(Config())
+    payload = optimizer.optimize(frame, quad)
+    height, width = payload.shape
+    assert width < 520 * 1.1 and height < 880 * 1.1
+    decoded = cv2.imdecode(np.frombuffer(payload.data, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert decoded.ndim == 2 and decoded.shape == payload.shape
+    assert abs(median_text_height(decoded) - Config().ocr_payload_text_height) <= 6
+
+    # 文書の四隅がなくても検出して切り出す
+    detected = optimizer.optimize(frame, detect=True)
+    assert detected.shape[1] < 1920 / 2
+
+    # ファイルから作ると元のサイズとの差（削減量）がわかる
+    path = str(tmp_path / "frame.jpg")
+    cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    from_file = optimizer.optimize_file(path, quad)
+    assert from_file.bytes_saved > 0 and from_file.bytes_saved == from_file.source_bytes - len(from_file.data)
+    assert optimizer.optimize_file(str(tmp_path / "missing.jpg")) is None
+
+def test_format_is_chosen_by_size_and_fidelity():
+    """二値画像はPNG、写真はテキストが保たれる範囲で最も小さいJPEGを選ぶテスト"""
+    optimizer = OCRPayloadOptimizer(Config())
+    gray = cv2.cvtColor(_frame()[0], cv2.COLOR_BGR2GRAY)[100:980, 700:1220]
+    binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY)[1]
+    assert optimizer.encode(binary).format == "png"
+
+    noisy = np.clip(gray.astype(np.int16) + np.random.RandomState(0).randint(-12, 12, gray.shape), 0, 255).astype(np.uint8)
+    photo = optimizer.encode(noisy)
+    assert photo.format == "jpeg" and photo.fidelity >= Config().ocr_payload_min_fidelity
+    assert ink_fidelity(noisy, noisy) == 1.0
+
+    # どのJPEGもしきい値を満たさなければPNG（劣化なし）
+    strict = Config()
+    strict.ocr_payload_min_fidelity = 1.01
+    assert OCRPayloadOptimizer(strict).encode(noisy).format == "png"
+
+def test_enhanced_crop_stays_single_channel():
+    """OCR向けの補正結果は3チャンネルに戻さないテスト"""
+    frame, _ = _frame()
+    enhanced = ImagePreprocessor(Config())._enhance_for_ocr(frame)
+    assert enhanced.ndim == 2 and enhanced.shape == frame.shape[:2]
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from database import get_db
+from models import Base, ProcessingMetric, User, Video
+from routers import auth, metrics
+from services.processing_metrics import ProcessingMetrics, instrument_job, mark_failed, registry, stage, track
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Video), [{"id": 1, "filename": "a.mp4"}])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+def test_stages_are_aggregated_and_nested():
+    """同じ段階は合算し、入れ子の段階は親の名前付きで記録するテスト"""
+    now = [0.0]
+    metrics = ProcessingMetrics("job", 1, clock=lambda: now[0])
+    with metrics.stage("select_frames"):
+        for _ in range(3):
+            with metrics.stage("detection", items=1) as detection:
+                detection.add(bytes_decoded=100)
+                now[0] += 0.5
+        with metrics.stage("ocr", ocr_calls=2):
+            now[0] += 1.0
+    metrics.finish()
+
+    stages = {s["name"]: s for s in metrics.to_dict()["stages"]}
+    assert list(stages) == ["select_frames", "select_frames.detection", "select_frames.ocr"]
+    assert stages["select_frames.detection"]["calls"] == 3
+    assert stages["select_frames.detection"]["duration_ms"] == 1500
+    assert stages["select_frames.detection"]["items"] == 3
+    assert stages["select_frames.detection"]["bytes_decoded"] == 300
+    assert stages["select_frames.ocr"]["ocr_calls"] == 2
+    assert stages["select_frames"]["duration_ms"] == 2500
+    assert metrics.status == "done" and metrics.duration_ms == 2500
+
+    # ジョブの外では何もしない
+    with stage("sampling") as sampling:
+        sampling.add(items=1)
+
+def test_peak_rss_is_per_job(monkeypatch):
+    """最大メモリはジョブ中に段階の境界で計測した RSS の最大値（プロセス開始からの最大ではない）"""
+    from services import processing_metrics
+
+    samples = iter([100.0, 120.0, 140.0, 180.0, 150.0, 110.0])
+    monkeypatch.setattr(processing_metrics, "current_rss_mb", lambda: next(samples))
+    monkeypatch.setattr(processing_metrics, "peak_rss_mb", lambda: 4096.0)
+    metrics = ProcessingMetrics("job", 1)
+    with metrics.stage("decode"):
+        with metrics.stage("ocr"):
+            pass
+    metrics.finish()
+    assert metrics.to_dict()["peak_rss_mb"] == 180.0
+
+def test_instrument_job_persists_and_exports(session_factory):
+    """ジョブの計測結果をDBに保存し、失敗も記録してPrometheus形式で出力するテスト"""
+    SessionLocal = session_factory
+    registry.clear()
+
+    @instrument_job("sync_job")
+    def sync_job(video_id, db):
+        with stage("sampling", items=4, bytes_decoded=1024):
+            pass
+        with stage("ocr", ocr_calls=1):
+            pass
+
+    @instrument_job("async_job")
+    async def async_job(video_id, fps, db):
+        with stage("ai_extraction", ai_calls=1):
+            await asyncio.sleep(0)
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError as e:
+            # 例外を握りつぶす処理でも失敗として記録する
+            mark_failed(e)
+
+    with SessionLocal() as db:
+        sync_job(1, db)
+        asyncio.run(async_job(1, 10, db=db))
+        rows = db.query(ProcessingMetric).order_by(ProcessingMetric.id).all()
+
+    assert [(row.job, row.status, row.video_id) for row in rows] == [("sync_job", "done", 1), ("async_job", "error", 1)]
+    stages = json.loads(rows[0].stages_json)
+    assert [s["name"] for s in stages] == ["sampling", "ocr"]
+    assert stages[0]["items"] == 4 and stages[0]["bytes_decoded"] == 1024
+    assert rows[1].error_message == "boom"
+
+    with pytest.raises(ValueError):
+        with track("raising_job"):
+            raise ValueError("x")
+
+    text = registry.render_prometheus()
+    assert 'video_processing_job_duration_seconds_count{job="sync_job",status="done"} 1' in text
+    assert 'video_processing_job_duration_seconds_count{job="async_job",status="error"} 1' in text
+    assert 'video_processing_job_duration_seconds_count{job="raising_job",status="error"} 1' in text
+    assert 'video_processing_stage_bytes_decoded_total{job="sync_job",stage="sampling"} 1024' in text
+    assert 'video_processing_stage_ai_calls_total{job="async_job",stage="ai_extraction"} 1' in text
+    assert "process_peak_resident_memory_bytes " in text
+    registry.clear()
+
+def test_admin_endpoints(session_factory, monkeypatch):
+    """計測結果APIは管理者のみ、/metrics はスクレイプ用トークンでも取得できるテスト"""
+    SessionLocal = session_factory
+    with SessionLocal() as db:
+        # bcrypt のハッシュ計算は不要なのでダミーのハッシュで直接登録
+        db.execute(insert(User), [
+            {"id": 1, "email": "admin@example.com", "username": "admin", "hashed_password": "x", "is_active": True, "is_superuser": True},
+            {"id": 2, "email": "user@example.com", "username": "user", "hashed_password": "x", "is_active": True, "is_superuser": False},
+        ])
+        db.commit()
+        with track("run_video_analysis", 1, bind=db.get_bind()):
+            with stage("probe"):
+                pass
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(metrics.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    admin = {"Authorization": f"Bearer {auth.create_access_token({'sub': '1'})}"}
+    user = {"Authorization": f"Bearer {auth.create_access_token({'sub': '2'})}"}
+
+    response = client.get("/admin/processing-metrics", params={"video_id": 1}, headers=admin)
+    assert response.status_code == 200
+    assert response.json()[0]["job"] == "run_video_analysis"
+    assert response.json()[0]["stages"][0]["name"] == "probe"
+    assert client.get("/admin/processing-metrics", headers=user).status_code == 403
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=user).status_code == 403
+    response = client.get("/metrics", headers=admin)
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
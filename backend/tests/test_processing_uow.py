@@ -0,0 +1,99 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import Base, Video, Frame, Receipt, JournalEntry
+from services.journal_generator import JournalGenerator
+from services.processing_uow import ProcessingUnitOfWork, ProgressChannel
+
+# テスト用データベース
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def _receipt(video, i, vendor_norm=None):
+    return Receipt(
+        video_id=video.id,
+        vendor=f"店舗{i}",
+        vendor_norm=vendor_norm or f"店舗{i}",
+        issue_date=datetime(2024, 1, 15),
+        total=1000 + i,
+        tax_rate=0.10,
+    )
+
+def test_batch_commit(db):
+    """フレーム・レシート・仕訳が1回のコミットで紐付けて保存されるテスト"""
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.commit()
+
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(1))
+
+    uow = ProcessingUnitOfWork(db, video, generator=JournalGenerator(db), batch_size=10)
+    for i in range(5):
+        uow.add(frame=Frame(video_id=video.id, time_ms=i * 1000), receipt=_receipt(video, i))
+    uow.commit(status="done", progress=100)
+
+    assert len(commits) == 1
+    assert db.query(Receipt).count() == 5
+    assert db.query(JournalEntry).count() == 5
+    for receipt in db.query(Receipt).all():
+        assert receipt.best_frame is not None
+        assert receipt.journal_entries[0].time_ms == receipt.best_frame.time_ms
+    assert db.query(Video).one().status == "done"
+
+def test_fallback_on_conflict(db):
+    """一意制約違反時にユニットごとの保存へ切り替わり、失敗分だけ除外されるテスト"""
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.flush()
+    db.add(_receipt(video, 1, vendor_norm="dup"))
+    db.commit()
+
+    uow = ProcessingUnitOfWork(db, video)
+    for i in range(3):
+        receipt = _receipt(video, 1, vendor_norm="dup") if i == 1 else _receipt(video, i + 10)
+        uow.add(frame=Frame(video_id=video.id, time_ms=i * 1000), receipt=receipt)
+    uow.commit(status="done")
+
+    assert len(uow.failed_units) == 1
+    assert uow.saved_receipts == 2
+    assert db.query(Receipt).count() == 3
+    assert db.query(Video).one().status == "done"
+
+    # フックでTrueを返すと修正して再試行される
+    def add_suffix(unit, error):
+        unit.receipt.vendor_norm += "_retry"
+        return True
+
+    uow = ProcessingUnitOfWork(db, video, on_unit_error=add_suffix)
+    uow.add(receipt=_receipt(video, 1, vendor_norm="dup"))
+    uow.commit()
+    assert not uow.failed_units
+    assert db.query(Receipt).filter(Receipt.vendor_norm == "dup_retry").count() == 1
+
+def test_progress_channel(db):
+    """進捗チャネルが同じ内容・間隔内の更新を間引くテスト"""
+    video = Video(filename="test.mp4")
+    db.add(video)
+    db.commit()
+
+    channel = ProgressChannel(engine, video.id, min_interval=60)
+    assert channel.update(10, "開始")
+    assert not channel.update(10, "開始")
+    assert not channel.update(20, "処理中")
+    assert channel.update(30, "処理中", status="processing")
+    assert channel.updates_sent == 2
+
+    db.expire_all()
+    video = db.query(Video).one()
+    assert video.progress == 30
+    assert video.status == "processing"
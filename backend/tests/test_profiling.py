@@ -0,0 +1,122 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from services import profiling
+from services.profiling import ProfileStore, ProfilingMiddleware, StackSampler, is_valid_profile_id, profile_job
+
+def _busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path / "profiles"), max_profiles=3)
+    monkeypatch.setattr(profiling, "profile_store", store)
+    return store
+
+def test_sampler_collapsed_output():
+    """実行中の関数がスタックに含まれ、collapsed 形式で出力されるテスト"""
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    _busy(0.2)
+    sampler.stop()
+
+    assert sampler.samples > 0
+    lines = sampler.collapsed().splitlines()
+    assert any("_busy (tests/test_profiling.py:" in line for line in lines)
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack.startswith("thread ")
+    # サンプラー自身のスレッドは含めない
+    assert not any("stack-sampler" in line for line in lines)
+
+def test_store_prunes_and_rejects_invalid_ids(store):
+    """古いプロファイルを削除し、不正なIDでは保存・取得しないテスト"""
+    sampler = StackSampler()
+    sampler.stacks["thread main;main (app.py:1)"] = 3
+    for i in range(5):
+        assert store.save(f"req-{i}", sampler, trigger="slow")
+        time.sleep(0.01)
+
+    assert [meta["id"] for meta in store.list()] == ["req-4", "req-3", "req-2"]
+    assert store.path_for("req-0") is None
+    with open(store.path_for("req-4")) as f:
+        assert f.read() == "thread main;main (app.py:1) 3\n"
+
+    assert not is_valid_profile_id("../etc/passwd") and not is_valid_profile_id("..")
+    assert store.save("../x", sampler) is None
+    assert store.path_for("../req-4") is None
+
+def test_middleware_profiles_slow_and_requested(store):
+    """遅いリクエストと管理者が要求したリクエストだけをプロファイルするテスト"""
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow():
+        _busy(0.3)
+        return {}
+
+    @app.get("/blocking")
+    async def blocking():
+        # イベントループを止める async のハンドラー
+        _busy(0.3)
+        return {}
+
+    @app.get("/fast")
+    def fast():
+        return {}
+
+    async def authorize(authorization):
+        return authorization == "Bearer admin"
+
+    app.add_middleware(ProfilingMiddleware, authorize=authorize, slow_request_ms=100)
+    client = TestClient(app)
+
+    response = client.get("/slow", headers={"X-Request-ID": "slow-1"})
+    assert response.headers["x-request-id"] == "slow-1"
+    assert response.headers["x-profile-id"] == "slow-1"
+    meta = store.list()[0]
+    assert meta["trigger"] == "slow" and meta["path"] == "/slow" and meta["duration_ms"] >= 300
+
+    response = client.get("/blocking")
+    assert response.headers["x-profile-id"] == response.headers["x-request-id"]
+    meta = store.list()[0]
+    assert meta["trigger"] == "slow" and meta["path"] == "/blocking"
+    with open(store.path_for(meta["id"])) as f:
+        assert "blocking (tests/test_profiling.py:" in f.read()
+
+    response = client.get("/fast")
+    assert len(response.headers["x-request-id"]) == 32
+    assert "x-profile-id" not in response.headers
+    # 管理者以外の要求は無視する
+    assert "x-profile-id" not in client.get("/fast", headers={"X-Profile": "1"}).headers
+
+    response = client.get("/slow", params={"__profile": "1"}, headers={"Authorization": "Bearer admin"})
+    profile_id = response.headers["x-profile-id"]
+    assert store.list()[0]["trigger"] == "requested"
+    with open(store.path_for(profile_id)) as f:
+        assert "slow (tests/test_profiling.py:" in f.read()
+
+def test_profile_job(store, monkeypatch):
+    """ジョブを実行したスレッドをプロファイルするテスト"""
+    @profile_job("busy_job", slow_seconds=0.05)
+    def busy_job(video_id):
+        _busy(0.25)
+        return video_id
+
+    @profile_job("quick_job", slow_seconds=10)
+    def quick_job(video_id):
+        _busy(0.05)
+        return video_id
+
+    assert busy_job(7) == 7
+    assert quick_job(8) == 8
+    metas = store.list()
+    assert [meta["job"] for meta in metas] == ["busy_job"]
+    assert metas[0]["id"].startswith("busy_job-") and metas[0]["args"] == ["7"]
+
+    monkeypatch.setattr(profiling, "PROFILE_JOBS", True)
+    quick_job(9)
+    assert store.list()[0]["trigger"] == "job"
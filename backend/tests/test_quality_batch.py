@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+import pytest
+from services.smart_frame_extractor import SmartFrameExtractor
+from video_processing import quality
+from video_processing.quality import QualityAssessor, batch_frame_stats, stack_gray
+from video_processing.types import Config, DocumentQuad
+
+def _frames(seed, n=6, size=(90, 160)):
+    """ぼけ・白飛び・黒つぶれ・テキスト風の線を含む合成フレーム"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(n):
+        frame = rng.integers(0, 256, (*size, 3), dtype=np.uint8)
+        if i % 3 == 1:
+            frame = cv2.GaussianBlur(frame, (9, 9), 3)
+        if i % 3 == 2:
+            frame[:] = 120
+            for y in range(10, size[0] - 10, 8):
+                cv2.line(frame, (10, y), (size[1] - 20, y), (20, 20, 20), 2)
+        frame[: size[0] // 4, : size[1] // 4] = 255 if i % 2 else 0
+        frames.append(frame)
+    return frames
+
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_stats_match_opencv(seed, monkeypatch):
+    """バッチの統計量が OpenCV のフレームごとの計算と一致するテスト（チャンク分割を含む）"""
+    monkeypatch.setattr(quality, "BATCH_STATS_PIXELS", 90 * 160 * 4)
+    frames = _frames(seed)
+    gray = stack_gray(frames)
+    stats = batch_frame_stats(gray, np.stack(frames))
+
+    for i, frame in enumerate(frames):
+        g = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        assert np.array_equal(gray[i], g)
+        assert stats["laplacian_var"][i] == pytest.approx(cv2.Laplacian(g, cv2.CV_64F).var(), rel=1e-9)
+        assert stats["mean"][i] == pytest.approx(g.mean(), rel=1e-12)
+        assert stats["std"][i] == pytest.approx(g.std(), rel=1e-9)
+        assert stats["edge_mean"][i] == pytest.approx(cv2.Canny(g, 50, 150).mean(), rel=1e-12)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_assess_batch_matches_assess_frame(seed):
+    """QualityAssessor.assess_batch が assess_frame と同じスコアになるテスト"""
+    assessor = QualityAssessor(Config())
+    frames = _frames(seed)
+    quad = DocumentQuad(points=np.array([[10, 10], [150, 10], [150, 80], [10, 80]], dtype=np.float32),
+                        area_ratio=0.6, perspective_score=0.8)
+    doc_quads = [quad if i % 2 else None for i in range(len(frames))]
+    motion = [i * 0.2 for i in range(len(frames))]
+
+    batch = assessor.assess_batch(frames, doc_quads, motion)
+    for frame, doc_quad, motion_score, scores in zip(frames, doc_quads, motion, batch):
+        expected = assessor.assess_frame(frame, doc_quad, motion_score)
+        assert scores.keys() == expected.keys()
+        for key, value in expected.items():
+            assert scores[key] == pytest.approx(value, rel=1e-6, abs=1e-9), key
+    assert assessor.assess_batch([]) == []
+
+@pytest.mark.parametrize("seed", range(3))
+def test_smart_extractor_batch_matches_per_frame(seed):
+    """SmartFrameExtractor のバッチ評価がフレームごとの評価と一致するテスト"""
+    extractor = SmartFrameExtractor()
+    frames = _frames(seed)
+    for frame, (score, details) in zip(frames, extractor._evaluate_frames_batch(frames)):
+        expected_score, expected = extractor._evaluate_frame_quality(frame)
+        assert score == pytest.approx(expected_score, rel=1e-9)
+        assert details.keys() == expected.keys()
+        for key, value in expected.items():
+            assert details[key] == pytest.approx(value, rel=1e-9), key
+
+def test_smart_extractor_bounds_buffered_pixels(tmp_path, monkeypatch):
+    """プロキシのない 4K 動画では、溜めて評価するフレームの画素数が BATCH_STATS_PIXELS を超えないテスト"""
+    path = str(tmp_path / "uhd.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (3840, 2160))
+    frame = np.full((2160, 3840, 3), 200, np.uint8)
+    for i in range(4):
+        cv2.putText(frame, f"TOTAL {i}", (400, 1000), cv2.FONT_HERSHEY_SIMPLEX, 8, (20, 20, 20), 12)
+        writer.write(frame)
+    writer.release()
+
+    extractor = SmartFrameExtractor()
+    batches = []
+    evaluate = extractor._evaluate_frames_batch
+    monkeypatch.setattr(extractor, "_evaluate_frames_batch",
+                        lambda frames: batches.append([f.shape for f in frames]) or evaluate(frames))
+    extractor.extract_smart_frames(path, sample_fps=10, output_dir=str(tmp_path / "frames"))
+
+    assert sum(len(batch) for batch in batches) == 4
+    for batch in batches:
+        assert batch[0][:2] == (2160, 3840)
+        assert sum(h * w for h, w, _ in batch) <= max(quality.BATCH_STATS_PIXELS, 3840 * 2160)
+
+    # 小さいフレームは上限の枚数までまとめる
+    assert extractor._batch_frames(np.zeros((360, 640, 3), np.uint8)) == extractor.quality_batch_size
+
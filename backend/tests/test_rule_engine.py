@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Receipt, Vendor, Rule
+from services.journal_generator import JournalGenerator
+from services.rule_engine import RuleEngine
+
+# テスト用データベース
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_vendor_and_rules_loaded_once(db):
+    """ベンダー・ルールは1回だけ読み込まれる"""
+    db.add(Vendor(name="スターバックス", name_norm="スターバックス", default_debit_account="5130"))
+    db.add(Rule(pattern="ヤマト", pattern_type="vendor", debit_account="5180", priority=1))
+    db.commit()
+    
+    rules = RuleEngine()
+    generator = JournalGenerator(db, engine=rules)
+    snapshot = generator.rules
+    
+    assert generator._get_vendor("スターバックス").default_debit_account == "5130"
+    assert generator._determine_debit_account(Receipt(vendor="ヤマト運輸"), None) == "5180"
+    assert generator.rules is snapshot
+
+def test_rule_priority_order(db):
+    """優先度の高いルールが優先される"""
+    db.add(Rule(pattern="運輸", pattern_type="vendor", debit_account="5190", priority=1))
+    db.add(Rule(pattern="ヤマト", pattern_type="vendor", debit_account="5180", priority=10))
+    db.add(Rule(pattern="ヤマト", pattern_type="vendor", debit_account=None, priority=20))
+    db.add(Rule(pattern="[", pattern_type="vendor", debit_account="9999", priority=30))  # 不正な正規表現は無視
+    db.commit()
+    
+    generator = JournalGenerator(db, engine=RuleEngine())
+    assert generator._determine_debit_account(Receipt(vendor="ヤマト運輸"), None) == "5180"
+    assert generator._determine_debit_account(Receipt(vendor="佐川急便", vendor_norm="佐川急便"), None) == \
+        generator.default_accounts['expenses']['雑費']
+
+def test_amount_range_without_total_matches_vendor(db):
+    """金額範囲のルールは合計がなければベンダー名で判定する"""
+    db.add(Rule(pattern="^[1-9][0-9]{4}", pattern_type="amount_range", debit_account="5200", priority=10))
+    db.add(Rule(pattern="コーヒー", pattern_type="amount_range", debit_account="5130", priority=5))
+    db.commit()
+    
+    generator = JournalGenerator(db, engine=RuleEngine())
+    assert generator._determine_debit_account(Receipt(vendor="コーヒー店", total=12000), None) == "5200"
+    assert generator._determine_debit_account(Receipt(vendor="コーヒー店", total=None), None) == "5130"
+    # 合計があれば金額で判定し、ベンダー名は見ない
+    assert generator._determine_debit_account(Receipt(vendor="コーヒー店", total=500), None) != "5130"
+
+def test_invalidate_reloads(db):
+    """バージョン更新で再読込される"""
+    rules = RuleEngine()
+    generator = JournalGenerator(db, engine=rules)
+    assert generator._get_vendor("ローソン") is None
+    
+    db.add(Vendor(name="ローソン", name_norm="ローソン", default_debit_account="5140"))
+    db.commit()
+    assert generator._get_vendor("ローソン") is None  # キャッシュ済み
+    
+    rules.invalidate()
+    assert generator._get_vendor("ローソン").default_debit_account == "5140"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,66 @@
+import os
+import re
+import sys
+import subprocess
+from pathlib import Path
+from sqlalchemy import create_engine, inspect, text
+from services import lazy_loader
+from services.lazy_loader import lazy_import, register_warmup, warm_up
+from services.schema_migrations import ADDED_VIDEO_COLUMNS, add_missing_columns, create_tables
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# main の読み込み時間の上限（ミリ秒）。遅延読み込みする前は約5秒かかっていた
+IMPORT_BUDGET_MS = int(os.getenv("IMPORT_BUDGET_MS", "3000"))
+
+# 起動時に読み込まないモジュール
+DEFERRED_MODULES = ["cv2", "sklearn", "imagehash", "google.generativeai", "google.cloud.videointelligence", "boto3"]
+
+def test_import_time_budget(tmp_path):
+    """main の読み込みが時間の上限内に収まり、重いモジュールを読み込まないテスト（-X importtime）"""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    env.pop("RENDER", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            timings[match.group(3)] = int(match.group(1))
+
+    assert timings["main"] / 1000 < IMPORT_BUDGET_MS
+    loaded = [name for name in DEFERRED_MODULES if name in timings]
+    assert loaded == []
+
+def test_lazy_import_and_warm_up(monkeypatch):
+    """遅延読み込みしたモジュールは初回アクセスで読み込まれ、ウォームアップで所要時間を返すテスト"""
+    # テスト用のタスクをアプリのウォームアップに残さない
+    monkeypatch.setattr(lazy_loader, "_warmup_tasks", [])
+    module = lazy_import("json")
+    assert module.dumps({"a": 1}) == '{"a": 1}'
+
+    register_warmup("test_ok", lambda: None)
+    register_warmup("test_error", lambda: 1 / 0)
+    results = warm_up()
+    assert list(results) == ["test_ok", "test_error"]
+    assert results["test_ok"]["error"] is None and results["test_ok"]["ms"] >= 0
+    assert "division by zero" in results["test_error"]["error"]
+
+def test_run_migrations_idempotent(tmp_path):
+    """マイグレーションで不足カラムが追加され、2回実行しても変わらないテスト"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    # 後からカラムを追加する前の videos テーブル
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE videos (id INTEGER PRIMARY KEY, filename VARCHAR(255))"))
+
+    for _ in range(2):
+        create_tables(engine)
+        add_missing_columns(engine)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("videos")}
+    assert {name for name, _ in ADDED_VIDEO_COLUMNS} <= columns
+    assert {"reset_token", "reset_token_expires"} <= {c["name"] for c in inspect(engine).get_columns("users")}
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import boto3
+from botocore.stub import Stubber
+from services.upload_engine import (
+    FilesystemBackend, S3Backend, TransientUploadError, UploadEngine, UploadError, UploadItem,
+)
+
+class FlakyBackend(FilesystemBackend):
+    """指定回数だけパート送信が一時エラーになるバックエンド"""
+    def __init__(self, root, failures, error=TransientUploadError):
+        super().__init__(root)
+        self.failures = failures
+        self.error = error
+        self.aborted = 0
+
+    def put_part(self, item, state, number, offset, data):
+        if number == 2 and self.failures > 0:
+            self.failures -= 1
+            raise self.error("connection reset")
+        return super().put_part(item, state, number, offset, data)
+
+    def abort_multipart(self, item, state):
+        self.aborted += 1
+        super().abort_multipart(item, state)
+
+def test_upload_many_with_multipart(tmp_path):
+    """小さいファイルは1回、大きいファイルはパート分割で並列アップロードされるテスト"""
+    engine = UploadEngine(FilesystemBackend(tmp_path / "bucket", "https://cdn.example"),
+                          max_workers=3, multipart_threshold=1000, part_size=400)
+    source = tmp_path / "video.mp4"
+    source.write_bytes(os.urandom(2500))
+    items = [
+        UploadItem("frames/a.jpg", b"small", content_type="image/jpeg"),
+        UploadItem("videos/v.mp4", source_path=str(source), content_type="video/mp4"),
+        UploadItem("frames/b.jpg", os.urandom(1200), content_type="image/jpeg"),
+    ]
+
+    results = engine.upload_many(items)
+    assert [r.key for r in results] == ["frames/a.jpg", "videos/v.mp4", "frames/b.jpg"]
+    assert all(r.success for r in results)
+    assert [r.parts for r in results] == [1, 7, 3]
+    assert results[0].url == "https://cdn.example/frames/a.jpg"
+    assert (tmp_path / "bucket/videos/v.mp4").read_bytes() == source.read_bytes()
+    assert (tmp_path / "bucket/frames/b.jpg").read_bytes() == items[2].data
+    assert not list((tmp_path / "bucket").rglob("*.part"))
+    engine.shutdown()
+
+def test_retry_with_jitter_and_abort(tmp_path):
+    """一時エラーはジッター付きで再試行し、再試行できないエラーはマルチパートを中止するテスト"""
+    delays = []
+    backend = FlakyBackend(tmp_path / "bucket", failures=2)
+    engine = UploadEngine(backend, max_workers=2, multipart_threshold=10, part_size=10,
+                          max_attempts=3, backoff_base=0.5, backoff_max=8, sleep=delays.append)
+    data = os.urandom(35)
+
+    result = engine.upload(UploadItem("v.mp4", data))
+    assert result.success and result.attempts == 3
+    assert len(delays) == 2 and 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 1.0
+    assert (tmp_path / "bucket/v.mp4").read_bytes() == data
+
+    # 試行回数を超えた場合・再試行できないエラーは失敗として返し、途中のファイルを残さない
+    for failures, error in ((5, TransientUploadError), (1, UploadError)):
+        backend.failures, backend.error = failures, error
+        result = engine.upload(UploadItem("w.mp4", data))
+        assert not result.success and "connection reset" in result.error
+    assert backend.aborted == 2
+    assert not (tmp_path / "bucket/w.mp4").exists()
+    assert not list((tmp_path / "bucket").glob("*.part"))
+    engine.shutdown()
+
+def test_s3_multipart_requests():
+    """S3のマルチパートアップロードのリクエスト列のテスト"""
+    client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="y")
+    engine = UploadEngine(S3Backend(client, "bucket"), max_workers=1, multipart_threshold=10, part_size=8)
+    data = b"0123456789abcdefghij"
+
+    with Stubber(client) as stub:
+        stub.add_response("create_multipart_upload", {"UploadId": "u1"},
+                          {"Bucket": "bucket", "Key": "v.mp4", "ContentType": "video/mp4"})
+        for number, chunk in enumerate((data[0:8], data[8:16], data[16:]), 1):
+            stub.add_response("upload_part", {"ETag": f'"e{number}"'},
+                              {"Bucket": "bucket", "Key": "v.mp4", "UploadId": "u1", "PartNumber": number, "Body": chunk})
+        stub.add_response("complete_multipart_upload", {}, {
+            "Bucket": "bucket", "Key": "v.mp4", "UploadId": "u1",
+            "MultipartUpload": {"Parts": [{"PartNumber": n, "ETag": f'"e{n}"'} for n in (1, 2, 3)]},
+        })
+        result = engine.upload(UploadItem("v.mp4", data, content_type="video/mp4"))
+        stub.assert_no_pending_responses()
+
+    assert result.success and result.parts == 3
+    assert "bucket" in result.url and "v.mp4" in result.url
+    engine.shutdown()
+
+def test_storage_service_filesystem(tmp_path, monkeypatch):
+    """STORAGE_TYPE=filesystem の StorageService でアップロード・ダウンロードできるテスト"""
+    from services.storage import StorageService
+
+    monkeypatch.setenv("STORAGE_TYPE", "filesystem")
+    monkeypatch.setenv("STORAGE_ROOT", str(tmp_path / "storage"))
+    storage = StorageService()
+
+    success, url = storage.upload_file_sync(b"video", "users/1/videos/v.mp4")
+    assert success and url == str(tmp_path / "storage/users/1/videos/v.mp4")
+    assert asyncio.run(storage.upload_file(b"thumb", "users/1/thumbnails/t.jpg", "image/jpeg"))[0]
+
+    results = storage.upload_many([UploadItem(f"users/1/frames/{i}.jpg", bytes([i]) * 10) for i in range(5)])
+    assert all(r.success for r in results)
+    assert asyncio.run(storage.download_file("users/1/frames/3.jpg")) == bytes([3]) * 10
+    assert asyncio.run(storage.delete_file("users/1/frames/3.jpg"))
+    assert asyncio.run(storage.download_file("users/1/frames/3.jpg")) is None
@@ -0,0 +1,107 @@
+import shutil
+from types import SimpleNamespace
+import pytest
+import cv2
+import numpy as np
+from services.video_remux import (
+    create_playback_rendition, create_proxy_rendition, needs_reencode, nearest_keyframe, read_mp4_info,
+    dump_keyframe_index, load_keyframe_index, proxy_source,
+)
+from video_processing.extract_best_frames import _scale_quad
+from video_processing.types import DocumentQuad, FrameCandidate
+
+def _write_video(path, frames=50, fps=10, size=(64, 48)):
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        writer.write(np.full((height, width, 3), i * 5, np.uint8))
+    writer.release()
+
+def test_read_mp4_info(tmp_path):
+    """MP4のアトム順・コーデック・キーフレーム時刻の読み取りテスト"""
+    path = tmp_path / "video.mp4"
+    _write_video(path)
+
+    info = read_mp4_info(path)
+    assert info is not None
+    assert info.faststart is False  # OpenCVはmoovを末尾に書く
+    assert info.video_codec == "mp4v"
+    assert info.duration_ms == 5000
+    assert info.keyframes_ms[0] == 0
+    assert info.keyframes_ms == sorted(info.keyframes_ms)
+    # MP4でそのまま使えないコーデックは再エンコード対象
+    assert needs_reencode(info)
+
+    # MP4以外はNone
+    other = tmp_path / "video.avi"
+    other.write_bytes(b"RIFF" + b"\0" * 100)
+    assert read_mp4_info(other) is None
+    assert needs_reencode(None)
+
+def test_keyframe_index():
+    """キーフレームインデックスの保存・検索テスト"""
+    keyframes = [0, 1000, 2000, 3000]
+    assert load_keyframe_index(dump_keyframe_index(keyframes)) == keyframes
+    assert load_keyframe_index(None) == []
+    assert nearest_keyframe(keyframes, 1400) == 1000
+    assert nearest_keyframe(keyframes, 1600) == 2000
+    assert nearest_keyframe(keyframes, 9999) == 3000
+    assert nearest_keyframe([], 100) is None
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_create_playback_rendition(tmp_path):
+    """faststart MP4が作成され、キーフレームが一定間隔になるテスト"""
+    source = tmp_path / "upload.mov"
+    _write_video(tmp_path / "upload.mp4", frames=60)
+    (tmp_path / "upload.mp4").rename(source)
+
+    path, result = create_playback_rendition(source)
+    assert path == tmp_path / "playback" / "upload.mp4"
+    assert result["mode"] == "reencode"
+
+    info = read_mp4_info(path)
+    assert info.faststart
+    assert info.video_codec == "avc1"
+    assert info.max_keyframe_gap_ms <= 1000
+    assert result["keyframes_ms"] == info.keyframes_ms
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_create_proxy_rendition(tmp_path, monkeypatch):
+    """プロキシが縦横比を保って縮小され、短い間隔でキーフレームを持つテスト"""
+    monkeypatch.setattr("services.video_remux.PROXY_MAX_DIMENSION", 160)
+    source = tmp_path / "upload.mp4"
+    _write_video(source, frames=30, size=(640, 360))
+
+    proxy = create_proxy_rendition(source)
+    assert proxy == tmp_path / "proxy" / "upload.mp4"
+
+    cap = cv2.VideoCapture(str(proxy))
+    ret, frame = cap.read()
+    cap.release()
+    assert ret and frame.shape[:2] == (90, 160)
+
+    info = read_mp4_info(proxy)
+    assert info.faststart
+    assert info.max_keyframe_gap_ms <= 500
+
+    # 元動画がプロキシより小さい場合は拡大しない
+    small = tmp_path / "small.mp4"
+    _write_video(small, frames=10)
+    cap = cv2.VideoCapture(str(create_proxy_rendition(small)))
+    assert cap.read()[1].shape[:2] == (48, 64)
+    cap.release()
+
+def test_proxy_fallback_and_quad_scaling(tmp_path):
+    """プロキシがなければ元動画を使い、プロキシ上の検出座標は元解像度に変換されるテスト"""
+    proxy = tmp_path / "proxy.mp4"
+    assert proxy_source(SimpleNamespace(proxy_path=None)) is None
+    assert proxy_source(SimpleNamespace(proxy_path=str(proxy))) is None
+    proxy.write_bytes(b"")
+    assert proxy_source(SimpleNamespace(proxy_path=str(proxy))) == str(proxy)
+
+    quad = DocumentQuad(points=np.array([[10, 20], [90, 20], [90, 140], [10, 140]], dtype=np.float32))
+    candidate = FrameCandidate(frame_idx=0, time_ms=0, time_s=0.0, frame=None,
+                               frame_path="", frame_size=(96, 160))
+    scaled = _scale_quad(quad, candidate, 1080, 1800)
+    assert scaled.points.tolist() == [[112.5, 225], [1012.5, 225], [1012.5, 1575], [112.5, 1575]]
+    assert _scale_quad(quad, candidate, 96, 160) is quad
@@ -42,6 +42,24 @@ def load_config(config_path: Optional[str] = None) -> Config:
         config.target_min = int(os.getenv("VP_TARGET_MIN"))
     if os.getenv("VP_TARGET_MAX"):
         config.target_max = int(os.getenv("VP_TARGET_MAX"))
+    if os.getenv("VP_OCR_BUDGET"):
+        config.ocr_budget = int(os.getenv("VP_OCR_BUDGET"))
+    if os.getenv("VP_OCR_MIN_UTILITY"):
+        config.ocr_min_utility = float(os.getenv("VP_OCR_MIN_UTILITY"))
+    if os.getenv("VP_OCR_ENGINE"):
+        config.ocr_engine = os.getenv("VP_OCR_ENGINE").lower()
+    if os.getenv("VP_LOCAL_OCR_ENGINE"):
+        config.local_ocr_engine = os.getenv("VP_LOCAL_OCR_ENGINE").lower()
+    if os.getenv("VP_LOCAL_OCR_WORKERS"):
+        config.local_ocr_workers = int(os.getenv("VP_LOCAL_OCR_WORKERS"))
+    if os.getenv("VP_LOCAL_OCR_PREFILTER"):
+        config.local_ocr_prefilter = os.getenv("VP_LOCAL_OCR_PREFILTER").lower() == "true"
+    if os.getenv("VP_OCR_FUSION"):
+        config.ocr_fusion = os.getenv("VP_OCR_FUSION").lower() == "true"
+    if os.getenv("VP_FUSION_FRAMES_PER_RECEIPT"):
+        config.fusion_frames_per_receipt = int(os.getenv("VP_FUSION_FRAMES_PER_RECEIPT"))
+    if os.getenv("VP_OCR_PAYLOAD"):
+        config.ocr_payload = os.getenv("VP_OCR_PAYLOAD").lower() == "true"
     
     # Validate weights sum to 1.0 (excluding penalty)
     positive_weights = (
@@ -10,16 +10,21 @@ from pathlib import Path
 from typing import List, Optional
 import argparse
 import sys
+from dataclasses import replace
 
-from .types import Config, SelectedFrame, FrameCandidate
+from .types import Config, SelectedFrame, FrameCandidate, DocumentQuad
 from .config import load_config
 from .sampling import AdaptiveSampler
 from .doc_detect import DocumentDetector
 from .quality import QualityAssessor
 from .nms import NMSProcessor
+from .ocr_budget import OCRBudgetPlanner
 from .preprocess import ImagePreprocessor
 from .ocr import OCRProcessor
+from .local_ocr import LocalOCRPool, local_engine_available
+from .ocr_fusion import FrameReading, OCRFusion
 from .text_dedup import TextDeduplicator
+from services.processing_metrics import stage
 
 # Configure logging
 logging.basicConfig(
@@ -28,12 +33,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Frames scored together by QualityAssessor.assess_batch
+SCORING_BATCH_SIZE = 32
+
+
+def _scale_quad(quad: Optional[DocumentQuad], candidate: FrameCandidate,
+                frame_width: int, frame_height: int) -> Optional[DocumentQuad]:
+    """Map a quad detected on the analyzed (proxy) frame onto the full-resolution frame."""
+    if quad is None or quad.points is None or not candidate.frame_size:
+        return quad
+    analyzed_width, analyzed_height = candidate.frame_size
+    if (analyzed_width, analyzed_height) == (frame_width, frame_height):
+        return quad
+    scale = [frame_width / analyzed_width, frame_height / analyzed_height]
+    return replace(quad, points=(quad.points * scale).astype(quad.points.dtype))
+
 
 def select_receipt_frames(
     video_path: str,
     target_min: int = 7,
     target_max: int = 15,
-    config: Optional[Config] = None
+    config: Optional[Config] = None,
+    proxy_path: Optional[str] = None,
+    output_dir: Optional[str] = None
 ) -> List[SelectedFrame]:
     """
     Extract best quality receipt frames from video.
@@ -45,6 +67,10 @@ def select_receipt_frames(
         target_min: Minimum number of frames to select
         target_max: Maximum number of frames to select
         config: Optional configuration object
+        proxy_path: Optional low-resolution rendition of the same video. Sampling,
+            document detection and scoring decode the proxy; only the final
+            crops for OCR are read from video_path at full resolution.
+        output_dir: Optional directory for the crops (default: output/crops)
         
     Returns:
         List of SelectedFrame objects with processed receipt images
@@ -69,14 +95,15 @@ def select_receipt_frames(
     logger.info(f"Target frames: {target_min}-{target_max}")
     
     # Create output directories
-    output_dir = Path("output")
-    crops_dir = output_dir / "crops"
+    crops_dir = Path(output_dir) if output_dir else Path("output") / "crops"
     crops_dir.mkdir(parents=True, exist_ok=True)
     
     # Step 1: Adaptive sampling
     logger.info("Step 1: Adaptive frame sampling...")
     sampler = AdaptiveSampler(config)
-    candidates = sampler.sample_frames(video_path)
+    with stage("sampling") as sampling:
+        candidates = sampler.sample_frames(proxy_path or video_path)
+        sampling.add(items=len(candidates), frames_decoded=sampler.frames_decoded, bytes_decoded=sampler.bytes_decoded)
     logger.info(f"Sampled {len(candidates)} candidate frames")
     
     # Step 2: Document detection and quality assessment
@@ -85,55 +112,78 @@ def select_receipt_frames(
     assessor = QualityAssessor(config)
     
     scored_candidates = []
+    batch = []  # (candidate, frame) waiting to be scored
+    
+    def score_batch():
+        # Quality scoring runs on batches of same-sized frames (see QualityAssessor.assess_batch)
+        with stage("scoring", items=len(batch)):
+            batch_scores = assessor.assess_batch(
+                [frame for _, frame in batch],
+                [candidate.doc_quad for candidate, _ in batch],
+                [candidate.motion_score for candidate, _ in batch]
+            )
+        
+        for (candidate, _), scores in zip(batch, batch_scores):
+            # Update candidate with scores
+            candidate.sharpness_score = scores['sharpness']
+            candidate.doc_area_score = scores['doc_area']
+            candidate.perspective_score = scores['perspective']
+            candidate.exposure_score = scores['exposure']
+            candidate.stability_score = scores['stability']
+            candidate.glare_penalty = scores['glare_penalty']
+            candidate.textness_score = scores['textness']
+            candidate.total_score = scores['total']
+            
+            # Only keep frames with reasonable scores
+            if candidate.total_score > 0.1:
+                scored_candidates.append(candidate)
+        batch.clear()
+    
     for i, candidate in enumerate(candidates):
         if i % 10 == 0:
             logger.debug(f"Processing frame {i+1}/{len(candidates)}")
         
-        # Load frame
-        frame = cv2.imread(candidate.frame_path)
-        if frame is None:
-            continue
-        
-        # Detect document
-        doc_quad = detector.detect_document(frame)
-        candidate.doc_quad = doc_quad
-        candidate.has_document = doc_quad is not None
-        
-        # Assess quality
-        scores = assessor.assess_frame(
-            frame, 
-            doc_quad, 
-            candidate.motion_score
-        )
-        
-        # Update candidate with scores
-        candidate.sharpness_score = scores['sharpness']
-        candidate.doc_area_score = scores['doc_area']
-        candidate.perspective_score = scores['perspective']
-        candidate.exposure_score = scores['exposure']
-        candidate.stability_score = scores['stability']
-        candidate.glare_penalty = scores['glare_penalty']
-        candidate.textness_score = scores['textness']
-        candidate.total_score = scores['total']
+        with stage("detection") as detection:
+            # Load frame
+            frame = cv2.imread(candidate.frame_path)
+            if frame is None:
+                continue
+            detection.add(items=1, bytes_decoded=frame.nbytes)
+            
+            # Detect document
+            doc_quad = detector.detect_document(frame)
+            candidate.doc_quad = doc_quad
+            candidate.has_document = doc_quad is not None
         
-        # Only keep frames with reasonable scores
-        if candidate.total_score > 0.1:
-            scored_candidates.append(candidate)
+        if batch and batch[0][1].shape != frame.shape:
+            score_batch()
+        batch.append((candidate, frame))
+        if len(batch) >= SCORING_BATCH_SIZE:
+            score_batch()
+    
+    if batch:
+        score_batch()
     
     logger.info(f"Scored {len(scored_candidates)} frames above threshold")
     
     # Step 3: Non-Maximum Suppression
     logger.info("Step 3: Applying NMS for frame selection...")
     nms = NMSProcessor(config)
-    selected_candidates = nms.apply_adaptive_selection(scored_candidates)
+    with stage("nms", items=len(scored_candidates)):
+        selected_candidates = nms.apply_adaptive_selection(scored_candidates)
     logger.info(f"Selected {len(selected_candidates)} frames after NMS")
     
+    # Step 3b: Spend the OCR budget on the frames expected to add the most information
+    with stage("ocr_budget", items=len(selected_candidates)) as budgeting:
+        ocr_plan = OCRBudgetPlanner(config).plan_candidates(selected_candidates)
+        budgeting.add(ocr_calls_saved=ocr_plan.calls_saved)
+    selected_candidates = ocr_plan.selected
+    
     # Step 4: Preprocessing and OCR
     logger.info("Step 4: Preprocessing and OCR...")
     preprocessor = ImagePreprocessor(config)
-    ocr_processor = OCRProcessor(config)
     
-    ocr_results = []
+    prepared = []  # (candidate, crop_path, success)
     for i, candidate in enumerate(selected_candidates):
         logger.debug(f"Processing selected frame {i+1}/{len(selected_candidates)}")
         
@@ -142,45 +192,137 @@ def select_receipt_frames(
         crop_filename = f"{video_name}_crop_{int(candidate.time_s*1000):08d}ms.jpg"
         crop_path = str(crops_dir / crop_filename)
         
-        # ビデオから直接フレームを抽出
-        cap = cv2.VideoCapture(video_path)
-        cap.set(cv2.CAP_PROP_POS_MSEC, candidate.time_s * 1000)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret:
-            logger.warning(f"Failed to extract frame at {candidate.time_s}s")
-            success = False
-        else:
-            # フレームを一時的に保存
-            temp_frame_path = f"/tmp/temp_frame_{int(candidate.time_s*1000)}.jpg"
-            cv2.imwrite(temp_frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-            
-            # Preprocess
-            success = preprocessor.process_frame(
-                temp_frame_path,
-                candidate.doc_quad,
-                crop_path
-            )
+        with stage("preprocess", items=1) as preprocessing:
+            # ビデオから直接フレームを抽出
+            cap = cv2.VideoCapture(video_path)
+            cap.set(cv2.CAP_PROP_POS_MSEC, candidate.time_s * 1000)
+            ret, frame = cap.read()
+            cap.release()
             
-            # 一時ファイルを削除
-            import os
-            if os.path.exists(temp_frame_path):
-                os.remove(temp_frame_path)
+            if not ret:
+                logger.warning(f"Failed to extract frame at {candidate.time_s}s")
+                success = False
+            else:
+                preprocessing.add(bytes_decoded=frame.nbytes)
+                
+                # プロキシ上で検出した文書領域を元解像度の座標に変換
+                candidate.doc_quad = _scale_quad(candidate.doc_quad, candidate, frame.shape[1], frame.shape[0])
+                
+                # フレームを一時的に保存
+                temp_frame_path = f"/tmp/temp_frame_{int(candidate.time_s*1000)}.jpg"
+                cv2.imwrite(temp_frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+                
+                # Preprocess
+                success = preprocessor.process_frame(
+                    temp_frame_path,
+                    candidate.doc_quad,
+                    crop_path
+                )
+                
+                # 一時ファイルを削除
+                import os
+                if os.path.exists(temp_frame_path):
+                    os.remove(temp_frame_path)
         
-        if success:
-            # OCR
-            text_block = ocr_processor.process_image(crop_path)
-            
-            if text_block:
-                # Extract receipt info
-                receipt_info = ocr_processor.extract_receipt_info(text_block.text)
+        prepared.append((candidate, crop_path, success))
+    
+    # Local OCR runs over all crops at once in a process pool (as the OCR engine,
+    # or as a prefilter deciding which crops are worth a remote OCR call)
+    use_local = config.ocr_engine == "local"
+    prefilter = not use_local and config.local_ocr_prefilter
+    if prefilter and not local_engine_available(config.local_ocr_engine):
+        logger.warning(f"Local OCR engine '{config.local_ocr_engine}' not available, prefilter disabled")
+        prefilter = False
+    local_blocks = {}
+    if use_local or prefilter:
+        ocr_paths = [crop_path for _, crop_path, success in prepared if success]
+        with LocalOCRPool(config) as pool, stage("local_ocr", items=len(ocr_paths), local_ocr_calls=len(ocr_paths)):
+            local_blocks = dict(zip(ocr_paths, pool.process_images(ocr_paths)))
+        ocr_processor = pool.processor if use_local else OCRProcessor(config)
+    else:
+        ocr_processor = OCRProcessor(config)
+    skip_remote = set()
+    if prefilter:
+        with stage("ocr_prefilter", items=len(local_blocks)) as prefiltering:
+            skip_remote = {
+                path for path, block in local_blocks.items()
+                if len(block.text.strip() if block else "") < config.local_ocr_min_chars
+            }
+            prefiltering.add(ocr_calls_saved=len(skip_remote))
+        logger.info(f"Prefilter: {len(skip_remote)}/{len(local_blocks)} crops have too little text for remote OCR")
+    
+    def read_text(crop_path, counted=True):
+        if use_local:
+            return local_blocks.get(crop_path)
+        if crop_path in skip_remote:
+            return None
+        if not counted:
+            return ocr_processor.process_image(crop_path)
+        with stage("ocr", items=1, ocr_calls=1):
+            return ocr_processor.process_image(crop_path)
+    
+    ocr_results = []
+    if config.ocr_fusion:
+        # Frames of the same receipt are OCRed together (best first, concurrently)
+        # and their receipt fields fused; one frame per receipt goes on to dedup
+        fusion = OCRFusion(config)
+        readable = sorted(
+            [(candidate, crop_path) for candidate, crop_path, success in prepared if success],
+            key=lambda item: item[0].total_score, reverse=True
+        )
+        groups = fusion.group(readable, lambda item: item[0].time_s, lambda item: item[0].phash)
+        remote_calls = []
+        
+        def read(item):
+            candidate, crop_path = item
+            text_block = read_text(crop_path, counted=False)
+            if not use_local and crop_path not in skip_remote:
+                remote_calls.append(crop_path)
+            if not text_block:
+                return None
+            receipt_info = ocr_processor.extract_receipt_info(text_block.text)
+            return FrameReading(receipt_info, text_block.confidence or 0.5, payload=text_block)
+        
+        # Worker threads do not see the metrics context: calls are counted here
+        with stage("ocr_fusion", items=len(readable)) as fusing:
+            fused = fusion.run(groups, read)
+            fusing.add(ocr_calls=len(remote_calls),
+                       ocr_calls_saved=len(readable) - sum(result.calls for result in fused))
+        logger.info(f"OCR fusion: {len(groups)} receipts, {sum(r.calls for r in fused)}/{len(readable)} frames read")
+        
+        for group, result in zip(groups, fused):
+            if result.best is None:
+                candidate, crop_path = group[0]
+                ocr_results.append((candidate, None, crop_path, None))
+                continue
+            (candidate, crop_path), reading = result.best
+            receipt_info = dict(result.fields)
+            receipt_info['fusion'] = {
+                'frames': len(group),
+                'calls': result.calls,
+                'readings': len(result.readings),
+                'agreement': result.agreement
+            }
+            ocr_results.append((candidate, reading.payload, crop_path, receipt_info))
+        ocr_results.extend(
+            (candidate, None, candidate.frame_path, None)
+            for candidate, _, success in prepared if not success
+        )
+    else:
+        for candidate, crop_path, success in prepared:
+            if success:
+                text_block = read_text(crop_path)
                 
-                ocr_results.append((candidate, text_block, crop_path, receipt_info))
+                if text_block:
+                    # Extract receipt info
+                    with stage("receipt_info", items=1):
+                        receipt_info = ocr_processor.extract_receipt_info(text_block.text)
+                    
+                    ocr_results.append((candidate, text_block, crop_path, receipt_info))
+                else:
+                    ocr_results.append((candidate, None, crop_path, None))
             else:
-                ocr_results.append((candidate, None, crop_path, None))
-        else:
-            ocr_results.append((candidate, None, candidate.frame_path, None))
+                ocr_results.append((candidate, None, candidate.frame_path, None))
     
     # Step 5: Text deduplication
     logger.info("Step 5: Text deduplication...")
@@ -188,7 +330,8 @@ def select_receipt_frames(
     
     # Prepare for deduplication
     text_pairs = [(c, tb) for c, tb, _, _ in ocr_results if tb is not None]
-    deduplicated = deduplicator.deduplicate(text_pairs)
+    with stage("text_dedup", items=len(text_pairs)):
+        deduplicated = deduplicator.deduplicate(text_pairs)
     
     # Create final selected frames
     selected_frames = []
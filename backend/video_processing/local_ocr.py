@@ -0,0 +1,260 @@
+"""
+Local CPU OCR (Tesseract / PaddleOCR) behind the OCRProcessor interface.
+
+Runs without network access or credentials, so the pipeline can be run and
+benchmarked offline, and can act as a first-pass filter before remote OCR
+(``Config.local_ocr_prefilter``). Engines are optional dependencies and are
+imported on first use:
+
+- tesseract: ``pytesseract`` + the ``tesseract`` binary (with ``jpn`` data)
+- paddle:    ``paddleocr``
+
+OCR is CPU bound, so ``LocalOCRPool`` runs it in a process pool sized to the
+available cores, with one engine instance per worker process.
+"""
+
+import os
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from .ocr import OCRProcessor
+from .types import Config, TextBlock
+
+logger = logging.getLogger(__name__)
+
+
+class LocalOCREngine(ABC):
+    """A local OCR engine: image path -> recognized lines."""
+
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the engine's dependencies are installed."""
+        return True
+
+    @abstractmethod
+    def recognize(self, image_path: str) -> List[Tuple[str, float]]:
+        """Recognized lines as (text, confidence 0-1), top to bottom."""
+
+
+_ENGINES: Dict[str, Type[LocalOCREngine]] = {}
+
+
+def register_local_engine(name: str):
+    """Class decorator registering a LocalOCREngine under ``name``."""
+    def decorator(cls: Type[LocalOCREngine]) -> Type[LocalOCREngine]:
+        cls.name = name
+        _ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+def available_engines() -> List[str]:
+    """Registered engines whose dependencies are installed."""
+    return sorted(name for name, cls in _ENGINES.items() if cls.available())
+
+
+def local_engine_available(name: str) -> bool:
+    """Whether ``name`` is registered and its dependencies are installed."""
+    return name in _ENGINES and _ENGINES[name].available()
+
+
+def _join_words(words: List[str]) -> str:
+    """Join words with spaces, except between Japanese words (tesseract splits them per character)."""
+    text = ""
+    for word in words:
+        if text and text[-1].isascii() and word[0].isascii():
+            text += " "
+        text += word
+    return text
+
+
+@register_local_engine("tesseract")
+class TesseractEngine(LocalOCREngine):
+    """Tesseract via pytesseract (line confidence = mean word confidence)."""
+
+    def __init__(self, config: Config):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.lang = config.local_ocr_languages
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            return False
+
+    def recognize(self, image_path):
+        data = self.pytesseract.image_to_data(
+            image_path, lang=self.lang, output_type=self.pytesseract.Output.DICT
+        )
+        lines: Dict[Tuple[int, int, int], List[Tuple[str, float]]] = {}
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if not word.strip() or conf < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append((word, conf / 100.0))
+        return [
+            (_join_words([w for w, _ in words]), sum(c for _, c in words) / len(words))
+            for _, words in sorted(lines.items())
+        ]
+
+
+@register_local_engine("paddle")
+class PaddleEngine(LocalOCREngine):
+    """PaddleOCR (detection + recognition, angle classifier disabled for speed)."""
+
+    def __init__(self, config: Config):
+        from paddleocr import PaddleOCR
+        self.ocr = PaddleOCR(lang=config.local_ocr_paddle_lang, use_angle_cls=False, show_log=False)
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import paddleocr  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def recognize(self, image_path):
+        result = self.ocr.ocr(image_path, cls=False)
+        boxes = (result or [None])[0] or []
+        # Sort detected boxes top to bottom, then left to right
+        boxes = sorted(boxes, key=lambda item: (min(p[1] for p in item[0]), min(p[0] for p in item[0])))
+        return [(text, float(conf)) for _, (text, conf) in boxes]
+
+
+class LocalOCRProcessor(OCRProcessor):
+    """
+    OCRProcessor backed by a local engine (``config.local_ocr_engine``).
+
+    Returns the same TextBlock (text, confidence, tokens, n-grams) as the Vision
+    processor, and shares its receipt info extraction.
+    """
+
+    def _initialize_client(self):
+        """Load the local engine (the 'client' of the Vision processor)."""
+        name = self.config.local_ocr_engine
+        engine_cls = _ENGINES.get(name)
+        if engine_cls is None:
+            logger.error(f"Unknown local OCR engine: {name} (registered: {', '.join(sorted(_ENGINES))})")
+            return
+        if not engine_cls.available():
+            logger.error(f"Local OCR engine '{name}' is not installed")
+            return
+        try:
+            self.client = engine_cls(self.config)
+            logger.info(f"Local OCR engine '{name}' initialized")
+        except Exception as e:
+            logger.error(f"Failed to initialize local OCR engine '{name}': {e}")
+            self.client = None
+
+    def process_image(self, image_path: str) -> Optional[TextBlock]:
+        """
+        Perform local OCR on an image.
+
+        Args:
+            image_path: Path to image file
+
+        Returns:
+            TextBlock with extracted text and mean line confidence
+        """
+        if not self.client:
+            logger.error("Local OCR engine not initialized")
+            return None
+
+        try:
+            lines = [(text.strip(), conf) for text, conf in self.client.recognize(image_path) if text.strip()]
+        except Exception as e:
+            logger.error(f"Local OCR failed for {image_path}: {e}")
+            return None
+        if not lines:
+            return None
+
+        text = "\n".join(line for line, _ in lines)
+        tokens = self._extract_tokens(text)
+        return TextBlock(
+            text=text,
+            confidence=sum(conf for _, conf in lines) / len(lines),
+            tokens=tokens,
+            ngrams=self._generate_ngrams(tokens, n=3)
+        )
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects affinity / container cpusets)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# One processor (engine instance) per pool worker process
+_worker_processor: Optional[LocalOCRProcessor] = None
+
+
+def _init_worker(config: Config):
+    global _worker_processor
+    # Engines such as tesseract use OpenMP; one thread per worker avoids oversubscription
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    _worker_processor = LocalOCRProcessor(config)
+
+
+def _process_in_worker(image_path: str) -> Optional[TextBlock]:
+    return _worker_processor.process_image(image_path)
+
+
+class LocalOCRPool:
+    """
+    Runs LocalOCRProcessor over many images in a process pool.
+
+    The pool is sized to ``config.local_ocr_workers`` (0 = available cores) and
+    started lazily; with a single worker or a single image, OCR runs inline.
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, config: Config, max_workers: Optional[int] = None):
+        self.config = config
+        workers = max_workers if max_workers is not None else config.local_ocr_workers
+        self.max_workers = workers if workers and workers > 0 else available_cores()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inline: Optional[LocalOCRProcessor] = None
+
+    @property
+    def processor(self) -> LocalOCRProcessor:
+        """In-process processor (inline OCR and receipt info extraction)."""
+        if self._inline is None:
+            self._inline = LocalOCRProcessor(self.config)
+        return self._inline
+
+    def process_images(self, image_paths: Sequence[str]) -> List[Optional[TextBlock]]:
+        """OCR each image; results keep the input order (None where OCR failed)."""
+        if not image_paths:
+            return []
+        if self.max_workers == 1 or len(image_paths) == 1:
+            return [self.processor.process_image(path) for path in image_paths]
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self.config,)
+            )
+        chunksize = max(1, len(image_paths) // (self.max_workers * 4))
+        return list(self._executor.map(_process_in_worker, image_paths, chunksize=chunksize))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,15 +4,92 @@ Non-Maximum Suppression (NMS) implementations for frame selection.
 
 import numpy as np
 import logging
-from typing import List, Tuple, Set
+from typing import List, Optional, Tuple, Set
 from collections import defaultdict
 import imagehash
 from PIL import Image
-from sklearn.cluster import DBSCAN
 from .types import FrameCandidate, Config
 
 logger = logging.getLogger(__name__)
 
+# 16進ハッシュを解釈できない場合の距離（NMSProcessor._hamming_distance と同じ）
+INVALID_HASH_DISTANCE = 64
+
+
+def _hash_bits(hashes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """16進ハッシュをビット列の行列に変換（桁数が違う場合は上位を0で埋める）。解釈できたかのマスクも返す"""
+    parsed = []
+    for value in hashes:
+        try:
+            number = int(value, 16)
+        except (TypeError, ValueError):
+            number = None
+        # 負の値（"-" 付き）はハッシュとして扱わない
+        parsed.append(number if number is not None and number >= 0 else None)
+    width = max((number.bit_length() for number in parsed if number is not None), default=0)
+    n_bytes = max(1, (width + 7) // 8)
+    rows = np.zeros((len(hashes), n_bytes), dtype=np.uint8)
+    for i, number in enumerate(parsed):
+        if number is not None:
+            rows[i] = np.frombuffer(number.to_bytes(n_bytes, "big"), dtype=np.uint8)
+    bits = np.unpackbits(rows, axis=1).astype(bool)
+    return bits, np.array([number is not None for number in parsed], dtype=bool)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def hamming_components(hashes: List[Optional[str]], eps: float) -> List[int]:
+    """
+    ハミング距離が eps 以下のハッシュをつないだ連結成分のラベルを返す（Union-Find）
+
+    DBSCAN(eps, min_samples=1, metric='precomputed') と同じラベルになる。
+    - ラベルは各成分の最小の添字の順に 0, 1, 2, ...
+    - ハッシュがない（None・空）フレームとの距離は 0（以前の距離行列の初期値と同じ）
+    - 16進として解釈できないハッシュとの距離は INVALID_HASH_DISTANCE
+    """
+    n = len(hashes)
+    parent = list(range(n))
+
+    def union(i: int, j: int) -> None:
+        root_i, root_j = _find(parent, i), _find(parent, j)
+        if root_i != root_j:
+            # 小さい添字を根にする
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    present = [i for i, value in enumerate(hashes) if value]
+    missing = [i for i, value in enumerate(hashes) if not value]
+
+    # ハッシュのないフレームは全フレームと距離 0
+    if missing and eps >= 0:
+        for i in range(1, n):
+            union(0, i)
+    elif present:
+        bits, valid = _hash_bits([hashes[i] for i in present])
+        valid_idx = np.flatnonzero(valid)
+        invalid_idx = np.flatnonzero(~valid)
+        valid_bits = bits[valid_idx]
+        # 1行ずつ、後ろのハッシュとの距離をまとめて計算して近傍をつなぐ
+        for row, i in enumerate(valid_idx[:-1]):
+            distances = np.count_nonzero(valid_bits[row + 1:] != valid_bits[row], axis=1)
+            for j in valid_idx[row + 1:][distances <= eps]:
+                union(present[i], present[j])
+        if len(invalid_idx) and INVALID_HASH_DISTANCE <= eps:
+            for i in invalid_idx:
+                for j in range(len(present)):
+                    union(present[i], present[j])
+
+    labels: List[int] = []
+    root_labels = {}
+    for i in range(n):
+        root = _find(parent, i)
+        labels.append(root_labels.setdefault(root, len(root_labels)))
+    return labels
+
 
 class NMSProcessor:
     """
@@ -66,7 +143,7 @@ class NMSProcessor:
     def apply_visual_nms(self, candidates: List[FrameCandidate], 
                         eps: int = None) -> List[FrameCandidate]:
         """
-        # 視覚的類似度によるNMS（pHash + DBSCAN）
+        # 視覚的類似度によるNMS（pHash + 連結成分クラスタリング）
         Apply visual NMS using perceptual hashing and clustering.
         
         Args:
@@ -86,20 +163,9 @@ class NMSProcessor:
             if cand.phash is None:
                 cand.phash = self._calculate_phash(cand.frame_path)
         
-        # ハミング距離行列を構築
-        n = len(candidates)
-        distances = np.zeros((n, n))
-        
-        for i in range(n):
-            for j in range(i+1, n):
-                if candidates[i].phash and candidates[j].phash:
-                    dist = self._hamming_distance(candidates[i].phash, candidates[j].phash)
-                    distances[i, j] = dist
-                    distances[j, i] = dist
-        
-        # DBSCANクラスタリング
-        clustering = DBSCAN(eps=eps, min_samples=1, metric='precomputed')
-        labels = clustering.fit_predict(distances)
+        # ハミング距離が eps 以下のフレームを連結成分にまとめる
+        # （DBSCAN(min_samples=1, metric='precomputed') と同じラベル）
+        labels = hamming_components([cand.phash for cand in candidates], eps)
         
         # 各クラスターから最高スコアを選択
         selected = []
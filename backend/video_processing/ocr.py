@@ -6,9 +6,12 @@ import os
 import logging
 from typing import Optional, Dict, Any, List
 from pathlib import Path
-from google.cloud import vision
-from google.api_core import exceptions
+try:
+    from google.cloud import vision
+except ImportError:  # local OCR (local_ocr.LocalOCRProcessor) does not need the Vision client
+    vision = None
 from .types import TextBlock, Config
+from .ocr_payload import OCRPayloadOptimizer
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +24,14 @@ class OCRProcessor:
     def __init__(self, config: Config):
         self.config = config
         self.client = None
+        self.payload_optimizer = OCRPayloadOptimizer(config) if config.ocr_payload else None
         self._initialize_client()
         
     def _initialize_client(self):
         """Initialize Vision API client."""
+        if vision is None:
+            logger.error("google-cloud-vision is not installed")
+            return
         try:
             self.client = vision.ImageAnnotatorClient()
             logger.info("Vision API client initialized")
@@ -47,9 +54,15 @@ class OCRProcessor:
             return None
         
         try:
-            # Load image
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            # Load image (crops are already rectified: no document detection)
+            payload = self.payload_optimizer.optimize_file(image_path) if self.payload_optimizer else None
+            if payload is not None:
+                content = payload.data
+                logger.debug(f"OCR payload {len(content)} bytes ({payload.format}, {payload.shape[1]}x{payload.shape[0]}), "
+                             f"{payload.bytes_saved} bytes saved")
+            else:
+                with open(image_path, 'rb') as image_file:
+                    content = image_file.read()
             
             image = vision.Image(content=content)
             
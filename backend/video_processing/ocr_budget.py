@@ -0,0 +1,160 @@
+"""
+OCR budget planning: decide which selected frames are worth an OCR call.
+
+Every OCR call goes to an external API and dominates latency and cost, so
+frames are ranked by the new information OCR is expected to return:
+
+    utility = base utility (textness, document area, sharpness)
+              x novelty (pHash distance to frames already planned for OCR)
+
+and the per-video budget is spent greedily on the highest utility frame,
+re-scoring novelty after each pick. Frames below ``ocr_min_utility`` are
+never sent, even when budget is left.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+import cv2
+import imagehash
+from PIL import Image
+
+from .doc_detect import DocumentDetector
+from .nms import INVALID_HASH_DISTANCE
+from .quality import QualityAssessor
+from .types import Config, FrameCandidate
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class OCRPlan:
+    """Result of OCR budget planning (both lists keep the input order)."""
+    selected: List = field(default_factory=list)
+    skipped: List = field(default_factory=list)
+    utilities: List[float] = field(default_factory=list)  # utility at pick time, per input item
+
+    @property
+    def calls_saved(self) -> int:
+        return len(self.skipped)
+
+
+def hamming_distance(hash1: Optional[str], hash2: Optional[str]) -> int:
+    """Hamming distance of two hex hashes (INVALID_HASH_DISTANCE when either is missing or invalid)."""
+    if not hash1 or not hash2:
+        return INVALID_HASH_DISTANCE
+    try:
+        return bin(int(hash1, 16) ^ int(hash2, 16)).count("1")
+    except ValueError:
+        return INVALID_HASH_DISTANCE
+
+
+class OCRBudgetPlanner:
+    """Greedy expected-utility selection of frames to OCR under a per-video budget."""
+
+    def __init__(self, config: Config):
+        self.config = config
+
+    def base_utility(self, textness: float, doc_area: float, sharpness: float) -> float:
+        """Weighted textness / document area / sharpness, normalized to 0-1."""
+        weights = (self.config.ocr_weight_textness, self.config.ocr_weight_doc_area, self.config.ocr_weight_sharpness)
+        values = (textness, doc_area, sharpness)
+        total = sum(weights)
+        if total <= 0:
+            return 1.0
+        return sum(w * min(max(v, 0.0), 1.0) for w, v in zip(weights, values)) / total
+
+    def novelty(self, phash: Optional[str], planned: Sequence[Optional[str]]) -> float:
+        """1.0 for a frame unlike every planned frame, falling linearly to 0 for identical hashes."""
+        if not planned:
+            return 1.0
+        distance = min(hamming_distance(phash, other) for other in planned)
+        return min(1.0, distance / max(self.config.ocr_novelty_distance, 1))
+
+    def plan(self, items: Sequence[T], base_utility: Callable[[T], float],
+             phash: Callable[[T], Optional[str]], budget: Optional[int] = None) -> OCRPlan:
+        """
+        Choose which items to OCR.
+
+        Args:
+            items: candidate frames (any type)
+            base_utility: item -> 0-1 utility before novelty
+            phash: item -> hex pHash (None when unknown: treated as novel)
+            budget: maximum OCR calls (None uses config.ocr_budget; 0 means no limit)
+        """
+        budget = self.config.ocr_budget if budget is None else budget
+        limit = budget if budget and budget > 0 else len(items)
+        base = [base_utility(item) for item in items]
+        hashes = [phash(item) for item in items]
+        utilities = [0.0] * len(items)
+
+        chosen: List[int] = []
+        remaining = set(range(len(items)))
+        while remaining and len(chosen) < limit:
+            planned = [hashes[i] for i in chosen]
+            scored = {i: base[i] * self.novelty(hashes[i], planned) for i in remaining}
+            best = max(scored, key=lambda i: (scored[i], -i))
+            for i, utility in scored.items():
+                utilities[i] = utility
+            if scored[best] < self.config.ocr_min_utility:
+                break
+            chosen.append(best)
+            remaining.discard(best)
+
+        chosen_set = set(chosen)
+        plan = OCRPlan(
+            selected=[item for i, item in enumerate(items) if i in chosen_set],
+            skipped=[item for i, item in enumerate(items) if i not in chosen_set],
+            utilities=utilities,
+        )
+        logger.info(
+            f"OCR budget: {len(plan.selected)}/{len(items)} frames to OCR "
+            f"(budget={budget or 'none'}, saved {plan.calls_saved} calls)"
+        )
+        return plan
+
+    def plan_candidates(self, candidates: Sequence[FrameCandidate], budget: Optional[int] = None) -> OCRPlan:
+        """Plan OCR for scored FrameCandidates (after NMS)."""
+        return self.plan(
+            candidates,
+            lambda c: self.base_utility(c.textness_score, c.doc_area_score, c.sharpness_score),
+            lambda c: c.phash,
+            budget,
+        )
+
+    def image_features(self, image_path: str, max_width: int = 640) -> Optional[Dict]:
+        """
+        Textness, document area, sharpness and pHash of a saved frame image.
+
+        Used where frames were selected without document detection (the interval
+        selector); the image is scored at proxy width to keep this cheap.
+        """
+        image = cv2.imread(image_path)
+        if image is None:
+            return None
+        if image.shape[1] > max_width:
+            scale = max_width / image.shape[1]
+            image = cv2.resize(image, (max_width, int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        assessor = QualityAssessor(self.config)
+        quad = DocumentDetector(self.config).detect_document(image)
+        return {
+            "textness": assessor._estimate_text_density(image, quad),
+            "doc_area": min(quad.area_ratio / 0.5, 1.0) if quad else 0.0,
+            "sharpness": assessor._calculate_sharpness(image),
+            "phash": str(imagehash.phash(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))),
+        }
+
+    def plan_images(self, items: Sequence[T], image_path: Callable[[T], str],
+                    budget: Optional[int] = None) -> OCRPlan:
+        """Plan OCR for items backed by saved images (unreadable images are never sent)."""
+        features = [self.image_features(image_path(item)) for item in items]
+        by_id = {id(item): f for item, f in zip(items, features)}
+
+        def base_utility(item):
+            f = by_id[id(item)]
+            return self.base_utility(f["textness"], f["doc_area"], f["sharpness"]) if f else 0.0
+
+        return self.plan(items, base_utility, lambda item: (by_id[id(item)] or {}).get("phash"), budget)
@@ -0,0 +1,273 @@
+"""
+Multi-frame OCR fusion: one fused reading per physical receipt.
+
+A receipt held in front of the camera survives frame selection as several
+near-duplicate frames. Instead of OCRing all of them and keeping one, frames
+are grouped per receipt (time gap + pHash distance), a few of the best frames
+of each group are OCRed concurrently, and the field-level results are fused
+with confidence-weighted voting:
+
+- scalar fields (vendor, date, total, tax, ...) are normalized and the value
+  with the largest summed confidence wins
+- line items are matched by normalized name; items supported by at least
+  half of the confidence are kept, each with its own voted amount
+
+OCR runs in waves: the first ``fusion_min_frames`` frames of every group are
+read at once, and further frames (up to ``fusion_frames_per_receipt``) are
+only read for groups whose readings disagree on vendor or total.
+"""
+
+import logging
+import re
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from .ocr_budget import hamming_distance
+from .types import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Fields that must agree before a group stops asking for more OCR calls
+KEY_FIELDS = ("vendor", "total")
+
+# Keys holding the amount of a line item (first one present is voted)
+LINE_ITEM_AMOUNT_KEYS = ("amount", "price", "total", "unit_price")
+
+# Fields that are never voted on (per-frame bookkeeping)
+_SKIPPED_FIELDS = {"confidence_score", "line_items"}
+
+_NUMBER = re.compile(r"^[¥￥]?\s*-?[\d,]+(\.\d+)?\s*円?$")
+_DATE_PARTS = re.compile(r"\d+")
+
+
+@dataclass
+class FrameReading:
+    """Fields read from one frame, with the confidence used as its vote weight."""
+    fields: Dict[str, Any]
+    confidence: float = 0.5
+    payload: Any = None  # caller data (e.g. the TextBlock), returned untouched
+
+
+@dataclass
+class FusionResult(Generic[T]):
+    """Fused reading of one receipt group."""
+    fields: Dict[str, Any] = field(default_factory=dict)
+    agreement: Dict[str, float] = field(default_factory=dict)  # winning share of the vote, per field
+    readings: List[Tuple[T, FrameReading]] = field(default_factory=list)  # successful reads, best first
+    calls: int = 0
+
+    @property
+    def best(self) -> Optional[Tuple[T, FrameReading]]:
+        """Reading that agrees most with the fused fields (ties: highest confidence)."""
+        if not self.readings:
+            return None
+        return max(self.readings, key=lambda pair: (_agreeing_fields(pair[1].fields, self.fields), pair[1].confidence))
+
+
+def group_frames(items: Sequence[T], time_of: Callable[[T], float], phash_of: Callable[[T], Optional[str]],
+                 max_gap_s: float, max_distance: int) -> List[List[int]]:
+    """
+    Group items into receipts: in time order, an item joins the current group when
+    it follows the previous one within ``max_gap_s`` and its pHash is within
+    ``max_distance`` of any frame in the group. Returns input indices per group,
+    groups in time order and indices in input order (so a best-first input
+    stays best first within each group, as ``OCRFusion.run`` expects).
+    """
+    order = sorted(range(len(items)), key=lambda i: time_of(items[i]))
+    groups: List[List[int]] = []
+    for index in order:
+        if groups:
+            group = groups[-1]
+            close_in_time = time_of(items[index]) - time_of(items[group[-1]]) <= max_gap_s
+            if close_in_time and any(
+                hamming_distance(phash_of(items[index]), phash_of(items[other])) <= max_distance for other in group
+            ):
+                group.append(index)
+                continue
+        groups.append([index])
+    return [sorted(group) for group in groups]
+
+
+def normalize_value(name: str, value: Any) -> Any:
+    """Voting key of a field value (None when the value is empty)."""
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    text = unicodedata.normalize("NFKC", str(value)).strip()
+    if not text:
+        return None
+    if _NUMBER.match(text):
+        return round(float(re.sub(r"[¥￥,円\s]", "", text)), 2)
+    if "date" in name:
+        parts = [int(p) for p in _DATE_PARTS.findall(text)]
+        if len(parts) >= 3:
+            year, month, day = parts[:3]
+            if "令和" in text:
+                year += 2018
+            elif "平成" in text:
+                year += 1988
+            return f"{year:04d}-{month:02d}-{day:02d}"
+    return re.sub(r"[\W_]+", "", text.casefold())
+
+
+def _agreeing_fields(fields: Dict[str, Any], fused: Dict[str, Any]) -> int:
+    return sum(
+        1 for name, value in fused.items()
+        if name not in _SKIPPED_FIELDS and value is not None
+        and normalize_value(name, fields.get(name)) == normalize_value(name, value)
+    )
+
+
+def _vote(name: str, candidates: List[Tuple[Any, float]]) -> Tuple[Any, float]:
+    """Confidence-weighted vote; returns (value of the best reading of the winner, winning share)."""
+    weights: Dict[Any, float] = OrderedDict()
+    values: Dict[Any, Tuple[Any, float]] = {}
+    for value, weight in candidates:
+        key = normalize_value(name, value)
+        if key is None:
+            continue
+        weights[key] = weights.get(key, 0.0) + weight
+        if key not in values or weight > values[key][1]:
+            values[key] = (value, weight)
+    if not weights:
+        return None, 0.0
+    # Ties go to the value seen first (readings are sorted by confidence)
+    winner = max(weights, key=weights.get)
+    return values[winner][0], weights[winner] / sum(weights.values())
+
+
+def _line_item_amount_key(item: Dict[str, Any]) -> Optional[str]:
+    return next((key for key in LINE_ITEM_AMOUNT_KEYS if item.get(key) is not None), None)
+
+
+def _fuse_line_items(readings: List[FrameReading]) -> Tuple[List[Dict[str, Any]], float]:
+    """Line items supported by at least half of the confidence of readings that listed items."""
+    listed = [r for r in readings if r.fields.get("line_items")]
+    if not listed:
+        return [], 0.0
+    total_weight = sum(r.confidence for r in listed)
+    support: Dict[Any, float] = OrderedDict()
+    positions: Dict[Any, List[float]] = {}
+    members: Dict[Any, List[Tuple[Dict[str, Any], float]]] = {}
+    for reading in listed:
+        items = [item for item in reading.fields["line_items"] if isinstance(item, dict) and item.get("name")]
+        seen = set()
+        for position, item in enumerate(items):
+            key = normalize_value("name", item["name"])
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            support[key] = support.get(key, 0.0) + reading.confidence
+            positions.setdefault(key, []).append(position / max(len(items), 1))
+            members.setdefault(key, []).append((item, reading.confidence))
+
+    fused = []
+    for key, weight in support.items():
+        if weight < 0.5 * total_weight:
+            continue
+        item = dict(max(members[key], key=lambda member: member[1])[0])
+        amount_key = _line_item_amount_key(item)
+        if amount_key:
+            item[amount_key], _ = _vote(amount_key, [(m.get(amount_key), w) for m, w in members[key]])
+        fused.append((sum(positions[key]) / len(positions[key]), item))
+    fused.sort(key=lambda pair: pair[0])
+    kept = sum(support[normalize_value("name", item["name"])] for _, item in fused)
+    return [item for _, item in fused], kept / (total_weight * max(len(fused), 1))
+
+
+def fuse_readings(readings: Sequence[FrameReading]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Fuse the fields of several readings of the same receipt; returns (fields, agreement)."""
+    readings = sorted(readings, key=lambda r: r.confidence, reverse=True)
+    names: List[str] = []
+    for reading in readings:
+        names.extend(name for name in reading.fields if name not in names and name not in _SKIPPED_FIELDS)
+
+    fields: Dict[str, Any] = {}
+    agreement: Dict[str, float] = {}
+    for name in names:
+        value, share = _vote(name, [(r.fields.get(name), r.confidence) for r in readings])
+        fields[name] = value
+        if value is not None:
+            agreement[name] = round(share, 3)
+    if any("line_items" in r.fields for r in readings):
+        fields["line_items"], share = _fuse_line_items(readings)
+        if fields["line_items"]:
+            agreement["line_items"] = round(share, 3)
+    return fields, agreement
+
+
+def readings_agree(readings: Sequence[FrameReading], fields: Sequence[str] = KEY_FIELDS) -> bool:
+    """True when every reading that has a value for a key field reads the same value."""
+    for name in fields:
+        keys = {normalize_value(name, r.fields.get(name)) for r in readings} - {None}
+        if len(keys) > 1:
+            return False
+    return True
+
+
+class OCRFusion:
+    """Budgeted, concurrent OCR of receipt groups with field-level fusion."""
+
+    def __init__(self, config: Config, frames_per_receipt: Optional[int] = None,
+                 min_frames: Optional[int] = None, max_workers: Optional[int] = None):
+        self.config = config
+        self.frames_per_receipt = max(1, frames_per_receipt or config.fusion_frames_per_receipt)
+        self.min_frames = max(1, min(min_frames or config.fusion_min_frames, self.frames_per_receipt))
+        self.max_workers = max(1, max_workers or config.fusion_workers)
+
+    def group(self, items: Sequence[T], time_of: Callable[[T], float],
+              phash_of: Callable[[T], Optional[str]]) -> List[List[T]]:
+        """Group items per receipt with the configured time gap and pHash distance."""
+        groups = group_frames(items, time_of, phash_of, self.config.fusion_max_gap_s, self.config.fusion_phash_distance)
+        return [[items[i] for i in group] for group in groups]
+
+    def run(self, groups: Sequence[Sequence[T]], read: Callable[[T], Optional[FrameReading]]) -> List[FusionResult]:
+        """
+        OCR and fuse each group. Items in a group should be ordered best first;
+        ``read`` returns None when a frame yields nothing. Reads of all groups in
+        a wave run concurrently.
+        """
+        results = [FusionResult() for _ in groups]
+        next_item = [0] * len(groups)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            wanted = [min(self.min_frames, len(group)) for group in groups]
+            while True:
+                jobs = []
+                for g, group in enumerate(groups):
+                    for item in group[next_item[g]:wanted[g]]:
+                        jobs.append((g, item, executor.submit(read, item)))
+                    next_item[g] = max(next_item[g], wanted[g])
+                if not jobs:
+                    break
+                for g, item, future in jobs:
+                    results[g].calls += 1
+                    try:
+                        reading = future.result()
+                    except Exception as e:
+                        logger.warning(f"OCR fusion read failed: {e}")
+                        reading = None
+                    if reading is not None:
+                        results[g].readings.append((item, reading))
+
+                # Next wave: groups whose readings disagree, or that have no readings yet
+                for g, group in enumerate(groups):
+                    readings = [r for _, r in results[g].readings]
+                    settled = len(readings) >= self.min_frames and readings_agree(readings)
+                    wanted[g] = len(group) if settled else min(len(group), self.frames_per_receipt)
+                    if settled:
+                        next_item[g] = len(group)
+
+        for result in results:
+            result.readings.sort(key=lambda pair: pair[1].confidence, reverse=True)
+            if result.readings:
+                result.fields, result.agreement = fuse_readings([r for _, r in result.readings])
+        return results
@@ -0,0 +1,162 @@
+"""
+OCR payload optimization: send only the receipt, at the resolution OCR needs.
+
+Remote OCR calls were made with whole frames (or full-size enhanced crops)
+written as 3-channel JPEG-95, several MB per call. The payload is instead:
+
+1. cropped to the document (the detected ``DocumentQuad`` bounding box plus
+   ``warp_padding_percent``; optionally detected here on a downscaled copy)
+2. single-channel grayscale
+3. downscaled until the median text line is ``ocr_payload_text_height``
+   pixels (never upscaled, never longer than ``ocr_payload_max_side``)
+4. encoded as PNG and as JPEG at each of ``ocr_payload_jpeg_qualities``;
+   the smallest encoding whose ink fidelity (IoU of the binarized text of the
+   decoded payload vs. the source) is at least ``ocr_payload_min_fidelity``
+   is sent. PNG is lossless and wins on binarized crops, JPEG on photos.
+
+``scripts/benchmark_ocr_payload.py`` reports bytes per call and upload
+latency against the previous payloads.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .doc_detect import DocumentDetector
+from .types import Config, DocumentQuad
+
+logger = logging.getLogger(__name__)
+
+# Width at which text lines and documents are detected
+_ANALYSIS_WIDTH = 1280
+_DETECTION_WIDTH = 960
+
+
+@dataclass
+class OCRPayload:
+    """Encoded image sent to the OCR engine."""
+    data: bytes
+    format: str  # "png" or "jpeg"
+    quality: Optional[int]
+    shape: Tuple[int, int]  # (height, width) of the encoded image
+    fidelity: float = 1.0
+    source_bytes: int = 0  # size of the image file it was built from (0 when built from an array)
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.source_bytes - len(self.data))
+
+
+def ink_fidelity(reference: np.ndarray, decoded: np.ndarray) -> float:
+    """IoU of the dark (text) pixels of two grayscale images, binarized at the reference's Otsu threshold."""
+    threshold, ink = cv2.threshold(reference, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    decoded_ink = decoded <= threshold
+    ink = ink > 0
+    union = np.count_nonzero(ink | decoded_ink)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(ink & decoded_ink) / float(union)
+
+
+def median_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median text line height in pixels of ``gray`` (None when no text lines are found)."""
+    from services.ocr_gate import detect_text_lines
+
+    scale = min(1.0, _ANALYSIS_WIDTH / float(gray.shape[1]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    lines = detect_text_lines(gray)
+    if not lines:
+        return None
+    return float(np.median([h for _, _, _, h in lines])) / scale
+
+
+class OCRPayloadOptimizer:
+    """Crop, grayscale, downscale and encode images for OCR."""
+
+    def __init__(self, config: Config):
+        self.config = config
+
+    def detect_document(self, image: np.ndarray) -> Optional[DocumentQuad]:
+        """Detect the document on a downscaled copy (points in full-size coordinates)."""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        scale = min(1.0, _DETECTION_WIDTH / float(image.shape[1]))
+        small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+        quad = DocumentDetector(self.config).detect_document(small)
+        if quad is None or quad.points is None:
+            return None
+        quad.points = quad.points.astype(np.float32) / scale
+        return quad
+
+    def region(self, image: np.ndarray, doc_quad: Optional[DocumentQuad] = None) -> np.ndarray:
+        """Crop to the bounding box of the document plus padding (the whole image without a quad)."""
+        if doc_quad is None or doc_quad.points is None:
+            return image
+        height, width = image.shape[:2]
+        x, y, w, h = cv2.boundingRect(np.asarray(doc_quad.points, dtype=np.float32))
+        pad_x = int(w * self.config.warp_padding_percent)
+        pad_y = int(h * self.config.warp_padding_percent)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+        if x1 - x0 < 32 or y1 - y0 < 32:
+            return image
+        return image[y0:y1, x0:x1]
+
+    def prepare(self, image: np.ndarray, doc_quad: Optional[DocumentQuad] = None,
+                detect: bool = False) -> np.ndarray:
+        """Single-channel crop at the OCR engine's effective resolution."""
+        if doc_quad is None and detect:
+            doc_quad = self.detect_document(image)
+        region = self.region(image, doc_quad)
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+
+        height, width = gray.shape
+        scale = min(1.0, self.config.ocr_payload_max_side / float(max(height, width)))
+        text_height = median_text_height(gray)
+        if text_height:
+            scale = min(scale, self.config.ocr_payload_text_height / text_height)
+        if scale < 1.0:
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def encode(self, gray: np.ndarray) -> OCRPayload:
+        """Smallest encoding of ``gray`` that keeps the text (PNG when no JPEG quality does)."""
+        ok, png = cv2.imencode(".png", gray, [cv2.IMWRITE_PNG_COMPRESSION, 6])
+        best = OCRPayload(png.tobytes(), "png", None, gray.shape[:2])
+        for quality in sorted(self.config.ocr_payload_jpeg_qualities, reverse=True):
+            ok, jpeg = cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            if not ok or len(jpeg) >= len(best.data):
+                continue
+            fidelity = ink_fidelity(gray, cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE))
+            if fidelity < self.config.ocr_payload_min_fidelity:
+                # Lower qualities only lose more
+                break
+            best = OCRPayload(jpeg.tobytes(), "jpeg", int(quality), gray.shape[:2], round(fidelity, 4))
+        return best
+
+    def optimize(self, image: np.ndarray, doc_quad: Optional[DocumentQuad] = None,
+                 detect: bool = False) -> OCRPayload:
+        """Build the OCR payload of an image (BGR or grayscale)."""
+        return self.encode(self.prepare(image, doc_quad, detect))
+
+    def optimize_file(self, image_path: str, doc_quad: Optional[DocumentQuad] = None,
+                      detect: bool = False) -> Optional[OCRPayload]:
+        """Build the OCR payload of an image file (None when it cannot be read)."""
+        image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            return None
+        if image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        payload = self.optimize(image, doc_quad, detect)
+        payload.source_bytes = os.path.getsize(image_path)
+        return payload
@@ -216,10 +216,8 @@ class ImagePreprocessor:
         kernel = np.ones((2,2), np.uint8)
         morph = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
         
-        # BGRに戻す（Vision APIはカラー画像を期待）
-        result = cv2.cvtColor(morph, cv2.COLOR_GRAY2BGR)
-        
-        return result
+        # 1チャンネルのまま返す（Vision APIはグレースケールも受け付ける。3チャンネルに戻しても情報は増えず、保存・送信が重くなるだけ）
+        return morph
     
     def _assess_binary_quality(self, binary: np.ndarray) -> float:
         """
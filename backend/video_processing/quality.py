@@ -5,11 +5,112 @@ Frame quality assessment for receipt detection.
 import cv2
 import numpy as np
 import logging
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, List, Optional, Sequence
 from .types import FrameCandidate, DocumentQuad, Config
 
 logger = logging.getLogger(__name__)
 
+# Pixels per chunk in batch_frame_stats (bounds the temporary int16
+# Laplacian and index image)
+BATCH_STATS_PIXELS = 16_000_000
+
+
+def stack_gray(frames: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Stack same-sized BGR (or grayscale) frames into an (N, H, W) uint8 tensor.
+
+    The color conversion is a per-pixel operation, so it runs once over the
+    frames laid out as one tall image instead of once per frame.
+    """
+    batch = np.stack(frames)
+    if batch.ndim == 3:
+        return batch
+    n, h, w, _ = batch.shape
+    return cv2.cvtColor(batch.reshape(n * h, w, 3), cv2.COLOR_BGR2GRAY).reshape(n, h, w)
+
+
+def batch_frame_stats(gray: np.ndarray, bgr: Optional[np.ndarray] = None,
+                      edges: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Per-frame image statistics for a stacked (N, H, W) uint8 grayscale batch.
+
+    Every value matches what the single-frame scorers compute with OpenCV
+    (Laplacian variance, mean/std, 256-bin histogram, Canny edge ratio, glare
+    masks) up to floating point rounding. The batch is laid out as one tall
+    (N*H, W) image so each OpenCV call and NumPy reduction covers all frames;
+    only Canny, whose hysteresis is not local, still runs frame by frame.
+    Large batches are processed in chunks of about BATCH_STATS_PIXELS pixels.
+
+    Args:
+        gray: (N, H, W) uint8 grayscale frames (H >= 2)
+        bgr: optional (N, H, W, 3) uint8 BGR frames, required for the glare ratios
+        edges: compute the Canny edge ratio
+
+    Returns:
+        Dictionary of (N,) arrays: laplacian_var, mean, std, entropy, low_clip,
+        high_clip, edge_ratio, edge_mean and, with bgr, glare_ratio and white_ratio
+    """
+    if gray.ndim != 3 or gray.dtype != np.uint8 or gray.shape[1] < 2:
+        raise ValueError(f"expected an (N, H, W) uint8 batch with H >= 2, got {gray.shape} {gray.dtype}")
+    if bgr is not None and bgr.shape[:3] != gray.shape:
+        raise ValueError(f"bgr batch {bgr.shape} does not match gray batch {gray.shape}")
+    n, h, w = gray.shape
+    pixels = h * w
+    # Frame indices are stored as uint8 for the joint histogram
+    chunk = min(256, max(1, BATCH_STATS_PIXELS // pixels))
+    if n > chunk:
+        parts = [
+            batch_frame_stats(gray[i:i + chunk], bgr[i:i + chunk] if bgr is not None else None, edges)
+            for i in range(0, n, chunk)
+        ]
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    gray = np.ascontiguousarray(gray)
+    tall = gray.reshape(n * h, w)
+    stats: Dict[str, np.ndarray] = {}
+
+    # Laplacian (ksize=1) of the tall image is exact in int16. Rows at frame
+    # boundaries saw the neighbouring frame instead of the BORDER_REFLECT_101
+    # row, so swap that neighbour back.
+    lap = cv2.Laplacian(tall, cv2.CV_16S).reshape(n, h, w)
+    if n > 1:
+        lap[1:, 0] += gray[1:, 1].astype(np.int16) - gray[:-1, -1]
+        lap[:-1, -1] += gray[:-1, -2].astype(np.int16) - gray[1:, 0]
+    lap = lap.reshape(n, pixels)
+    lap_mean = lap.sum(axis=1, dtype=np.int64) / pixels
+    lap_sq = np.einsum("ni,ni->n", lap, lap, dtype=np.int64)
+    stats["laplacian_var"] = np.maximum(lap_sq / pixels - lap_mean ** 2, 0.0)
+    del lap
+
+    # Joint (intensity, frame) histogram in one calcHist call; counts are exact
+    # in float32 below 2**24 pixels per frame
+    frame_index = np.repeat(np.arange(n, dtype=np.uint8), pixels).reshape(n * h, w)
+    counts = cv2.calcHist([tall, frame_index], [0, 1], None, [256, n], [0, 256, 0, n]).T
+    levels = np.arange(256, dtype=np.float64)
+    stats["mean"] = counts @ levels / pixels
+    stats["std"] = np.sqrt(np.maximum(counts @ (levels ** 2) / pixels - stats["mean"] ** 2, 0.0))
+
+    # Same float32 arithmetic as cv2.calcHist + normalization in the per-frame path
+    hist = counts / counts.sum(axis=1, keepdims=True)
+    stats["low_clip"] = hist[:, :10].sum(axis=1)
+    stats["high_clip"] = hist[:, -10:].sum(axis=1)
+    stats["entropy"] = -np.sum(hist * np.log2(hist + np.float32(1e-10)), axis=1)
+
+    if edges:
+        edge_counts = np.array([cv2.countNonZero(cv2.Canny(frame, 50, 150)) for frame in gray], dtype=np.int64)
+        stats["edge_ratio"] = edge_counts / pixels
+        stats["edge_mean"] = edge_counts * 255 / pixels
+
+    if bgr is not None:
+        bgr_tall = np.ascontiguousarray(bgr).reshape(n * h, w, 3)
+        hsv = cv2.cvtColor(bgr_tall, cv2.COLOR_BGR2HSV)
+        # value > 250 and saturation < 30 / all channels > 250
+        glare = cv2.inRange(hsv, (0, 0, 251), (255, 29, 255)).reshape(n, pixels)
+        white = cv2.inRange(bgr_tall, (251, 251, 251), (255, 255, 255)).reshape(n, pixels)
+        stats["glare_ratio"] = np.count_nonzero(glare, axis=1) / pixels
+        stats["white_ratio"] = np.count_nonzero(white, axis=1) / pixels
+
+    return stats
+
 
 class QualityAssessor:
     """
@@ -60,7 +161,60 @@ class QualityAssessor:
         scores['textness'] = self._estimate_text_density(frame, doc_quad)
         
         # Calculate weighted total
-        total = (
+        total = self._weighted_total(scores)
+        
+        scores['total'] = max(0.0, min(1.0, total))
+        
+        return scores
+    
+    def assess_batch(self, frames: Sequence[np.ndarray],
+                     doc_quads: Optional[Sequence[Optional[DocumentQuad]]] = None,
+                     motion_scores: Optional[Sequence[float]] = None) -> List[Dict[str, float]]:
+        """
+        Score same-sized BGR frames in one pass; equivalent to assess_frame per frame.
+
+        Sharpness, exposure/contrast and glare come from batch_frame_stats; the
+        text density estimate depends on each frame's document quad and still
+        runs frame by frame.
+        """
+        if len(frames) == 0:
+            return []
+        doc_quads = doc_quads if doc_quads is not None else [None] * len(frames)
+        motion_scores = motion_scores if motion_scores is not None else [0.0] * len(frames)
+        
+        bgr = np.stack(frames)
+        gray = stack_gray(bgr)
+        stats = batch_frame_stats(gray, bgr if bgr.ndim == 4 else None, edges=False)
+        
+        sharpness = np.minimum(1.0, np.log(stats['laplacian_var'] + 1) / np.log(5000))
+        exposure = np.maximum(0, 1.0 - (stats['low_clip'] + stats['high_clip']) * 2)
+        contrast = np.minimum(1.0, stats['entropy'] / 8.0)
+        if bgr.ndim == 4:
+            glare = np.maximum(stats['glare_ratio'], stats['white_ratio'])
+            glare = np.where(glare > self.config.max_glare_ratio, np.minimum(1.0, glare * 3), glare)
+        else:
+            glare = np.array([self._detect_glare(frame) for frame in frames])
+        
+        results = []
+        for i, (doc_quad, motion_score) in enumerate(zip(doc_quads, motion_scores)):
+            scores = {'sharpness': float(sharpness[i])}
+            if doc_quad:
+                scores['doc_area'] = min(doc_quad.area_ratio / 0.5, 1.0)
+                scores['perspective'] = doc_quad.perspective_score
+            else:
+                scores['doc_area'] = 0.0
+                scores['perspective'] = 0.0
+            scores['exposure'] = float(exposure[i])
+            scores['contrast'] = float(contrast[i])
+            scores['stability'] = 1.0 - min(motion_score, 1.0)
+            scores['glare_penalty'] = -float(glare[i])
+            scores['textness'] = self._estimate_text_density(gray[i], doc_quad)
+            scores['total'] = max(0.0, min(1.0, self._weighted_total(scores)))
+            results.append(scores)
+        return results
+    
+    def _weighted_total(self, scores: Dict[str, float]) -> float:
+        return (
             scores['sharpness'] * self.config.weight_sharpness +
             scores['doc_area'] * self.config.weight_doc_area +
             scores['perspective'] * self.config.weight_perspective +
@@ -69,10 +223,6 @@ class QualityAssessor:
             scores['glare_penalty'] * abs(self.config.weight_glare_penalty) +
             scores['textness'] * self.config.weight_textness
         )
-        
-        scores['total'] = max(0.0, min(1.0, total))
-        
-        return scores
     
     def _calculate_sharpness(self, image: np.ndarray) -> float:
         """
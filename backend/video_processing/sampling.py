@@ -21,6 +21,8 @@ class AdaptiveSampler:
         self.config = config
         self.prev_frame = None
         self.prev_gray = None
+        self.frames_decoded = 0
+        self.bytes_decoded = 0
         
     def sample_frames(self, video_path: str) -> List[FrameCandidate]:
         """
@@ -100,6 +102,8 @@ class AdaptiveSampler:
             ret, frame = cap.read()
             if not ret:
                 break
+            self.frames_decoded += 1
+            self.bytes_decoded += frame.nbytes
             
             # Calculate stability/motion score
             motion_score = self._calculate_motion(frame)
@@ -123,6 +127,7 @@ class AdaptiveSampler:
                     time_s=time_s,
                     frame=None,  # Don't keep in memory
                     frame_path=frame_path,
+                    frame_size=(frame.shape[1], frame.shape[0]),
                     motion_score=motion_score,
                     stability_score=1.0 - min(motion_score, 1.0)
                 )
@@ -40,6 +40,38 @@ class Config:
     target_min: int = 7
     target_max: int = 15
     
+    # OCR budget (expected utility of OCR'ing each selected frame)
+    ocr_budget: int = 0  # max OCR calls per video (0 = no limit)
+    ocr_min_utility: float = 0.1  # frames below this utility are not sent to OCR
+    ocr_novelty_distance: int = 16  # pHash distance at which a frame counts as entirely new
+    ocr_weight_textness: float = 0.4
+    ocr_weight_doc_area: float = 0.35
+    ocr_weight_sharpness: float = 0.25
+    
+    # OCR engine
+    ocr_engine: str = "vision"  # vision (Google Cloud Vision) or local (local_ocr)
+    local_ocr_engine: str = "tesseract"  # tesseract or paddle
+    local_ocr_languages: str = "jpn+eng"  # tesseract language data
+    local_ocr_paddle_lang: str = "japan"
+    local_ocr_workers: int = 0  # OCR processes (0 = available cores)
+    local_ocr_prefilter: bool = False  # with the vision engine: skip frames where local OCR finds little text
+    local_ocr_min_chars: int = 10  # prefilter: min characters found locally to send a frame to remote OCR
+    
+    # Multi-frame OCR fusion (ocr_fusion)
+    ocr_fusion: bool = True  # group frames per receipt and fuse their OCR fields
+    fusion_max_gap_s: float = 1.5  # max time between consecutive frames of one receipt
+    fusion_phash_distance: int = 12  # max pHash distance to a frame of the same receipt
+    fusion_frames_per_receipt: int = 3  # max OCR calls per receipt
+    fusion_min_frames: int = 2  # frames read first; more only when they disagree
+    fusion_workers: int = 4  # concurrent OCR calls
+    
+    # OCR payload (ocr_payload): what is sent per OCR call
+    ocr_payload: bool = True  # crop / grayscale / downscale / re-encode before sending
+    ocr_payload_max_side: int = 2048  # longest side of the payload
+    ocr_payload_text_height: int = 28  # downscale until the median text line is this tall (px)
+    ocr_payload_jpeg_qualities: Tuple[int, ...] = (90, 80, 70, 60)  # tried against lossless PNG
+    ocr_payload_min_fidelity: float = 0.9  # min ink IoU of a JPEG payload vs. its source
+    
     # Text deduplication
     text_jaccard_threshold: float = 0.85
     text_token_similarity: float = 0.90
@@ -74,6 +106,7 @@ class FrameCandidate:
     time_s: float
     frame: Optional[np.ndarray]  # Can be None after processing
     frame_path: str
+    frame_size: Optional[Tuple[int, int]] = None  # (width, height) of the analyzed frame
     
     # Quality scores
     sharpness_score: float = 0.0